@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''End-to-end latency of read-only limited-apt commands: run in the process of the user
+against escalated through sudo and the privileged script (forced by LIMITED_APT_ALWAYS_ESCALATE).
+
+It runs the installed program, so it needs a configured machine (the state, python-apt
+and the sudo rule): "benchmarks/cli.py --program /usr/local/bin/limited-apt -r 20".
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+PROGRAM_NAME = 'limited-apt-cli-benchmarks'
+
+COMMANDS = [["list-of-mine"], ["owners-of", "bash"], ["ownership-report"], ["search-enclosure", "lib"],
+            ["print-enclosure"]]
+
+
+def measure(command, environment, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        durations.append(time.perf_counter() - start)
+    return {"min": min(durations), "mean": sum(durations) / repeat, "max": max(durations)}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME,
+                                     description='''%(prog)s times read-only commands of the installed '''
+                                     '''limited-apt in the process of the user and escalated through sudo.''')
+    parser.add_argument('-p', '--program', default='/usr/local/bin/limited-apt', help='limited-apt executable')
+    parser.add_argument('-r', '--repeat', type=int, default=10, help='How many times to run every command')
+    args = parser.parse_args()
+
+    in_process = dict(os.environ)
+    in_process.pop('LIMITED_APT_ALWAYS_ESCALATE', None)
+    escalated = dict(os.environ, LIMITED_APT_ALWAYS_ESCALATE='1')
+    results = {}
+    for arguments in COMMANDS:
+        command = [args.program] + arguments
+        results[" ".join(arguments)] = {"in-process": measure(command, in_process, args.repeat),
+                                        "escalated": measure(command, escalated, args.repeat)}
+
+    json.dump({"parameters": {"program": args.program, "repeat": args.repeat}, "results": results},
+              sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
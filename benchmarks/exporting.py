@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Peak memory and wall time of writing limited-apt XML structures: incremental writers of
+the structures against building the whole element tree first (the way they were written before).
+
+Run it from the repository root: "PYTHONPATH=src benchmarks/exporting.py --packages 200000".
+Every measurement is made in a forked process, so peaks do not hide each other. Memory is reported
+in kilobytes: "rss" is the growth of the resident set (libxml2 nodes included), "python" is the peak
+of Python allocations traced by "tracemalloc". Linux only (reads "/proc/self/status").
+'''
+
+import argparse
+import itertools
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+from lxml import etree
+from limitedapt.packages import *
+from limitedapt.enclosure import *
+from limitedapt.enclosure import _package_element
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+from limitedapt.synthetic import generate_cache
+from generating import *
+
+
+PROGRAM_NAME = 'limited-apt-exporting-benchmarks'
+
+
+def write_tree(file, root_tag, elements, root_attributes=None):
+    '''Reference writer: the whole document is built in memory and serialized at once'''
+    root = etree.Element(root_tag, root_attributes or {})
+    root.extend(elements)
+    etree.ElementTree(root).write(file, pretty_print=True, encoding="UTF-8", xml_declaration=True)
+
+
+def enclosure_elements(enclosure):
+    for rule in enclosure.rules:
+        yield rule.to_xml_element()
+    for name in sorted(enclosure):
+        yield _package_element(name, enclosure.arch_and_versions(name))
+
+
+def coownership_elements(coownership):
+    for package in sorted(coownership):
+        package_element = etree.Element("package", name=package.name, arch=package.architecture)
+        for user in sorted(coownership.owners_of(package)):
+            etree.SubElement(package_element, "user", name=user)
+        yield package_element
+
+
+def priorities_elements(priorities):
+    for name, group in itertools.groupby(priorities.items(), key=lambda item: item[0].name):
+        package_element = etree.Element("package", name=name)
+        for package, state in group:
+            if state.status == Status.HAS_QUESTIONS:
+                etree.SubElement(package_element, "arch", name=package.architecture, status=str(state.status),
+                                 priority=str(state.priority))
+            else:
+                etree.SubElement(package_element, "arch", name=package.architecture, status=str(state.status))
+        yield package_element
+
+
+def generate_priorities(cache):
+    priorities = DebconfPriorities()
+    for index, pkg in enumerate(cache):
+        if pkg.candidate is None:
+            continue
+        if index % 20 == 0:
+            state = PackageState(Status.HAS_QUESTIONS, list(Priority)[index % len(Priority)])
+        else:
+            state = PackageState(Status.HAS_NOT_QUESTIONS)
+        priorities[ConcretePackage(pkg.shortname, pkg.candidate.architecture)] = state
+    return priorities
+
+
+def memory_status(field):
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError("There is no {0} in /proc/self/status".format(field))
+
+
+def measure_in_child(function):
+    '''Runs `function` in a forked process. Returns its wall time and memory peaks'''
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            rss_before = memory_status("VmRSS")
+            tracemalloc.start()
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            python_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result = {"seconds": elapsed, "rss": memory_status("VmHWM") - rss_before,
+                      "python": python_peak // 1024}
+            with os.fdopen(write_end, "wb") as pipe:
+                pickle.dump(result, pipe)
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end, "rb") as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    return pickle.loads(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME,
+                                     description='''%(prog)s compares incremental and whole-tree writing '''
+                                     '''of limited-apt XML structures on synthetic data.''')
+    parser.add_argument('-n', '--packages', type=int, default=100000, help='Count of packages in the synthetic cache')
+    parser.add_argument('-u', '--users', type=int, default=50, help='Count of users owning packages')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Seed of the generators')
+    args = parser.parse_args()
+
+    cache = generate_cache(args.packages, seed=args.seed)
+    structures = {
+        "enclosure": (generate_enclosure(cache, seed=args.seed), "enclosure", enclosure_elements),
+        "coownership": (generate_coownership(cache, generate_users(args.users), seed=args.seed), "packages",
+                        coownership_elements),
+        "priorities": (generate_priorities(cache), "debconf-priorities", priorities_elements),
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="limited-apt-exporting-") as workdir:
+        filename = os.path.join(workdir, "exported")
+        for name, (structure, root_tag, elements) in structures.items():
+            results[name] = {
+                "tree": measure_in_child(lambda: write_tree(filename, root_tag, elements(structure))),
+                "incremental": measure_in_child(lambda: structure.export_to_xml(filename)),
+                "compact": measure_in_child(lambda: structure.export_to_xml(filename, pretty=False)),
+            }
+            results[name]["size"] = os.path.getsize(filename)
+
+    json.dump({"parameters": {"packages": args.packages, "users": args.users, "seed": args.seed},
+               "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Generators of synthetic limited-apt state (enclosures, coownership lists, priority databases)'''
+
+import os
+import random
+import sqlite3
+from limitedapt.packages import *
+from limitedapt.enclosure import *
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+from limitedapt.rules import EnclosureRule
+from limitedapt.synthetic import SECTIONS, TAGS
+from limitedapt.tasks import Tasks
+
+
+def generate_enclosure(cache, seed=0, enclosed_ratio=0.8, full_ratio=0.1):
+    '''Encloses about `enclosed_ratio` of candidates of the cache. About `full_ratio` of them
+    are enclosed by "fullpackage" elements, the rest by their exact versions
+    '''
+    rnd = random.Random(seed)
+    enclosure = Enclosure()
+    for pkg in cache:
+        if pkg.candidate is None or rnd.random() >= enclosed_ratio:
+            continue
+        if rnd.random() < full_ratio:
+            arch_and_versions = ArchAndVersions(isevery=True)
+            arch_and_versions.every = Versions(isevery=True)
+            enclosure.add_package(pkg.shortname, arch_and_versions)
+        else:
+            enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.candidate.architecture,
+                                                             pkg.candidate.version))
+            if pkg.installed is not None and pkg.installed.version != pkg.candidate.version:
+                enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.installed.architecture,
+                                                                 pkg.installed.version))
+    return enclosure
+
+
+def generate_rule_enclosure(cache, seed=0, rule_count=200):
+    '''Enclosure of rules only: name globs (prefixes of existing names), sections, tags and
+    version relations mixed at random
+    '''
+    rnd = random.Random(seed)
+    names = [pkg.shortname for pkg in cache]
+    enclosure = Enclosure()
+    for _ in range(rule_count):
+        rule = EnclosureRule()
+        kind = rnd.random()
+        if kind < 0.5:
+            name = rnd.choice(names)
+            rule.names.append(name[:rnd.randint(3, max(3, len(name)))] + "*")
+        elif kind < 0.6:
+            rule.name_regexes.append("{0}[0-9]+".format(rnd.choice(names)[:4]))
+        if rnd.random() < 0.4:
+            rule.sections.extend(rnd.sample(SECTIONS, 2))
+        if rnd.random() < 0.3:
+            rule.tags.append(rnd.choice(TAGS))
+        if rnd.random() < 0.1:
+            rule.versions.append((">=", "1.{0}".format(rnd.randint(0, 9))))
+        enclosure.add_rule(rule)
+    return enclosure
+
+
+def generate_users(user_count):
+    return ["user{0}".format(index) for index in range(user_count)]
+
+
+def generate_coownership(cache, users, seed=0, owners_per_package=3):
+    '''Gives every manually installed package of the cache to random users (and sometimes to root)'''
+    rnd = random.Random(seed)
+    coownership = CoownershipList()
+    for pkg in cache:
+        if pkg.is_installed and not pkg.is_auto_installed:
+            package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
+            for user in rnd.sample(users, min(len(users), rnd.randint(1, owners_per_package))):
+                coownership.add_ownership(package, user, also_root=rnd.random() < 0.2)
+    return coownership
+
+
+def generate_priorities_db(cache, filename, seed=0, questions_ratio=0.05, errors_ratio=0.01):
+    '''Writes the "debconf-priorities.sqlite" database for every candidate of the cache'''
+    rnd = random.Random(seed)
+    if os.path.exists(filename):
+        os.remove(filename)
+    # Create the schema the same way limited-apt does
+    DebconfPrioritiesDB("sqlite:///" + filename)
+    rows = []
+    for pkg in cache:
+        if pkg.candidate is None:
+            continue
+        chance = rnd.random()
+        if chance < errors_ratio:
+            status, priority = Status.PROCESSING_ERROR, None
+        elif chance < errors_ratio + questions_ratio:
+            status, priority = Status.HAS_QUESTIONS, rnd.choice(list(Priority))
+        else:
+            status, priority = rnd.choice([Status.HAS_NOT_QUESTIONS, Status.NO_CONFIG_FILE]), None
+        rows.append((pkg.shortname, pkg.candidate.architecture, status.name,
+                     priority.name if priority is not None else None))
+    connection = sqlite3.connect(filename)
+    with connection:
+        connection.executemany("INSERT INTO priorities (name, architecture, status, priority) VALUES (?, ?, ?, ?)",
+                               rows)
+    connection.close()
+
+
+def generate_tasks(cache, enclosure, coownership, user, seed=0, install_count=20, remove_count=5):
+    '''Tasks of `user`: installing random packages whose dependencies are enclosed too
+    and removing some of his packages
+    '''
+    rnd = random.Random(seed)
+
+    def is_enclosed(pkg):
+        return VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.candidate.version) in enclosure
+
+    not_installed = [pkg for pkg in cache if not pkg.is_installed and pkg.candidate is not None and is_enclosed(pkg)]
+    rnd.shuffle(not_installed)
+    tasks = Tasks()
+    for pkg in not_installed:
+        if len(tasks.install) == install_count:
+            break
+        pkg.mark_install()
+        if all(is_enclosed(changed) for changed in cache.get_changes()):
+            tasks.install.append(pkg.name)
+        cache.clear()
+    his_packages = sorted(coownership.his_packages(user))
+    tasks.remove = [str(package) for package in rnd.sample(his_packages, min(remove_count, len(his_packages)))]
+    return tasks
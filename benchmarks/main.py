@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmarks of limited-apt policy layer on synthetic data.
+
+Run it from the repository root: "PYTHONPATH=src benchmarks/main.py --packages 50000 -o results.json".
+Every benchmark is repeated several times, results (in seconds) go out as JSON.
+'''
+
+import argparse
+import json
+import os
+import platform
+import pwd
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from datetime import datetime
+from limitedapt import constants
+from limitedapt import single
+from limitedapt import runners
+from limitedapt.packages import *
+from limitedapt.enclosure import *
+from limitedapt.coownership import *
+from limitedapt.debconf import Priority, debconf_priorities_db_to_map
+from limitedapt.changes import get_all_changes
+from limitedapt.errors import TerminationError
+from limitedapt.installability import analyse_installability
+from limitedapt.modes import *
+from limitedapt.settings import Settings, EnclosureRecord
+from limitedapt.synthetic import generate_cache
+from limitedapt.tasks import *
+from limitedapt.updatetime import UpdateTimes
+from generating import *
+
+
+PROGRAM_NAME = 'limited-apt-benchmarks'
+
+
+def measure(function, repeat):
+    '''Runs `function` `repeat` times. Returns statistics of elapsed seconds'''
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {"repeat": repeat, "min": min(durations), "mean": sum(durations) / repeat, "max": max(durations)}
+
+
+class QuietInterface(Modded):
+    '''Error handlers and applying UI which keep silence'''
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class BenchmarkRunner(runners.ModificationRunner):
+    '''Runner for an ordinary (non-root) user who is a member of limited-apt groups'''
+
+    @staticmethod
+    def _is_belong_to_group(user_name, group_name):
+        return group_name != constants.UNIX_LIMITEDAPT_ROOTS_GROUPNAME
+
+    def _ModificationRunner__check_free_space(self):
+        pass
+
+
+def ordinary_user():
+    for entry in pwd.getpwall():
+        if entry.pw_uid != 0:
+            return entry
+    raise RuntimeError("There is no non-root user on this machine")
+
+
+class Bench:
+
+    def __init__(self, workdir, package_count, user_count, seed, repeat):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.user = ordinary_user()
+
+        start = time.perf_counter()
+        self.cache = generate_cache(package_count, seed=seed)
+        single.set_cache_factory(lambda: self.cache)
+        self.enclosure = generate_enclosure(self.cache, seed=seed)
+        self.rule_enclosure = generate_rule_enclosure(self.cache, seed=seed)
+        users = generate_users(user_count) + [self.user.pw_name]
+        self.coownership = generate_coownership(self.cache, users, seed=seed)
+        self.tasks = generate_tasks(self.cache, self.enclosure, self.coownership, self.user.pw_name, seed=seed)
+        self.generation_time = time.perf_counter() - start
+
+        constants.PATH_TO_PROGRAM_VARIABLE = workdir
+        constants.PATH_TO_UNCOMPLETED_TASKS = os.path.join(workdir, constants.UNCOMPLETED_TASKS_FILENAME)
+        self.enclosure_filename = os.path.join(workdir, "synthetic.enclosure")
+        self.coownership_filename = os.path.join(workdir, "coownership-list")
+        self.enclosure.export_to_xml(self.enclosure_filename)
+        self.coownership.export_to_xml(self.coownership_filename)
+        generate_priorities_db(self.cache, os.path.join(workdir, "debconf-priorities.sqlite"), seed=seed)
+        self.priorities = debconf_priorities_db_to_map("sqlite:///" + os.path.join(workdir, "debconf-priorities.sqlite"))
+        self.installability = analyse_installability(self.cache, self.enclosure, self.priorities, Priority.HIGH, {})
+        update_times = UpdateTimes()
+        update_times.distro = update_times.enclosure = update_times.priorities = datetime.now()
+        update_times.export_to_xml(os.path.join(workdir, "updatetimes"))
+
+    def enclosure_import(self):
+        Enclosure().import_from_xml(self.enclosure_filename)
+
+    def enclosure_contains(self):
+        enclosure = MixedEnclosure(self.enclosure)
+        for pkg in self.cache:
+            described_package(pkg) in enclosure
+
+    def enclosure_rules_contains(self):
+        # Recompiled every time to count compilation in
+        self.rule_enclosure.replace_rules(self.rule_enclosure.rules)
+        for pkg in self.cache:
+            described_package(pkg) in self.rule_enclosure
+
+    def installability_analysis(self):
+        analyse_installability(self.cache, self.enclosure, self.priorities, Priority.HIGH, {})
+
+    def installability_reanalysis(self):
+        # Nothing has changed: every result which is not blocked by a dependency is reused
+        analyse_installability(self.cache, self.enclosure, self.priorities, Priority.HIGH, {}, self.installability)
+
+    def coownership_import(self):
+        CoownershipList().import_from_xml(self.coownership_filename)
+
+    def coownership_export(self):
+        self.coownership.export_to_xml(os.path.join(self.workdir, "coownership-list.copy"))
+
+    def coownership_queries(self):
+        for pkg in self.cache:
+            if pkg.is_installed:
+                package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
+                self.coownership.owners_of(package)
+                self.coownership.is_sole_own(package, self.user.pw_name)
+        list(self.coownership.his_packages(self.user.pw_name))
+
+    def coownership_edit(self):
+        packages = [package for package in self.coownership
+                    if not self.coownership.is_own(package, "benchmark-user")]
+        for package in packages:
+            self.coownership.add_ownership(package, "benchmark-user")
+        for package in packages:
+            self.coownership.remove_ownership(package, "benchmark-user")
+
+    def __mark_tasks(self):
+        self.cache.clear()
+        with self.cache.actiongroup():
+            for name in self.tasks.install:
+                self.cache[name].mark_install()
+            for name in self.tasks.remove:
+                self.cache[name].mark_delete()
+
+    def all_changes(self):
+        self.__mark_tasks()
+        real_tasks = RealTasks(self.tasks)
+        start = time.perf_counter()
+        get_all_changes(self.cache.get_changes(), real_tasks)
+        return time.perf_counter() - start
+
+    def __runner(self):
+        settings = Settings(self.workdir)
+        settings.urls.enclosures = [EnclosureRecord("synthetic", "file://" + self.enclosure_filename)]
+        settings.updatetime_module = SimpleNamespace(is_distro_update_needed=lambda last_update: False,
+                                                     is_enclosure_update_needed=lambda last_update: False,
+                                                     is_priorities_update_needed=lambda last_update: False)
+        display_modes = DisplayModes(False, False, False)
+        work_modes = WorkModes(remove_dependencies=False, force=False, purge_unused=False, fatal_errors=False,
+                               assume_yes=True, simulate=True)
+        return BenchmarkRunner(settings, self.user.pw_uid, display_modes, work_modes, QuietInterface(),
+                               QuietInterface(), runners.Progresses(None, None, None), sys.stderr)
+
+    def runner_operations(self):
+        self.cache.clear()
+        runner = self.__runner()
+        try:
+            runner.perform_operations(self.tasks)
+        except TerminationError:
+            pass
+
+    def runner_upgrade(self):
+        self.cache.clear()
+        runner = self.__runner()
+        try:
+            runner.upgrade(full_upgrade=False)
+        except TerminationError:
+            pass
+
+    def run(self, names):
+        results = {}
+        for name in names:
+            if name == "all-changes":
+                durations = [self.all_changes() for _ in range(self.repeat)]
+                results[name] = {"repeat": self.repeat, "min": min(durations),
+                                 "mean": sum(durations) / self.repeat, "max": max(durations)}
+            else:
+                results[name] = measure(getattr(self, name.replace("-", "_")), self.repeat)
+        return results
+
+
+BENCHMARKS = ["enclosure-import", "enclosure-contains", "enclosure-rules-contains", "installability-analysis",
+              "installability-reanalysis", "coownership-import", "coownership-export",
+              "coownership-queries", "coownership-edit", "all-changes", "runner-operations", "runner-upgrade"]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME,
+                                     description='''%(prog)s times limited-apt structures and runners '''
+                                     '''on synthetic data of configurable size.''')
+    parser.add_argument('-n', '--packages', type=int, default=20000, help='Count of packages in the synthetic cache')
+    parser.add_argument('-u', '--users', type=int, default=50, help='Count of users owning packages')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Seed of the generators')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='How many times to repeat every benchmark')
+    parser.add_argument('-b', '--benchmark', action='append', choices=BENCHMARKS,
+                        help='Run only this benchmark (may be specified several times)')
+    parser.add_argument('-o', '--output', type=str, help='File to write JSON results to (stdout by default)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="limited-apt-benchmarks-") as workdir:
+        bench = Bench(workdir, args.packages, args.users, args.seed, args.repeat)
+        report = {
+            "timestamp": datetime.now().isoformat(sep=" ", timespec="seconds"),
+            "python": platform.python_version(),
+            "parameters": {"packages": args.packages, "users": args.users, "seed": args.seed,
+                           "repeat": args.repeat},
+            "generation": bench.generation_time,
+            "results": bench.run(args.benchmark or BENCHMARKS)
+        }
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''Time to the first byte and throughput of printing "list-of-mine": the sorted list printed
+line by line (the way it was printed before) against the streaming output in chunks
+in the plain, NUL-separated and JSON lines formats.
+
+Run it from the repository root: "PYTHONPATH=src benchmarks/streaming.py --packages 50000".
+The list is made from a synthetic dpkg status file read anew every time, the output goes
+to a sink which only remembers when the first byte has come.
+'''
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from limitedapt import constants
+from limitedapt.coownership import CoownershipList
+from limitedapt.dpkgstatus import DpkgStatus
+from limitedapt.modes import DisplayModes
+from limitedapt.output import *
+from limitedapt.runners import PrintRunner
+from limitedapt.settings import Settings
+
+
+PROGRAM_NAME = 'limited-apt-streaming-benchmarks'
+
+
+def write_status(filename, package_count):
+    architectures = ["amd64", "amd64", "amd64", "all", "i386"]
+    with open(filename, "w") as file:
+        # dpkg keeps the status file unsorted in general
+        for number in range(package_count):
+            index = (number * 7919) % package_count
+            file.write("Package: package{0}\nStatus: install ok installed\nPriority: optional\n"
+                       "Architecture: {1}\nVersion: 1.{0}-1\nDescription: synthetic package {0}\n"
+                       " Long description.\n\n".format(index, architectures[index % len(architectures)]))
+
+
+class Sink(io.RawIOBase):
+    '''Discards the data. Remembers the time of the first write'''
+
+    def __init__(self):
+        super().__init__()
+        self.first_write = None
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.first_write is None and len(data):
+            self.first_write = time.perf_counter()
+        self.size += len(data)
+        return len(data)
+
+
+class BenchmarkPrintRunner(PrintRunner):
+
+    status_filename = None
+
+    def _dpkg_status(self):
+        return DpkgStatus(self.status_filename, os.devnull, native_architecture="amd64")
+
+    @staticmethod
+    def _is_belong_to_group(user_name, group_name):
+        return False
+
+
+def print_lines(runner, sink):
+    # What "print" to a pipe is: a text wrapper over a buffered writer
+    stdout = io.TextIOWrapper(io.BufferedWriter(sink), encoding="utf-8")
+    for name in runner.get_printed_list_of_mine():
+        print(name, file=stdout)
+    stdout.flush()
+
+
+def chunked_writer(output_format, sort):
+    def write(runner, sink):
+        with ChunkedWriter(sink, output_format) as writer:
+            writer.write_all(runner.get_list_of_mine_entries(sort))
+    return write
+
+
+WRITERS = {
+    "sorted-print": print_lines,
+    "sorted-chunked": chunked_writer(OutputFormat.PLAIN, True),
+    "streaming-plain": chunked_writer(OutputFormat.PLAIN, False),
+    "streaming-nul": chunked_writer(OutputFormat.NUL, False),
+    "streaming-jsonl": chunked_writer(OutputFormat.JSON_LINES, False),
+}
+
+
+def measure(write, make_runner, package_count, repeat):
+    first_bytes, totals = [], []
+    for _ in range(repeat):
+        sink = Sink()
+        start = time.perf_counter()
+        write(make_runner(), sink)
+        totals.append(time.perf_counter() - start)
+        first_bytes.append(sink.first_write - start)
+    return {"first-byte": min(first_bytes), "total": min(totals), "lines-per-second": package_count / min(totals),
+            "bytes": sink.size}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME,
+                                     description='''%(prog)s times sorted and streaming output of '''
+                                     '''"list-of-mine" on a synthetic dpkg status file.''')
+    parser.add_argument('-n', '--packages', type=int, default=50000, help='Count of packages in the status file')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='How many times to repeat every benchmark')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="limited-apt-streaming-") as workdir:
+        old_variable = constants.PATH_TO_PROGRAM_VARIABLE
+        constants.PATH_TO_PROGRAM_VARIABLE = workdir
+        BenchmarkPrintRunner.status_filename = os.path.join(workdir, "status")
+        write_status(BenchmarkPrintRunner.status_filename, args.packages)
+        # Nobody else owns anything: all the installed packages are root's
+        CoownershipList().export_to_xml(os.path.join(workdir, "coownership-list"))
+
+        def make_runner():
+            return BenchmarkPrintRunner(Settings(workdir), 0, DisplayModes(False, False, False), None)
+
+        try:
+            for name, write in WRITERS.items():
+                results[name] = measure(write, make_runner, args.packages, args.repeat)
+        finally:
+            constants.PATH_TO_PROGRAM_VARIABLE = old_variable
+
+    json.dump({"parameters": {"packages": args.packages, "repeat": args.repeat}, "results": results},
+              sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,7 @@ from limitedapt import single
 from limitedapt.constants import *
 from limitedapt.modes import Modded
 from limitedapt.debconf import *
+from limitedapt.installability import Installability
 from metrics import *
 
 
@@ -149,6 +150,19 @@ class ErrorHandlers(Modded):
             print('''Error: package "{0}" which you {1} is system-constitutive and nobody '''
                   '''but root may install it'''.format(name, purpose))
 
+    def not_installable(self, pkg, installability):
+        name = self.modes.pkg_str(pkg)
+        if installability.status == Installability.DEPENDENCY_NOT_ENCLOSED:
+            reason = 'its dependency "{0}" cannot be installed by you'.format(installability.blocker)
+        elif installability.status == Installability.DEBCONF_PRIORITY:
+            reason = 'it has questions at least "{0}" to configure with Debconf'.\
+                format(installability.blocker)
+        elif installability.status == Installability.UNKNOWN_DEBCONF_PRIORITY:
+            reason = 'its Debconf configuration is unknown'
+        else:
+            reason = 'it is not trusted'
+        print('''Error: package "{0}" cannot be installed by you because {1}'''.format(name, reason))
+
     def now_install_warning(self, pkg):
         print('''Warning: this new version ("{1}") of package "{0}" has become system-constitutive now'''.
               format(self.modes.pkg_str(pkg), pkg.candidate.version))
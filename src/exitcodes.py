@@ -22,6 +22,7 @@ class ExitCodes(enum.Enum):
     GOOD = 0
     INTERRUPTED = 1
     INVALID_OPERATION_ON_THE_SUFFIX = 2
+    BAD_SEARCH_PATTERN = 3
     YOU_HAVE_NOT_PRIVILEGES = 10
     WANT_TO_DO_SYSTEM_COMPOSING = 11
     SYSTEM_COMPOSING_BY_RESOLVER = 12
@@ -31,6 +32,9 @@ class ExitCodes(enum.Enum):
     DPKG_JOUNAL_DIRTY = 20
     PRECEDING_TASKS_HAS_NOT_BEEN_COMPLETED = 21
     NOTHING_INTERRUPTED = 22
+    NO_RESOLVED_PLAN = 23
+    RESOLVED_PLAN_IS_STALE = 24
+    CONFIGURING_FAILED = 25
     DISTRO_HAS_NOT_BEEN_UPDATED = 30
     GROUP_NOT_EXIST = 40
     PRIVILEGED_SCRIPT_HAS_BEEN_RUN_INCORRECTLY = 50
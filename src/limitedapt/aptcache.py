@@ -0,0 +1,55 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Adapter of "apt.Cache" to the package cache interface ("limitedapt.cachebackend").
+
+"apt.package.Package" satisfies the interface except for dpkg states of packages: they are read
+from its low-level package ("apt_pkg.Package") here only.
+'''
+
+import apt
+import apt_pkg
+from .cachebackend import PackageBackend, CacheBackend
+
+
+class AptPackage(apt.package.Package):
+
+    @property
+    def is_reinstall_required(self):
+        return self._pkg.inst_state in (apt_pkg.INSTSTATE_REINSTREQ, apt_pkg.INSTSTATE_HOLD_REINSTREQ)
+
+    @property
+    def is_configured(self):
+        return self._pkg.current_state == apt_pkg.CURSTATE_INSTALLED and not self.is_reinstall_required
+
+    def mark_reinstall(self):
+        self._pcache._depcache.set_reinstall(self._pkg, True)
+
+
+class AptCache(apt.Cache):
+    '''"apt.Cache" whose packages are "AptPackage"s'''
+
+    def _rawpkg_to_pkg(self, rawpkg):
+        return self._weakref.setdefault(rawpkg.get_fullname(pretty=True), AptPackage(self, rawpkg))
+
+    def __iter__(self):
+        # Sorted by names as in "apt.Cache"
+        for name in self.keys():
+            yield self._weakref.setdefault(name, AptPackage(self, self._cache[name]))
+
+
+PackageBackend.register(AptPackage)
+CacheBackend.register(AptCache)
@@ -0,0 +1,208 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Batch mode: many operations run one after another in one process. The cache is opened once
+(and reopened only after commits), the enclosure is loaded once and the coownership list is
+loaded anew only when its file has been changed (by the commits of the batch itself).
+
+Every line of a batch is one operation: a subcommand ("install", "remove", "physically-remove",
+"purge", "markauto", "unmarkauto" followed by packages, "safe-upgrade" or "full-upgrade")
+or packages with suffixes as for "diverse" subcommand. Empty lines and comments ("#") are skipped.
+'''
+
+import copy
+import enum
+import time
+from .errors import *
+from .tasks import *
+from .runners import *
+from .fileutils import file_signature
+
+
+class BatchSyntaxError(Error):
+
+    def __init__(self, line_number, line, reason):
+        super().__init__(line_number, line, reason)
+        self.__line_number = line_number
+        self.__line = line
+        self.__reason = reason
+
+    @property
+    def line_number(self):
+        return self.__line_number
+
+    @property
+    def line(self):
+        return self.__line
+
+    @property
+    def reason(self):
+        return self.__reason
+
+
+# Subcommands of the operation lines and the fields of "Tasks" they fill
+OPERATION_SUBCOMMANDS = {"install": "install", "remove": "remove", "physically-remove": "physically_remove",
+                         "purge": "purge", "markauto": "markauto", "unmarkauto": "unmarkauto"}
+UPGRADE_SUBCOMMANDS = {"safe-upgrade": False, "full-upgrade": True}
+
+
+class BatchOperation:
+    '''Operation of the line. "full_upgrade" is None for package operations, "tasks" is None for upgrades'''
+
+    def __init__(self, line_number, text, tasks=None, full_upgrade=None):
+        self.__line_number = line_number
+        self.__text = text
+        self.__tasks = tasks
+        self.__full_upgrade = full_upgrade
+
+    @property
+    def line_number(self):
+        return self.__line_number
+
+    @property
+    def text(self):
+        return self.__text
+
+    @property
+    def tasks(self):
+        return self.__tasks
+
+    @property
+    def full_upgrade(self):
+        return self.__full_upgrade
+
+    @property
+    def is_upgrade(self):
+        return self.__full_upgrade is not None
+
+
+def parse_batch(lines):
+    '''Operations of the lines. All the lines are parsed before anything is run,
+    so a syntax error is found before the batch has begun
+    '''
+    operations = []
+    for line_number, line in enumerate(lines, 1):
+        text = line.partition("#")[0].strip()
+        if not text:
+            continue
+        words = text.split()
+        if words[0] in UPGRADE_SUBCOMMANDS:
+            if len(words) > 1:
+                raise BatchSyntaxError(line_number, text, "upgrade takes no packages")
+            operations.append(BatchOperation(line_number, text, full_upgrade=UPGRADE_SUBCOMMANDS[words[0]]))
+        elif words[0] in OPERATION_SUBCOMMANDS:
+            if len(words) == 1:
+                raise BatchSyntaxError(line_number, text, "no packages given")
+            tasks = Tasks()
+            setattr(tasks, OPERATION_SUBCOMMANDS[words[0]], words[1:])
+            operations.append(BatchOperation(line_number, text, tasks))
+        else:
+            try:
+                operations.append(BatchOperation(line_number, text, Tasks.from_suffixed_operations(words)))
+            except InvalidOperationSuffix as err:
+                raise BatchSyntaxError(line_number, text, 'invalid operation on the suffix: "{0}"'.
+                                       format(err.operation))
+    return operations
+
+
+class BatchOutcome(enum.Enum):
+    DONE = "done"
+    SIMULATED = "simulated"
+    NOTHING_DONE = "nothing-done"
+
+    def __str__(self):
+        return self.value
+
+
+class BatchResult:
+
+    def __init__(self, operation, outcome, seconds):
+        self.__operation = operation
+        self.__outcome = outcome
+        self.__seconds = seconds
+
+    @property
+    def operation(self):
+        return self.__operation
+
+    @property
+    def outcome(self):
+        return self.__outcome
+
+    @property
+    def seconds(self):
+        return self.__seconds
+
+
+class BatchRunner(ModificationRunner):
+    '''Runs operations as "perform_operations" and "upgrade" do, one after another. It stops at the first
+    error (it is raised) leaving the operations done before committed
+    '''
+
+    def __init__(self, settings, user_id, display_modes, work_modes, handlers, applying_ui, progresses, debug_stream,
+                 profiler=None):
+        super().__init__(settings, user_id, display_modes, work_modes, handlers, applying_ui, progresses,
+                         debug_stream, profiler)
+        self.__enclosure = None
+        self.__coownership = None
+        self.__coownership_signature = None
+
+    @staticmethod
+    def __coownership_filename():
+        return os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'coownership-list')
+
+    def _load_enclosure(self):
+        # Operations don't change enclosures
+        if self.__enclosure is None:
+            self.__enclosure = super()._load_enclosure()
+        return self.__enclosure
+
+    def _load_coownership_list(self):
+        signature = file_signature(self.__coownership_filename())
+        if self.__coownership is None or signature != self.__coownership_signature:
+            self.__coownership = super()._load_coownership_list()
+            self.__coownership_signature = signature
+        # Marking changes the list, a failed operation must not leave its changes in it
+        return copy.deepcopy(self.__coownership)
+
+    def _save_coownership_list(self, coownership_list):
+        super()._save_coownership_list(coownership_list)
+        self.__coownership = None
+
+    def run(self, operation):
+        cache = get_cache()
+        outcome = BatchOutcome.NOTHING_DONE
+        start = time.perf_counter()
+        try:
+            with self._span("batch-operation"):
+                try:
+                    if operation.is_upgrade:
+                        self.upgrade(operation.full_upgrade)
+                    else:
+                        self.perform_operations(operation.tasks)
+                    outcome = BatchOutcome.SIMULATED if self.work_modes.simulate else BatchOutcome.DONE
+                except GoodExit:
+                    pass
+        finally:
+            with self._span("cache-resetting"):
+                if outcome is BatchOutcome.DONE:
+                    # States of the packages have been changed by dpkg
+                    cache.open(None)
+                else:
+                    cache.clear()
+        return BatchResult(operation, outcome, time.perf_counter() - start)
+
+    def run_all(self, operations):
+        return (self.run(operation) for operation in operations)
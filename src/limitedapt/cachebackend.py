@@ -0,0 +1,283 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Interface of the package cache limited-apt runners work with.
+
+It is the subset of "apt.Cache", "apt.package.Package", "apt.package.Version" and
+"apt.package.Origin" interfaces the runners really use and the dpkg states of packages apt exposes
+in its low-level packages only. "apt.Cache" is adapted to it by "limitedapt.aptcache", other backends
+(e. g. "limitedapt.synthetic") are installed by "limitedapt.single.set_cache_factory".
+'''
+
+from abc import ABC, abstractmethod
+
+
+class OriginBackend:
+    '''Where package version comes from ("apt.package.Origin")'''
+
+    archive = None
+    origin = None
+    trusted = False
+
+
+class VersionBackend(ABC):
+    '''Concrete version of a package ("apt.package.Version")'''
+
+    @property
+    @abstractmethod
+    def package(self):
+        pass
+
+    @property
+    @abstractmethod
+    def version(self):
+        pass
+
+    @property
+    @abstractmethod
+    def architecture(self):
+        pass
+
+    @property
+    @abstractmethod
+    def origins(self):
+        pass
+
+    @property
+    @abstractmethod
+    def size(self):
+        pass
+
+    @property
+    @abstractmethod
+    def installed_size(self):
+        pass
+
+    @property
+    @abstractmethod
+    def section(self):
+        pass
+
+    @property
+    @abstractmethod
+    def priority(self):
+        pass
+
+    @property
+    @abstractmethod
+    def record(self):
+        pass
+
+    @property
+    @abstractmethod
+    def dependencies(self):
+        pass
+
+    @property
+    @abstractmethod
+    def filename(self):
+        pass
+
+    @property
+    @abstractmethod
+    def sha256(self):
+        pass
+
+
+class PackageBackend(ABC):
+    '''Package of the cache ("apt.package.Package")'''
+
+    @property
+    @abstractmethod
+    def name(self):
+        pass
+
+    @property
+    @abstractmethod
+    def shortname(self):
+        pass
+
+    @property
+    @abstractmethod
+    def candidate(self):
+        pass
+
+    @property
+    @abstractmethod
+    def installed(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_installed(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_upgradable(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_auto_installed(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_auto_removable(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_inst_broken(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_now_broken(self):
+        pass
+
+    @property
+    @abstractmethod
+    def has_config_files(self):
+        pass
+
+    @property
+    @abstractmethod
+    def is_configured(self):
+        '''Whether dpkg has completely installed the package: it is neither only unpacked (or half-configured)
+        nor required to be reinstalled'''
+        pass
+
+    @property
+    @abstractmethod
+    def is_reinstall_required(self):
+        pass
+
+    @property
+    @abstractmethod
+    def marked_install(self):
+        pass
+
+    @property
+    @abstractmethod
+    def marked_upgrade(self):
+        pass
+
+    @property
+    @abstractmethod
+    def marked_delete(self):
+        pass
+
+    @property
+    @abstractmethod
+    def marked_keep(self):
+        pass
+
+    @property
+    @abstractmethod
+    def marked_reinstall(self):
+        pass
+
+    @property
+    @abstractmethod
+    def marked_downgrade(self):
+        pass
+
+    @abstractmethod
+    def mark_install(self, auto_fix=True, auto_inst=True, from_user=True):
+        pass
+
+    @abstractmethod
+    def mark_upgrade(self, from_user=True):
+        pass
+
+    @abstractmethod
+    def mark_delete(self, auto_fix=True, purge=False):
+        pass
+
+    @abstractmethod
+    def mark_keep(self):
+        pass
+
+    @abstractmethod
+    def mark_reinstall(self):
+        '''Marks the installed version to be installed once again'''
+        pass
+
+    @abstractmethod
+    def mark_auto(self, auto=True):
+        pass
+
+
+class CacheBackend(ABC):
+    '''Package cache ("apt.Cache"). Iteration yields packages sorted by name'''
+
+    dpkg_journal_dirty = False
+
+    @abstractmethod
+    def __getitem__(self, key):
+        pass
+
+    @abstractmethod
+    def __contains__(self, key):
+        pass
+
+    @abstractmethod
+    def __iter__(self):
+        pass
+
+    @abstractmethod
+    def get_changes(self):
+        pass
+
+    @abstractmethod
+    def actiongroup(self):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def upgrade(self, dist_upgrade=False):
+        pass
+
+    @abstractmethod
+    def update(self, fetch_progress=None):
+        pass
+
+    @abstractmethod
+    def open(self, progress=None):
+        pass
+
+    @abstractmethod
+    def fetch_archives(self, progress=None, fetcher=None):
+        pass
+
+    @abstractmethod
+    def commit(self, fetch_progress=None, install_progress=None):
+        pass
+
+    @property
+    @abstractmethod
+    def required_download(self):
+        pass
+
+    @property
+    @abstractmethod
+    def required_space(self):
+        pass
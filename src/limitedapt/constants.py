@@ -25,4 +25,12 @@ UNIX_LIMITEDAPT_UPGRADERS_GROUPNAME = 'limited-apt-upgraders'
 
 PATH_TO_PROGRAM_VARIABLE = "/var/lib/limited-apt/"
 UNCOMPLETED_TASKS_FILENAME = "uncompleted-tasks"
-PATH_TO_UNCOMPLETED_TASKS = os.path.join(PATH_TO_PROGRAM_VARIABLE, UNCOMPLETED_TASKS_FILENAME)
\ No newline at end of file
+PATH_TO_UNCOMPLETED_TASKS = os.path.join(PATH_TO_PROGRAM_VARIABLE, UNCOMPLETED_TASKS_FILENAME)
+RESOLVED_PLANS_DIRNAME = "resolved-plans"
+NSS_CACHE_FILENAME = "nss-cache"
+PATH_TO_DEBTAGS_DATABASE = "/var/lib/debtags/package-tags"
+
+PATH_TO_APT_PKGCACHE = "/var/cache/apt/pkgcache.bin"
+PATH_TO_APT_ARCHIVES = "/var/cache/apt/archives/"
+PATH_TO_APT_EXTENDED_STATES = "/var/lib/apt/extended_states"
+PATH_TO_DPKG_STATUS = "/var/lib/dpkg/status"
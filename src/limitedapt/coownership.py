@@ -19,6 +19,7 @@
 import enum
 from lxml import etree
 from .packages import ConcretePackage
+from .xmlwriting import write_xml_document
 from .errors import *
 
 
@@ -105,14 +106,16 @@ class CoownershipList:
     def clear(self):
         self.__data.clear()
         
-    def export_to_xml(self, file):
-        root = etree.Element("packages")
-        for package, owners in sorted(self.__data.items(), key=lambda x: x[0]):
-            package_element = etree.SubElement(root, "package", name=package.name, arch=package.architecture)
-            for user in sorted(owners):
-                etree.SubElement(package_element, "user", name=user)
-        tree = etree.ElementTree(root)        
-        tree.write(file, pretty_print=True, encoding="UTF-8", xml_declaration=True)
+    def export_to_xml(self, file, pretty=True):
+
+        def elements():
+            for package in sorted(self.__data):
+                package_element = etree.Element("package", name=package.name, arch=package.architecture)
+                for user in sorted(self.__data[package]):
+                    etree.SubElement(package_element, "user", name=user)
+                yield package_element
+
+        write_xml_document(file, "packages", elements(), pretty=pretty)
         
     def import_from_xml(self, file):
         try:
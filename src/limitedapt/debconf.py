@@ -23,6 +23,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .errors import Error
 from .packages import *
+from .xmlwriting import write_xml_document
 
 
 class DebconfError(Error): pass
@@ -91,7 +92,7 @@ class Priority(enum.Enum):
         return PRIORITY_STR_MAP[self.value]
 
     def __eq__(self, other):
-        return self.value == other.value
+        return isinstance(other, Priority) and self.value == other.value
 
     def __lt__(self, other):
         return self.value < other.value
@@ -172,18 +173,20 @@ class DebconfPriorities(DeconfPrioritiesBase):
             for arch, state in sorted(archs.items(), key=lambda x: x[0]):
                 yield (ConcretePackage(package_name, arch), state)
 
-    def export_to_xml(self, file):
-        root = etree.Element("debconf-priorities")
-        for package_name, archs in self.__data.items():
-            package_element = etree.SubElement(root, "package", name=package_name)
-            for arch, state in archs.items():
-                if state.status == Status.HAS_QUESTIONS:
-                    etree.SubElement(package_element, "arch", name=arch, status=str(state.status),
-                                     priority=str(state.priority))
-                else:
-                    etree.SubElement(package_element, "arch", name=arch, status=str(state.status))
-        tree = etree.ElementTree(root)
-        tree.write(file, pretty_print=True, encoding="UTF-8", xml_declaration=True)
+    def export_to_xml(self, file, pretty=True):
+
+        def elements():
+            for package_name, archs in self.__data.items():
+                package_element = etree.Element("package", name=package_name)
+                for arch, state in archs.items():
+                    if state.status == Status.HAS_QUESTIONS:
+                        etree.SubElement(package_element, "arch", name=arch, status=str(state.status),
+                                         priority=str(state.priority))
+                    else:
+                        etree.SubElement(package_element, "arch", name=arch, status=str(state.status))
+                yield package_element
+
+        write_xml_document(file, "debconf-priorities", elements(), pretty=pretty)
 
     def import_from_xml(self, file):
         try:
@@ -255,6 +258,17 @@ class DebconfPrioritiesDB(DeconfPrioritiesBase):
             record.status = state.status
             record.priority = state.priority
 
+    def items(self):
+        Record = DebconfPrioritiesDB.__Record
+        for record in self.__session.query(Record).order_by(Record.name, Record.architecture):
+            yield (ConcretePackage(record.name, record.architecture), PackageState(record.status, record.priority))
+
+    def add_new(self, items):
+        '''Adds (package, state) pairs of packages which are not in the database yet without looking them up'''
+        Record = DebconfPrioritiesDB.__Record
+        self.__session.add_all(Record(package.name, package.architecture, state.status, state.priority)
+                               for package, state in items)
+
     def commit(self):
         self.__session.commit()
 
@@ -266,6 +280,13 @@ def debconf_priorities_map_to_db(map_priorities, db_url):
     db.commit()
 
 
+def debconf_priorities_db_to_map(db_url):
+    map_priorities = DebconfPriorities()
+    for package, state in DebconfPrioritiesDB(db_url).items():
+        map_priorities[package] = state
+    return map_priorities
+
+
 def minimal_debconf_priority_to_ask_questions():
     found = subprocess.getoutput('debconf-show debconf')
     lines = found.splitlines()
@@ -0,0 +1,214 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''In-process debtags engine: the tag database is loaded into bitsets (one Python integer per tag,
+bit number N stands for the N-th package in name order) and boolean queries in the syntax of
+"debtags search" ("&&", "||", "!", parentheses, "facet::*" wildcards) are evaluated by
+bitwise operations over whole sets at once
+'''
+
+import fnmatch
+import re
+from .errors import Error
+
+
+class DebtagsError(Error): pass
+
+class DebtagsDatabaseSyntaxError(DebtagsError): pass
+
+class DebtagsQuerySyntaxError(DebtagsError): pass
+
+
+def _expand_tags(tags_field):
+    # "use::{editing,viewing}" is a short form of "use::editing, use::viewing"
+    tags = []
+    for tag in re.findall(r"[^,{]+(?:\{[^}]*\})?", tags_field):
+        tag = tag.strip()
+        if not tag:
+            continue
+        prefix, brace, rest = tag.partition("{")
+        if brace:
+            tags.extend(prefix + item.strip() for item in rest.rstrip("}").split(",") if item.strip())
+        else:
+            tags.append(tag)
+    return tags
+
+
+class DebtagsDatabase:
+
+    def __init__(self):
+        self.__names = []
+        self.__tag_bits = {}
+
+    @property
+    def names(self):
+        '''Names of packages ordered by their IDs'''
+        return self.__names
+
+    @property
+    def tags(self):
+        return self.__tag_bits.keys()
+
+    @property
+    def all_bits(self):
+        return (1 << len(self.__names)) - 1
+
+    def tag_bits(self, tag):
+        return self.__tag_bits.get(tag, 0)
+
+    def load(self, file):
+        '''Loads "package-tags" database of debtags ("name: tag, tag, ..." lines)'''
+        package_tags = {}
+        with open(file) as database:
+            for line_number, line in enumerate(database, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                name, colon, tags_field = line.partition(":")
+                name = name.strip()
+                # Bare names without tags are valid too
+                if not name or " " in name:
+                    raise DebtagsDatabaseSyntaxError('''Bad line {0} of debtags database "{1}"'''.
+                                                     format(line_number, file))
+                package_tags.setdefault(name, set()).update(_expand_tags(tags_field) if colon else ())
+        self.__names = sorted(package_tags)
+        tag_ids = {}
+        for package_id, name in enumerate(self.__names):
+            for tag in package_tags[name]:
+                tag_ids.setdefault(tag, []).append(package_id)
+        # Building an integer from the string of bits is much faster than OR-ing bit by bit
+        self.__tag_bits = {}
+        for tag, package_ids in tag_ids.items():
+            digits = bytearray(b"0" * len(self.__names))
+            for package_id in package_ids:
+                digits[-1 - package_id] = ord("1")
+            self.__tag_bits[tag] = int(digits, 2)
+
+    def names_of(self, bits):
+        '''Yields names of the packages of the bitset in name order'''
+        digits = bin(bits)[:1:-1]
+        position = digits.find("1")
+        while position != -1:
+            yield self.__names[position]
+            position = digits.find("1", position + 1)
+
+    def search(self, query):
+        '''Bitset of the packages matching the query'''
+        return compile_query(query)(self)
+
+
+_TOKEN = re.compile(r"\s*(?:(&&)|(\|\|)|(!)|(\()|(\))|([^\s&|!()]+))")
+
+
+def _tokenize(query):
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None:
+            raise DebtagsQuerySyntaxError('''Unexpected symbol at position {0} of query "{1}"'''.
+                                          format(position, query))
+        tokens.append(next(group for group in match.groups() if group is not None))
+        position = match.end()
+    return tokens
+
+
+class _QueryParser:
+    '''Recursive descent parser: "||" has the lowest precedence, then "&&", then "!"'''
+
+    def __init__(self, query):
+        self.__query = query
+        self.__tokens = _tokenize(query)
+        self.__position = 0
+
+    def __peek(self):
+        return self.__tokens[self.__position] if self.__position < len(self.__tokens) else None
+
+    def __take(self):
+        token = self.__peek()
+        if token is None:
+            raise DebtagsQuerySyntaxError('''Unexpected end of query "{0}"'''.format(self.__query))
+        self.__position += 1
+        return token
+
+    def parse(self):
+        evaluator = self.__parse_or()
+        if self.__peek() is not None:
+            raise DebtagsQuerySyntaxError('''Unexpected "{0}" in query "{1}"'''.format(self.__peek(), self.__query))
+        return evaluator
+
+    def __parse_or(self):
+        operands = [self.__parse_and()]
+        while self.__peek() == "||":
+            self.__take()
+            operands.append(self.__parse_and())
+        if len(operands) == 1:
+            return operands[0]
+
+        def evaluate(database):
+            bits = 0
+            for operand in operands:
+                bits |= operand(database)
+            return bits
+        return evaluate
+
+    def __parse_and(self):
+        operands = [self.__parse_not()]
+        while self.__peek() == "&&":
+            self.__take()
+            operands.append(self.__parse_not())
+        if len(operands) == 1:
+            return operands[0]
+
+        def evaluate(database):
+            bits = database.all_bits
+            for operand in operands:
+                bits &= operand(database)
+                if not bits:
+                    break
+            return bits
+        return evaluate
+
+    def __parse_not(self):
+        token = self.__take()
+        if token == "!":
+            operand = self.__parse_not()
+            return lambda database: database.all_bits & ~operand(database)
+        if token == "(":
+            evaluator = self.__parse_or()
+            if self.__take() != ")":
+                raise DebtagsQuerySyntaxError('''Unbalanced parentheses in query "{0}"'''.format(self.__query))
+            return evaluator
+        if token in ("&&", "||", ")"):
+            raise DebtagsQuerySyntaxError('''Unexpected "{0}" in query "{1}"'''.format(token, self.__query))
+        return self.__tag(token)
+
+    @staticmethod
+    def __tag(pattern):
+        if not any(char in pattern for char in "*?["):
+            return lambda database: database.tag_bits(pattern)
+
+        def evaluate(database):
+            bits = 0
+            for tag in fnmatch.filter(database.tags, pattern):
+                bits |= database.tag_bits(tag)
+            return bits
+        return evaluate
+
+
+def compile_query(query):
+    '''Compiles the query into a function of DebtagsDatabase returning bitset of matching packages'''
+    return _QueryParser(query).parse()
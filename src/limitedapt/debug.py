@@ -15,13 +15,13 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import itertools
 import os
 import time
-import subprocess
 
+from limitedapt import constants
 from .packages import VersionedPackage
 from .enclosure import *
+from .debtags import DebtagsDatabase
 from .single import get_cache
 
 
@@ -34,27 +34,29 @@ def debug_suidbit(place):
     os.makedirs(time_path)
     print()
 
-def update_enclosure_by_debtags(filename):
-    enclosure = Enclosure()
-    
-    query = 'role::documentation || role::app-data || role::data || role::debug-symbols || ' + \
-        '(role::source && ! use::driver) || role::metapackage || role::examples || ' + \
-        'role::program && ( ! (security::antivirus || security::firewall) ) || ' + \
-        '! ( (admin::configuring && admin::filesystem && admin::logging) || ' + \
-        '(admin::logging && interface::daemon) || ' + \
-        '(admin::kernel && interface::daemon) || admin::TODO)'
-
-    found = subprocess.getoutput('debtags search "{0}"'.format(query))   
-    lines = found.splitlines()
-    seriated_names = [line.partition(" ")[0] for line in lines]
-    names = list(key for key, _ in itertools.groupby(seriated_names))
-    
+DEBUG_ENCLOSURE_QUERY = 'role::documentation || role::app-data || role::data || role::debug-symbols || ' + \
+    '(role::source && ! use::driver) || role::metapackage || role::examples || ' + \
+    'role::program && ( ! (security::antivirus || security::firewall) ) || ' + \
+    '! ( (admin::configuring && admin::filesystem && admin::logging) || ' + \
+    '(admin::logging && interface::daemon) || ' + \
+    '(admin::kernel && interface::daemon) || admin::TODO)'
+
+
+def update_enclosure_by_debtags(filename, database_filename=constants.PATH_TO_DEBTAGS_DATABASE,
+                                query=DEBUG_ENCLOSURE_QUERY):
+    database = DebtagsDatabase()
+    database.load(database_filename)
+
     enclosure = Enclosure()
     if os.path.exists(filename):
         enclosure.import_from_xml(filename)
     cache = get_cache()
-    for name in names:
+    for name in database.names_of(database.search(query)):
+        if name not in cache:
+            continue
         pkg = cache[name]
-        enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.candidate.version))
+        if pkg.candidate is not None:
+            enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.candidate.architecture,
+                                                             pkg.candidate.version))
 
-    enclosure.export_to_xml(filename)
+    store_enclosure(enclosure, filename)
@@ -0,0 +1,121 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Comparison of Debian package versions. "apt_pkg.version_compare" is used if python-apt
+is available, otherwise the same algorithm as dpkg's one implemented in Python
+'''
+
+import functools
+import string
+
+try:
+    import apt_pkg
+    apt_pkg.init()
+except (ImportError, SystemError):
+    apt_pkg = None
+
+
+class BadVersionRelation(ValueError): pass
+
+
+_LETTERS = frozenset(string.ascii_letters)
+
+
+def _order(char):
+    if char == "~":
+        return -1
+    if char.isdigit():
+        return 0
+    if char in _LETTERS:
+        return ord(char)
+    return ord(char) + 256
+
+
+def _compare_part(a, b):
+    '''"verrevcmp" of dpkg: compares upstream versions or Debian revisions'''
+    i = j = 0
+    while i < len(a) or j < len(b):
+        first_diff = 0
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            a_order = _order(a[i]) if i < len(a) else 0
+            b_order = _order(b[j]) if j < len(b) else 0
+            if a_order != b_order:
+                return a_order - b_order
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == "0":
+            i += 1
+        while j < len(b) and b[j] == "0":
+            j += 1
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def _split(version):
+    epoch, colon, rest = version.partition(":")
+    if not colon:
+        epoch, rest = "0", version
+    upstream, hyphen, revision = rest.rpartition("-")
+    if not hyphen:
+        upstream, revision = rest, ""
+    return int(epoch or "0"), upstream, revision
+
+
+def python_version_compare(a, b):
+    '''Pure-Python version of "apt_pkg.version_compare"'''
+    a_epoch, a_upstream, a_revision = _split(a)
+    b_epoch, b_upstream, b_revision = _split(b)
+    if a_epoch != b_epoch:
+        return a_epoch - b_epoch
+    return _compare_part(a_upstream, b_upstream) or _compare_part(a_revision, b_revision)
+
+
+def version_compare(a, b):
+    '''Returns negative number if version "a" is older than "b", zero if they are equal
+    and positive one if "a" is newer
+    '''
+    if apt_pkg is not None:
+        return apt_pkg.version_compare(a, b)
+    return python_version_compare(a, b)
+
+
+version_key = functools.cmp_to_key(version_compare)
+
+
+RELATIONS = {
+    "<<": lambda result: result < 0,
+    "<=": lambda result: result <= 0,
+    "=": lambda result: result == 0,
+    ">=": lambda result: result >= 0,
+    ">>": lambda result: result > 0,
+}
+
+
+def check_relation(version, relation, number):
+    '''Checks "version relation number" (e. g. "1.2-1 >= 1.0") as dpkg does'''
+    try:
+        return RELATIONS[relation](version_compare(version, number))
+    except KeyError:
+        raise BadVersionRelation('''Unknown version relation "{0}"'''.format(relation))
@@ -14,7 +14,11 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pycurl
+from lxml import etree
 from .errors import TerminationError
 
 
@@ -33,13 +37,313 @@ class DownloadError(TerminationError):
         return self.__filename
 
 
-def download_file(url, filename):
+class Validators:
+    '''HTTP validators ("ETag" and "Last-Modified") of a downloaded file. They are kept
+    in a sidecar file and let the next downloading be conditional or resumed
+    '''
+
+    def __init__(self, url, etag=None, last_modified=None):
+        self.__url = url
+        self.__etag = etag
+        self.__last_modified = last_modified
+
+    @property
+    def url(self):
+        return self.__url
+
+    @property
+    def etag(self):
+        return self.__etag
+
+    @property
+    def last_modified(self):
+        return self.__last_modified
+
+    @property
+    def empty(self):
+        return self.etag is None and self.last_modified is None
+
+    @staticmethod
+    def from_headers(url, headers):
+        return Validators(url, headers.get("etag"), headers.get("last-modified"))
+
+    def export_to_xml(self, file):
+        root = etree.Element("validators", url=self.url)
+        if self.etag is not None:
+            root.set("etag", self.etag)
+        if self.last_modified is not None:
+            root.set("last-modified", self.last_modified)
+        etree.ElementTree(root).write(file, pretty_print=True, encoding="UTF-8", xml_declaration=True)
+
+    @staticmethod
+    def import_from_xml(file):
+        root = etree.parse(file).getroot()
+        return Validators(root.get("url"), root.get("etag"), root.get("last-modified"))
+
+
+def validators_filename(filename):
+    return filename + ".validators"
+
+
+def partial_filename(filename):
+    return filename + ".part"
+
+
+def load_validators(filename, url):
+    '''Returns stored validators of the file downloaded from url or None if there are no usable ones'''
+    try:
+        validators = Validators.import_from_xml(validators_filename(filename))
+    except (IOError, etree.XMLSyntaxError):
+        return None
+    if validators.url != url or validators.empty:
+        return None
+    return validators
+
+
+def save_validators(filename, validators):
+    temp_filename = validators_filename(filename) + ".tmp"
+    validators.export_to_xml(temp_filename)
+    os.replace(temp_filename, validators_filename(filename))
+
+
+def remove_if_exists(filename):
     try:
-        with open(filename, "wb") as fh:
-            curl = pycurl.Curl()
-            curl.setopt(curl.URL, url)
-            curl.setopt(curl.WRITEDATA, fh)
-            curl.perform()
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+class DownloadStatistics:
+
+    def __init__(self, transferred, saved, not_modified=False, resumed=False):
+        self.__transferred = transferred
+        self.__saved = saved
+        self.__not_modified = not_modified
+        self.__resumed = resumed
+
+    @property
+    def transferred(self):
+        '''Number of bytes really transferred'''
+        return self.__transferred
+
+    @property
+    def saved(self):
+        '''Number of bytes which have not been transferred due to revalidation or resuming'''
+        return self.__saved
+
+    @property
+    def not_modified(self):
+        return self.__not_modified
+
+    @property
+    def resumed(self):
+        return self.__resumed
+
+
+class _Transfer:
+    '''Single HTTP exchange writing the body to the partial file'''
+
+    def __init__(self, url, filename, offset, consumer):
+        self.__url = url
+        self.__filename = filename
+        self.__offset = offset
+        self.__consumer = consumer
+        self.__status = None
+        self.__headers = {}
+        self.__file = None
+        self.__resumed = False
+        self.transferred = 0
+
+    @property
+    def status(self):
+        return self.__status
+
+    @property
+    def headers(self):
+        return self.__headers
+
+    def header(self, line):
+        line = line.decode("iso-8859-1").strip()
+        if line.startswith("HTTP/"):
+            # Every response (redirections too) starts new set of headers
+            self.__status = int(line.split()[1])
+            self.__headers = {}
+        elif ":" in line:
+            name, value = line.split(":", 1)
+            self.__headers[name.strip().lower()] = value.strip()
+
+    def write(self, data):
+        if self.__file is None:
+            self.__resumed = self.__status == 206 and self.__offset > 0
+            # Validators of the partial file are saved before its content so interrupted transfer may be resumed
+            save_validators(partial_filename(self.__filename), Validators.from_headers(self.__url, self.__headers))
+            self.__file = open(partial_filename(self.__filename), "ab" if self.__resumed else "wb")
+            if self.__resumed and self.__consumer is not None:
+                self.__feed_partial()
+        self.__file.write(data)
+        if self.__consumer is not None:
+            self.__consumer.feed(data)
+        self.transferred += len(data)
+
+    def __feed_partial(self):
+        with open(partial_filename(self.__filename), "rb") as partial:
+            for chunk in iter(lambda: partial.read(64 * 1024), b""):
+                self.__consumer.feed(chunk)
+
+    @property
+    def resumed(self):
+        return self.__resumed
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def perform(self, validators, partial_validators):
+        curl = pycurl.Curl()
+        try:
+            curl.setopt(curl.URL, self.__url)
+            curl.setopt(curl.FOLLOWLOCATION, True)
+            curl.setopt(curl.FAILONERROR, True)
+            curl.setopt(curl.HEADERFUNCTION, self.header)
+            curl.setopt(curl.WRITEFUNCTION, self.write)
+            request_headers = []
+            if validators is not None:
+                if validators.etag is not None:
+                    request_headers.append("If-None-Match: " + validators.etag)
+                if validators.last_modified is not None:
+                    request_headers.append("If-Modified-Since: " + validators.last_modified)
+            if partial_validators is not None and self.__offset > 0:
+                curl.setopt(curl.RANGE, "{0}-".format(self.__offset))
+                request_headers.append("If-Range: " + (partial_validators.etag or partial_validators.last_modified))
+            curl.setopt(curl.HTTPHEADER, request_headers)
+            try:
+                curl.perform()
+            finally:
+                self.close()
+            self.__status = curl.getinfo(curl.RESPONSE_CODE)
+        finally:
             curl.close()
-    except:
-        raise DownloadError(url, filename)
\ No newline at end of file
+
+
+def download_file(url, filename, consumer=None):
+    '''Downloads url to filename and returns DownloadStatistics.
+
+    Download is conditional if the file has been downloaded earlier (validators are stored
+    in "<filename>.validators"), it continues an interrupted one kept in "<filename>.part"
+    and the file is replaced by the new content only after it has been received completely.
+    Every chunk of the content is also passed to "consumer.feed" (if consumer is given) as soon
+    as it has been received; nothing is passed if the file has not been modified
+    '''
+    part = partial_filename(filename)
+    validators = load_validators(filename, url) if os.path.exists(filename) else None
+    for attempt in range(2):
+        partial_validators = load_validators(part, url) if os.path.exists(part) else None
+        offset = os.path.getsize(part) if partial_validators is not None else 0
+        transfer = _Transfer(url, filename, offset, consumer)
+        try:
+            transfer.perform(validators, partial_validators)
+            break
+        except pycurl.error:
+            if transfer.status == 416 and attempt == 0:
+                # Partial file is not valid any more (e. g. it is larger than the file on the server)
+                remove_if_exists(part)
+                remove_if_exists(validators_filename(part))
+                continue
+            raise DownloadError(url, filename)
+        except OSError:
+            raise DownloadError(url, filename)
+
+    try:
+        if transfer.status == 304:
+            remove_if_exists(part)
+            remove_if_exists(validators_filename(part))
+            return DownloadStatistics(0, os.path.getsize(filename), not_modified=True)
+        if not os.path.exists(part):
+            # Server has sent empty body
+            open(part, "wb").close()
+            save_validators(part, Validators.from_headers(url, transfer.headers))
+        os.replace(part, filename)
+        os.replace(validators_filename(part), validators_filename(filename))
+    except OSError:
+        raise DownloadError(url, filename)
+    return DownloadStatistics(transfer.transferred, offset if transfer.resumed else 0, resumed=transfer.resumed)
+
+
+class DownloadJob:
+
+    def __init__(self, url, filename, consumer=None):
+        self.url = url
+        self.filename = filename
+        self.consumer = consumer
+
+
+class DownloadResult:
+
+    def __init__(self, job, elapsed, statistics=None, error=None):
+        self.__job = job
+        self.__elapsed = elapsed
+        self.__statistics = statistics
+        self.__error = error
+
+    @property
+    def job(self):
+        return self.__job
+
+    @property
+    def url(self):
+        return self.__job.url
+
+    @property
+    def filename(self):
+        return self.__job.filename
+
+    @property
+    def elapsed(self):
+        return self.__elapsed
+
+    @property
+    def statistics(self):
+        return self.__statistics
+
+    @property
+    def error(self):
+        return self.__error
+
+    @property
+    def succeeded(self):
+        return self.__error is None
+
+
+class ParallelDownloads:
+    '''Downloads several files at once in background threads (pycurl releases GIL while transferring).
+    A failure of one download doesn't affect the others: it is reported by its result
+    '''
+
+    def __init__(self, jobs, max_workers=None, profiler=None):
+        self.__jobs = list(jobs)
+        self.__profiler = profiler
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers or max(1, len(self.__jobs)))
+        self.__futures = [self.__executor.submit(self.__download, job) for job in self.__jobs]
+
+    def __download(self, job):
+        start = time.perf_counter()
+        try:
+            if self.__profiler is not None:
+                with self.__profiler.span('downloading "{0}"'.format(job.filename)):
+                    statistics = download_file(job.url, job.filename, job.consumer)
+            else:
+                statistics = download_file(job.url, job.filename, job.consumer)
+            return DownloadResult(job, time.perf_counter() - start, statistics)
+        except DownloadError as err:
+            return DownloadResult(job, time.perf_counter() - start, error=err)
+
+    def wait(self):
+        '''Waits for all the downloads. Returns their results in order of the jobs'''
+        results = [future.result() for future in self.__futures]
+        self.__executor.shutdown()
+        return results
+
+
+def download_files(jobs, max_workers=None):
+    return ParallelDownloads(jobs, max_workers).wait()
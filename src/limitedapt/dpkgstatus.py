@@ -0,0 +1,247 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Installed packages read directly from the dpkg status file and apt extended states
+(automatically installed flags) without opening the apt cache.
+
+The status file is mapped into memory and scanned incrementally: a lookup reads
+paragraphs only until the package is found, the following lookups go on from there.
+Only the fields needed ("Package", "Architecture", "Version" and "Status") are extracted.
+'''
+
+import mmap
+import os
+import subprocess
+from .errors import Error
+from .packages import ConcretePackage
+from .fileutils import file_signature
+
+
+class DpkgStatusError(Error): pass
+
+
+# States of dpkg packages which have an installed version (in the apt terms)
+NOT_INSTALLED_STATES = frozenset(["not-installed", "config-files"])
+
+
+class InstalledPackage:
+    '''Package of the dpkg status file. "state" is the last word of the "Status" field'''
+
+    def __init__(self, name, architecture, version, state, auto=False):
+        self.__name = name
+        self.__architecture = architecture
+        self.__version = version
+        self.__state = state
+        self.__auto = auto
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def architecture(self):
+        return self.__architecture
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def state(self):
+        return self.__state
+
+    @property
+    def is_installed(self):
+        return self.__state not in NOT_INSTALLED_STATES
+
+    @property
+    def is_auto_installed(self):
+        return self.__auto
+
+    @property
+    def concrete(self):
+        return ConcretePackage(self.name, self.architecture)
+
+    def __lt__(self, other):
+        return self.concrete < other.concrete
+
+
+class _ControlFile:
+    '''Paragraphs of a deb822 file mapped into memory'''
+
+    def __init__(self, filename):
+        try:
+            with open(filename, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                self.__data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except FileNotFoundError:
+            self.__data = b""
+        self.__position = 0
+
+    def next_paragraph(self):
+        '''Bounds (start, end) of the next paragraph or None at the end of the file'''
+        data = self.__data
+        while self.__position < len(data) and data[self.__position:self.__position + 1] == b"\n":
+            self.__position += 1
+        if self.__position >= len(data):
+            return None
+        start = self.__position
+        end = data.find(b"\n\n", start)
+        if end == -1:
+            end = len(data)
+        self.__position = end + 1
+        return start, end
+
+    def field(self, bounds, name):
+        '''Value of the (single line) field of the paragraph or None'''
+        data = self.__data
+        start, end = bounds
+        prefix = name + b": "
+        if data[start:start + len(prefix)] == prefix:
+            position = start + len(prefix)
+        else:
+            position = data.find(b"\n" + prefix, start, end)
+            if position == -1:
+                return None
+            position += len(prefix) + 1
+        value_end = data.find(b"\n", position, end)
+        if value_end == -1:
+            value_end = end
+        return data[position:value_end].decode("utf-8").strip()
+
+    def paragraphs(self):
+        while True:
+            bounds = self.next_paragraph()
+            if bounds is None:
+                return
+            yield bounds
+
+
+def native_architecture():
+    try:
+        return subprocess.check_output(["dpkg", "--print-architecture"], universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError) as err:
+        raise DpkgStatusError("Cannot determine the native architecture: " + str(err))
+
+
+class DpkgStatus:
+    '''Packages of the dpkg status file with automatically installed flags of apt extended states'''
+
+    def __init__(self, status_filename, extended_states_filename, native_architecture=None):
+        self.__native_architecture = native_architecture
+        self.__status = _ControlFile(status_filename)
+        self.__packages = {}
+        self.__read_order = []
+        self.__auto = self.__read_extended_states(extended_states_filename)
+
+    @property
+    def native_architecture(self):
+        if self.__native_architecture is None:
+            self.__native_architecture = native_architecture()
+        return self.__native_architecture
+
+    def __read_extended_states(self, filename):
+        '''Set of (name, architecture) of packages marked automatically installed.
+        Architecture is None if apt has not written it
+        '''
+        extended_states = _ControlFile(filename)
+        result = set()
+        for bounds in extended_states.paragraphs():
+            if extended_states.field(bounds, b"Auto-Installed") == "1":
+                result.add((extended_states.field(bounds, b"Package"), extended_states.field(bounds, b"Architecture")))
+        return result
+
+    def __is_auto(self, name, architecture):
+        return (name, architecture) in self.__auto or \
+               ((name, None) in self.__auto and architecture in (self.native_architecture, "all"))
+
+    def __read_next(self):
+        '''Reads the next package of the status file. Returns it or None at the end of the file'''
+        status = self.__status
+        bounds = status.next_paragraph()
+        if bounds is None:
+            return None
+        name = status.field(bounds, b"Package")
+        if name is None:
+            raise DpkgStatusError("Paragraph without package name in the dpkg status file")
+        architecture = status.field(bounds, b"Architecture")
+        state = (status.field(bounds, b"Status") or "").rpartition(" ")[2]
+        if state in NOT_INSTALLED_STATES:
+            package = InstalledPackage(name, architecture, None, state)
+        else:
+            package = InstalledPackage(name, architecture, status.field(bounds, b"Version"), state,
+                                       self.__is_auto(name, architecture))
+        self.__packages.setdefault(name, []).append(package)
+        self.__read_order.append(package)
+        return package
+
+    def __read_all(self):
+        while self.__read_next() is not None:
+            pass
+
+    def __candidates(self, name, architecture):
+        if architecture is not None:
+            return [package for package in self.__packages.get(name, ()) if package.architecture == architecture]
+        # As in apt a name without architecture means the native (or "all") one
+        return [package for package in self.__packages.get(name, ())
+                if package.architecture in (self.native_architecture, "all")]
+
+    def find(self, name, architecture=None):
+        '''Installed package with the name (and the architecture) or None. Scans the file only until it is found'''
+        while True:
+            installed = [package for package in self.__candidates(name, architecture) if package.is_installed]
+            if installed:
+                return installed[0]
+            if self.__read_next() is None:
+                return None
+
+    def __contains__(self, name):
+        name, _, architecture = name.partition(":")
+        return self.find(name, architecture or None) is not None
+
+    def iter_installed(self):
+        '''Installed packages in the order of the status file. Packages are yielded while the file is scanned'''
+        index = 0
+        while True:
+            if index < len(self.__read_order):
+                package = self.__read_order[index]
+                index += 1
+            else:
+                package = self.__read_next()
+                if package is None:
+                    return
+                index = len(self.__read_order)
+            if package.is_installed:
+                yield package
+
+    def installed(self):
+        '''All installed packages sorted by names and architectures'''
+        self.__read_all()
+        return sorted(package for packages in self.__packages.values() for package in packages
+                      if package.is_installed)
+
+
+_dpkg_status_cache = {}
+
+def get_dpkg_status(status_filename, extended_states_filename, native_architecture=None):
+    '''Shared reader of the files which is made anew only if either of them has been changed'''
+    key = (status_filename, extended_states_filename)
+    signature = (file_signature(status_filename), file_signature(extended_states_filename))
+    cached = _dpkg_status_cache.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, DpkgStatus(status_filename, extended_states_filename, native_architecture))
+        _dpkg_status_cache[key] = cached
+    return cached[1]
@@ -15,8 +15,14 @@
 #
 '''Package "enclosure" structure description and processing'''
 
+import os
+import pickle
 from lxml import etree
 from .errors import *
+from .fileutils import file_signature
+from .rules import *
+from .debversion import version_compare, version_key
+from .xmlwriting import write_xml_document
 
 
 class EveryError(Error): pass
@@ -31,32 +37,162 @@ class CannonEnumerateEvery(EveryError): pass
 
 class CannotAddExistingPackage(Error): pass
 
+class EnclosureDeltaBaseMismatch(Error): pass
+
 class EnclosureImportSyntaxError(XmlImportSyntaxError):
     '''Syntax or semantic error while enclosure structure parsing'''
 
 
+class VersionRange:
+    '''Versions between "lower" and "upper" bounds in dpkg ordering. None bound means the range
+    is unbounded at that side. It is written as "range" element with "ge" (>=) or "gt" (>>)
+    attribute for the lower bound and "le" (<=) or "lt" (<<) for the upper one
+    '''
+
+    def __init__(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=False):
+        self.__lower = lower
+        self.__lower_inclusive = lower_inclusive
+        self.__upper = upper
+        self.__upper_inclusive = upper_inclusive
+
+    @property
+    def lower(self):
+        return self.__lower
+
+    @property
+    def lower_inclusive(self):
+        return self.__lower_inclusive
+
+    @property
+    def upper(self):
+        return self.__upper
+
+    @property
+    def upper_inclusive(self):
+        return self.__upper_inclusive
+
+    def __eq__(self, other):
+        return (self.lower, self.lower_inclusive, self.upper, self.upper_inclusive) == \
+               (other.lower, other.lower_inclusive, other.upper, other.upper_inclusive)
+
+    def __contains__(self, version):
+        if self.lower is not None:
+            result = version_compare(version, self.lower)
+            if result < 0 or result == 0 and not self.lower_inclusive:
+                return False
+        if self.upper is not None:
+            result = version_compare(version, self.upper)
+            if result > 0 or result == 0 and not self.upper_inclusive:
+                return False
+        return True
+
+    def xml_attributes(self):
+        attributes = {}
+        if self.lower is not None:
+            attributes["ge" if self.lower_inclusive else "gt"] = self.lower
+        if self.upper is not None:
+            attributes["le" if self.upper_inclusive else "lt"] = self.upper
+        return attributes
+
+    @staticmethod
+    def from_xml_attributes(attributes):
+        if ("ge" in attributes and "gt" in attributes) or ("le" in attributes and "lt" in attributes):
+            raise ValueError("Version range must have only one lower and one upper bound")
+        lower = attributes.get("ge", attributes.get("gt"))
+        upper = attributes.get("le", attributes.get("lt"))
+        if lower is None and upper is None:
+            raise ValueError("Version range must have at least one bound")
+        return VersionRange(lower, "gt" not in attributes, upper, "le" in attributes)
+
+
+class _RangeIndex:
+    '''Ranges merged into disjoint intervals sorted by lower bound. Containment is a binary search'''
+
+    def __init__(self, ranges):
+
+        def lower_key(version_range):
+            return (version_range.lower is not None, version_key(version_range.lower or ""))
+
+        self.__intervals = []
+        for version_range in sorted(ranges, key=lower_key):
+            if self.__intervals and self.__overlap(self.__intervals[-1], version_range):
+                self.__intervals[-1] = self.__union(self.__intervals[-1], version_range)
+            else:
+                self.__intervals.append(version_range)
+
+    @staticmethod
+    def __overlap(previous, following):
+        # "following" doesn't start before "previous"
+        if previous.upper is None or following.lower is None:
+            return True
+        result = version_compare(following.lower, previous.upper)
+        return result < 0 or result == 0 and (previous.upper_inclusive or following.lower_inclusive)
+
+    @staticmethod
+    def __union(previous, following):
+        if previous.upper is None or following.upper is None:
+            upper, upper_inclusive = None, False
+        else:
+            result = version_compare(following.upper, previous.upper)
+            if result > 0 or result == 0 and following.upper_inclusive:
+                upper, upper_inclusive = following.upper, following.upper_inclusive
+            else:
+                upper, upper_inclusive = previous.upper, previous.upper_inclusive
+        return VersionRange(previous.lower, previous.lower_inclusive, upper, upper_inclusive)
+
+    def __contains__(self, version):
+        low, high = 0, len(self.__intervals)
+        while low < high:
+            middle = (low + high) // 2
+            lower = self.__intervals[middle].lower
+            if lower is None or version_compare(lower, version) <= 0:
+                low = middle + 1
+            else:
+                high = middle
+        return low > 0 and version in self.__intervals[low - 1]
+
+
 class Versions:
     
     def __init__(self, isevery=False):
         self.__isevery = isevery
         self.__items = set()
+        self.__ranges = []
+        self.__range_index = None
         
     @property
     def isevery(self):
         return self.__isevery
+
+    @property
+    def ranges(self):
+        return self.__ranges
     
     def __iter__(self):
+        '''Enumerates distinct versions (not ranges)'''
         if self.isevery:
             raise CannonEnumerateEvery("Cannot enumerate every possible versions")
         return iter(self.__items)    
         
     def __contains__(self, version):
-        return self.isevery or version in self.__items
+        if self.isevery or version in self.__items:
+            return True
+        if not self.__ranges:
+            return False
+        if self.__range_index is None:
+            self.__range_index = _RangeIndex(self.__ranges)
+        return version in self.__range_index
             
     def add(self, version):
         if self.isevery:
             raise VersionsEveryAndDistinctError("You must not add distinct versions where every added")
         self.__items.add(version)
+
+    def add_range(self, version_range):
+        if self.isevery:
+            raise VersionsEveryAndDistinctError("You must not add version ranges where every added")
+        self.__ranges.append(version_range)
+        self.__range_index = None
     
     
 class ArchAndVersions:
@@ -117,27 +253,143 @@ class ArchAndVersions:
                 self.__data[arch] = versions
         
         
+def _package_element(name, arch_and_versions):
+    if arch_and_versions.isevery and arch_and_versions.every.isevery:
+        return etree.Element("fullpackage", name=name)
+    else:
+        package_element = etree.Element("package", name=name)
+        if arch_and_versions.isevery:
+            everyarch_element = etree.SubElement(package_element, "everyarch")
+            _add_versions_elements(everyarch_element, arch_and_versions.every)
+        else:
+            for arch, versions in sorted(arch_and_versions, key=lambda x: x[0]):
+                arch_element = etree.SubElement(package_element, "arch", name=arch)
+                if versions.isevery:
+                    etree.SubElement(arch_element, "everyversion")
+                else:
+                    _add_versions_elements(arch_element, versions)
+        return package_element
+
+
+def _add_versions_elements(parent, versions):
+    for version in sorted(versions):
+        etree.SubElement(parent, "version", number=version)
+    for version_range in versions.ranges:
+        etree.SubElement(parent, "range", version_range.xml_attributes())
+
+
+def _versions_from_element(element):
+    versions = Versions()
+    for version_element in element.findall("version"):
+        versions.add(version_element.get("number"))
+    for range_element in element.findall("range"):
+        versions.add_range(VersionRange.from_xml_attributes(range_element.attrib))
+    return versions
+
+
+def _full_arch_and_versions():
+    arch_and_versions = ArchAndVersions(isevery=True)
+    arch_and_versions.every = Versions(isevery=True)
+    return arch_and_versions
+
+
+def _arch_and_versions_from_element(package_element):
+    everyarch_element = package_element.find("everyarch")
+    if everyarch_element is not None:
+        arch_and_versions = ArchAndVersions(isevery=True)
+        everyversion_element = everyarch_element.find("everyversion")
+        if everyversion_element is not None:
+            arch_and_versions.every = Versions(isevery=True)
+        else:
+            arch_and_versions.add(_versions_from_element(everyarch_element))
+    else:
+        arch_and_versions = ArchAndVersions()
+        for arch_element in package_element.findall("arch"):
+            everyversion_element = arch_element.find("everyversion")
+            if everyversion_element is not None:
+                arch_and_versions.add(Versions(isevery=True), arch_element.get("name"))
+            else:
+                arch_and_versions.add(_versions_from_element(arch_element), arch_element.get("name"))
+    return arch_and_versions
+
+
+def read_enclosure_revision(file):
+    '''Returns revision of the enclosure file reading only its root element. None if the file has no
+    revision or cannot be read
+    '''
+    try:
+        for event, element in etree.iterparse(file, events=("start",)):
+            return element.get("revision")
+    except (IOError, etree.XMLSyntaxError):
+        return None
+
+
 class Enclosure:
     
     def __init__(self):
         self.__packages = {}
+        self.__revision = None
+        self.__rules = []
+        self.__matcher = None
+
+    @property
+    def revision(self):
+        '''Revision of the enclosure feed (None if the publisher doesn't number them)'''
+        return self.__revision
+
+    @revision.setter
+    def revision(self, revision):
+        self.__revision = revision
         
     def __iter__(self):
         return iter(self.__packages)
     
     def __contains__(self, package):
+        '''A package is in the enclosure if it is listed explicitly or matches some rule'''
         try:
-            return self.__packages[package.name].has_arch_version(package.architecture, package.version)
+            if self.__packages[package.name].has_arch_version(package.architecture, package.version):
+                return True
         except KeyError:
-            return False
+            pass
+        return bool(self.__rules) and package in self.matcher
+
+    @property
+    def rules(self):
+        return self.__rules
+
+    @property
+    def matcher(self):
+        '''Rules compiled into RuleMatcher'''
+        if self.__matcher is None:
+            self.__matcher = RuleMatcher(self.__rules)
+        return self.__matcher
+
+    def add_rule(self, rule):
+        self.__rules.append(rule)
+        self.__matcher = None
+
+    def replace_rules(self, rules):
+        self.__rules = list(rules)
+        self.__matcher = None
+
+    def arch_and_versions(self, name):
+        return self.__packages[name]
         
     def clear(self):
         self.__packages.clear()
+        self.__revision = None
+        self.replace_rules([])
         
     def add_package(self, name, arch_and_versions):
         if name in self.__packages:
             raise CannotAddExistingPackage("Package '{0}' is already in the eclosure".format(name))
         self.__packages[name] = arch_and_versions
+
+    def replace_package(self, name, arch_and_versions):
+        self.__packages[name] = arch_and_versions
+
+    def remove_package(self, name):
+        self.__packages.pop(name, None)
         
     def add_versioned_package(self, versioned):
         try:
@@ -147,70 +399,259 @@ class Enclosure:
             arch_and_versions.add_single(versioned.version, versioned.architecture)
             self.__packages[versioned.name] = arch_and_versions
         
-    def export_to_xml(self, file):
-        root = etree.Element("enclosure")
-        for pkg, arch_and_versions in sorted(self.__packages.items(), key=lambda x: x[0]):
-            if arch_and_versions.isevery and arch_and_versions.every.isevery:
-                etree.SubElement(root, "fullpackage", name=pkg)
-            else:
-                package_element = etree.SubElement(root, "package", name=pkg)
-                if arch_and_versions.isevery:
-                    everyarch_element = etree.SubElement(package_element, "everyarch")
-                    for version in sorted(arch_and_versions.every):
-                        etree.SubElement(everyarch_element, "version", number=version)
-                else:
-                    for arch, versions in sorted(arch_and_versions, key=lambda x: x[0]):
-                        arch_element = etree.SubElement(package_element, "arch", name=arch)
-                        if versions.isevery:
-                            etree.SubElement(arch_element, "everyversion")
-                        else:
-                            for version in sorted(versions):
-                                etree.SubElement(arch_element, "version", number=version)
-        tree = etree.ElementTree(root)
-        tree.write(file, pretty_print=True, encoding="UTF-8", xml_declaration=True)          
+    def export_to_xml(self, file, pretty=True):
+
+        def elements():
+            for rule in self.__rules:
+                yield rule.to_xml_element()
+            for name in sorted(self.__packages):
+                yield _package_element(name, self.__packages[name])
+
+        write_xml_document(file, "enclosure", elements(),
+                           {"revision": self.revision} if self.revision is not None else None, pretty)
     
     def import_from_xml(self, file):
         try:
             root = etree.parse(file).getroot()
             self.clear()
+            self.revision = root.get("revision")
+            for rule_element in root.findall("rule"):
+                self.add_rule(EnclosureRule.from_xml_element(rule_element))
             for fullpackage_element in root.findall("fullpackage"):
-                arch_and_versions = ArchAndVersions(isevery=True)
-                arch_and_versions.every = Versions(isevery=True)
-                self.add_package(fullpackage_element.get("name"), arch_and_versions)
+                self.add_package(fullpackage_element.get("name"), _full_arch_and_versions())
             for package_element in root.findall("package"):
-                everyarch_element = package_element.find("everyarch")
-                if everyarch_element is not None:
-                    arch_and_versions = ArchAndVersions(isevery=True)
-                    everyversion_element = everyarch_element.find("everyversion")
-                    if everyversion_element is not None:
-                        arch_and_versions.every = Versions(isevery=True)
-                    else:
-                        versions = Versions()
-                        for version_element in everyarch_element.findall("version"):
-                            versions.add(version_element.get("number"))
-                        arch_and_versions.add(versions)
-                else:
-                    arch_and_versions = ArchAndVersions()
-                    for arch_element in package_element.findall("arch"):
-                        everyversion_element = arch_element.find("everyversion")
-                        if everyversion_element is not None:
-                            arch_and_versions.add(Versions(isevery=True), arch_element.get("name"))
-                        else:
-                            versions = Versions()
-                            for version_element in arch_element.findall("version"):
-                                versions.add(version_element.get("number"))
-                            arch_and_versions.add(versions, arch_element.get("name"))
-                self.add_package(package_element.get("name"), arch_and_versions)
+                self.add_package(package_element.get("name"), _arch_and_versions_from_element(package_element))
         except (ValueError, LookupError, etree.XMLSyntaxError) as err:
             raise EnclosureImportSyntaxError('''Syntax error has been appeared during importing 
                                              enclosure structure from xml: ''' + str(err))
 
 
+class EnclosureDelta:
+    '''Changes turning the enclosure of revision "base" into the one of revision "revision".
+    Every changed package is replaced by its new description as a whole
+    '''
+
+    def __init__(self, base=None, revision=None):
+        self.base = base
+        self.revision = revision
+        self.__replaced = {}
+        self.__removed = set()
+        # New rules of the enclosure as a whole or None if they are not changed
+        self.rules = None
+
+    @property
+    def replaced(self):
+        return self.__replaced
+
+    @property
+    def removed(self):
+        return self.__removed
+
+    def replace_package(self, name, arch_and_versions):
+        self.__removed.discard(name)
+        self.__replaced[name] = arch_and_versions
+
+    def remove_package(self, name):
+        self.__replaced.pop(name, None)
+        self.__removed.add(name)
+
+    @staticmethod
+    def between(old, new):
+        '''Computes delta from "old" enclosure to "new" one'''
+
+        def package_to_string(enclosure, name):
+            return etree.tostring(_package_element(name, enclosure.arch_and_versions(name)))
+
+        delta = EnclosureDelta(old.revision, new.revision)
+        old_names = set(old)
+        for name in new:
+            if name not in old_names or package_to_string(old, name) != package_to_string(new, name):
+                delta.replace_package(name, new.arch_and_versions(name))
+        for name in old_names.difference(new):
+            delta.remove_package(name)
+        if old.rules != new.rules:
+            delta.rules = list(new.rules)
+        return delta
+
+    def apply_to(self, enclosure):
+        if enclosure.revision == self.revision:
+            return
+        if enclosure.revision != self.base:
+            raise EnclosureDeltaBaseMismatch(
+                '''Delta from revision "{0}" cannot be applied to the enclosure of revision "{1}"'''.
+                format(self.base, enclosure.revision))
+        for name in self.removed:
+            enclosure.remove_package(name)
+        for name, arch_and_versions in self.replaced.items():
+            enclosure.replace_package(name, arch_and_versions)
+        if self.rules is not None:
+            enclosure.replace_rules(self.rules)
+        enclosure.revision = self.revision
+
+    def export_to_xml(self, file, pretty=True):
+
+        def elements():
+            if self.rules is not None:
+                rules_element = etree.Element("rules")
+                for rule in self.rules:
+                    rules_element.append(rule.to_xml_element())
+                yield rules_element
+            for name in sorted(self.removed):
+                yield etree.Element("remove", name=name)
+            for name in sorted(self.replaced):
+                yield _package_element(name, self.replaced[name])
+
+        write_xml_document(file, "enclosure-delta", elements(), {"base": self.base, "revision": self.revision},
+                           pretty)
+
+    def import_from_xml(self, file):
+        try:
+            root = etree.parse(file).getroot()
+            if root.tag != "enclosure-delta":
+                raise ValueError('''root element must be "enclosure-delta"''')
+            self.base = root.attrib["base"]
+            self.revision = root.attrib["revision"]
+            self.__replaced.clear()
+            self.__removed.clear()
+            rules_element = root.find("rules")
+            self.rules = None if rules_element is None else \
+                [EnclosureRule.from_xml_element(rule_element) for rule_element in rules_element.findall("rule")]
+            for remove_element in root.findall("remove"):
+                self.remove_package(remove_element.attrib["name"])
+            for fullpackage_element in root.findall("fullpackage"):
+                self.replace_package(fullpackage_element.attrib["name"], _full_arch_and_versions())
+            for package_element in root.findall("package"):
+                self.replace_package(package_element.attrib["name"], _arch_and_versions_from_element(package_element))
+        except (ValueError, LookupError, etree.XMLSyntaxError) as err:
+            raise EnclosureImportSyntaxError('''Syntax error has been appeared during importing 
+                                             enclosure delta from xml: ''' + str(err))
+
+
+class EnclosureBuilder:
+    '''Builds the enclosure incrementally from chunks of its XML as they arrive (e. g. from network).
+    Every package element is converted and dropped as soon as it has been parsed
+    '''
+
+    def __init__(self):
+        self.__parser = etree.XMLPullParser(events=("start", "end"))
+        self.__enclosure = Enclosure()
+        self.__depth = 0
+        self.__package_count = 0
+
+    @property
+    def package_count(self):
+        '''Number of packages that have been built so far'''
+        return self.__package_count
+
+    def __handle_events(self):
+        for event, element in self.__parser.read_events():
+            if event == "start":
+                if self.__depth == 0:
+                    if element.tag != "enclosure":
+                        raise ValueError('''root element must be "enclosure"''')
+                    self.__enclosure.revision = element.get("revision")
+                self.__depth += 1
+                continue
+            self.__depth -= 1
+            if self.__depth != 1:
+                continue
+            if element.tag == "rule":
+                self.__enclosure.add_rule(EnclosureRule.from_xml_element(element))
+            elif element.tag == "fullpackage":
+                self.__enclosure.add_package(element.get("name"), _full_arch_and_versions())
+            elif element.tag == "package":
+                self.__enclosure.add_package(element.get("name"), _arch_and_versions_from_element(element))
+            if element.tag != "rule":
+                self.__package_count += 1
+            element.clear()
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def feed(self, data):
+        try:
+            self.__parser.feed(data)
+            self.__handle_events()
+        except (ValueError, LookupError, etree.XMLSyntaxError) as err:
+            raise EnclosureImportSyntaxError('''Syntax error has been appeared during importing 
+                                             enclosure structure from xml: ''' + str(err))
+
+    def close(self):
+        '''Finishes parsing and returns the enclosure'''
+        try:
+            self.__parser.close()
+            self.__handle_events()
+        except (ValueError, LookupError, etree.XMLSyntaxError) as err:
+            raise EnclosureImportSyntaxError('''Syntax error has been appeared during importing 
+                                             enclosure structure from xml: ''' + str(err))
+        return self.__enclosure
+
+
+ENCLOSURE_INDEX_FORMAT = 1
+
+
+def enclosure_index_filename(filename):
+    return filename + ".index"
+
+
+def save_enclosure_index(enclosure, filename):
+    '''Saves compiled (pickled) enclosure next to its XML file "filename". The index is bound
+    to the current state of the XML file and it is not used after the file changes
+    '''
+    index_filename = enclosure_index_filename(filename)
+    temp_filename = index_filename + ".tmp"
+    with open(temp_filename, "wb") as file:
+        pickle.dump((ENCLOSURE_INDEX_FORMAT, file_signature(filename), enclosure), file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, index_filename)
+
+
+def load_enclosure_index(filename):
+    '''Returns the enclosure from the compiled index of XML file "filename" or None if the index
+    doesn't exist or is out of date
+    '''
+    try:
+        with open(enclosure_index_filename(filename), "rb") as file:
+            index_format, signature, enclosure = pickle.load(file)
+        if index_format != ENCLOSURE_INDEX_FORMAT or signature != file_signature(filename) or \
+                not isinstance(enclosure, Enclosure):
+            return None
+        return enclosure
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+        return None
+
+
+def load_enclosure(filename):
+    '''Loads the enclosure from the compiled index if it is up to date, otherwise from XML'''
+    enclosure = load_enclosure_index(filename)
+    if enclosure is None:
+        enclosure = Enclosure()
+        enclosure.import_from_xml(filename)
+    return enclosure
+
+
+def store_enclosure(enclosure, filename):
+    '''Replaces XML file "filename" by the enclosure atomically and compiles its index'''
+    temp_filename = filename + ".tmp"
+    try:
+        enclosure.export_to_xml(temp_filename)
+        os.replace(temp_filename, filename)
+    except:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    save_enclosure_index(enclosure, filename)
+
+
 class MixedEnclosure:
 
     def __init__(self, *enclosures):
         self.enclosures = [enclosure for enclosure in enclosures]
 
+    @property
+    def rules(self):
+        return [rule for enclosure in self.enclosures for rule in enclosure.rules]
+
     def __contains__(self, package):
         for enclosure in self.enclosures:
             if package in enclosure:
@@ -47,7 +47,7 @@ class YouHaveNotPrivilegesError(Error): pass
 class YouHaveNotUserPrivilegesError(YouHaveNotPrivilegesError, GroupProblem):
     
     def __init__(self, group_name):
-        GroupProblem.__init__(group_name)
+        GroupProblem.__init__(self, group_name)
 
 class YouMayNotUpdateError(YouHaveNotUserPrivilegesError):
     
@@ -82,7 +82,7 @@ class YouMayNotIgnoreInterruptedError(YouMayNotProcessInterruptedError): pass
 class GroupNotExistError(TerminationError, GroupProblem):
 
     def __init__(self, group_name):
-        GroupProblem.__init__(group_name)
+        GroupProblem.__init__(self, group_name)
 
 class FileError(TerminationError):
     
@@ -151,6 +151,16 @@ class DpkgJournalDirtyError(PackageManagerError): pass
 
 class PrecedingTasksHasNotBeenCompletedError(PackageManagerError): pass
 
+class ConfiguringError(PackageManagerError):
+
+    def __init__(self, packages):
+        super().__init__(packages)
+        self.__packages = packages
+
+    @property
+    def packages(self):
+        return self.__packages
+
 class PackageNotExistNow(PackageManagerError):
 
     def __init__(self, package):
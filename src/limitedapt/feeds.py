@@ -0,0 +1,242 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Feeds of enclosures and debconf priorities. A feed may be compressed by xz, gzip or
+zstd (the last needs "zstandard" module); compression is detected by the magic number
+and the feed is decompressed on the fly while being imported
+'''
+
+import gzip
+import lzma
+import os
+import shutil
+import zlib
+from .errors import DataError
+from .enclosure import *
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class FeedError(DataError): pass
+
+class UnsupportedFeedCompression(FeedError): pass
+
+
+_MAGIC_NUMBERS = [
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+]
+
+COMPRESSIONS = ["xz", "gzip", "zstd"]
+
+
+_MAGIC_LENGTH = max(len(magic) for magic, compression in _MAGIC_NUMBERS)
+
+
+def _compression_of(head):
+    for magic, compression in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def detect_compression(filename):
+    '''Returns compression of the file ("xz", "gzip" or "zstd") or None if it is not compressed'''
+    with open(filename, "rb") as file:
+        return _compression_of(file.read(_MAGIC_LENGTH))
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise UnsupportedFeedCompression('''"zstandard" module is needed to handle zstd-compressed feeds''')
+
+
+def open_feed(filename):
+    '''Opens the feed for binary reading decompressing it if needed'''
+    compression = detect_compression(filename)
+    if compression == "xz":
+        return lzma.open(filename, "rb")
+    elif compression == "gzip":
+        return gzip.open(filename, "rb")
+    elif compression == "zstd":
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+    else:
+        return open(filename, "rb")
+
+
+def compress_file(source, target, compression):
+    if compression == "xz":
+        target_file = lzma.open(target, "wb")
+    elif compression == "gzip":
+        target_file = gzip.open(target, "wb")
+    elif compression == "zstd":
+        _require_zstandard()
+        target_file = zstandard.ZstdCompressor().stream_writer(open(target, "wb"), closefd=True)
+    else:
+        raise UnsupportedFeedCompression('''Unknown compression "{0}"'''.format(compression))
+    with open(source, "rb") as source_file, target_file:
+        shutil.copyfileobj(source_file, target_file)
+
+
+def _replace_atomically(target, write):
+    temp_target = target + ".tmp"
+    try:
+        write(temp_target)
+        os.replace(temp_target, target)
+    except:
+        if os.path.exists(temp_target):
+            os.remove(temp_target)
+        raise
+
+
+def _read_feed(filename, importer):
+    try:
+        with open_feed(filename) as feed:
+            importer(feed)
+    except (lzma.LZMAError, EOFError, gzip.BadGzipFile) as err:
+        raise FeedError('''Cannot decompress feed "{0}": {1}'''.format(filename, err))
+    except Exception as err:
+        if zstandard is not None and isinstance(err, zstandard.ZstdError):
+            raise FeedError('''Cannot decompress feed "{0}": {1}'''.format(filename, err))
+        raise
+
+
+def decompress_feed(filename, target):
+    '''Decompresses the feed to the target file replacing it atomically'''
+
+    def write(temp_target):
+        with open(temp_target, "wb") as target_file:
+            _read_feed(filename, lambda feed: shutil.copyfileobj(feed, target_file))
+
+    _replace_atomically(target, write)
+
+
+def load_enclosure_feed(filename):
+    enclosure = Enclosure()
+    _read_feed(filename, enclosure.import_from_xml)
+    return enclosure
+
+
+def load_enclosure_delta_feed(filename):
+    delta = EnclosureDelta()
+    _read_feed(filename, delta.import_from_xml)
+    return delta
+
+
+def install_enclosure_feed(filename, target):
+    '''Imports the whole enclosure from the feed and stores it to the target file with its index'''
+    store_enclosure(load_enclosure_feed(filename), target)
+
+
+def apply_enclosure_delta_feed(filename, target):
+    '''Applies the delta from the feed to the enclosure stored in the target file'''
+    delta = load_enclosure_delta_feed(filename)
+    enclosure = load_enclosure(target)
+    delta.apply_to(enclosure)
+    store_enclosure(enclosure, target)
+
+
+class _PlainDecompressor:
+
+    eof = True
+
+    def decompress(self, data):
+        return data
+
+
+class StreamingDecompressor:
+    '''Decompresses the feed chunk by chunk detecting its compression by the first bytes'''
+
+    def __init__(self):
+        self.__head = b""
+        self.__decompressor = None
+
+    @staticmethod
+    def __create(compression):
+        if compression == "xz":
+            return lzma.LZMADecompressor()
+        elif compression == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif compression == "zstd":
+            _require_zstandard()
+            return zstandard.ZstdDecompressor().decompressobj()
+        else:
+            return _PlainDecompressor()
+
+    def __decompress(self, data):
+        try:
+            return self.__decompressor.decompress(data)
+        except (lzma.LZMAError, zlib.error) as err:
+            raise FeedError("Cannot decompress feed: {0}".format(err))
+        except Exception as err:
+            if zstandard is not None and isinstance(err, zstandard.ZstdError):
+                raise FeedError("Cannot decompress feed: {0}".format(err))
+            raise
+
+    def decompress(self, data):
+        if self.__decompressor is None:
+            self.__head += data
+            if len(self.__head) < _MAGIC_LENGTH:
+                return b""
+            data, self.__head = self.__head, b""
+            self.__decompressor = self.__create(_compression_of(data))
+        return self.__decompress(data)
+
+    def finish(self):
+        '''Returns the rest of decompressed data. Raises FeedError if the feed is truncated'''
+        rest = b""
+        if self.__decompressor is None:
+            data, self.__head = self.__head, b""
+            self.__decompressor = self.__create(_compression_of(data))
+            rest = self.__decompress(data)
+        if not self.__decompressor.eof:
+            raise FeedError("Feed is truncated")
+        return rest
+
+
+class StreamingEnclosureFeed:
+    '''Consumer of downloaded chunks of the (possibly compressed) enclosure feed. The enclosure
+    is being built while the feed is still being transferred. An error doesn't stop the transfer:
+    it is raised by "finish"
+    '''
+
+    def __init__(self):
+        self.__decompressor = StreamingDecompressor()
+        self.__builder = EnclosureBuilder()
+        self.__error = None
+
+    @property
+    def package_count(self):
+        return self.__builder.package_count
+
+    def feed(self, data):
+        if self.__error is not None:
+            return
+        try:
+            self.__builder.feed(self.__decompressor.decompress(data))
+        except (FeedError, EnclosureImportSyntaxError) as err:
+            self.__error = err
+
+    def finish(self):
+        '''Returns the built enclosure'''
+        if self.__error is not None:
+            raise self.__error
+        self.__builder.feed(self.__decompressor.finish())
+        return self.__builder.close()
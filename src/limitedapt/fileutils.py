@@ -0,0 +1,30 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Helpers for files the stored indexes and reports are made from'''
+
+import os
+
+
+def file_signature(filename):
+    '''Size and modification time of the file (None if it doesn't exist). Compiled indexes and
+    reports store signatures of their source files to find out they are out of date
+    '''
+    try:
+        stat = os.stat(filename)
+        return (stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError:
+        return None
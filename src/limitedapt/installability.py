@@ -0,0 +1,279 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Precomputed installability of enclosed packages: whether an ordinary user is able to install
+the candidate of every enclosed package without the resolver dragging in non-enclosed packages
+or packages asking debconf questions.
+
+It is an estimation made without the resolver: a dependency (a group of alternatives) is
+considered satisfied if one of its alternatives is installed in a suitable version or its
+candidate is installable itself. So the resolver may still reject an "installable" package
+(because of conflicts, for example) but never accepts a "not installable" one.
+'''
+
+import enum
+import os
+import pickle
+from .errors import Error
+from .fileutils import file_signature
+from .packages import *
+from .debconf import *
+
+
+INSTALLABILITY_REPORT_FORMAT = 1
+
+
+class Installability(enum.Enum):
+    INSTALLABLE = "installable"
+    DEPENDENCY_NOT_ENCLOSED = "dependency-not-enclosed"
+    DEBCONF_PRIORITY = "debconf-priority"
+    UNKNOWN_DEBCONF_PRIORITY = "unknown-debconf-priority"
+    UNTRUSTED = "untrusted"
+
+    def __str__(self):
+        return self.value
+
+
+class PackageInstallability:
+    '''Installability of the candidate version of a package. "blocker" is the unsatisfied
+    dependency (the names of its alternatives separated by " | ") or the debconf priority
+    '''
+
+    def __init__(self, version, status, blocker=None):
+        self.__version = version
+        self.__status = status
+        self.__blocker = blocker
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def status(self):
+        return self.__status
+
+    @property
+    def blocker(self):
+        return self.__blocker
+
+    @property
+    def installable(self):
+        return self.__status == Installability.INSTALLABLE
+
+    def __eq__(self, other):
+        return self.version == other.version and self.status == other.status and self.blocker == other.blocker
+
+
+class InstallabilityReport:
+    '''Installability of enclosed candidates (by package names of the cache). "sources" maps
+    files the report is made from (enclosures, priorities, dpkg status, apt extended states and
+    package cache) to their signatures
+    '''
+
+    def __init__(self, sources, minimal_priority):
+        self.__sources = sources
+        self.__minimal_priority = minimal_priority
+        self.__results = {}
+        # What results depend on: package inputs and dependency names of analysed packages
+        self.__inputs = {}
+        self.__depends = {}
+        self.__analysed_count = 0
+
+    @property
+    def sources(self):
+        return self.__sources
+
+    @property
+    def minimal_priority(self):
+        return self.__minimal_priority
+
+    @property
+    def analysed_count(self):
+        '''Count of packages analysed anew (not taken from the previous report)'''
+        return self.__analysed_count
+
+    def __iter__(self):
+        return iter(self.__results)
+
+    def __len__(self):
+        return len(self.__results)
+
+    def __contains__(self, name):
+        return name in self.__results
+
+    def __getitem__(self, name):
+        return self.__results[name]
+
+    def is_current(self, sources, minimal_priority):
+        return self.__sources == sources and self.__minimal_priority == minimal_priority
+
+    def installability_of(self, pkg):
+        '''Installability of the candidate of the package or None if the report knows nothing
+        about this candidate (it is not enclosed or has appeared after the report was made)
+        '''
+        result = self.__results.get(pkg.name)
+        if result is None or pkg.candidate is None or result.version != pkg.candidate.version:
+            return None
+        return result
+
+    def count_installable(self):
+        return sum(1 for result in self.__results.values() if result.installable)
+
+    def _inputs(self):
+        return self.__inputs
+
+    def _depends(self):
+        return self.__depends
+
+    def _set_analysed_count(self, count):
+        self.__analysed_count = count
+
+    def _results(self):
+        return self.__results
+
+
+def _package_inputs(pkg, enclosure, priorities):
+    '''Everything the installability of the package and of its reverse dependencies depends on'''
+    candidate = pkg.candidate
+    installed = pkg.installed.version if pkg.installed is not None else None
+    if candidate is None:
+        return (None, installed, False, None, False)
+    concrete_package = ConcretePackage(pkg.shortname, candidate.architecture)
+    if concrete_package in priorities:
+        state = priorities[concrete_package]
+        priority_state = (state.status, state.priority)
+    else:
+        priority_state = None
+    trusted = bool(candidate.origins) and candidate.origins[0].trusted
+    enclosed = described_package(pkg, enclosure=enclosure) in enclosure
+    return (candidate.version, installed, enclosed, priority_state, trusted)
+
+
+def _own_installability(inputs, minimal_priority):
+    '''Installability of the candidate regardless of dependencies, None if it depends on them'''
+    version, installed, enclosed, priority_state, trusted = inputs
+    if installed == version:
+        return PackageInstallability(version, Installability.INSTALLABLE)
+    if not trusted:
+        return PackageInstallability(version, Installability.UNTRUSTED)
+    if priority_state is None or priority_state[0] == Status.PROCESSING_ERROR:
+        return PackageInstallability(version, Installability.UNKNOWN_DEBCONF_PRIORITY)
+    status, priority = priority_state
+    if status == Status.HAS_QUESTIONS and priority >= minimal_priority:
+        return PackageInstallability(version, Installability.DEBCONF_PRIORITY, str(priority))
+    return None
+
+
+def analyse_installability(cache, enclosure, priorities, minimal_priority, sources, previous=None):
+    '''Makes installability report of enclosed candidates of the cache. "priorities" is a debconf
+    priority structure ("DebconfPriorities" is much faster than "DebconfPrioritiesDB" here).
+
+    Results of the previous report are reused for packages whose inputs (and inputs of whose
+    dependencies) have not changed. Packages blocked by a dependency are always analysed anew
+    because a new package may provide the missing one
+    '''
+    report = InstallabilityReport(sources, minimal_priority)
+    inputs, depends, results = report._inputs(), report._depends(), report._results()
+    for pkg in cache:
+        inputs[pkg.name] = _package_inputs(pkg, enclosure, priorities)
+
+    if previous is not None and previous.minimal_priority == minimal_priority:
+        previous_inputs, previous_depends, previous_results = previous._inputs(), previous._depends(), previous._results()
+        changed = {name for name, package_inputs in inputs.items() if previous_inputs.get(name) != package_inputs}
+        changed.update(name for name in previous_inputs if name not in inputs)
+        reverse_depends = {}
+        for name, names in previous_depends.items():
+            for dependency in names:
+                reverse_depends.setdefault(dependency, []).append(name)
+        dirty = set()
+        stack = list(changed)
+        while stack:
+            name = stack.pop()
+            if name not in dirty:
+                dirty.add(name)
+                stack.extend(reverse_depends.get(name, ()))
+        for name, result in previous_results.items():
+            if name not in dirty and result.status != Installability.DEPENDENCY_NOT_ENCLOSED:
+                results[name] = result
+                depends[name] = previous_depends[name]
+    analysed = [name for name, package_inputs in inputs.items() if package_inputs[2] and name not in results]
+
+    # Greatest fixpoint: every analysed package is supposed to be installable until one of its
+    # dependencies is proved not to be satisfiable
+    groups = {}
+    for name in analysed:
+        own = _own_installability(inputs[name], minimal_priority)
+        if own is not None:
+            results[name] = own
+            depends[name] = ()
+            continue
+        results[name] = PackageInstallability(inputs[name][0], Installability.INSTALLABLE)
+        package_groups = []
+        names = set()
+        for dependency in cache[name].candidate.dependencies:
+            names.update(base.name for base in dependency.or_dependencies)
+            installed_targets = [version.package.name for base in dependency.or_dependencies
+                                 for version in base.installed_target_versions]
+            if installed_targets:
+                names.update(installed_targets)
+                continue
+            targets = [version.package.name for version in dependency.target_versions
+                       if version == version.package.candidate]
+            names.update(targets)
+            package_groups.append((" | ".join(base.name for base in dependency.or_dependencies), targets))
+        groups[name] = package_groups
+        depends[name] = tuple(names)
+
+    reverse_depends = {}
+    for name, package_groups in groups.items():
+        for alternatives, targets in package_groups:
+            for target in targets:
+                reverse_depends.setdefault(target, set()).add(name)
+
+    def is_installable(name):
+        result = results.get(name)
+        return result is not None and result.installable
+
+    queue = list(groups)
+    while queue:
+        name = queue.pop()
+        if not results[name].installable:
+            continue
+        for alternatives, targets in groups[name]:
+            if not any(is_installable(target) for target in targets):
+                results[name] = PackageInstallability(inputs[name][0], Installability.DEPENDENCY_NOT_ENCLOSED,
+                                                      alternatives)
+                queue.extend(reverse_depends.get(name, ()))
+                break
+
+    report._set_analysed_count(len(analysed))
+    return report
+
+
+def save_installability_report(report, filename):
+    temp_filename = filename + ".new"
+    with open(temp_filename, "wb") as file:
+        pickle.dump((INSTALLABILITY_REPORT_FORMAT, report), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def load_installability_report(filename):
+    '''Returns None if there is no (readable) report'''
+    try:
+        with open(filename, "rb") as file:
+            report_format, report = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, ImportError):
+        return None
+    return report if report_format == INSTALLABILITY_REPORT_FORMAT else None
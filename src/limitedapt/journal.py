@@ -0,0 +1,267 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Commit journal kept in the uncompleted tasks file: the exact changes being committed
+and how far the commit has gone.
+
+"resolved": the changes are marked, archives may be not downloaded yet.
+"fetched": archives of all the installed versions are downloaded (with the hashes given),
+dpkg may have been run already.
+
+Which changes dpkg has done is not journaled: it is the state of installed packages itself.
+A version is installed completely only when dpkg has configured it: the one dpkg has only unpacked
+is configured apart, the one required to be reinstalled is installed once again.
+'''
+
+import enum
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
+from .errors import *
+
+
+class JournalError(Error): pass
+
+class JournalImportSyntaxError(XmlImportSyntaxError, JournalError): pass
+
+class JournalMismatch(JournalError):
+    '''The cache cannot make changes of the journal (e. g. the candidate version is other now)'''
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__name = name
+
+    @property
+    def name(self):
+        return self.__name
+
+
+class JournalPhase(enum.Enum):
+    RESOLVED = "resolved"
+    FETCHED = "fetched"
+
+    def __str__(self):
+        return self.value
+
+
+def archive_filename(version, archives_directory):
+    '''Where apt keeps the downloaded archive of the version'''
+    return os.path.join(archives_directory, "{0}_{1}_{2}.deb".format(version.package.shortname,
+                                                                     version.version.replace(":", "%3a"),
+                                                                     version.architecture))
+
+
+class JournalChange:
+    '''Change of a package: "version" is the version to install or None for deletion.
+    "archive", "size" and "sha256" describe the archive of the version to install
+    '''
+
+    def __init__(self, name, version, auto=False, purge=False, archive=None, size=None, sha256=None):
+        self.__name = name
+        self.__version = version
+        self.__auto = auto
+        self.__purge = purge
+        self.__archive = archive
+        self.__size = size
+        self.__sha256 = sha256
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def auto(self):
+        return self.__auto
+
+    @property
+    def purge(self):
+        return self.__purge
+
+    @property
+    def archive(self):
+        return self.__archive
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def sha256(self):
+        return self.__sha256
+
+    @property
+    def is_delete(self):
+        return self.__version is None
+
+    def __is_version_installed(self, pkg):
+        return not self.is_delete and pkg.is_installed and pkg.installed.version == self.version
+
+    def is_done(self, cache):
+        '''Whether dpkg has already made the change. An unpacked or half-configured version is not installed yet'''
+        pkg = cache[self.name]
+        if self.is_delete:
+            return not pkg.is_installed
+        return self.__is_version_installed(pkg) and pkg.is_configured
+
+    def is_unconfigured(self, cache):
+        '''Whether dpkg has unpacked the version but has not configured it'''
+        pkg = cache[self.name]
+        return self.__is_version_installed(pkg) and not pkg.is_configured and not pkg.is_reinstall_required
+
+    def is_archive_valid(self):
+        '''Whether the archive is in place and is the same that has been fetched'''
+        try:
+            if os.path.getsize(self.archive) != self.size:
+                return False
+            digest = hashlib.sha256()
+            with open(self.archive, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(chunk)
+        except OSError:
+            return False
+        return digest.hexdigest() == self.sha256
+
+
+class CommitJournal:
+    '''"auto_flags" maps names of installed packages to their automatically installed flags
+    which are changed without changing the packages themselves
+    '''
+
+    def __init__(self, changes, auto_flags=None, phase=JournalPhase.RESOLVED):
+        self.__changes = list(changes)
+        self.__auto_flags = dict(auto_flags) if auto_flags is not None else {}
+        self.phase = phase
+
+    @staticmethod
+    def from_cache(cache, archives_directory, is_purged=lambda pkg: False, task_packages=()):
+        '''Journal of the changes marked in the cache. Auto flags of installed task packages are journaled too'''
+        changes = []
+        for pkg in cache.get_changes():
+            if pkg.marked_delete:
+                changes.append(JournalChange(pkg.name, None, purge=is_purged(pkg)))
+            else:
+                candidate = pkg.candidate
+                changes.append(JournalChange(pkg.name, candidate.version, auto=pkg.is_auto_installed,
+                                             archive=archive_filename(candidate, archives_directory),
+                                             size=candidate.size, sha256=candidate.sha256))
+        auto_flags = {pkg.name: pkg.is_auto_installed for pkg in task_packages
+                      if pkg.is_installed and not pkg.marked_delete}
+        return CommitJournal(changes, auto_flags)
+
+    @property
+    def changes(self):
+        return self.__changes
+
+    @property
+    def auto_flags(self):
+        return self.__auto_flags
+
+    def is_empty(self):
+        return not self.changes and not self.auto_flags
+
+    def unconfigured(self, cache):
+        '''Names of the packages to configure (apt configures only the packages it installs itself)'''
+        try:
+            return [change.name for change in self.changes if change.is_unconfigured(cache)]
+        except KeyError as err:
+            raise JournalMismatch(str(err)) from err
+
+    def remaining(self, cache):
+        '''Journal of what dpkg and apt have not done yet'''
+        try:
+            return CommitJournal([change for change in self.changes if not change.is_done(cache)],
+                                 {name: auto for name, auto in self.auto_flags.items()
+                                  if cache[name].is_auto_installed != auto},
+                                 self.phase)
+        except KeyError as err:
+            raise JournalMismatch(str(err)) from err
+
+    def invalid_archives(self, max_workers=None):
+        '''Changes (installations) whose archives have to be fetched once again.
+        Archives are verified in parallel
+        '''
+        installations = [change for change in self.changes if not change.is_delete]
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            validity = list(executor.map(JournalChange.is_archive_valid, installations))
+        return [change for change, valid in zip(installations, validity) if not valid]
+
+    def mark(self, cache):
+        '''Marks the changes in the cache (it must be done inside its action group) without resolution.
+        Unconfigured packages are not marked'''
+        try:
+            for change in self.changes:
+                pkg = cache[change.name]
+                if change.is_delete:
+                    pkg.mark_delete(auto_fix=False, purge=change.purge)
+                elif pkg.candidate is None or pkg.candidate.version != change.version:
+                    raise JournalMismatch(change.name)
+                elif pkg.is_installed and pkg.installed.version == change.version:
+                    if pkg.is_reinstall_required:
+                        pkg.mark_reinstall()
+                    if pkg.is_auto_installed != change.auto:
+                        pkg.mark_auto(change.auto)
+                else:
+                    pkg.mark_install(auto_fix=False, auto_inst=False, from_user=not change.auto)
+                    if pkg.is_auto_installed != change.auto:
+                        pkg.mark_auto(change.auto)
+            for name, auto in self.auto_flags.items():
+                cache[name].mark_auto(auto)
+        except KeyError as err:
+            raise JournalMismatch(str(err)) from err
+
+    def export_to_xml_element(self, parent):
+        '''Replaces the journal element of the parent if it has one'''
+        for element in parent.findall("journal"):
+            parent.remove(element)
+        journal_element = etree.SubElement(parent, "journal", phase=str(self.phase))
+        for change in self.changes:
+            if change.is_delete:
+                etree.SubElement(journal_element, "delete", name=change.name, purge=str(change.purge))
+            else:
+                etree.SubElement(journal_element, "install", name=change.name, version=change.version,
+                                 auto=str(change.auto), archive=change.archive, size=str(change.size),
+                                 sha256=change.sha256)
+        for name, auto in sorted(self.auto_flags.items()):
+            etree.SubElement(journal_element, "auto", name=name, auto=str(auto))
+
+    @staticmethod
+    def import_from_xml_element(parent):
+        '''Returns None if the parent has no journal (the file is written by an older version)'''
+        journal_element = parent.find("journal")
+        if journal_element is None:
+            return None
+        try:
+            changes = []
+            auto_flags = {}
+            for element in journal_element:
+                if element.tag == "delete":
+                    changes.append(JournalChange(element.get("name"), None, purge=element.get("purge") == "True"))
+                elif element.tag == "install":
+                    changes.append(JournalChange(element.get("name"), element.get("version"),
+                                                 auto=element.get("auto") == "True", archive=element.get("archive"),
+                                                 size=int(element.get("size")), sha256=element.get("sha256")))
+                elif element.tag == "auto":
+                    auto_flags[element.get("name")] = element.get("auto") == "True"
+                else:
+                    raise ValueError(element.tag)
+            return CommitJournal(changes, auto_flags, JournalPhase(journal_element.get("phase")))
+        except (ValueError, TypeError) as err:
+            raise JournalImportSyntaxError("Syntax error in the commit journal: " + str(err))
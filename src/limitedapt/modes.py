@@ -30,6 +30,12 @@ class DisplayModes:
     def pkg_str(self, pkg):
         return pkg.shortname + ":" + pkg.candidate.architecture if self.show_arch else pkg.name
 
+    def concrete_str(self, package, native_architecture):
+        '''The same as "pkg_str" for "ConcretePackage": architecture is shown for foreign packages anyway'''
+        if self.show_arch or package.architecture not in (native_architecture, "all"):
+            return str(package)
+        return package.name
+
     @property
     def verbose(self):
         return self.__verbose
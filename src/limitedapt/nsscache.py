@@ -0,0 +1,126 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Cached resolution of users and their groups through NSS for privilege checks.
+
+Membership of the single user is asked by "os.getgrouplist" instead of getting whole groups
+with their members (which may be large and slow to enumerate on LDAP/SSSD hosts). Results
+are kept in a file of the state directory for a short time, so successive runs don't ask
+NSS again. Only root writes the file, failing to write it is not an error.
+'''
+
+import grp
+import os
+import pickle
+import pwd
+import time
+from .errors import GroupNotExistError
+from .profiling import Profiler
+
+
+NSS_CACHE_FORMAT = 1
+
+DEFAULT_NSS_CACHE_TTL = 60
+
+
+class NssStatistics:
+    '''Counts of the cache hits and of the lookups made through NSS with their total time in seconds'''
+
+    def __init__(self):
+        self.hits = 0
+        self.lookups = 0
+        self.lookup_time = 0.0
+
+
+class NssCache:
+    '''"clock" gives the current time in seconds (it must be comparable between runs)'''
+
+    def __init__(self, filename=None, ttl=DEFAULT_NSS_CACHE_TTL, profiler=None, clock=time.time):
+        self.__filename = filename
+        self.__ttl = ttl
+        self.__profiler = profiler if profiler is not None else Profiler(enabled=False)
+        self.__clock = clock
+        self.__entries = None
+        self.__statistics = NssStatistics()
+
+    @property
+    def statistics(self):
+        return self.__statistics
+
+    def __load(self):
+        entries = {}
+        if self.__filename is not None:
+            try:
+                with open(self.__filename, "rb") as file:
+                    cache_format, entries = pickle.load(file)
+                if cache_format != NSS_CACHE_FORMAT or not isinstance(entries, dict):
+                    entries = {}
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, ImportError):
+                entries = {}
+        now = self.__clock()
+        # Entries "from the future" are dropped as well: the clock has been turned back
+        return {key: (stored, value) for key, (stored, value) in entries.items() if 0 <= now - stored < self.__ttl}
+
+    def __save(self):
+        if self.__filename is None:
+            return
+        temp_filename = self.__filename + ".new"
+        try:
+            with open(temp_filename, "wb") as file:
+                pickle.dump((NSS_CACHE_FORMAT, self.__entries), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_filename, self.__filename)
+        except OSError:
+            pass
+
+    def __lookup(self, key, function):
+        if self.__entries is None:
+            self.__entries = self.__load()
+        if key in self.__entries:
+            self.__statistics.hits += 1
+            return self.__entries[key][1]
+        start = time.perf_counter()
+        with self.__profiler.span("nss-lookup"):
+            value = function()
+        self.__statistics.lookups += 1
+        self.__statistics.lookup_time += time.perf_counter() - start
+        self.__entries[key] = (self.__clock(), value)
+        self.__save()
+        return value
+
+    def user_name(self, user_id):
+        return self.__lookup(("user", user_id), lambda: pwd.getpwuid(user_id).pw_name)
+
+    def group_id(self, group_name):
+        '''Raises "GroupNotExistError" if there is no such group (it is not cached)'''
+        def lookup():
+            try:
+                return grp.getgrnam(group_name).gr_gid
+            except KeyError:
+                raise GroupNotExistError(group_name)
+        return self.__lookup(("group", group_name), lookup)
+
+    def group_ids_of(self, user_name):
+        '''Identifiers of all the groups of the user (the primary one included)'''
+        def lookup():
+            try:
+                primary_group_id = pwd.getpwnam(user_name).pw_gid
+            except KeyError:
+                return frozenset()
+            return frozenset(os.getgrouplist(user_name, primary_group_id))
+        return self.__lookup(("groups-of", user_name), lookup)
+
+    def is_belong_to_group(self, user_name, group_name):
+        return self.group_id(group_name) in self.group_ids_of(user_name)
@@ -0,0 +1,94 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Streaming output of package lists for other programs: entries are written as they are made,
+in buffered chunks, as plain lines, NUL-separated names or JSON lines.
+
+An entry is a pair of its text (what is printed in the plain and NUL-separated formats)
+and its fields (the object of its JSON line).
+'''
+
+import enum
+import json
+
+
+class OutputFormat(enum.Enum):
+    PLAIN = "plain"
+    NUL = "nul"
+    JSON_LINES = "jsonl"
+
+    def __str__(self):
+        return self.value
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class ChunkedWriter:
+    '''Writes entries to a binary stream in chunks of about "chunk_size" bytes.
+    The first entry is flushed at once, so a reader gets it without waiting for the whole chunk
+    '''
+
+    def __init__(self, stream, output_format=OutputFormat.PLAIN, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.__stream = stream
+        self.__format = OutputFormat(output_format)
+        self.__chunk_size = chunk_size
+        self.__chunk = []
+        self.__chunk_length = 0
+        self.__written = 0
+
+    @property
+    def output_format(self):
+        return self.__format
+
+    @property
+    def written(self):
+        '''Count of the entries written'''
+        return self.__written
+
+    def __encode(self, text, fields):
+        if self.__format is OutputFormat.JSON_LINES:
+            return json.dumps(fields if fields is not None else {"name": text}, ensure_ascii=False).encode() + b"\n"
+        if self.__format is OutputFormat.NUL:
+            # Package names never contain NUL
+            return text.encode() + b"\0"
+        return text.encode() + b"\n"
+
+    def write(self, text, fields=None):
+        data = self.__encode(text, fields)
+        self.__chunk.append(data)
+        self.__chunk_length += len(data)
+        self.__written += 1
+        if self.__written == 1 or self.__chunk_length >= self.__chunk_size:
+            self.flush()
+
+    def write_all(self, entries):
+        for text, fields in entries:
+            self.write(text, fields)
+
+    def flush(self):
+        if self.__chunk:
+            self.__stream.write(b"".join(self.__chunk))
+            self.__chunk = []
+            self.__chunk_length = 0
+        self.__stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
@@ -60,3 +60,80 @@ class VersionedPackage(ConcretePackage):
 
     def __str__(self):
         return "{0} : {1} : {2}".format(self.name, self.architecture, self.version)
+
+
+class DescribedPackage(VersionedPackage):
+    '''Versioned package with the properties enclosure rules may match: section, priority,
+    debtags and origins ("origin" and "archive" pairs)
+    '''
+
+    def __init__(self, name, architecture, version, section=None, priority=None, tags=(), origins=()):
+        super().__init__(name, architecture, version)
+        self.__section = section
+        self.__priority = priority
+        self.__tags = frozenset(tags)
+        self.__origins = tuple(origins)
+
+    @property
+    def section(self):
+        return self.__section
+
+    @property
+    def priority(self):
+        return self.__priority
+
+    @property
+    def tags(self):
+        return self.__tags
+
+    @property
+    def origins(self):
+        return self.__origins
+
+
+def parse_tags(tag_field):
+    '''Parses "Tag" field of a package record'''
+    return [tag.strip() for tag in tag_field.split(",") if tag.strip()] if tag_field else []
+
+
+class CacheVersionPackage(DescribedPackage):
+    '''Described package of a version of the package cache. Section, priority, debtags and origins
+    are read from the cache only when some enclosure rule asks for them
+    '''
+
+    def __init__(self, name, version):
+        super().__init__(name, version.architecture, version.version)
+        self.__cache_version = version
+        self.__tags = None
+        self.__origins = None
+
+    @property
+    def section(self):
+        return self.__cache_version.section
+
+    @property
+    def priority(self):
+        return self.__cache_version.priority
+
+    @property
+    def tags(self):
+        if self.__tags is None:
+            self.__tags = frozenset(parse_tags(self.__cache_version.record.get("Tag")))
+        return self.__tags
+
+    @property
+    def origins(self):
+        if self.__origins is None:
+            self.__origins = tuple((origin.origin, origin.archive) for origin in self.__cache_version.origins)
+        return self.__origins
+
+
+def described_package(pkg, version=None, enclosure=None):
+    '''Package of the version of the cache package (candidate by default) to look up in the enclosure.
+    If the enclosure has no rules only the name, architecture and version are needed
+    '''
+    if version is None:
+        version = pkg.candidate
+    if enclosure is not None and not enclosure.rules:
+        return VersionedPackage(pkg.shortname, version.architecture, version.version)
+    return CacheVersionPackage(pkg.shortname, version)
@@ -0,0 +1,267 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Resolved plans: marks the resolver has made for tasks, stored after a simulation so that
+the following real run commits them without marking, resolution and checks once again.
+
+A plan is valid while its key is: the tasks, the user, the work modes, the minimal debconf
+priority, the signature (size and modification time) of the apt package cache and the hashes
+of the state files (enclosures, coownership list, debconf priorities, dpkg status and apt
+extended states).
+'''
+
+import hashlib
+import io
+import os
+import pickle
+from lxml import etree
+from .errors import *
+from .fileutils import file_signature
+from .coownership import CoownershipList
+
+
+RESOLVED_PLAN_FORMAT = 2
+
+
+class ResolvedPlanError(TerminationError): pass
+
+class NoResolvedPlanError(ResolvedPlanError): pass
+
+class StaleResolvedPlanError(ResolvedPlanError):
+
+    def __init__(self, differences):
+        super().__init__(differences)
+        self.__differences = differences
+
+    @property
+    def differences(self):
+        '''Descriptions of what has changed since the plan was made'''
+        return self.__differences
+
+
+def file_digest(filename):
+    '''SHA-256 of the file contents (hexadecimal) or None if there is no such file'''
+    digest = hashlib.sha256()
+    try:
+        with open(filename, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def tasks_to_tuple(tasks):
+    return (tuple(tasks.install), tuple(tasks.remove), tuple(tasks.physically_remove), tuple(tasks.purge),
+            tuple(tasks.markauto), tuple(tasks.unmarkauto))
+
+
+class ResolvedPlanKey:
+    '''What the resolved plan is made from. "tasks_type" is "operations", "safe-upgrade" or "full-upgrade",
+    "tasks" are ones converted by "tasks_to_tuple"
+    '''
+
+    def __init__(self, tasks_type, tasks, username, work_modes, minimal_priority, pkgcache_signature, state_digests):
+        self.__tasks_type = tasks_type
+        self.__tasks = tasks
+        self.__username = username
+        self.__work_modes = (work_modes.remove_dependencies, work_modes.force, work_modes.purge_unused)
+        self.__minimal_priority = minimal_priority
+        self.__pkgcache_signature = pkgcache_signature
+        self.__state_digests = dict(state_digests)
+
+    @staticmethod
+    def from_state(tasks_type, tasks, username, work_modes, minimal_priority, pkgcache_filename, state_filenames):
+        return ResolvedPlanKey(tasks_type, tasks, username, work_modes, minimal_priority,
+                               file_signature(pkgcache_filename),
+                               {filename: file_digest(filename) for filename in state_filenames})
+
+    @property
+    def tasks_type(self):
+        return self.__tasks_type
+
+    @property
+    def tasks(self):
+        return self.__tasks
+
+    @property
+    def username(self):
+        return self.__username
+
+    def differences(self, other):
+        '''Descriptions of the parts of the key which differ from the other one'''
+        result = []
+        if self.__tasks_type != other.__tasks_type or self.__tasks != other.__tasks:
+            result.append("tasks")
+        if self.__username != other.__username:
+            result.append("user")
+        if self.__work_modes != other.__work_modes:
+            result.append("work modes")
+        if self.__minimal_priority != other.__minimal_priority:
+            result.append("minimal debconf priority")
+        if self.__pkgcache_signature != other.__pkgcache_signature:
+            result.append("package cache")
+        for filename in sorted(self.__state_digests.keys() | other.__state_digests.keys()):
+            if self.__state_digests.get(filename) != other.__state_digests.get(filename):
+                result.append('file "{0}"'.format(filename))
+        return result
+
+    def __eq__(self, other):
+        return isinstance(other, ResolvedPlanKey) and not self.differences(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class PlannedMark:
+    '''Mark of a changed package: "version" is the version to install or None for deletion'''
+
+    def __init__(self, name, version, purge=False, auto=False):
+        self.__name = name
+        self.__version = version
+        self.__purge = purge
+        self.__auto = auto
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def purge(self):
+        return self.__purge
+
+    @property
+    def auto(self):
+        return self.__auto
+
+    @property
+    def is_delete(self):
+        return self.__version is None
+
+    def __eq__(self, other):
+        return self.name == other.name and self.version == other.version
+
+
+def _changes_marks(cache, is_purged=lambda pkg: False):
+    marks = []
+    for pkg in cache.get_changes():
+        if pkg.marked_delete:
+            marks.append(PlannedMark(pkg.name, None, purge=is_purged(pkg)))
+        else:
+            marks.append(PlannedMark(pkg.name, pkg.candidate.version, auto=pkg.is_auto_installed))
+    return marks
+
+
+class ResolvedPlan:
+    '''Marks of the cache made for the tasks together with everything the real run needs to apply them:
+    the coownership list changed accordingly and the element of the uncompleted tasks file
+    '''
+
+    def __init__(self, key, marks, auto_flags, coownership_xml, tasks_xml):
+        self.__key = key
+        self.__marks = marks
+        self.__auto_flags = auto_flags
+        self.__coownership_xml = coownership_xml
+        self.__tasks_xml = tasks_xml
+
+    @staticmethod
+    def record(cache, key, real_tasks, work_modes, coownership, uncompleted_tasks_xml_element):
+        '''Makes the plan of the marks made in the cache'''
+        marks = _changes_marks(cache, lambda pkg: work_modes.purge_unused or pkg in real_tasks.purge)
+        # Auto flags of installed packages may change without changing packages themselves
+        auto_flags = {}
+        for name in (name for names in key.tasks for name in names):
+            if name in cache:
+                pkg = cache[name]
+                if pkg.is_installed and not pkg.marked_delete:
+                    auto_flags[pkg.name] = pkg.is_auto_installed
+        coownership_file = io.BytesIO()
+        coownership.export_to_xml(coownership_file)
+        return ResolvedPlan(key, marks, auto_flags, coownership_file.getvalue(),
+                            etree.tostring(uncompleted_tasks_xml_element))
+
+    @property
+    def key(self):
+        return self.__key
+
+    @property
+    def marks(self):
+        return self.__marks
+
+    @property
+    def auto_flags(self):
+        return self.__auto_flags
+
+    def coownership(self):
+        coownership = CoownershipList()
+        coownership.import_from_xml(io.BytesIO(self.__coownership_xml))
+        return coownership
+
+    def uncompleted_tasks_xml_element(self):
+        return etree.fromstring(self.__tasks_xml)
+
+    def replay(self, cache):
+        '''Makes the marks in the cache (it must be done inside its action group) without resolution.
+        Raises "StaleResolvedPlanError" if the cache differs from the one the plan is made in
+        '''
+        try:
+            for mark in self.marks:
+                pkg = cache[mark.name]
+                if mark.is_delete:
+                    pkg.mark_delete(auto_fix=False, purge=mark.purge)
+                elif pkg.candidate is None or pkg.candidate.version != mark.version:
+                    raise StaleResolvedPlanError(['candidate of package "{0}"'.format(mark.name)])
+                else:
+                    pkg.mark_install(auto_fix=False, auto_inst=False, from_user=not mark.auto)
+            for mark in self.marks:
+                if not mark.is_delete and cache[mark.name].is_auto_installed != mark.auto:
+                    cache[mark.name].mark_auto(mark.auto)
+            for name, auto in self.auto_flags.items():
+                if cache[name].is_auto_installed != auto:
+                    cache[name].mark_auto(auto)
+        except KeyError as err:
+            raise StaleResolvedPlanError(["package cache"]) from err
+        if _changes_marks(cache) != self.marks:
+            raise StaleResolvedPlanError(["package cache"])
+
+
+def save_resolved_plan(plan, filename):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp_filename = filename + ".new"
+    with open(temp_filename, "wb") as file:
+        pickle.dump((RESOLVED_PLAN_FORMAT, plan), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def load_resolved_plan(filename):
+    '''Returns None if there is no (readable) plan'''
+    try:
+        with open(filename, "rb") as file:
+            plan_format, plan = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, ImportError):
+        return None
+    return plan if plan_format == RESOLVED_PLAN_FORMAT else None
+
+
+def remove_resolved_plan(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,155 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''What-if planning: many task sets are checked against one opened cache and once loaded
+enclosure and coownership list instead of running "--simulate" for every one of them
+'''
+
+import copy
+from .errors import *
+from .modes import *
+from .tasks import *
+from .runners import *
+
+
+class HandlerCall:
+    '''Call of an error handler: the message "ModificationRunner" would show'''
+
+    def __init__(self, name, args):
+        self.__name = name
+        self.__args = args
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def args(self):
+        return self.__args
+
+    def __str__(self):
+        args = (arg.name if hasattr(arg, "candidate") else str(arg) for arg in self.args)
+        return "{0}({1})".format(self.name, ", ".join(args))
+
+
+class RecordingHandlers(Modded):
+    '''Error handlers recording calls instead of printing messages'''
+
+    def __init__(self):
+        self.__calls = []
+
+    @property
+    def calls(self):
+        return self.__calls
+
+    def clear(self):
+        self.__calls = []
+
+    def resolving_done(self):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def record(*args, **kwargs):
+            self.__calls.append(HandlerCall(name, args + tuple(kwargs.values())))
+
+        return record
+
+
+class RecordingApplying(Modded):
+    '''Applying interface remembering changes instead of showing them and never agreeing'''
+
+    def __init__(self):
+        self.__changes = None
+
+    @property
+    def changes(self):
+        return self.__changes
+
+    def clear(self):
+        self.__changes = None
+
+    def show_changes(self, all_changes):
+        self.__changes = all_changes
+
+    def prompt_agree(self):
+        return False
+
+
+class PlanVerdict:
+
+    def __init__(self, tasks, allowed, messages, changes):
+        self.__tasks = tasks
+        self.__allowed = allowed
+        self.__messages = messages
+        self.__changes = changes
+
+    @property
+    def tasks(self):
+        return self.__tasks
+
+    @property
+    def allowed(self):
+        return self.__allowed
+
+    @property
+    def messages(self):
+        '''"HandlerCall"s: errors and warnings "perform_operations" would show'''
+        return self.__messages
+
+    @property
+    def changes(self):
+        '''"AllChanges" or None if the tasks have been rejected before resolution'''
+        return self.__changes
+
+
+class WhatIfPlanner(ModificationRunner):
+    '''Checks task sets as "perform_operations" with "--simulate" does. The cache, the enclosure,
+    the coownership list and debconf priorities are opened once; marks of the cache are
+    reset after every task set
+    '''
+
+    def __init__(self, settings, user_id, display_modes, work_modes, debug_stream, profiler=None):
+        super().__init__(settings, user_id, display_modes, work_modes, RecordingHandlers(), RecordingApplying(),
+                         Progresses(None, None, None), debug_stream, profiler)
+        if not self.has_privileges:
+            raise YouMayNotPerformError(constants.UNIX_LIMITEDAPT_GROUPNAME)
+        self._check_interrupted()
+        self.__enclosure = self._load_enclosure()
+        self.__coownership = self._load_coownership_list()
+
+    def plan(self, tasks):
+        cache = get_cache()
+        self.handlers.clear()
+        self.applying_ui.clear()
+        # Marking changes the coownership list, so every task set gets its own copy
+        coownership = copy.deepcopy(self.__coownership)
+        real_tasks = RealTasks(tasks)
+        try:
+            with self._span("planning"):
+                with cache.actiongroup():
+                    self._mark_operations(tasks, real_tasks, self.__enclosure, coownership)
+                    self._examine_changes(real_tasks, self.__enclosure, coownership)
+            allowed = True
+        except (SystemComposingByResolverError, WantToDoSystemComposingError):
+            allowed = False
+        finally:
+            cache.clear()
+        return PlanVerdict(tasks, allowed, self.handlers.calls, self.applying_ui.changes)
+
+    def plan_all(self, tasks_list):
+        return (self.plan(tasks) for tasks in tasks_list)
@@ -0,0 +1,107 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Background downloading of the archives of marked changes while the user is being asked to agree.
+
+Archives are fetched into the usual archives directory, so "cache.commit" finds them downloaded
+and only verifies them. Prefetching is an optimisation only: its failures are not reported here,
+the commit downloads whatever is missing and reports errors as usual.
+'''
+
+import threading
+
+
+class CancellableAcquireProgress:
+    '''Silent acquire progress ("apt.progress.base.AcquireProgress" interface). Acquiring stops
+    at the next pulse after the event is set
+    '''
+
+    def __init__(self, cancelled):
+        self.__cancelled = cancelled
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def pulse(self, owner):
+        return not self.__cancelled.is_set()
+
+    def done(self, item):
+        pass
+
+    def fail(self, item):
+        pass
+
+    def fetch(self, item):
+        pass
+
+    def ims_hit(self, item):
+        pass
+
+    def media_change(self, media, drive):
+        # There is nobody to insert a medium
+        return False
+
+
+class ArchivePrefetch:
+    '''Downloads archives of the changes marked in the cache in a background thread.
+    Nothing else may use the cache until "wait" or "cancel" returns
+    '''
+
+    def __init__(self, cache):
+        self.__cache = cache
+        self.__cancelled = threading.Event()
+        self.__thread = None
+        self.__completed = False
+        self.__error = None
+
+    @property
+    def completed(self):
+        '''Whether all the archives have been downloaded'''
+        return self.__completed
+
+    @property
+    def cancelled(self):
+        return self.__cancelled.is_set()
+
+    @property
+    def error(self):
+        '''Exception the downloading has stopped with (cancelling included) or None'''
+        return self.__error
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, name="archive-prefetch", daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        try:
+            self.__completed = bool(self.__cache.fetch_archives(CancellableAcquireProgress(self.__cancelled)))
+        except Exception as err:
+            self.__error = err
+
+    def wait(self):
+        '''Waits for the downloading to finish. Returns whether all the archives have been downloaded'''
+        if self.__thread is not None:
+            self.__thread.join()
+        return self.completed
+
+    def cancel(self):
+        '''Stops the downloading and waits for it. Archives already downloaded are kept'''
+        self.__cancelled.set()
+        if self.__thread is not None:
+            self.__thread.join()
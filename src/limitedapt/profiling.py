@@ -0,0 +1,123 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Timing of the runner phases (spans)'''
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    '''Finished timed phase. Times are in seconds since the profiler creation'''
+
+    def __init__(self, name, start, duration, depth, thread_id):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.depth = depth
+        self.thread_id = thread_id
+
+
+class PhaseStatistics:
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class Profiler:
+    '''Collects spans. Disabled profiler collects nothing and costs (almost) nothing'''
+
+    def __init__(self, enabled=True):
+        self.__enabled = enabled
+        self.__origin = time.perf_counter()
+        self.__spans = []
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    @property
+    def enabled(self):
+        return self.__enabled
+
+    @property
+    def spans(self):
+        return list(self.__spans)
+
+    def elapsed(self):
+        return time.perf_counter() - self.__origin
+
+    @contextlib.contextmanager
+    def span(self, name):
+        if not self.__enabled:
+            yield
+            return
+        depth = getattr(self.__local, "depth", 0)
+        self.__local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            finish = time.perf_counter()
+            self.__local.depth = depth
+            with self.__lock:
+                self.__spans.append(Span(name, start - self.__origin, finish - start, depth,
+                                         threading.get_ident()))
+
+    def phases(self):
+        '''Statistics of spans grouped by name (in order of the first start)'''
+        result = {}
+        for span in sorted(self.__spans, key=lambda span: span.start):
+            statistics = result.setdefault(span.name, PhaseStatistics(span.name))
+            statistics.count += 1
+            statistics.total += span.duration
+        return list(result.values())
+
+    def format_phases(self):
+        '''Lines of human-readable phase breakdown'''
+        elapsed = self.elapsed()
+        lines = ['{0:<32} {1:>6} {2:>12} {3:>7}'.format("phase", "count", "seconds", "share")]
+        for statistics in self.phases():
+            lines.append('{0:<32} {1:>6} {2:>12.6f} {3:>6.1f}%'.format(statistics.name, statistics.count,
+                                                                       statistics.total,
+                                                                       100 * statistics.total / elapsed))
+        lines.append('{0:<32} {1:>6} {2:>12.6f}'.format("(whole run)", "", elapsed))
+        return lines
+
+    def export_to_json(self, file):
+        data = {"elapsed": self.elapsed(),
+                "phases": [{"name": statistics.name, "count": statistics.count, "total": statistics.total}
+                           for statistics in self.phases()],
+                "spans": [{"name": span.name, "start": span.start, "duration": span.duration, "depth": span.depth}
+                          for span in sorted(self.__spans, key=lambda span: span.start)]}
+        with open(file, "w") as fh:
+            json.dump(data, fh, indent=2)
+
+    def export_to_chrome_trace(self, file):
+        '''Writes spans in Chrome trace event format (for "chrome://tracing" or Perfetto)'''
+        pid = os.getpid()
+        events = [{"name": span.name, "cat": "limited-apt", "ph": "X", "pid": pid, "tid": span.thread_id,
+                   "ts": span.start * 1000000, "dur": span.duration * 1000000}
+                  for span in sorted(self.__spans, key=lambda span: span.start)]
+        with open(file, "w") as fh:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh)
@@ -0,0 +1,280 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Rules of enclosures. A rule describes a set of packages by properties instead of listing
+them: name (glob or regular expression), architecture, section, priority, debtags, origin
+and version relations. All the given conditions of a rule must hold; alternatives of the
+same kind (several names, sections, ...) are joined by "or", but every listed tag is required.
+
+Rules are compiled into RuleMatcher. Exact names and "prefix*" globs are looked up in tables,
+other globs and regular expressions are prefiltered by one combined regular expression; the
+other properties are looked up in bitsets (bit number N stands for the N-th rule)
+'''
+
+import fnmatch
+import re
+from lxml import etree
+from .debversion import version_compare, RELATIONS
+
+
+class EnclosureRule:
+
+    def __init__(self, names=(), name_regexes=(), architectures=(), sections=(), priorities=(), tags=(),
+                 origins=(), versions=()):
+        self.names = list(names)
+        self.name_regexes = list(name_regexes)
+        self.architectures = list(architectures)
+        self.sections = list(sections)
+        self.priorities = list(priorities)
+        self.tags = list(tags)
+        self.origins = list(origins)
+        self.versions = list(versions)
+
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+
+    @property
+    def restricts_names(self):
+        return bool(self.names or self.name_regexes)
+
+    def to_xml_element(self):
+        rule_element = etree.Element("rule")
+        for name in self.names:
+            etree.SubElement(rule_element, "name", glob=name)
+        for regex in self.name_regexes:
+            etree.SubElement(rule_element, "name", regex=regex)
+        for tag, values in (("arch", self.architectures), ("section", self.sections),
+                            ("priority", self.priorities), ("tag", self.tags)):
+            for value in values:
+                etree.SubElement(rule_element, tag).text = value
+        for origin, archive in self.origins:
+            origin_element = etree.SubElement(rule_element, "origin")
+            if origin is not None:
+                origin_element.set("name", origin)
+            if archive is not None:
+                origin_element.set("archive", archive)
+        for relation, number in self.versions:
+            etree.SubElement(rule_element, "version", relation=relation, number=number)
+        return rule_element
+
+    @staticmethod
+    def from_xml_element(rule_element):
+        rule = EnclosureRule()
+        for name_element in rule_element.findall("name"):
+            if name_element.get("glob") is not None:
+                rule.names.append(name_element.get("glob"))
+            else:
+                regex = name_element.attrib["regex"]
+                try:
+                    re.compile(regex)
+                except re.error as err:
+                    raise ValueError('''Bad regular expression "{0}": {1}'''.format(regex, err))
+                rule.name_regexes.append(regex)
+        for tag, values in (("arch", rule.architectures), ("section", rule.sections),
+                            ("priority", rule.priorities), ("tag", rule.tags)):
+            for element in rule_element.findall(tag):
+                if not element.text:
+                    raise ValueError('''"{0}" element of a rule must not be empty'''.format(tag))
+                values.append(element.text.strip())
+        for origin_element in rule_element.findall("origin"):
+            origin = (origin_element.get("name"), origin_element.get("archive"))
+            if origin == (None, None):
+                raise ValueError('''"origin" element of a rule must have "name" or "archive" attribute''')
+            rule.origins.append(origin)
+        for version_element in rule_element.findall("version"):
+            relation = version_element.attrib["relation"]
+            if relation not in RELATIONS:
+                raise ValueError('''Unknown version relation "{0}"'''.format(relation))
+            rule.versions.append((relation, version_element.attrib["number"]))
+        return rule
+
+
+_GLOB_SPECIALS = frozenset("*?[")
+
+
+def _classify_glob(glob):
+    '''Returns ("exact", name), ("prefix", prefix) or ("regex", regular expression)'''
+    if not _GLOB_SPECIALS.intersection(glob):
+        return "exact", glob
+    if glob.endswith("*") and not _GLOB_SPECIALS.intersection(glob[:-1]):
+        return "prefix", glob[:-1]
+    return "regex", fnmatch.translate(glob)
+
+
+def _section_keys(section):
+    # "contrib/doc" is matched both by "contrib/doc" and "doc"
+    if section is None:
+        return ()
+    return (section, section.rpartition("/")[2])
+
+
+class _Facet:
+    '''Bitsets of rules by values of one property. Rules that don't restrict the property
+    are in "unrestricted"
+    '''
+
+    def __init__(self):
+        self.unrestricted = 0
+        self.by_value = {}
+
+    def add(self, bit, values):
+        if not values:
+            self.unrestricted |= bit
+        for value in values:
+            self.by_value[value] = self.by_value.get(value, 0) | bit
+
+    def mask(self, keys):
+        mask = self.unrestricted
+        for key in keys:
+            mask |= self.by_value.get(key, 0)
+        return mask
+
+
+class RuleMatcher:
+    '''Compiled rules'''
+
+    def __init__(self, rules):
+        self.__rules = list(rules)
+        self.__all = (1 << len(self.__rules)) - 1
+        self.__exact_names = _Facet()
+        self.__prefixes = {}
+        self.__prefix_lengths = set()
+        self.__name_patterns = []
+        self.__names_unrestricted = 0
+        self.__architectures = _Facet()
+        self.__sections = _Facet()
+        self.__priorities = _Facet()
+        self.__origins = _Facet()
+        self.__tag_masks = {}
+        self.__versioned = 0
+        patterns = []
+        for index, rule in enumerate(self.__rules):
+            bit = 1 << index
+            if not rule.restricts_names:
+                self.__names_unrestricted |= bit
+            for glob in rule.names:
+                kind, value = _classify_glob(glob)
+                if kind == "exact":
+                    self.__exact_names.add(bit, (value,))
+                elif kind == "prefix":
+                    self.__prefixes[value] = self.__prefixes.get(value, 0) | bit
+                    self.__prefix_lengths.add(len(value))
+                else:
+                    patterns.append(value)
+                    self.__name_patterns.append((bit, re.compile(value)))
+            for regex in rule.name_regexes:
+                pattern = "(?:{0})\\Z".format(regex)
+                patterns.append(pattern)
+                self.__name_patterns.append((bit, re.compile(pattern)))
+            self.__architectures.add(bit, rule.architectures)
+            self.__sections.add(bit, rule.sections)
+            self.__priorities.add(bit, rule.priorities)
+            self.__origins.add(bit, rule.origins)
+            for tag in rule.tags:
+                self.__tag_masks[tag] = self.__tag_masks.get(tag, 0) | bit
+            if rule.versions:
+                self.__versioned |= bit
+        self.__combined_names = re.compile("|".join("(?:{0})".format(pattern) for pattern in patterns)) \
+            if patterns else None
+        self.__prefix_lengths = sorted(self.__prefix_lengths)
+        self.__name_masks = {}
+        self.__comparisons = {}
+
+    def __len__(self):
+        return len(self.__rules)
+
+    def __name_mask(self, name):
+        try:
+            return self.__name_masks[name]
+        except KeyError:
+            mask = self.__names_unrestricted | self.__exact_names.mask((name,))
+            for length in self.__prefix_lengths:
+                if length > len(name):
+                    break
+                mask |= self.__prefixes.get(name[:length], 0)
+            # The combined expression rejects most of names at once
+            if self.__combined_names is not None and self.__combined_names.match(name):
+                for bit, pattern in self.__name_patterns:
+                    if pattern.fullmatch(name):
+                        mask |= bit
+            self.__name_masks[name] = mask
+            return mask
+
+    def __tags_mask(self, tags):
+        # Every tag (or "facet::*") required by a rule must be present
+        present = set(tags)
+        present.update(tag.partition("::")[0] + "::*" for tag in tags)
+        missing = 0
+        for tag, mask in self.__tag_masks.items():
+            if tag not in present:
+                missing |= mask
+        return self.__all & ~missing
+
+    def __origins_mask(self, origins):
+        keys = []
+        for origin, archive in origins:
+            keys.extend(((origin, archive), (origin, None), (None, archive)))
+        return self.__origins.mask(keys)
+
+    def __candidate_rules(self, package):
+        # Rules matching all the properties except versions
+        mask = self.__name_mask(package.name)
+        if mask:
+            mask &= self.__architectures.mask((package.architecture,))
+        if mask:
+            mask &= self.__sections.mask(_section_keys(getattr(package, "section", None)))
+        if mask:
+            mask &= self.__priorities.mask((getattr(package, "priority", None),))
+        if mask:
+            mask &= self.__tags_mask(getattr(package, "tags", ()))
+        if mask:
+            mask &= self.__origins_mask(getattr(package, "origins", ()))
+        return mask
+
+    def __version_matches(self, bit, version):
+        rule = self.__rules[bit.bit_length() - 1]
+        return all(self.__check_relation(version, relation, number) for relation, number in rule.versions)
+
+    def matching_rules(self, package):
+        '''Bitset of the rules matching the package. Properties absent in the package are considered
+        unknown and rules restricting them don't match
+        '''
+        mask = self.__candidate_rules(package)
+        versioned = mask & self.__versioned
+        while versioned:
+            bit = versioned & -versioned
+            versioned &= ~bit
+            if not self.__version_matches(bit, package.version):
+                mask &= ~bit
+        return mask
+
+    def __check_relation(self, version, relation, number):
+        # Several rules often share the same version bound
+        try:
+            result = self.__comparisons[version, number]
+        except KeyError:
+            result = self.__comparisons[version, number] = version_compare(version, number)
+        return RELATIONS[relation](result)
+
+    def __contains__(self, package):
+        mask = self.__candidate_rules(package)
+        if mask & ~self.__versioned:
+            return True
+        while mask:
+            bit = mask & -mask
+            mask &= ~bit
+            if self.__version_matches(bit, package.version):
+                return True
+        return False
@@ -17,17 +17,17 @@
 
 
 from datetime import datetime
-import pwd
-import grp
+import contextlib
 import os
 import os.path
 import shutil
+import subprocess
 from lxml import etree
-import apt_pkg
 from .single import get_cache
 from limitedapt import constants
 from limitedapt import debug
 from .errors import *
+from .fileutils import file_signature
 from .packages import *
 from .coownership import *
 from .enclosure import *
@@ -37,6 +37,15 @@ from .modes import *
 from .updatetime import *
 from .debconf import *
 from .download import *
+from .feeds import *
+from .installability import *
+from .plancache import *
+from .prefetch import ArchivePrefetch
+from .journal import *
+from .search import *
+from .dpkgstatus import get_dpkg_status
+from .nsscache import NssCache
+from .profiling import Profiler
 
 
 DEBUG = True
@@ -70,21 +79,28 @@ class RealTasksImportSyntaxError(XmlImportSyntaxError): pass
 
 class RunnerBase:
 
-    def __init__(self, settings, user_id, display_modes, debug_stream):
+    def __init__(self, settings, user_id, display_modes, debug_stream, profiler=None):
         self.__settings = settings
         self.__display_modes = display_modes
         self.__debug_stream = debug_stream
+        self.__profiler = profiler if profiler is not None else Profiler(enabled=False)
+        self.__nss_cache = NssCache(os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, constants.NSS_CACHE_FILENAME),
+                                    profiler=self.__profiler)
 
         def effective_username(user_id):
             if user_id == 0:
                 return "root"
-            name = pwd.getpwuid(user_id).pw_name
+            name = self.__nss_cache.user_name(user_id)
             return "root" if name == "root" or \
                              self._is_belong_to_group(name, constants.UNIX_LIMITEDAPT_ROOTS_GROUPNAME) \
                 else name
 
-        self.__username = effective_username(user_id)
-        self._check_user_privileges()
+        with self._span("privileges-checking"):
+            self.__username = effective_username(user_id)
+            self._check_user_privileges()
+        statistics = self.__nss_cache.statistics
+        self._debug_message('''users and groups: {0} taken from the cache, {1} looked up in {2:.3f} seconds'''.
+                            format(statistics.hits, statistics.lookups, statistics.lookup_time))
 
     @property
     def settings(self):
@@ -98,6 +114,10 @@ class RunnerBase:
     def debug_stream(self):
         return self.__debug_stream
 
+    @property
+    def profiler(self):
+        return self.__profiler
+
     @property
     def username(self):
         return self.__username
@@ -110,13 +130,17 @@ class RunnerBase:
         if self.display_modes.debug:
             print('Debug message: {0}'.format(message))
 
+    @contextlib.contextmanager
+    def _span(self, name):
+        with self.profiler.span(name):
+            yield
+
     @staticmethod
-    def _is_belong_to_group(user_name, group_name):
-        try:
-            group = grp.getgrnam(group_name)
-            return user_name in group.gr_mem
-        except KeyError:
-            raise GroupNotExistError(group_name)
+    def _minimal_debconf_priority():
+        return minimal_debconf_priority_to_ask_questions()
+
+    def _is_belong_to_group(self, user_name, group_name):
+        return self.__nss_cache.is_belong_to_group(user_name, group_name)
 
     @property
     def update_times(self):
@@ -134,8 +158,9 @@ class RunnerBase:
         self._debug_message('''loading list of package coownership (by users) from file "{0}" ...'''.
                             format(filename))
         try:
-            coownership_list = CoownershipList()
-            coownership_list.import_from_xml(filename)
+            with self._span("coownership-loading"):
+                coownership_list = CoownershipList()
+                coownership_list.import_from_xml(filename)
             return coownership_list
         except IOError as err:
             raise ReadingVariableFileError(filename, err.errno)
@@ -145,10 +170,21 @@ class RunnerBase:
         self._debug_message('''saving list of package coownership (by users) to file "{0}" ...'''.
                             format(filename))
         try:
-            coownership_list.export_to_xml(filename)
+            with self._span("coownership-saving"):
+                coownership_list.export_to_xml(filename)
         except IOError as err:
             raise WritingVariableFileError(filename, err.errno)
 
+    def _enclosure_filenames(self):
+        if self.settings.urls.enclosure_debug_mode:
+            return [os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, "enclosure")]
+        filenames = [os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, record.filename + ".enclosure")
+                     for record in self.settings.urls.enclosures]
+        path_to_local_enclosure = os.path.join(self.settings.path_to_program_config, "local.enclosure")
+        if os.path.exists(path_to_local_enclosure):
+            filenames.append(path_to_local_enclosure)
+        return filenames
+
     def _load_enclosure(self):
 
         def load_single(filename):
@@ -157,29 +193,69 @@ class RunnerBase:
             if not os.path.exists(filename):
                 raise FileNotExist(filename)
             try:
-                enclosure = Enclosure()
-                enclosure.import_from_xml(filename)
-                return enclosure
+                return load_enclosure(filename)
             except IOError as err:
                 raise ReadingVariableFileError(filename, err.errno)
-            return enclosure
 
-        if self.settings.urls.enclosure_debug_mode:
-            enclosure = load_single(os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, "enclosure"))
-        else:
-            enclosure_list = [load_single(os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, record.filename + ".enclosure"))
-                              for record in self.settings.urls.enclosures]
-            path_to_local_enclosure = os.path.join(self.settings.path_to_program_config, "local.enclosure")
-            if os.path.exists(path_to_local_enclosure):
-                enclosure_list.append(load_single(path_to_local_enclosure))
-            enclosure = MixedEnclosure(*enclosure_list)
+        with self._span("enclosure-loading"):
+            enclosure_list = [load_single(filename) for filename in self._enclosure_filenames()]
+            if self.settings.urls.enclosure_debug_mode:
+                enclosure = enclosure_list[0]
+            else:
+                enclosure = MixedEnclosure(*enclosure_list)
 
         return enclosure
 
+    @staticmethod
+    def _installability_filename():
+        return os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'installability')
+
+    def _installability_sources(self):
+        # Installability depends on installed and candidate versions too
+        filenames = self._enclosure_filenames() + \
+                    [os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite'),
+                     constants.PATH_TO_DPKG_STATUS, constants.PATH_TO_APT_EXTENDED_STATES,
+                     constants.PATH_TO_APT_PKGCACHE]
+        return {filename: file_signature(filename) for filename in filenames}
+
+    def _load_installability_report(self, minimal_priority):
+        '''Report made by the last update if nothing it is made from has changed since, else None'''
+        filename = self._installability_filename()
+        self._debug_message('''loading installability report from file "{0}" ...'''.format(filename))
+        report = load_installability_report(filename)
+        if report is not None and report.is_current(self._installability_sources(), minimal_priority):
+            return report
+        self._debug_message('''installability report is absent or out of date''')
+        return None
+
+    def _analyse_installability(self, minimal_priority):
+        '''Makes installability report reusing the previous one'''
+        with self._span("installability-analysis"):
+            enclosure = self._load_enclosure()
+            priorities = debconf_priorities_db_to_map(
+                "sqlite:///" + os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite'))
+            report = analyse_installability(get_cache(), enclosure, priorities, minimal_priority,
+                                            self._installability_sources(),
+                                            load_installability_report(self._installability_filename()))
+        self._debug_message('''{0} of {1} enclosed candidates are installable ({2} analysed anew)'''.
+                            format(report.count_installable(), len(report), report.analysed_count))
+        return report
+
+    @staticmethod
+    def _search_index_filename():
+        return search_index_filename(constants.PATH_TO_PROGRAM_VARIABLE)
+
+    def _search_index_sources(self):
+        return search_index_sources(self._enclosure_filenames() + [constants.PATH_TO_APT_PKGCACHE])
+
+    def _build_search_index(self):
+        with self._span("search-index-building"):
+            return EnclosureSearchIndex.build(get_cache(), self._load_enclosure(), self._search_index_sources())
+
 class UpdationRunner(RunnerBase):
 
-    def __init__(self, settings, user_id, display_modes, fetch_progress, debug_stream):
-        super().__init__(settings, user_id, display_modes, debug_stream)
+    def __init__(self, settings, user_id, display_modes, fetch_progress, debug_stream, profiler=None):
+        super().__init__(settings, user_id, display_modes, debug_stream, profiler)
         if not self.has_privileges:
             raise YouMayNotUpdateError(constants.UNIX_LIMITEDAPT_GROUPNAME)
         self.__fetch_progress = fetch_progress
@@ -197,92 +273,368 @@ class UpdationRunner(RunnerBase):
         except IOError as err:
             raise WritingVariableFileError(filename, err.errno)
 
+    def __load_previous_update_times(self):
+        filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'updatetimes')
+        update_times = UpdateTimes()
+        if os.path.exists(filename):
+            try:
+                update_times.import_from_xml(filename)
+            except (IOError, UpdateTimesImportSyntaxError):
+                update_times = UpdateTimes()
+        return update_times
+
+    @staticmethod
+    def __enclosure_filename(record):
+        return os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, record.filename + '.enclosure')
+
+    @staticmethod
+    def __priorities_filename():
+        return os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite')
+
+    def __enclosure_download_jobs(self):
+        '''The delta is downloaded instead of the whole enclosure if the publisher ships it
+        and we know revision of the local enclosure
+        '''
+        jobs = []
+        for record in self.settings.urls.enclosures:
+            filename = self.__enclosure_filename(record)
+            if record.delta_url is not None and read_enclosure_revision(filename) is not None:
+                jobs.append(DownloadJob(record.delta_url, filename + '.delta'))
+            else:
+                jobs.append(DownloadJob(record.url, filename + '.feed', StreamingEnclosureFeed()))
+        return jobs
+
+    def __priorities_download_job(self):
+        return DownloadJob(self.settings.urls.debconf_priorities, self.__priorities_filename() + '.feed')
+
+    def __start_downloads(self, jobs):
+        for job in jobs:
+            self._debug_message('''downloading "{0}" to the file "{1}" ...'''.format(job.url, job.filename))
+        return ParallelDownloads(jobs, profiler=self.profiler)
+
+    def __finish_downloads(self, downloads):
+        with self._span("downloads-waiting"):
+            results = downloads.wait()
+        for result in results:
+            if result.succeeded and result.statistics.not_modified:
+                self._debug_message('''"{0}" has not been modified since the file "{1}" was downloaded '''
+                                    '''({2:.3f} seconds, {3} bytes saved)'''.
+                                    format(result.url, result.filename, result.elapsed, result.statistics.saved))
+            elif result.succeeded:
+                self._debug_message('''"{0}" has been downloaded to the file "{1}" in {2:.3f} seconds '''
+                                    '''({3} bytes transferred, {4} bytes saved)'''.
+                                    format(result.url, result.filename, result.elapsed,
+                                           result.statistics.transferred, result.statistics.saved))
+            else:
+                self._debug_message('''downloading "{0}" to the file "{1}" has failed in {2:.3f} seconds'''.
+                                    format(result.url, result.filename, result.elapsed))
+        return results
+
+    def __install_enclosure(self, record, result):
+        filename = self.__enclosure_filename(record)
+        if result.filename == filename + '.delta':
+            try:
+                self._debug_message('''applying enclosure delta "{0}" to the file "{1}" ...'''.
+                                    format(result.filename, filename))
+                apply_enclosure_delta_feed(result.filename, filename)
+                return
+            except (EnclosureDeltaBaseMismatch, EnclosureImportSyntaxError, FeedError) as err:
+                self._debug_message('''delta cannot be applied ({0}), downloading the whole enclosure ...'''.
+                                    format(err))
+                feed = StreamingEnclosureFeed()
+                if not download_file(record.url, filename + '.feed', feed).not_modified:
+                    store_enclosure(feed.finish(), filename)
+                    return
+        elif not result.statistics.not_modified:
+            self._debug_message('''storing enclosure built while downloading "{0}" to the file "{1}" ...'''.
+                                format(result.filename, filename))
+            store_enclosure(result.job.consumer.finish(), filename)
+            return
+        elif load_enclosure_index(filename) is not None:
+            return
+        self._debug_message('''importing enclosure feed "{0}" to the file "{1}" ...'''.format(filename + '.feed', filename))
+        install_enclosure_feed(filename + '.feed', filename)
+
+    def __install_priorities(self, result):
+        filename = self.__priorities_filename()
+        if result.statistics.not_modified and os.path.exists(filename):
+            return
+        self._debug_message('''decompressing debconf priorities feed "{0}" to the file "{1}" ...'''.
+                            format(result.filename, filename))
+        decompress_feed(result.filename, filename)
+
+    def __update_enclosure_by_debtags(self):
+        filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'enclosure')
+        self._debug_message('''updating enclosure in the file "{0}" in the debug mode ...'''.format(filename))
+        debug.update_enclosure_by_debtags(filename)
+
+    def __update_enclosures(self, results):
+        '''Installs downloaded enclosure feeds. Returns errors appeared during downloading or installing'''
+        errors = []
+        for record, result in zip(self.settings.urls.enclosures, results):
+            try:
+                if not result.succeeded:
+                    raise result.error
+                with self._span("enclosure-installing"):
+                    self.__install_enclosure(record, result)
+            except (DownloadError, EnclosureImportSyntaxError, FeedError) as err:
+                errors.append(err)
+        return errors
+
+    def __update_priorities(self, result):
+        try:
+            if not result.succeeded:
+                raise result.error
+            with self._span("priorities-installing"):
+                self.__install_priorities(result)
+            return []
+        except (DownloadError, FeedError) as err:
+            return [err]
+
+    def __update_installability(self):
+        filename = self._installability_filename()
+        try:
+            minimal_priority = self._minimal_debconf_priority()
+        except DebconfshowParsingError:
+            self._debug_message('''minimal debconf priority is unknown, installability report is not made''')
+            remove_if_exists(filename)
+            return
+        report = self._analyse_installability(minimal_priority)
+        self._debug_message('''saving installability report to file "{0}" ...'''.format(filename))
+        try:
+            save_installability_report(report, filename)
+        except IOError as err:
+            raise WritingVariableFileError(filename, err.errno)
+
+    def __update_search_index(self):
+        index = self._build_search_index()
+        filename = self._search_index_filename()
+        self._debug_message('''saving enclosure search index ({0} packages) to file "{1}" ...'''.
+                            format(len(index), filename))
+        try:
+            save_search_index(index, filename)
+        except IOError as err:
+            raise WritingVariableFileError(filename, err.errno)
+
+    @staticmethod
+    def __raise_first(errors):
+        if errors:
+            raise errors[0]
+
     def update_eclosure(self):
         if self.settings.urls.enclosure_debug_mode:
-            filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'enclosure')
-            self._debug_message('''updating enclosure in the file "{0}" in the debug mode ...'''.format(filename))
-            debug.update_enclosure_by_debtags(filename)
+            self.__update_enclosure_by_debtags()
         else:
-            for record in self.settings.urls.enclosures:
-                filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, record.filename + '.enclosure')
-                self._debug_message('''downloading enclosure from "{0}" to the file "{1}" ...'''.
-                                    format(record.url, filename))
-                download_file(record.url, filename)
+            downloads = self.__start_downloads(self.__enclosure_download_jobs())
+            self.__raise_first(self.__update_enclosures(self.__finish_downloads(downloads)))
+        self.__update_search_index()
 
     def update_priorities(self):
-        filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite')
-        url = self.settings.urls.debconf_priorities
-        self._debug_message('''downloading debconf priorities from "{0}" to the file "{1}" ...'''.format(url, filename))
-        download_file(url, filename)
+        downloads = self.__start_downloads([self.__priorities_download_job()])
+        self.__raise_first(self.__update_priorities(self.__finish_downloads(downloads)[0]))
 
     def update(self):
-        cache = get_cache()
-        update_times = UpdateTimes()
-        cache.update(self.fetch_progress)
-        update_times.distro = datetime.now()
-        cache.open(None)  #TODO: Do I really need to re-open the cache here?
-        self.update_eclosure()
-        update_times.enclosure = datetime.now()
-        self.update_priorities()
-        update_times.priorities = datetime.now()
+        '''Updates package lists, enclosures and debconf priorities. Enclosures and priorities
+        are downloaded simultaneously while package lists are being updated
+        '''
+        with self._span("cache-opening"):
+            cache = get_cache()
+        update_times = self.__load_previous_update_times()
+        enclosure_jobs = [] if self.settings.urls.enclosure_debug_mode else self.__enclosure_download_jobs()
+        downloads = self.__start_downloads(enclosure_jobs + [self.__priorities_download_job()])
+        try:
+            with self._span("distro-updating"):
+                cache.update(self.fetch_progress)
+            update_times.distro = datetime.now()
+            with self._span("cache-opening"):
+                cache.open(None)  #TODO: Do I really need to re-open the cache here?
+        finally:
+            results = self.__finish_downloads(downloads)
+        enclosure_results, priorities_result = results[:-1], results[-1]
+        if self.settings.urls.enclosure_debug_mode:
+            with self._span("enclosure-updating"):
+                self.__update_enclosure_by_debtags()
+            enclosure_errors = []
+        else:
+            enclosure_errors = self.__update_enclosures(enclosure_results)
+        if not enclosure_errors:
+            update_times.enclosure = datetime.now()
+            self.__update_search_index()
+        priorities_errors = self.__update_priorities(priorities_result)
+        if not priorities_errors:
+            update_times.priorities = datetime.now()
         self.__save_update_times(update_times)
+        if not enclosure_errors and not priorities_errors:
+            self.__update_installability()
+        self.__raise_first(enclosure_errors + priorities_errors)
 
 
 class PrintRunner(RunnerBase):
 
-    def __init__(self, settings, user_id, display_modes, debug_stream):
-        super().__init__(settings, user_id, display_modes, debug_stream)
+    def __init__(self, settings, user_id, display_modes, debug_stream, profiler=None):
+        super().__init__(settings, user_id, display_modes, debug_stream, profiler)
+
+    def _dpkg_status(self):
+        with self._span("dpkg-status-reading"):
+            return get_dpkg_status(constants.PATH_TO_DPKG_STATUS, constants.PATH_TO_APT_EXTENDED_STATES)
 
-    def get_list_of_mine(self):
+    def get_list_of_mine(self, sort=True):
+        '''Concrete packages installed (or unmarked auto) by the user. Unsorted ones are yielded
+        while the dpkg status file (or the coownership list) is being scanned
+        '''
         coownership_list = self._load_coownership_list()
-        cache = get_cache()
 
         def is_root_own_package(concrete_package):
             owner_set = coownership_list.owners_of(concrete_package)
             return not owner_set or "root" in owner_set
 
         if self.username == "root":
-            result = (pkg for pkg in cache if pkg.is_installed and not pkg.is_auto_installed and
-                      is_root_own_package(ConcretePackage(pkg.shortname, pkg.candidate.architecture)))
+            result = (package.concrete for package in self._dpkg_status().iter_installed()
+                      if not package.is_auto_installed and is_root_own_package(package.concrete))
         else:
-            result = (cache[str(concrete_package)] for concrete_package in coownership_list.his_packages(self.username))
-        return sorted(result)
+            result = coownership_list.his_packages(self.username)
+        return sorted(result) if sort else result
+
+    def get_printed_list_of_mine(self, sort=True):
+        return (text for text, fields in self.get_list_of_mine_entries(sort))
 
-    def get_printed_list_of_mine(self):
-        return (self.display_modes.pkg_str(pkg) for pkg in self.get_list_of_mine())
+    def get_list_of_mine_entries(self, sort=True):
+        '''Pairs of the printed names and the fields of the packages (for "output.ChunkedWriter")'''
+        native_architecture = self._dpkg_status().native_architecture
+        return ((self.display_modes.concrete_str(package, native_architecture),
+                 {"name": package.name, "architecture": package.architecture})
+                for package in self.get_list_of_mine(sort))
+
+    @staticmethod
+    def __owners_of(package_name, dpkg_status, coownership_list):
+        '''Concrete package with the name (installed one if there is) and its owners'''
+        name, _, architecture = package_name.partition(":")
+        installed = dpkg_status.find(name, architecture or None)
+        package = installed.concrete if installed is not None else \
+                  ConcretePackage(name, architecture or dpkg_status.native_architecture)
+        users = coownership_list.owners_of(package)
+        if users:
+            return package, users
+        else:
+            return package, {"root"} if installed is not None and not installed.is_auto_installed else set()
 
     def get_owners_of(self, package_name):
-        try:
-            cache = get_cache()
-            pkg = cache[package_name]
-            package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
-            coownership_list = self._load_coownership_list()
-            users = coownership_list.owners_of(package)
-            if users:
-                return users
-            else:
-                return {"root"} if pkg.is_installed and not pkg.is_auto_installed else set()
-        except KeyError:
-            return set()
+        return self.__owners_of(package_name, self._dpkg_status(), self._load_coownership_list())[1]
 
-    def get_printed_enclosure(self):
-        enclosure = self._load_enclosure()
+    def get_owners_of_many(self, package_names):
+        '''Pairs of concrete packages and their owners for every name of the iterable (it may be
+        read lazily). The state is loaded once for all of them
+        '''
+        dpkg_status = self._dpkg_status()
+        coownership_list = self._load_coownership_list()
+        return (self.__owners_of(package_name, dpkg_status, coownership_list) for package_name in package_names)
+
+    def get_ownership_report(self):
+        '''Triples of concrete packages, their owners and whether they are installed sorted by packages:
+        all the installed packages and the packages of the coownership list
+        '''
+        dpkg_status = self._dpkg_status()
+        coownership_list = self._load_coownership_list()
+        installed = {package.concrete: package for package in dpkg_status.installed()}
+        for package in sorted(installed.keys() | set(coownership_list)):
+            users = coownership_list.owners_of(package)
+            if not users and package in installed and not installed[package].is_auto_installed:
+                users = {"root"}
+            yield package, users, package in installed
+
+    def __ownership_entry(self, package, users, native_architecture, installed=None):
+        text = self.display_modes.concrete_str(package, native_architecture) + ":" + \
+               "".join(" " + user for user in sorted(users))
+        fields = {"name": package.name, "architecture": package.architecture, "owners": sorted(users)}
+        if installed is not None:
+            fields["installed"] = installed
+        return text, fields
+
+    def get_owners_entries(self, package_names):
+        '''Pairs of the printed ownerships and their fields (for "output.ChunkedWriter")'''
+        native_architecture = self._dpkg_status().native_architecture
+        return (self.__ownership_entry(package, users, native_architecture)
+                for package, users in self.get_owners_of_many(package_names))
+
+    def get_ownership_report_entries(self):
+        '''Pairs of the printed ownerships and their fields (for "output.ChunkedWriter")'''
+        native_architecture = self._dpkg_status().native_architecture
+        return (self.__ownership_entry(package, users, native_architecture, installed)
+                for package, users, installed in self.get_ownership_report())
+
+    def get_enclosure_packages(self, installable_only=False):
         # We don't need to sort packages because iterator of "Cache" class already returns
         # sorted sequence
-        return (self.display_modes.pkg_str(pkg) for pkg in get_cache() if pkg.candidate is not None and
-                VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.candidate.version) in enclosure)
+        if installable_only:
+            minimal_priority = self._minimal_debconf_priority()
+            report = self._load_installability_report(minimal_priority)
+            if report is None:
+                report = self._analyse_installability(minimal_priority)
+
+            def is_installable(pkg):
+                installability = report.installability_of(pkg)
+                return installability is not None and installability.installable
+
+            return (pkg for pkg in get_cache() if is_installable(pkg))
+        enclosure = self._load_enclosure()
+        return (pkg for pkg in get_cache()
+                if pkg.candidate is not None and described_package(pkg, enclosure=enclosure) in enclosure)
+
+    def get_printed_enclosure(self, installable_only=False):
+        return (self.display_modes.pkg_str(pkg) for pkg in self.get_enclosure_packages(installable_only))
+
+    def get_enclosure_entries(self, installable_only=False):
+        '''Pairs of the printed names and the fields of the packages (for "output.ChunkedWriter")'''
+        return ((self.display_modes.pkg_str(pkg),
+                 {"name": pkg.shortname, "architecture": pkg.candidate.architecture, "version": pkg.candidate.version})
+                for pkg in self.get_enclosure_packages(installable_only))
+
+
+    def _load_search_index(self):
+        '''Index made by the last update if nothing it is made from has changed since, else a new one'''
+        filename = self._search_index_filename()
+        self._debug_message('''loading enclosure search index from file "{0}" ...'''.format(filename))
+        with self._span("search-index-loading"):
+            index = load_search_index(filename)
+        if index is not None and index.is_current(self._search_index_sources()):
+            return index
+        self._debug_message('''enclosure search index is absent or out of date''')
+        return self._build_search_index()
+
+    def search_enclosure(self, pattern, mode=SearchMode.SUBSTRING, architecture=None, installed=None):
+        '''Enclosed packages whose names match the pattern. "installed" is True or False to get
+        only installed or only not installed packages (any version of them)
+        '''
+        entries = self._load_search_index().search(pattern, mode, architecture)
+        if installed is None:
+            return entries
+        dpkg_status = self._dpkg_status()
+        return (entry for entry in entries
+                if (dpkg_status.find(entry.shortname, entry.architecture) is not None) == installed)
+
+    def get_search_entries(self, pattern, mode=SearchMode.SUBSTRING, architecture=None, installed=None):
+        '''Pairs of the printed names and the fields of the packages (for "output.ChunkedWriter")'''
+        show_arch = self.display_modes.show_arch
+        return ((entry.shortname + ":" + entry.architecture if show_arch else entry.name,
+                 {"name": entry.shortname, "architecture": entry.architecture, "version": entry.version})
+                for entry in self.search_enclosure(pattern, mode, architecture, installed))
 
 
 class ModificationRunner(RunnerBase):
 
-    def __init__(self, settings, user_id, display_modes, work_modes, handlers, applying_ui, progresses, debug_stream):
+    def __init__(self, settings, user_id, display_modes, work_modes, handlers, applying_ui, progresses, debug_stream,
+                 profiler=None):
         self.__work_modes = work_modes
-        super().__init__(settings, user_id, display_modes, debug_stream)
+        super().__init__(settings, user_id, display_modes, debug_stream, profiler)
         self.__handlers = handlers
         self.__handlers.modes = display_modes
         self.__applying_ui = applying_ui
         self.__applying_ui.modes = display_modes
         self.__progresses = progresses
+        self.__priorities = None
+        self.__minimal_priority = None
+        self.__installability_report = None
+        self.__installability_report_sources = None
         self.__check_updating()
 
     @property
@@ -345,55 +697,73 @@ class ModificationRunner(RunnerBase):
         if self.settings.updatetime_module.is_priorities_update_needed(update_times.priorities):
             self.handlers.priorities_updating_warning(update_times.priorities)
 
-    def __check_interrupted(self):
-        if get_cache().dpkg_journal_dirty:
+    def _check_interrupted(self):
+        with self._span("cache-opening"):
+            cache = get_cache()
+        if cache.dpkg_journal_dirty:
             raise DpkgJournalDirtyError()
         if os.path.exists(constants.PATH_TO_UNCOMPLETED_TASKS):
             raise PrecedingTasksHasNotBeenCompletedError()
 
     # TODO: Do I really need it?
     def __load_program_options(self):
+        import apt_pkg
         apt_pkg.init_config()
         self.__default_release = apt_pkg.config["APT::Default-Release"] or None
 
+    def __load_priorities(self):
+        '''Priorities database and minimal priority are loaded once per runner'''
+        if self.__priorities is None:
+            filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite')
+            self.__priorities = DebconfPrioritiesDB("sqlite:///" + filename)
+            self.__minimal_priority = self._minimal_debconf_priority()
+        return self.__priorities, self.__minimal_priority
+
+    def __load_installability_report_once(self):
+        '''Loaded anew only if a file it is made from has been changed (e. g. by a commit of this runner)'''
+        sources = self._installability_sources()
+        if sources != self.__installability_report_sources:
+            self.__installability_report = self._load_installability_report(self.__load_priorities()[1])
+            self.__installability_report_sources = sources
+        return self.__installability_report
+
     def __check_priorities(self, fixing_interrupted=False):
-        filename = os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite')
-        priorities = DebconfPrioritiesDB("sqlite:///" + filename)
-        minimal_priority = minimal_debconf_priority_to_ask_questions()
-        changes = get_cache().get_changes()
+        with self._span("priority-checks"):
+            priorities, minimal_priority = self.__load_priorities()
+            changes = get_cache().get_changes()
 
-        errors = False
-        if not fixing_interrupted:
-            def check_fatal():
-                nonlocal errors
-                errors = True
-                if self.work_modes.fatal_errors:
-                    raise SystemComposingByResolverError()
-            def priorities_failure(pkg, package_priority):
-                self.handlers.may_not_debconf_configure(pkg, package_priority, minimal_priority)
-            def bad_priorities_failure(pkg):
-                self.handlers.bad_debconf_configure(pkg)
-        else:
-            def check_fatal():
-                pass
-            def priorities_failure(pkg, package_priority):
-                self.handlers.now_debconf_configure_warning(pkg, package_priority, minimal_priority)
-            def bad_priorities_failure(pkg):
-                self.handlers.now_bad_debconf_configure_warning(pkg)
-
-        for pkg in sorted(changes):
-            if is_setup_operation(pkg):
-                concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
-                if not priorities.well_processed(concrete_package):
-                    bad_priorities_failure(pkg)
-                    check_fatal()
-                else:
-                    state = priorities[concrete_package]
-                    if state.status == Status.HAS_QUESTIONS and state.priority >= minimal_priority:
-                        priorities_failure(pkg, state.priority)
+            errors = False
+            if not fixing_interrupted:
+                def check_fatal():
+                    nonlocal errors
+                    errors = True
+                    if self.work_modes.fatal_errors:
+                        raise SystemComposingByResolverError()
+                def priorities_failure(pkg, package_priority):
+                    self.handlers.may_not_debconf_configure(pkg, package_priority, minimal_priority)
+                def bad_priorities_failure(pkg):
+                    self.handlers.bad_debconf_configure(pkg)
+            else:
+                def check_fatal():
+                    pass
+                def priorities_failure(pkg, package_priority):
+                    self.handlers.now_debconf_configure_warning(pkg, package_priority, minimal_priority)
+                def bad_priorities_failure(pkg):
+                    self.handlers.now_bad_debconf_configure_warning(pkg)
+
+            for pkg in sorted(changes):
+                if is_setup_operation(pkg):
+                    concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
+                    if not priorities.well_processed(concrete_package):
+                        bad_priorities_failure(pkg)
                         check_fatal()
+                    else:
+                        state = priorities[concrete_package]
+                        if state.status == Status.HAS_QUESTIONS and state.priority >= minimal_priority:
+                            priorities_failure(pkg, state.priority)
+                            check_fatal()
 
-        return not errors
+            return not errors
 
     def __check_free_space(self):
 
@@ -403,11 +773,11 @@ class ModificationRunner(RunnerBase):
             return lines[1].split()[0]
 
         usr_total, usr_used, usr_free = shutil.disk_usage('/usr/')
-        apt_archives_total, apt_archives_used, apt_archives_free = shutil.disk_usage('/var/cache/apt/archives/')
+        apt_archives_total, apt_archives_used, apt_archives_free = shutil.disk_usage(constants.PATH_TO_APT_ARCHIVES)
         cache = get_cache()
         minimal_free_space = self.settings.minimal_free_space
 
-        if get_partition('/usr/') == get_partition('/var/cache/apt/archives/'):
+        if get_partition('/usr/') == get_partition(constants.PATH_TO_APT_ARCHIVES):
             required = cache.required_space + cache.required_download
             if not minimal_free_space.usr.less_or_equal_to_other(usr_free - required, usr_total):
                 raise NotEnoughSpace()
@@ -419,11 +789,61 @@ class ModificationRunner(RunnerBase):
             if not minimal_free_space.apt_archives.less_or_equal_to_other(usr_free - cache.required_download, usr_total):
                 raise NotEnoughSpace()
 
+    def __write_uncompleted_tasks_file(self, uncompleted_tasks_xml_element, journal):
+        journal.export_to_xml_element(uncompleted_tasks_xml_element)
+        filename = constants.PATH_TO_UNCOMPLETED_TASKS
+        self._debug_message('file "{0}" writing (phase "{1}")...'.format(filename, journal.phase))
+        string = etree.tostring(etree.ElementTree(uncompleted_tasks_xml_element), pretty_print=True)
+        temp_filename = filename + ".new"
+        with open(temp_filename, "wb") as file:
+            file.write(string)
+            file.flush()
+            os.fsync(file)
+        os.replace(temp_filename, filename)
+
+    def __fetch_archives(self, uncompleted_tasks_xml_element, journal):
+        '''Downloads archives before committing and journals that they have been downloaded'''
+        with self._span("fetching"):
+            fetched = get_cache().fetch_archives(self.progresses.acquire)
+        if fetched:
+            journal.phase = JournalPhase.FETCHED
+            self.__write_uncompleted_tasks_file(uncompleted_tasks_xml_element, journal)
+
     def __remove_uncompleted_tasks_file(self):
         self._debug_message('file "{0}" deleting...'.format(constants.PATH_TO_UNCOMPLETED_TASKS))
         os.remove(constants.PATH_TO_UNCOMPLETED_TASKS)
 
-    def __examine_and_apply_changes(self, tasks, real_tasks, enclosure, coownership, uncompleted_tasks_xml_element):
+    def __prompt_agree(self):
+        with self._span("prompt"):
+            return self.applying_ui.prompt_agree()
+
+    def __agree_to_apply(self):
+        '''Asks the user to agree with the marked changes. Their archives are being downloaded meanwhile'''
+        if self.work_modes.assume_yes:
+            return True
+        cache = get_cache()
+        if self.work_modes.simulate or not cache.required_download:
+            return self.__prompt_agree()
+        prefetch = ArchivePrefetch(cache)
+        prefetch.start()
+        agree = False
+        try:
+            agree = self.__prompt_agree()
+        finally:
+            if agree:
+                with self._span("prefetch-waiting"):
+                    prefetch.wait()
+            else:
+                prefetch.cancel()
+            self._debug_message('''archives prefetching has been {0}'''.format(
+                "cancelled" if prefetch.cancelled else
+                "completed" if prefetch.completed else "failed: {0}".format(prefetch.error)))
+        return agree
+
+    def _examine_changes(self, real_tasks, enclosure, coownership):
+        '''Shows changes marked in the cache and checks whether the user may do them.
+        Raises "SystemComposingByResolverError" if he may not
+        '''
         cache = get_cache()
         changes = cache.get_changes()
         all_changes = get_all_changes(changes, real_tasks)
@@ -446,91 +866,172 @@ class ModificationRunner(RunnerBase):
                 if self.work_modes.fatal_errors:
                     raise SystemComposingByResolverError()
 
-            for pkg in sorted(changes):
-                concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
-                versioned_package = VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.candidate.version)
-                if pkg.marked_install and versioned_package not in enclosure and self.username != "root":
-                    self.handlers.may_not_install(pkg)
-                    check_fatal()
-                if pkg.is_installed and pkg.marked_upgrade and versioned_package not in enclosure and not self.may_upgrade_package:
-                    installed_version = VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.installed)
-                    self.handlers.may_not_upgrade_to_new(pkg, installed_version not in enclosure)
-                    check_fatal()
-                if pkg.marked_downgrade and not self.work_modes.force:
-                    if self.work_modes.force:
-                        self.handlers.force_downgrade(pkg)
-                    else:
-                        self.handlers.may_not_downgrade()
+            with self._span("policy-checks"):
+                for pkg in sorted(changes):
+                    concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
+                    versioned_package = described_package(pkg, enclosure=enclosure)
+                    if pkg.marked_install and versioned_package not in enclosure and self.username != "root":
+                        self.handlers.may_not_install(pkg)
                         check_fatal()
-                if pkg.marked_keep:
-                    if self.work_modes.force:
-                        self.handlers.force_keep(pkg)
-                    else:
-                        self.handlers.may_not_keep()
+                    if pkg.is_installed and pkg.marked_upgrade and versioned_package not in enclosure and not self.may_upgrade_package:
+                        installed_version = described_package(pkg, pkg.installed, enclosure)
+                        self.handlers.may_not_upgrade_to_new(pkg, installed_version not in enclosure)
                         check_fatal()
-                if pkg.marked_delete and not pkg.is_auto_removable and \
-                        pkg not in (real_tasks.remove + real_tasks.physically_remove + real_tasks.purge):
-                    sole_owns = coownership.is_sole_own(concrete_package, self.username)
-                    if self.work_modes.remove_dependencies:
-                        if sole_owns:
-                            # User will be never being root here
-                            coownership.remove_ownership(concrete_package, self.username)
+                    if pkg.marked_downgrade and not self.work_modes.force:
+                        if self.work_modes.force:
+                            self.handlers.force_downgrade(pkg)
                         else:
-                            self.handlers.may_not_remove(pkg)
+                            self.handlers.may_not_downgrade()
                             check_fatal()
-                    else:
-                        if self.username == "root":
-                            if coownership.is_any_user_own(concrete_package):
-                                self.handlers.may_not_remove(pkg, is_root=True, suggest_to_remove_deps=sole_owns)
+                    if pkg.marked_keep:
+                        if self.work_modes.force:
+                            self.handlers.force_keep(pkg)
+                        else:
+                            self.handlers.may_not_keep()
+                            check_fatal()
+                    if pkg.marked_delete and not pkg.is_auto_removable and \
+                            pkg not in (real_tasks.remove + real_tasks.physically_remove + real_tasks.purge):
+                        sole_owns = coownership.is_sole_own(concrete_package, self.username)
+                        if self.work_modes.remove_dependencies:
+                            if sole_owns:
+                                # User will be never being root here
+                                coownership.remove_ownership(concrete_package, self.username)
+                            else:
+                                self.handlers.may_not_remove(pkg)
+                                check_fatal()
+                        else:
+                            if self.username == "root":
+                                if coownership.is_any_user_own(concrete_package):
+                                    self.handlers.may_not_remove(pkg, is_root=True, suggest_to_remove_deps=sole_owns)
+                                    check_fatal()
+                            else:
+                                self.handlers.may_not_remove(pkg, suggest_to_remove_deps=sole_owns)
                                 check_fatal()
+                    if pkg.is_inst_broken and not pkg.is_now_broken:
+                        if self.modes.force:
+                            self.handlers.force_break(pkg)
                         else:
-                            self.handlers.may_not_remove(pkg, suggest_to_remove_deps=sole_owns)
+                            self.handlers.may_not_break(pkg)
                             check_fatal()
-                if pkg.is_inst_broken and not pkg.is_now_broken:
-                    if self.modes.force:
-                        self.handlers.force_break(pkg)
-                    else:
-                        self.handlers.may_not_break(pkg)
-                        check_fatal()
 
-                # TODO: Вернуть эту проверку
-                #                     if self.default_release is not None and origin.archive != self.default_release:
-                #                         self.handlers.may_not_install_from_this_archive(origin.archive)
-                #                         check_fatal()
+                    # TODO: Вернуть эту проверку
+                    #                     if self.default_release is not None and origin.archive != self.default_release:
+                    #                         self.handlers.may_not_install_from_this_archive(origin.archive)
+                    #                         check_fatal()
 
-                if is_setup_operation(pkg):
-                    # TODO: Может быть я должен просматривать весь список origins?
-                    origin = pkg.candidate.origins[0]
+                    if is_setup_operation(pkg):
+                        # TODO: Может быть я должен просматривать весь список origins?
+                        origin = pkg.candidate.origins[0]
 
-                    if not origin.trusted:
-                        if self.work_modes.force:
-                            self.handlers.force_untrusted(pkg)
-                        else:
-                            self.handlers.package_is_not_trusted(pkg)
-                            check_fatal()
+                        if not origin.trusted:
+                            if self.work_modes.force:
+                                self.handlers.force_untrusted(pkg)
+                            else:
+                                self.handlers.package_is_not_trusted(pkg)
+                                check_fatal()
 
             if errors or not self.__check_priorities():
                 raise SystemComposingByResolverError()
 
+    def __resolved_plan_filename(self):
+        return os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, constants.RESOLVED_PLANS_DIRNAME, self.username)
+
+    def __resolved_plan_key(self, tasks_type, tasks):
+        state_filenames = self._enclosure_filenames() + \
+                          [os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'coownership-list'),
+                           os.path.join(constants.PATH_TO_PROGRAM_VARIABLE, 'debconf-priorities.sqlite'),
+                           constants.PATH_TO_DPKG_STATUS, constants.PATH_TO_APT_EXTENDED_STATES]
+        with self._span("plan-key"):
+            return ResolvedPlanKey.from_state(tasks_type, tasks, self.username, self.work_modes,
+                                              self.__load_priorities()[1], constants.PATH_TO_APT_PKGCACHE,
+                                              state_filenames)
+
+    def __simulated_plan_key(self, tasks_type, tasks):
+        '''Key of the plan to save after the simulation (None for a real run: it saves no plan)'''
+        return self.__resolved_plan_key(tasks_type, tasks) if self.work_modes.simulate else None
+
+    def __load_resolved_plan(self):
+        filename = self.__resolved_plan_filename()
+        self._debug_message('''loading resolved plan from file "{0}" ...'''.format(filename))
+        return load_resolved_plan(filename)
+
+    def __save_resolved_plan(self, plan):
+        filename = self.__resolved_plan_filename()
+        self._debug_message('''saving resolved plan to file "{0}" ...'''.format(filename))
+        try:
+            save_resolved_plan(plan, filename)
+        except IOError as err:
+            raise WritingVariableFileError(filename, err.errno)
+
+    def __reuse_resolved_plan(self, tasks_type, tasks, plan_key=None):
+        '''Applies the plan of the preceding simulation if it has been made for the same key.
+        Returns False if there is no such plan. The key is computed here if it isn't given
+        and only if there is some plan to compare it with
+        '''
+        plan = self.__load_resolved_plan()
+        if plan is None:
+            return False
+        if plan_key is None:
+            plan_key = self.__resolved_plan_key(tasks_type, tasks)
+        if plan.key != plan_key:
+            return False
+        try:
+            self.__apply_resolved_plan(plan)
+        except StaleResolvedPlanError as err:
+            self._debug_message('''resolved plan is stale ({0}), resolving anew'''.format(", ".join(err.differences)))
+            return False
+        return True
+
+    def __apply_resolved_plan(self, plan):
+        cache = get_cache()
+        with cache.actiongroup():
+            try:
+                with self._span("plan-replaying"):
+                    plan.replay(cache)
+            except StaleResolvedPlanError:
+                cache.clear()
+                raise
+            uncompleted_tasks_xml_element = plan.uncompleted_tasks_xml_element()
+            real_tasks = RealTasks(Tasks())
+            if uncompleted_tasks_xml_element.get("type") == "operations":
+                real_tasks.import_from_xml_element(uncompleted_tasks_xml_element)
+
+            self.applying_ui.show_changes(get_all_changes(cache.get_changes(), real_tasks))
+            self.handlers.resolving_done()
+
+            self.__apply_changes(plan.key, real_tasks, plan.coownership(), uncompleted_tasks_xml_element)
+
+    def __examine_and_apply_changes(self, plan_key, real_tasks, enclosure, coownership, uncompleted_tasks_xml_element):
+        self._examine_changes(real_tasks, enclosure, coownership)
+        self.__apply_changes(plan_key, real_tasks, coownership, uncompleted_tasks_xml_element)
+
+    def __apply_changes(self, plan_key, real_tasks, coownership, uncompleted_tasks_xml_element):
+        cache = get_cache()
+
         if real_tasks.is_empty():
             raise GoodExit()
 
         if not self.work_modes.force:
-            self.__check_free_space()
+            with self._span("free-space-checking"):
+                self.__check_free_space()
 
-        if self.work_modes.assume_yes or self.applying_ui.prompt_agree():
+        if self.__agree_to_apply():
             if not self.work_modes.simulate:
                 self._save_coownership_list(coownership)
-                tree = etree.ElementTree(uncompleted_tasks_xml_element)
-                self._debug_message('file "{0}" creating...'.format(constants.PATH_TO_UNCOMPLETED_TASKS))
-                string = etree.tostring(tree, pretty_print=True)
-                with open(constants.PATH_TO_UNCOMPLETED_TASKS, "wb") as file:
-                    file.write(string)
-                    file.flush()
-                    os.fsync(file)
-                cache.commit(self.progresses.acquire, self.progresses.install)
+                journal = CommitJournal.from_cache(
+                    cache, constants.PATH_TO_APT_ARCHIVES,
+                    lambda pkg: self.work_modes.purge_unused or pkg in real_tasks.purge,
+                    (real_tasks.install + real_tasks.markauto + real_tasks.unmarkauto).pkgs())
+                self.__write_uncompleted_tasks_file(uncompleted_tasks_xml_element, journal)
+                self.__fetch_archives(uncompleted_tasks_xml_element, journal)
+                with self._span("commit"):
+                    cache.commit(self.progresses.acquire, self.progresses.install)
                 self.__remove_uncompleted_tasks_file()
+                remove_resolved_plan(self.__resolved_plan_filename())
             else:
+                # The following real run commits the same marks without resolving them once again
+                self.__save_resolved_plan(ResolvedPlan.record(cache, plan_key, real_tasks, self.work_modes,
+                                                              coownership, uncompleted_tasks_xml_element))
                 self.handlers.simulate()
         else:
             raise GoodExit()
@@ -538,22 +1039,26 @@ class ModificationRunner(RunnerBase):
     def upgrade(self, full_upgrade=True):
         if not self.has_privileges:
             raise YouMayNotUpgradeError(constants.UNIX_LIMITEDAPT_UPGRADERS_GROUPNAME, full_upgrade)
-        self.__check_interrupted()
+        self._check_interrupted()
+        type = "full-upgrade" if full_upgrade else "safe-upgrade"
+        tasks = Tasks()
+        plan_key = self.__simulated_plan_key(type, tasks_to_tuple(tasks))
+        if self.__reuse_resolved_plan(type, tasks_to_tuple(tasks), plan_key):
+            return
         enclosure = self._load_enclosure()
         coownership = self._load_coownership_list()
-        get_cache().upgrade(full_upgrade)
-        tasks = Tasks()
+        with self._span("resolution"):
+            get_cache().upgrade(full_upgrade)
 
-        type = "full-upgrade" if full_upgrade else "safe-upgrade"
         root_element = etree.Element("tasks", {"type": type, "username": self.username,
                                                "purge-unused": str(self.work_modes.purge_unused)})
 
-        self.__examine_and_apply_changes(tasks, RealTasks(tasks), enclosure, coownership, root_element)
+        self.__examine_and_apply_changes(plan_key, RealTasks(tasks), enclosure, coownership, root_element)
 
     def perform_operations(self, tasks):
         if not self.has_privileges:
             raise YouMayNotPerformError(constants.UNIX_LIMITEDAPT_GROUPNAME)
-        self.__check_interrupted()
+        self._check_interrupted()
 
         cache = get_cache()
         coownership = self._load_coownership_list()
@@ -582,8 +1087,51 @@ class ModificationRunner(RunnerBase):
         if tasks.unmarkauto:
             self._debug_message("you want to unmarkauto: " + list_to_str(tasks.unmarkauto))
 
+        plan_key = self.__simulated_plan_key("operations", tasks_to_tuple(tasks))
+        if self.__reuse_resolved_plan("operations", tasks_to_tuple(tasks), plan_key):
+            self._debug_message("the plan resolved by the preceding simulation has been applied")
+            return
+
         real_tasks = RealTasks(tasks)
 
+        with cache.actiongroup():
+            self._mark_operations(tasks, real_tasks, enclosure, coownership)
+
+            root_element = etree.Element("tasks", {"type" : "operations", "username" : self.username,
+                                                   "purge-unused" : str(self.work_modes.purge_unused)})
+            real_tasks.export_to_xml_element(root_element)
+
+            self.__examine_and_apply_changes(plan_key, real_tasks, enclosure, coownership, root_element)
+
+    def apply_resolved_plan(self, tasks=None):
+        '''Commits the plan resolved by the preceding simulation of the user without resolving it once again.
+        If the tasks are given the plan must be made for them
+        '''
+        if not self.has_privileges:
+            raise YouMayNotPerformError(constants.UNIX_LIMITEDAPT_GROUPNAME)
+        self._check_interrupted()
+        plan = self.__load_resolved_plan()
+        if plan is None:
+            raise NoResolvedPlanError()
+        plan_key = self.__resolved_plan_key(plan.key.tasks_type,
+                                            plan.key.tasks if tasks is None else tasks_to_tuple(tasks))
+        differences = plan.key.differences(plan_key)
+        if differences:
+            raise StaleResolvedPlanError(differences)
+        self.__apply_resolved_plan(plan)
+
+    def _mark_operations(self, tasks, real_tasks, enclosure, coownership):
+        '''Marks changes of the tasks in the cache (it must be done inside its action group) and
+        changes the coownership list accordingly. Raises "SystemComposingByResolverError"
+        if the user may not do the tasks
+        '''
+        cache = get_cache()
+
+        # Enclosed packages which surely cannot be installed are rejected before resolution
+        installability_report = None
+        if tasks.install and self.username != "root":
+            installability_report = self.__load_installability_report_once()
+
         errors = False
 
         def check_fatal():
@@ -592,12 +1140,12 @@ class ModificationRunner(RunnerBase):
             if self.work_modes.fatal_errors:
                 raise WantToDoSystemComposingError()
 
-        with cache.actiongroup():
+        with self._span("resolution"):
             for package_name in tasks.install:
                 try:
                     pkg = cache[package_name]
                     # TODO: Is it correct?
-                    versioned_package = VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.candidate.version)
+                    versioned_package = described_package(pkg, enclosure=enclosure)
                     concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
                     if pkg.is_installed:
                         if pkg.is_upgradable:
@@ -634,8 +1182,14 @@ class ModificationRunner(RunnerBase):
                                 coownership.add_ownership(concrete_package, "root")
                             pkg.mark_install()
                         elif versioned_package in enclosure:
-                            coownership.add_ownership(concrete_package, self.username, also_root=False)
-                            pkg.mark_install()
+                            installability = installability_report.installability_of(pkg) \
+                                if installability_report is not None else None
+                            if installability is not None and not installability.installable:
+                                self.handlers.not_installable(pkg, installability)
+                                check_fatal()
+                            else:
+                                coownership.add_ownership(concrete_package, self.username, also_root=False)
+                                pkg.mark_install()
                         else:
                             check_fatal()
                 except KeyError:
@@ -729,8 +1283,7 @@ class ModificationRunner(RunnerBase):
                     concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
                     if pkg.is_installed:
                         if pkg.is_auto_installed:
-                            if VersionedPackage(pkg.shortname, pkg.candidate.architecture,
-                                                pkg.candidate.version) in enclosure:
+                            if described_package(pkg, enclosure=enclosure) in enclosure:
                                 # We don't need to catch UserAlreadyOwnsThisPackage exception because
                                 # if installed package marked 'automatically installed' nobody owns it.
                                 # Also we don't add "root" to this package owners for the same reason.
@@ -746,17 +1299,13 @@ class ModificationRunner(RunnerBase):
                 except KeyError:
                     self.handlers.cannot_find_package(package_name)
 
-            if errors:
-                raise SystemComposingByResolverError()
-
-            root_element = etree.Element("tasks", {"type" : "operations", "username" : self.username,
-                                                   "purge-unused" : str(self.work_modes.purge_unused)})
-            real_tasks.export_to_xml_element(root_element)
-
-            self.__examine_and_apply_changes(tasks, real_tasks, enclosure, coownership, root_element)
+        if errors:
+            raise SystemComposingByResolverError()
 
     def __check_interrupted_fixing(self):
-        if get_cache().dpkg_journal_dirty:
+        with self._span("cache-opening"):
+            cache = get_cache()
+        if cache.dpkg_journal_dirty:
             raise DpkgJournalDirtyError()
         if self.username != "root":
             raise YouMayNotFixInterruptedError()
@@ -773,15 +1322,32 @@ class ModificationRunner(RunnerBase):
             interrupted_type = root.get("type")
             username = root.get("username")
             purge_unused = root.get("purge-unused") == "True"
+            journal = CommitJournal.import_from_xml_element(root)
             real_tasks = RealTasks(Tasks())
+            if interrupted_type == "operations":
+                real_tasks.import_from_xml_element(root)
+            elif interrupted_type not in ("safe-upgrade", "full-upgrade"):
+                raise ValueError()
+        except (ValueError, LookupError, etree.XMLSyntaxError, JournalImportSyntaxError) as err:
+            raise RealTasksImportSyntaxError()
+
+        # The journal (if any) tells the exact changes: only ones dpkg has not made are marked
+        remaining = self.__mark_remaining_journaled(journal)
+        if remaining is not None and remaining.is_empty():
+            self._debug_message('all the interrupted changes have been made already')
+            if not self.work_modes.simulate:
+                self.__remove_uncompleted_tasks_file()
+            return
+        if remaining is None:
             if interrupted_type == "safe-upgrade":
-                cache.upgrade(dist_upgrade=False)
+                with self._span("resolution"):
+                    cache.upgrade(dist_upgrade=False)
             elif interrupted_type == "full-upgrade":
-                cache.upgrade(dist_upgrade=True)
-            elif interrupted_type == "operations":
-                real_tasks.import_from_xml_element(root)
+                with self._span("resolution"):
+                    cache.upgrade(dist_upgrade=True)
+            else:
                 try:
-                    with cache.actiongroup():
+                    with cache.actiongroup(), self._span("resolution"):
                         for package in real_tasks.install:
                             cache[str(package)].mark_install()
                         for package in real_tasks.remove + real_tasks.physically_remove:
@@ -794,10 +1360,6 @@ class ModificationRunner(RunnerBase):
                             cache[str(package)].mark_auto(auto=False)
                 except KeyError:
                     raise PackageNotExistNow(package)
-            else:
-                raise ValueError()
-        except (ValueError, LookupError, etree.XMLSyntaxError) as err:
-            raise RealTasksImportSyntaxError()
 
         changes = cache.get_changes()
         all_changes = get_all_changes(changes, real_tasks)
@@ -815,39 +1377,86 @@ class ModificationRunner(RunnerBase):
         enclosure = self._load_enclosure()
 
         if username != "root":
-            for pkg in sorted(changes):
-                versioned_package = VersionedPackage(pkg.shortname, pkg.candidate.architecture, pkg.candidate.version)
-                if pkg.marked_install and versioned_package not in enclosure:
-                    self.handlers.now_install_warning(pkg)
-                if pkg.is_installed and pkg.marked_upgrade and versioned_package not in enclosure:
-                    self.handlers.now_upgrade_to_new_warning(pkg)
-                if pkg.marked_downgrade and not self.work_modes.force:
-                    self.handlers.now_downgrade_warning(pkg)
-                if pkg.marked_keep:
-                    self.handlers.now_keep_warning(pkg)
-                if pkg.marked_delete and not pkg.is_auto_removable and \
-                        pkg not in (real_tasks.remove + real_tasks.physically_remove + real_tasks.purge):
-                    self.handlers.now_remove_warning(pkg)
-                if pkg.is_inst_broken and not pkg.is_now_broken:
-                    self.handlers.now_break_warning(pkg)
-                if is_setup_operation(pkg):
-                    origin = pkg.candidate.origins[0]
-                    if not origin.trusted:
-                        self.handlers.now_untrusted_warning(pkg)
+            with self._span("policy-checks"):
+                for pkg in sorted(changes):
+                    versioned_package = described_package(pkg, enclosure=enclosure)
+                    if pkg.marked_install and versioned_package not in enclosure:
+                        self.handlers.now_install_warning(pkg)
+                    if pkg.is_installed and pkg.marked_upgrade and versioned_package not in enclosure:
+                        self.handlers.now_upgrade_to_new_warning(pkg)
+                    if pkg.marked_downgrade and not self.work_modes.force:
+                        self.handlers.now_downgrade_warning(pkg)
+                    if pkg.marked_keep:
+                        self.handlers.now_keep_warning(pkg)
+                    if pkg.marked_delete and not pkg.is_auto_removable and \
+                            pkg not in (real_tasks.remove + real_tasks.physically_remove + real_tasks.purge):
+                        self.handlers.now_remove_warning(pkg)
+                    if pkg.is_inst_broken and not pkg.is_now_broken:
+                        self.handlers.now_break_warning(pkg)
+                    if is_setup_operation(pkg):
+                        origin = pkg.candidate.origins[0]
+                        if not origin.trusted:
+                            self.handlers.now_untrusted_warning(pkg)
             self.__check_priorities(fixing_interrupted=True)
 
         if not self.work_modes.force:
-            self.__check_free_space()
+            with self._span("free-space-checking"):
+                self.__check_free_space()
 
-        if self.work_modes.assume_yes or self.applying_ui.prompt_agree():
+        if self.__agree_to_apply():
             if not self.work_modes.simulate:
-                cache.commit(self.progresses.acquire, self.progresses.install)
+                if journal is not None:
+                    self.__refetch_journaled_archives(root, journal, remaining)
+                if remaining is not None:
+                    unconfigured = remaining.unconfigured(cache)
+                    if unconfigured:
+                        with self._span("configuring"):
+                            self._configure_packages(unconfigured)
+                with self._span("commit"):
+                    cache.commit(self.progresses.acquire, self.progresses.install)
                 self.__remove_uncompleted_tasks_file()
             else:
                 self.handlers.simulate()
         else:
             raise GoodExit()
 
+    @staticmethod
+    def _configure_packages(names):
+        '''Configures packages dpkg has unpacked only'''
+        if subprocess.call(["dpkg", "--configure"] + names) != 0:
+            raise ConfiguringError(names)
+
+    def __mark_remaining_journaled(self, journal):
+        '''Marks journaled changes which have not been made yet without resolution.
+        Returns journal of them or None if there is no journal or the cache cannot make them
+        '''
+        if journal is None:
+            return None
+        cache = get_cache()
+        try:
+            remaining = journal.remaining(cache)
+            with cache.actiongroup(), self._span("journal-replaying"):
+                remaining.mark(cache)
+        except JournalMismatch as err:
+            self._debug_message('''journaled change of package "{0}" cannot be made now, resolving anew'''.
+                                format(err.name))
+            cache.clear()
+            return None
+        self._debug_message('''{0} of {1} journaled changes remain (phase "{2}"), {3} of them are to configure'''.
+                            format(len(remaining.changes), len(journal.changes), journal.phase,
+                                   len(remaining.unconfigured(cache))))
+        return remaining
+
+    def __refetch_journaled_archives(self, uncompleted_tasks_xml_element, journal, remaining):
+        '''Fetches archives once again unless all the ones still needed are downloaded and intact'''
+        if remaining is not None and journal.phase == JournalPhase.FETCHED:
+            with self._span("archives-verification"):
+                invalid = remaining.invalid_archives()
+            self._debug_message('''{0} archives of remaining changes are missing or damaged'''.format(len(invalid)))
+            if not invalid:
+                return
+        self.__fetch_archives(uncompleted_tasks_xml_element, journal)
+
     def ignore_interrupted(self):
         self.__check_interrupted_fixing()
         self.__remove_uncompleted_tasks_file()
@@ -0,0 +1,279 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Search index of the enclosure: enclosed candidates of the cache sorted by names (prefixes
+are found by binary search) and a trigram index of the names for substring and regex queries.
+
+The index is built at update time together with the installability report and is valid while
+the files it is made from (enclosures and the apt package cache) are not changed.
+'''
+
+import array
+import bisect
+import enum
+import os
+import pickle
+import re
+from .errors import Error
+from .packages import described_package
+from .fileutils import file_signature
+
+
+SEARCH_INDEX_FORMAT = 1
+
+
+class SearchError(Error): pass
+
+class BadSearchPatternError(SearchError):
+
+    def __init__(self, pattern, reason):
+        super().__init__(pattern, reason)
+        self.__pattern = pattern
+        self.__reason = reason
+
+    @property
+    def pattern(self):
+        return self.__pattern
+
+    @property
+    def reason(self):
+        return self.__reason
+
+
+class SearchMode(enum.Enum):
+    PREFIX = "prefix"
+    SUBSTRING = "substring"
+    REGEX = "regex"
+
+    def __str__(self):
+        return self.value
+
+
+class SearchEntry:
+    '''Enclosed candidate. "name" is the apt name of the package (with architecture for foreign ones)'''
+
+    def __init__(self, shortname, name, architecture, version):
+        self.__shortname = shortname
+        self.__name = name
+        self.__architecture = architecture
+        self.__version = version
+
+    @property
+    def shortname(self):
+        return self.__shortname
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def architecture(self):
+        return self.__architecture
+
+    @property
+    def version(self):
+        return self.__version
+
+    def __eq__(self, other):
+        return (self.shortname, self.architecture, self.version) == (other.shortname, other.architecture, other.version)
+
+    def __repr__(self):
+        return "SearchEntry({0!r}, {1!r}, {2!r}, {3!r})".format(self.shortname, self.name, self.architecture,
+                                                               self.version)
+
+
+def trigrams(text):
+    return {text[position:position + 3] for position in range(len(text) - 2)}
+
+
+_REGEX_SPECIAL = set(".^$*+?{}[]()|\\")
+_REGEX_OPTIONAL = set("*?{")
+
+
+def required_literals(pattern):
+    '''Literal substrings every match of the regular expression contains. It is a conservative
+    estimation: an empty list means that nothing is known (any name may match)
+    '''
+    if "|" in pattern or "(?" in pattern:
+        return []
+    literals = []
+    current = []
+
+    def finish():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    position = 0
+    depth = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "\\":
+            escaped = pattern[position + 1:position + 2]
+            if depth == 0 and escaped and not escaped.isalnum():
+                char = escaped
+                position += 1
+            else:
+                # Classes ("\d", "\w" etc.) and back references
+                finish()
+                position += 2
+                continue
+        elif char == "[":
+            finish()
+            closing = pattern.find("]", position + 2)
+            position = closing + 1 if closing != -1 else len(pattern)
+            continue
+        elif char == "(":
+            # Groups may be repeated or optional
+            finish()
+            depth += 1
+            position += 1
+            continue
+        elif char == ")":
+            depth -= 1
+            position += 1
+            continue
+        elif char in _REGEX_SPECIAL or depth > 0:
+            if char in _REGEX_OPTIONAL and current:
+                # The previous character may be absent
+                current.pop()
+            finish()
+            if char == "{":
+                closing = pattern.find("}", position)
+                position = closing + 1 if closing != -1 else len(pattern)
+            else:
+                position += 1
+            continue
+        following = pattern[position + 1:position + 2]
+        if following and following in _REGEX_OPTIONAL:
+            finish()
+        else:
+            current.append(char)
+        position += 1
+    finish()
+    return literals
+
+
+class EnclosureSearchIndex:
+    '''"sources" maps files the index is made from to their signatures'''
+
+    def __init__(self, entries, sources):
+        self.__entries = sorted(entries, key=lambda entry: (entry.shortname, entry.architecture))
+        self.__names = [entry.shortname for entry in self.__entries]
+        self.__sources = sources
+        trigram_lists = {}
+        for number, name in enumerate(self.__names):
+            for trigram in trigrams(name):
+                trigram_lists.setdefault(trigram, []).append(number)
+        # Posting lists are kept sorted and compact
+        self.__trigrams = {trigram: array.array("I", numbers) for trigram, numbers in trigram_lists.items()}
+
+    @staticmethod
+    def build(cache, enclosure, sources):
+        '''Index of candidates of the cache which are in the enclosure'''
+        entries = (SearchEntry(pkg.shortname, pkg.name, pkg.candidate.architecture, pkg.candidate.version)
+                   for pkg in cache
+                   if pkg.candidate is not None and described_package(pkg, enclosure=enclosure) in enclosure)
+        return EnclosureSearchIndex(entries, sources)
+
+    @property
+    def sources(self):
+        return self.__sources
+
+    def is_current(self, sources):
+        return self.__sources == sources
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __iter__(self):
+        return iter(self.__entries)
+
+    def __prefix_numbers(self, prefix):
+        start = bisect.bisect_left(self.__names, prefix)
+        end = start
+        while end < len(self.__names) and self.__names[end].startswith(prefix):
+            end += 1
+        return range(start, end)
+
+    def __candidate_numbers(self, literals):
+        '''Numbers of the entries which may contain all the literals (sorted)'''
+        query_trigrams = set()
+        for literal in literals:
+            query_trigrams |= trigrams(literal)
+        if not query_trigrams:
+            return range(len(self.__entries))
+        posting_lists = []
+        for trigram in query_trigrams:
+            numbers = self.__trigrams.get(trigram)
+            if numbers is None:
+                return []
+            posting_lists.append(numbers)
+        posting_lists.sort(key=len)
+        result = set(posting_lists[0])
+        for numbers in posting_lists[1:]:
+            result.intersection_update(numbers)
+            if not result:
+                break
+        return sorted(result)
+
+    def search(self, pattern, mode=SearchMode.SUBSTRING, architecture=None):
+        '''Entries whose names match the pattern sorted by names and architectures.
+        A regular expression matches anywhere in the name (as "re.search" does)
+        '''
+        mode = SearchMode(mode)
+        if mode is SearchMode.PREFIX:
+            numbers = self.__prefix_numbers(pattern)
+            matches = lambda name: True
+        elif mode is SearchMode.SUBSTRING:
+            numbers = self.__candidate_numbers([pattern])
+            matches = lambda name: pattern in name
+        else:
+            try:
+                regex = re.compile(pattern)
+            except re.error as err:
+                raise BadSearchPatternError(pattern, str(err))
+            numbers = self.__candidate_numbers(required_literals(pattern))
+            matches = lambda name: regex.search(name) is not None
+        # Errors of the pattern are raised at once, entries are yielded lazily
+        return (self.__entries[number] for number in numbers
+                if (architecture is None or self.__entries[number].architecture == architecture) and
+                matches(self.__names[number]))
+
+
+def search_index_filename(directory):
+    return os.path.join(directory, "enclosure-search-index")
+
+
+def search_index_sources(filenames):
+    return {filename: file_signature(filename) for filename in filenames}
+
+
+def save_search_index(index, filename):
+    temp_filename = filename + ".new"
+    with open(temp_filename, "wb") as file:
+        pickle.dump((SEARCH_INDEX_FORMAT, index), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def load_search_index(filename):
+    '''Returns None if there is no (readable) index'''
+    try:
+        with open(filename, "rb") as file:
+            index_format, index = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, ImportError):
+        return None
+    return index if index_format == SEARCH_INDEX_FORMAT else None
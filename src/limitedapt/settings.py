@@ -28,12 +28,13 @@ class BadSpaceAmount(SettingsImportError): pass
 
 class EnclosureRecord:
 
-    def __init__(self, filename, url):
+    def __init__(self, filename, url, delta_url=None):
         self.filename = filename
         self.url = url
+        self.delta_url = delta_url
 
     def __eq__(self, other):
-        return self.filename == other.filename and self.url == other.url
+        return self.filename == other.filename and self.url == other.url and self.delta_url == other.delta_url
 
 
 class Urls:
@@ -46,7 +47,9 @@ class Urls:
     def export_to_xml_element(self, parent):
         base_element = etree.SubElement(parent, "urls", {"enclosure-debug-mode" : False})
         for enclosure in self.enclosures:
-            etree.SubElement(base_element, "enclosure", filename=enclosure.filename, url=enclosure.url)
+            enclosure_element = etree.SubElement(base_element, "enclosure", filename=enclosure.filename, url=enclosure.url)
+            if enclosure.delta_url is not None:
+                enclosure_element.set("delta-url", enclosure.delta_url)
         etree.SubElement(base_element, "debconf-priorities", url=self.debconf_priorities)
 
     def import_from_xml_element(self, base_element):
@@ -56,7 +59,8 @@ class Urls:
         else:
             self.enclosure_debug_mode = debug_mode_attr == "True"
         for enclosure_element in base_element.findall("enclosure"):
-            self.enclosures.append(EnclosureRecord(enclosure_element.get("filename"), enclosure_element.get("url")))
+            self.enclosures.append(EnclosureRecord(enclosure_element.get("filename"), enclosure_element.get("url"),
+                                                   enclosure_element.get("delta-url")))
         if not self.enclosure_debug_mode and not self.enclosures:
             raise NoEnclosureSpecified("No enclosure specified")
         self.debconf_priorities = base_element.find("debconf-priorities").get("url")
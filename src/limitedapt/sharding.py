@@ -0,0 +1,137 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Splitting of per-package work (e. g. obtaining debconf priorities) between several hosts
+and merging of their results'''
+
+import zlib
+from .errors import Error
+from .debconf import *
+
+
+class ShardingError(Error): pass
+
+class BadShardSpec(ShardingError): pass
+
+
+def shard_of(name, count):
+    '''Index (from 1) of the shard the package belongs to. It depends on the package name only and
+    is the same in every process and on every host (unlike "hash")'''
+    return zlib.crc32(name.encode("utf-8")) % count + 1
+
+
+class Shard:
+    '''K-th of N disjoint slices of packages ("K/N", 1 <= K <= N)'''
+
+    def __init__(self, index, count):
+        if count < 1 or not 1 <= index <= count:
+            raise BadShardSpec('''Shard "{0}/{1}" does not exist'''.format(index, count))
+        self.__index = index
+        self.__count = count
+
+    @property
+    def index(self):
+        return self.__index
+
+    @property
+    def count(self):
+        return self.__count
+
+    def __str__(self):
+        return "{0}/{1}".format(self.index, self.count)
+
+    def __eq__(self, other):
+        return self.index == other.index and self.count == other.count
+
+    def __hash__(self):
+        return hash((self.index, self.count))
+
+    def __contains__(self, name):
+        return shard_of(name, self.count) == self.index
+
+    @staticmethod
+    def from_string(string):
+        try:
+            index, count = string.split("/")
+            return Shard(int(index), int(count))
+        except ValueError:
+            raise BadShardSpec('''Bad shard "{0}": it must be "K/N"'''.format(string))
+
+
+class PrioritiesConflict:
+    '''Package processed by several shards with different results'''
+
+    def __init__(self, package, states):
+        self.__package = package
+        self.__states = states
+
+    @property
+    def package(self):
+        return self.__package
+
+    @property
+    def states(self):
+        '''(source, state) pairs'''
+        return self.__states
+
+
+class PrioritiesMerge:
+    '''Merges priority lists of shards. Well processed state wins a badly processed one;
+    different well processed states of the same package are conflicts (the first one is kept)
+    '''
+
+    def __init__(self):
+        self.__merged = DebconfPriorities()
+        self.__sources = {}
+        self.__conflicts = {}
+
+    @property
+    def merged(self):
+        return self.__merged
+
+    @property
+    def conflicts(self):
+        return sorted(self.__conflicts.values(), key=lambda conflict: conflict.package)
+
+    def add(self, source, priorities):
+        for package, state in priorities.items():
+            if package not in self.__merged:
+                self.__merged[package] = state
+                self.__sources[package] = source
+                continue
+            present = self.__merged[package]
+            if present == state:
+                continue
+            if self.__merged.badly_processed(package):
+                self.__merged[package] = state
+                self.__sources[package] = source
+            elif state.status != Status.PROCESSING_ERROR:
+                conflict = self.__conflicts.get(package)
+                if conflict is None:
+                    conflict = PrioritiesConflict(package, [(self.__sources[package], present)])
+                    self.__conflicts[package] = conflict
+                conflict.states.append((source, state))
+
+    def coverage_gaps(self, packages, count):
+        '''Packages absent (or processed with error) in the merged list grouped by their shards:
+        {shard: sorted list of packages}. "packages" are "ConcretePackage"s expected to be processed
+        '''
+        gaps = {}
+        for package in packages:
+            if not self.__merged.well_processed(package):
+                gaps.setdefault(Shard(shard_of(package.name, count), count), []).append(package)
+        for missing in gaps.values():
+            missing.sort()
+        return gaps
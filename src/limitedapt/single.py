@@ -16,13 +16,12 @@
 #
 
 import functools
-import apt
 
 
 def run_once(func):
-    """Runs a function (without parameters) (successfully) only once.
+    '''Runs a function (without parameters) (successfully) only once.
     The running can be reset by setting the `has_run` attribute to False
-    """
+    '''
     @functools.wraps(func)
     def wrapper():
         if not wrapper.has_run:
@@ -33,7 +32,24 @@ def run_once(func):
     return wrapper
 
 
+def apt_cache_factory():
+    from .aptcache import AptCache
+    return AptCache()
+
+
+_cache_factory = apt_cache_factory
+
+
+def set_cache_factory(factory):
+    '''Makes `get_cache` return objects created by `factory` (a function without parameters)
+    instead of "apt.Cache". The cache that has already been created is dropped
+    '''
+    global _cache_factory
+    _cache_factory = factory
+    get_cache.has_run = False
+
+
 @run_once
 def get_cache():
-    return apt.Cache()
+    return _cache_factory()
 
@@ -0,0 +1,650 @@
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''In-memory package cache with synthetic (generated) packages.
+
+It needs neither libapt nor a Debian archive, so runners can be load-tested and profiled
+deterministically on any machine:
+
+    cache = generate_cache(100000, seed=1)
+    limitedapt.single.set_cache_factory(lambda: cache)
+'''
+
+import contextlib
+import enum
+import hashlib
+import random
+from .errors import Error
+from .cachebackend import *
+
+
+class SyntheticCacheError(Error): pass
+
+
+class SyntheticOrigin(OriginBackend):
+
+    def __init__(self, archive="stable", origin="Debian", trusted=True):
+        self.archive = archive
+        self.origin = origin
+        self.trusted = trusted
+
+
+class SyntheticBaseDependency:
+    '''Single alternative of a dependency ("apt.package.BaseDependency")'''
+
+    def __init__(self, cache, name, relation="", version=""):
+        self.__cache = cache
+        self.name = name
+        self.relation = relation
+        self.version = version
+
+    @property
+    def target_versions(self):
+        try:
+            candidate = self.__cache[self.name].candidate
+            return [candidate] if candidate is not None else []
+        except KeyError:
+            return []
+
+    @property
+    def installed_target_versions(self):
+        try:
+            installed = self.__cache[self.name].installed
+            return [installed] if installed is not None else []
+        except KeyError:
+            return []
+
+
+class SyntheticDependency:
+    '''Group of alternatives ("apt.package.Dependency")'''
+
+    def __init__(self, or_dependencies):
+        self.or_dependencies = or_dependencies
+
+    @property
+    def target_versions(self):
+        return [version for base in self.or_dependencies for version in base.target_versions]
+
+
+class SyntheticVersion(VersionBackend):
+
+    def __init__(self, package, version, architecture, size=0, installed_size=0, section="misc",
+                 priority="optional", tags=(), origins=None, depends=()):
+        self.__package = package
+        self.__version = version
+        self.__architecture = architecture
+        self.__size = size
+        self.__installed_size = installed_size
+        self.__section = section
+        self.__priority = priority
+        self.__tags = tuple(tags)
+        self.__origins = origins if origins is not None else [SyntheticOrigin()]
+        # List of alternative groups, each one is a tuple of package names
+        self.__depends = [tuple(group) for group in depends]
+
+    @property
+    def package(self):
+        return self.__package
+
+    @property
+    def version(self):
+        return self.__version
+
+    @property
+    def architecture(self):
+        return self.__architecture
+
+    @property
+    def origins(self):
+        return self.__origins
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def installed_size(self):
+        return self.__installed_size
+
+    @property
+    def section(self):
+        return self.__section
+
+    @property
+    def priority(self):
+        return self.__priority
+
+    @property
+    def tags(self):
+        return self.__tags
+
+    @property
+    def depends(self):
+        return self.__depends
+
+    @property
+    def record(self):
+        record = {"Package": self.package.shortname, "Version": self.version,
+                  "Architecture": self.architecture, "Section": self.section, "Priority": self.priority}
+        if self.__tags:
+            record["Tag"] = ", ".join(self.__tags)
+        return record
+
+    @property
+    def dependencies(self):
+        cache = self.package.cache
+        return [SyntheticDependency([SyntheticBaseDependency(cache, name) for name in group])
+                for group in self.__depends]
+
+    @property
+    def filename(self):
+        shortname = self.package.shortname
+        return "pool/main/{0}/{1}/{1}_{2}_{3}.deb".format(shortname[0], shortname,
+                                                          self.version.replace(":", "%3a"), self.architecture)
+
+    @property
+    def sha256(self):
+        return hashlib.sha256("{0} {1} {2}".format(self.package.shortname, self.version,
+                                                   self.architecture).encode()).hexdigest()
+
+    def __eq__(self, other):
+        return isinstance(other, SyntheticVersion) and self.package is other.package and \
+               self.version == other.version
+
+    def __hash__(self):
+        return hash((self.package.shortname, self.version))
+
+    def __str__(self):
+        return "{0}={1}".format(self.package.name, self.version)
+
+
+class SyntheticDpkgState(enum.Enum):
+    '''States of an installed package in dpkg status'''
+    INSTALLED = "installed"
+    UNPACKED = "unpacked"
+    HALF_CONFIGURED = "half-configured"
+    HALF_INSTALLED = "half-installed"
+
+
+class SyntheticPackage(PackageBackend):
+
+    # Possible marks
+    _INSTALL = "install"
+    _UPGRADE = "upgrade"
+    _REINSTALL = "reinstall"
+    _DELETE = "delete"
+
+    def __init__(self, cache, shortname, architecture, is_auto_installed=False, has_config_files=False):
+        self.__cache = cache
+        self.__shortname = shortname
+        self.__architecture = architecture
+        self.__candidate = None
+        self.__installed = None
+        self.__is_auto_installed = is_auto_installed
+        self.__has_config_files = has_config_files
+        self.__dpkg_state = SyntheticDpkgState.INSTALLED
+        self.__reinstall_required = False
+        self._mark = None
+        self._purge = False
+        self._auto = None
+
+    @property
+    def cache(self):
+        return self.__cache
+
+    @property
+    def shortname(self):
+        return self.__shortname
+
+    @property
+    def name(self):
+        if self.__architecture in (self.__cache.native_architecture, "all"):
+            return self.__shortname
+        return self.fullname
+
+    @property
+    def fullname(self):
+        return "{0}:{1}".format(self.__shortname, self.__architecture)
+
+    def architecture(self):
+        return self.__architecture
+
+    @property
+    def candidate(self):
+        return self.__candidate
+
+    @candidate.setter
+    def candidate(self, version):
+        self.__candidate = version
+
+    @property
+    def installed(self):
+        return self.__installed
+
+    @installed.setter
+    def installed(self, version):
+        self.__installed = version
+
+    @property
+    def is_installed(self):
+        return self.installed is not None
+
+    @property
+    def is_upgradable(self):
+        return self.is_installed and self.candidate is not None and self.installed.version != self.candidate.version
+
+    @property
+    def is_auto_installed(self):
+        return self.__is_auto_installed if self._auto is None else self._auto
+
+    @property
+    def has_config_files(self):
+        return self.__has_config_files
+
+    @property
+    def dpkg_state(self):
+        '''State of the installed version (it may be set to imitate interrupted dpkg)'''
+        return self.__dpkg_state
+
+    @dpkg_state.setter
+    def dpkg_state(self, state):
+        self.__dpkg_state = state
+
+    @property
+    def is_reinstall_required(self):
+        return self.__reinstall_required
+
+    @is_reinstall_required.setter
+    def is_reinstall_required(self, required):
+        self.__reinstall_required = required
+
+    @property
+    def is_configured(self):
+        return self.is_installed and self.__dpkg_state == SyntheticDpkgState.INSTALLED and not self.__reinstall_required
+
+    @property
+    def marked_install(self):
+        return self._mark == SyntheticPackage._INSTALL
+
+    @property
+    def marked_upgrade(self):
+        return self._mark == SyntheticPackage._UPGRADE
+
+    @property
+    def marked_delete(self):
+        return self._mark == SyntheticPackage._DELETE
+
+    @property
+    def marked_keep(self):
+        return self._mark is None
+
+    @property
+    def marked_reinstall(self):
+        return self._mark == SyntheticPackage._REINSTALL
+
+    @property
+    def marked_downgrade(self):
+        return False
+
+    @property
+    def _will_be_installed(self):
+        return self._mark in (SyntheticPackage._INSTALL, SyntheticPackage._UPGRADE) or \
+               (self.is_installed and self._mark in (None, SyntheticPackage._REINSTALL))
+
+    @property
+    def _future_version(self):
+        if self._mark in (SyntheticPackage._INSTALL, SyntheticPackage._UPGRADE):
+            return self.candidate
+        if self._mark == SyntheticPackage._DELETE:
+            return None
+        return self.installed
+
+    @property
+    def is_inst_broken(self):
+        version = self._future_version
+        if version is None:
+            return False
+        return not all(self.__cache._is_satisfied(group) for group in version.depends)
+
+    @property
+    def is_now_broken(self):
+        if self.installed is None:
+            return False
+        return not all(any(self.__cache._is_installed_now(name) for name in group)
+                       for group in self.installed.depends)
+
+    @property
+    def is_auto_removable(self):
+        return self.is_installed and self.is_auto_installed and not self.marked_delete and \
+               not self.__cache._is_required(self)
+
+    def mark_install(self, auto_fix=True, auto_inst=True, from_user=True):
+        if self.candidate is None:
+            raise SyntheticCacheError("Package '{0}' has no candidate".format(self.name))
+        if self.is_installed:
+            if self.is_upgradable:
+                self.__cache._set_mark(self, SyntheticPackage._UPGRADE)
+            elif self.marked_delete:
+                self.__cache._set_mark(self, None)
+        else:
+            self.__cache._set_mark(self, SyntheticPackage._INSTALL)
+            self._auto = not from_user
+        if auto_inst:
+            self.__cache._install_dependencies(self)
+
+    def mark_upgrade(self, from_user=True):
+        if self.is_upgradable:
+            self.mark_install(from_user=from_user)
+
+    def mark_delete(self, auto_fix=True, purge=False):
+        if self.is_installed:
+            self.__cache._set_mark(self, SyntheticPackage._DELETE)
+            self._purge = purge
+            if auto_fix:
+                self.__cache._delete_reverse_dependencies(self, purge)
+        else:
+            self.__cache._set_mark(self, None)
+
+    def mark_reinstall(self):
+        if self.is_installed:
+            self.__cache._set_mark(self, SyntheticPackage._REINSTALL)
+
+    def mark_keep(self):
+        self.__cache._set_mark(self, None)
+
+    def mark_auto(self, auto=True):
+        self._auto = auto
+
+    def _reset(self):
+        self._mark = None
+        self._purge = False
+        self._auto = None
+
+    def _apply(self):
+        if self._mark in (SyntheticPackage._INSTALL, SyntheticPackage._UPGRADE):
+            self.installed = self.candidate
+        elif self._mark == SyntheticPackage._DELETE:
+            self.installed = None
+            self.__has_config_files = self.__has_config_files and not self._purge
+        if self._auto is not None:
+            self.__is_auto_installed = self._auto
+        if self._mark is not None:
+            # dpkg has processed the package completely
+            self.__dpkg_state = SyntheticDpkgState.INSTALLED
+            self.__reinstall_required = False
+        self._reset()
+
+    def __lt__(self, other):
+        return self.name < other.name
+
+    def __repr__(self):
+        return "<SyntheticPackage: name:'{0}' architecture='{1}'>".format(self.shortname, self.__architecture)
+
+
+class SyntheticCache(CacheBackend):
+
+    def __init__(self, native_architecture="amd64"):
+        self.native_architecture = native_architecture
+        self.dpkg_journal_dirty = False
+        self.__packages = {}
+        self.__sorted = None
+        self.__reverse_dependencies = None
+        self.__changed = set()
+        self.update_count = 0
+        self.commit_count = 0
+
+    def add_package(self, package):
+        if package.shortname in self.__packages:
+            raise SyntheticCacheError("Package '{0}' is already in the cache".format(package.shortname))
+        self.__packages[package.shortname] = package
+        self.__sorted = None
+        self.__reverse_dependencies = None
+
+    def create_package(self, name, depends=(), installed=False, auto=False, architecture="amd64", version="1.0-1",
+                       trusted=True):
+        '''Adds a new package with a candidate depending on "depends" (groups of alternative names).
+        The candidate is also the installed version if "installed" is true
+        '''
+        pkg = SyntheticPackage(self, name, architecture, is_auto_installed=auto)
+        pkg.candidate = SyntheticVersion(pkg, version, architecture, 100, 300, origins=[SyntheticOrigin(trusted=trusted)],
+                                         depends=depends)
+        if installed:
+            pkg.installed = pkg.candidate
+        self.add_package(pkg)
+        return pkg
+
+    def __lookup(self, key):
+        name, _, arch = key.partition(":")
+        pkg = self.__packages[name]
+        if arch and arch not in (pkg.architecture(), "all", self.native_architecture):
+            raise KeyError(key)
+        return pkg
+
+    def __getitem__(self, key):
+        try:
+            return self.__lookup(key)
+        except KeyError:
+            raise KeyError("The cache has no package named '{0}'".format(key))
+
+    def __contains__(self, key):
+        try:
+            self.__lookup(key)
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        if self.__sorted is None:
+            self.__sorted = sorted(self.__packages.values(), key=lambda pkg: pkg.name)
+        return iter(self.__sorted)
+
+    def __len__(self):
+        return len(self.__packages)
+
+    def get_changes(self):
+        return sorted((self.__packages[name] for name in self.__changed), key=lambda pkg: pkg.name)
+
+    def actiongroup(self):
+        return contextlib.nullcontext()
+
+    def clear(self):
+        for name in self.__changed:
+            self.__packages[name]._reset()
+        for pkg in self.__packages.values():
+            pkg._auto = None
+        self.__changed.clear()
+
+    def upgrade(self, dist_upgrade=False):
+        for pkg in self:
+            if pkg.is_upgradable:
+                pkg.mark_install(auto_inst=dist_upgrade, from_user=False)
+
+    def update(self, fetch_progress=None):
+        self.update_count += 1
+
+    def open(self, progress=None):
+        self.clear()
+
+    def fetch_archives(self, progress=None, fetcher=None):
+        return True
+
+    def commit(self, fetch_progress=None, install_progress=None):
+        for name in self.__changed:
+            self.__packages[name]._apply()
+        for pkg in self.__packages.values():
+            if pkg._auto is not None:
+                pkg._apply()
+        self.__changed.clear()
+        self.__reverse_dependencies = None
+        self.commit_count += 1
+        return True
+
+    @property
+    def required_download(self):
+        return sum(pkg.candidate.size for pkg in self.get_changes() if pkg.marked_install or pkg.marked_upgrade)
+
+    @property
+    def required_space(self):
+        space = 0
+        for pkg in self.get_changes():
+            if pkg.marked_install:
+                space += pkg.candidate.installed_size
+            elif pkg.marked_upgrade:
+                space += pkg.candidate.installed_size - pkg.installed.installed_size
+            elif pkg.marked_delete:
+                space -= pkg.installed.installed_size
+        return space
+
+    def _set_mark(self, pkg, mark):
+        pkg._mark = mark
+        if mark is None:
+            self.__changed.discard(pkg.shortname)
+        else:
+            self.__changed.add(pkg.shortname)
+
+    def _is_installed_now(self, name):
+        pkg = self.__packages.get(name)
+        return pkg is not None and pkg.is_installed
+
+    def _is_satisfied(self, group):
+        for name in group:
+            pkg = self.__packages.get(name)
+            if pkg is not None and pkg._will_be_installed:
+                return True
+        return False
+
+    def _install_dependencies(self, pkg):
+        stack = [pkg]
+        while stack:
+            current = stack.pop()
+            for group in current.candidate.depends:
+                if self._is_satisfied(group):
+                    continue
+                for name in group:
+                    dependency = self.__packages.get(name)
+                    if dependency is not None and dependency.candidate is not None:
+                        dependency.mark_install(auto_inst=False, from_user=False)
+                        stack.append(dependency)
+                        break
+
+    def __get_reverse_dependencies(self):
+        if self.__reverse_dependencies is None:
+            reverse = {}
+            for pkg in self.__packages.values():
+                for version in {pkg.installed, pkg.candidate}:
+                    if version is not None:
+                        for group in version.depends:
+                            for name in group:
+                                reverse.setdefault(name, set()).add(pkg.shortname)
+            self.__reverse_dependencies = reverse
+        return self.__reverse_dependencies
+
+    def _delete_reverse_dependencies(self, pkg, purge):
+        reverse = self.__get_reverse_dependencies()
+        stack = [pkg]
+        while stack:
+            current = stack.pop()
+            for name in reverse.get(current.shortname, ()):
+                dependent = self.__packages[name]
+                version = dependent._future_version
+                if version is None:
+                    continue
+                if not all(self._is_satisfied(group) for group in version.depends):
+                    if dependent.is_installed:
+                        self._set_mark(dependent, SyntheticPackage._DELETE)
+                        dependent._purge = purge
+                        stack.append(dependent)
+                    else:
+                        self._set_mark(dependent, None)
+
+    def _is_required(self, pkg):
+        for name in self.__get_reverse_dependencies().get(pkg.shortname, ()):
+            dependent = self.__packages[name]
+            version = dependent._future_version
+            if version is not None and any(pkg.shortname in group for group in version.depends):
+                return True
+        return False
+
+
+SECTIONS = ["admin", "devel", "doc", "games", "graphics", "libs", "net", "python", "sound", "text", "utils", "x11"]
+PRIORITIES = ["required", "important", "standard", "optional", "optional", "optional", "extra"]
+TAGS = ["role::program", "role::shared-lib", "role::documentation", "role::app-data", "role::devel-lib",
+        "interface::x11", "interface::commandline", "interface::daemon", "use::gameplaying", "use::editing",
+        "admin::configuring", "admin::logging", "security::firewall", "implemented-in::c", "implemented-in::python"]
+NAME_PREFIXES = ["", "", "", "lib", "lib", "python3-", "fonts-", "gir1.2-", "golang-", "r-cran-"]
+NAME_STEMS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett",
+              "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango"]
+
+
+def generate_cache(package_count, seed=0, native_architecture="amd64", manual_ratio=0.02, upgradable_ratio=0.05,
+                   max_dependencies=4, alternative_ratio=0.1, arch_all_ratio=0.2, untrusted_ratio=0.0):
+    '''Generates a cache of `package_count` packages with a dependency graph (without cycles).
+
+    The same arguments always give the same cache. Packages tend to depend on "low-level" ones
+    (as real packages depend on "libc6"), so dependency closures stay moderate. Every dependency
+    of an installed package is installed (automatically if nobody has installed it manually)
+    '''
+    rnd = random.Random(seed)
+    cache = SyntheticCache(native_architecture)
+
+    names = []
+    for index in range(package_count):
+        names.append("{0}{1}{2}".format(rnd.choice(NAME_PREFIXES), rnd.choice(NAME_STEMS), index))
+
+    # Groups of alternatives as indices of packages
+    depends = []
+    for index in range(package_count):
+        groups = []
+        if index > 0:
+            for _ in range(rnd.randint(0, max_dependencies)):
+                # Biased towards low indices that are "basic" packages
+                target = int(index * rnd.random() ** 3)
+                alternative = int(index * rnd.random() ** 3)
+                if rnd.random() < alternative_ratio and alternative != target:
+                    groups.append((target, alternative))
+                else:
+                    groups.append((target,))
+        depends.append(groups)
+
+    manual = [rnd.random() < manual_ratio for _ in range(package_count)]
+    installed = list(manual)
+    for index in reversed(range(package_count)):
+        if installed[index]:
+            for group in depends[index]:
+                installed[group[0]] = True
+
+    for index in range(package_count):
+        name = names[index]
+        name_depends = [tuple(names[target] for target in group) for group in depends[index]]
+        arch = "all" if rnd.random() < arch_all_ratio else native_architecture
+        pkg = SyntheticPackage(cache, name, arch, is_auto_installed=installed[index] and not manual[index],
+                               has_config_files=installed[index] and rnd.random() < 0.3)
+        origins = [SyntheticOrigin(trusted=rnd.random() >= untrusted_ratio)]
+        size = rnd.randint(1000, 2000000)
+        tags = rnd.sample(TAGS, rnd.randint(0, 3))
+        candidate_version = "{0}.{1}-{2}".format(rnd.randint(0, 9), rnd.randint(0, 30), rnd.randint(1, 5))
+        pkg.candidate = SyntheticVersion(pkg, candidate_version, arch, size, 3 * size, rnd.choice(SECTIONS),
+                                         rnd.choice(PRIORITIES), tags, origins, name_depends)
+        if installed[index]:
+            if rnd.random() < upgradable_ratio:
+                pkg.installed = SyntheticVersion(pkg, candidate_version + "~old1", arch, size, 3 * size,
+                                                 pkg.candidate.section, pkg.candidate.priority, tags, origins,
+                                                 name_depends)
+            else:
+                pkg.installed = pkg.candidate
+        cache.add_package(pkg)
+
+    return cache
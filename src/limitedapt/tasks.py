@@ -16,11 +16,24 @@
 #
 
 from lxml import etree
-import apt.package
+from .errors import Error
 from .packages import *
 from .single import get_cache
 
 
+class TasksError(Error): pass
+
+class InvalidOperationSuffix(TasksError):
+
+    def __init__(self, operation):
+        super().__init__(operation)
+        self.__operation = operation
+
+    @property
+    def operation(self):
+        return self.__operation
+
+
 class Tasks:
 
     def __init__(self):
@@ -31,6 +44,30 @@ class Tasks:
         self.markauto = []
         self.unmarkauto = []
 
+    def add_suffixed_operation(self, operation):
+        '''Adds a package with one of the suffixes: "+", "-", "^", "_", "%M", "%m" (similarly to ones in aptitude)'''
+        if operation.endswith('+'):
+            self.install.append(operation[:-1])
+        elif operation.endswith('-'):
+            self.remove.append(operation[:-1])
+        elif operation.endswith('^'):
+            self.physically_remove.append(operation[:-1])
+        elif operation.endswith('_'):
+            self.purge.append(operation[:-1])
+        elif operation.endswith('%M'):
+            self.markauto.append(operation[:-2])
+        elif operation.endswith('%m'):
+            self.unmarkauto.append(operation[:-2])
+        else:
+            raise InvalidOperationSuffix(operation)
+
+    @staticmethod
+    def from_suffixed_operations(operations):
+        tasks = Tasks()
+        for operation in operations:
+            tasks.add_suffixed_operation(operation)
+        return tasks
+
 
 class OnetypeRealTasks:
 
@@ -47,11 +84,10 @@ class OnetypeRealTasks:
         return bool(self.__container)
 
     def __contains__(self, package):
-        if isinstance(package, apt.package.Package):
-            cache = get_cache()
-            return ConcretePackage(package.shortname, package.candidate.architecture) in self.__container
-        elif isinstance(package, ConcretePackage):
+        if isinstance(package, ConcretePackage):
             return package in self.__container
+        elif hasattr(package, "shortname") and hasattr(package, "candidate"):
+            return ConcretePackage(package.shortname, package.candidate.architecture) in self.__container
         else:
             raise TypeError("ConcretePackage or apt.package.Package instance is required")
 
@@ -61,7 +61,7 @@ class UpdateTimes:
 
     @property
     def priorities(self):
-        return self.__enclosure
+        return self.__priorities
 
     @priorities.setter
     def priorities(self, priorities):
@@ -90,8 +90,9 @@ class UpdateTimes:
             self.distro = str_to_time(distro_element.get("time"))
             enclosure_element = root.find("enclosure")
             self.enclosure = str_to_time(enclosure_element.get("time"))
+            # Files written by older versions have no "priorities" element
             priorities_element = root.find("priorities")
-            self.priorities = str_to_time(priorities_element.get("time"))
+            self.priorities = str_to_time(priorities_element.get("time")) if priorities_element is not None else None
         except (ValueError, LookupError, etree.XMLSyntaxError) as err:
             raise UpdateTimesImportSyntaxError("Syntax error has been appeared during importing "
                                                "last time of updating from xml: " + str(err))
\ No newline at end of file
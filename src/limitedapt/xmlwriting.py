@@ -0,0 +1,55 @@
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Incremental writing of XML documents: children of the root element are serialized one by one
+as they are generated instead of building the whole tree in memory'''
+
+import itertools
+import os
+from lxml import etree
+
+
+def _write(output, root_tag, root_attributes, elements, pretty):
+    first = next(elements, None)
+    with etree.xmlfile(output, encoding="UTF-8") as xmlfile:
+        xmlfile.write_declaration()
+        if first is None:
+            xmlfile.write(etree.Element(root_tag, root_attributes))
+        else:
+            with xmlfile.element(root_tag, root_attributes):
+                for element in itertools.chain((first,), elements):
+                    if pretty:
+                        etree.indent(element, space="  ", level=1)
+                        xmlfile.write("\n  ")
+                    xmlfile.write(element)
+                if pretty:
+                    xmlfile.write("\n")
+    if pretty:
+        output.write(b"\n")
+
+
+def write_xml_document(file, root_tag, elements, root_attributes=None, pretty=True):
+    '''Writes XML document whose root element "root_tag" contains "elements" (any iterable of
+    etree elements; every one of them may be dropped after it has been written). Pretty output
+    is the same as "ElementTree.write" with "pretty_print=True" gives. File is a filename or
+    a binary file object
+    '''
+    elements = iter(elements)
+    root_attributes = root_attributes or {}
+    if isinstance(file, (str, bytes, os.PathLike)):
+        with open(file, "wb") as output:
+            _write(output, root_tag, root_attributes, elements, pretty)
+    else:
+        _write(file, root_tag, root_attributes, elements, pretty)
@@ -21,15 +21,48 @@
 # THE SOFTWARE.
 
 import sys
+import os
 import subprocess
+from limitedapt import constants
 
 
 PRIVILEGED_EXECUTABLE = '/usr/local/sbin/limited-apt_privileged'
 
+# Subcommands which only read world-readable state: they are run in this process
+# by the calling user instead of escalating through sudo
+READ_ONLY_SUBCOMMANDS = frozenset(['print-enclosure', 'search-enclosure', 'list-of-mine', 'owners-of',
+                                   'ownership-report'])
+# Common options followed by their values
+OPTIONS_WITH_VALUES = frozenset(['--profile-output', '--profile-format', '--cprofile'])
+
+
+def subcommand_of(arguments):
+    '''The first positional argument or None'''
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument == '--':
+            return next(arguments, None)
+        if argument in OPTIONS_WITH_VALUES:
+            next(arguments, None)
+        elif not argument.startswith('-'):
+            return argument
+    return None
+
+
+def may_run_unprivileged(arguments):
+    return subcommand_of(arguments) in READ_ONLY_SUBCOMMANDS and \
+           os.environ.get('LIMITED_APT_ALWAYS_ESCALATE') is None and \
+           os.access(constants.PATH_TO_PROGRAM_VARIABLE, os.R_OK | os.X_OK)
+
 
 def main():
+    if may_run_unprivileged(sys.argv[1:]):
+        # The privileged script lies beside this one (sys.path[0] follows symbolic links)
+        import privileged_main
+        privileged_main.privileged_main(os.getuid(), READ_ONLY_SUBCOMMANDS)
+        # The arguments have been parsed otherwise than guessed here: the subcommand needs privileges
     exitcode = subprocess.call(['/usr/bin/sudo', PRIVILEGED_EXECUTABLE] + sys.argv[1:])
     sys.exit(exitcode)
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
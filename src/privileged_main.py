@@ -22,7 +22,11 @@
 
 import sys
 import os
+import pwd
 import argparse
+import itertools
+import atexit
+import cProfile
 import importlib.util
 import apt
 import apt.progress.base
@@ -32,9 +36,16 @@ from limitedapt.tasks import *
 from limitedapt.errors import *
 from limitedapt.updatetime import *
 from limitedapt.download import DownloadError
+from limitedapt.feeds import FeedError
 from limitedapt.runners import *
+from limitedapt.planning import WhatIfPlanner
+from limitedapt.batch import BatchRunner, BatchSyntaxError, parse_batch
+from limitedapt.plancache import NoResolvedPlanError, StaleResolvedPlanError
 from limitedapt.constants import *
 from limitedapt.debconf import DebconfshowParsingError
+from limitedapt.profiling import Profiler
+from limitedapt.output import *
+from limitedapt.search import SearchMode, BadSearchPatternError
 from exitcodes import ExitCodes
 import consoleui
 
@@ -46,13 +57,56 @@ PROGRAM_NAME = 'limited-apt'
 def print_error(*args):
     print(*args, file=sys.stderr)
 
-def privileged_main():
-    
-    try:
-        user_id = int(os.environ["SUDO_UID"])
-    except:
-        print_error('This privileged script has been run incorrectly')
-        sys.exit(ExitCodes.PRIVILEGED_SCRIPT_HAS_BEEN_RUN_INCORRECTLY.value)
+def run_as_user(user_id, function):
+    '''Runs the function with the privileges of the user: files he names must not be opened by root.
+    If the script is run by sudo the function is run in a child process which drops root privileges'''
+    if os.geteuid() != 0 or user_id == 0:
+        function()
+        return
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            user = pwd.getpwuid(user_id)
+            os.setgroups(os.getgrouplist(user.pw_name, user.pw_gid))
+            os.setgid(user.pw_gid)
+            os.setuid(user_id)
+            function()
+            status = 0
+        except Exception as err:
+            print_error('Error: {0}'.format(err))
+        finally:
+            sys.stderr.flush()
+            os._exit(status)
+    os.waitpid(pid, 0)
+
+def finish_profiling(profiler, args, python_profile, user_id):
+    if python_profile is not None:
+        python_profile.disable()
+        run_as_user(user_id, lambda: python_profile.dump_stats(args.cprofile))
+    if args.profile:
+        print_error('Profile of the run:')
+        for line in profiler.format_phases():
+            print_error(line)
+    if args.profile_output is not None:
+        if args.profile_format == 'chrome':
+            run_as_user(user_id, lambda: profiler.export_to_chrome_trace(args.profile_output))
+        else:
+            run_as_user(user_id, lambda: profiler.export_to_json(args.profile_output))
+
+def privileged_main(user_id=None, allowed_subcommands=None):
+    '''"user_id" is given when read-only subcommands are run in the process of the user himself,
+    otherwise the script is run by sudo. Returns (without doing anything) only if the subcommand
+    is not one of "allowed_subcommands"'''
+
+    if user_id is None:
+        try:
+            user_id = int(os.environ["SUDO_UID"])
+        except:
+            print_error('This privileged script has been run incorrectly')
+            sys.exit(ExitCodes.PRIVILEGED_SCRIPT_HAS_BEEN_RUN_INCORRECTLY.value)
         
     # Create parser
     
@@ -70,6 +124,12 @@ def privileged_main():
     parser.add_argument('-v', '--verbose', action='store_true', help='Display extra information.')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='Debugging mode. Print detailed information on every action.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print how long every phase (state loading, resolution, checks, commit etc.) has taken.')
+    parser.add_argument('--profile-output', metavar='FILE', help='Write timings of the phases to the file.')
+    parser.add_argument('--profile-format', choices=['json', 'chrome'], default='json',
+                        help='Format of "--profile-output" file: plain JSON or Chrome trace event format.')
+    parser.add_argument('--cprofile', metavar='FILE', help='Profile the whole run by cProfile and write its stats to the file.')
     parser.add_argument('--version', action='version', version='%(prog)s '+SOFTWARE_VERSION)
 
     subparsers = parser.add_subparsers(dest='subcommand', title='command', description='valid commands')
@@ -79,17 +139,52 @@ def privileged_main():
                           help='Download (update) lists of new/upgradable packages and the list (subset) \
                           of non-system packages ordinary user can install (enclosure).', add_help=False)
      
+    # options of the commands printing lists of packages
+    parent_output_parser = argparse.ArgumentParser(add_help=False)
+    parent_output_parser.add_argument('--format', choices=[str(output_format) for output_format in OutputFormat],
+                                      default=str(OutputFormat.PLAIN),
+                                      help='Output format: lines of names, NUL-separated names or JSON lines '
+                                           '(objects with "name", "architecture" etc.).')
+
     # create the parser for the "print-enclosure" command
-    subparsers.add_parser('print-enclosure', help='Print enclosure (the list of non-system packages ordinary user can install).')
+    printenclosure_parser = subparsers.add_parser('print-enclosure', parents=[parent_output_parser],
+                                                  help='Print enclosure (the list of non-system packages ordinary user can install).')
+    printenclosure_parser.add_argument('-i', '--installable', action='store_true',
+                                       help='Print only packages which can be installed together with their dependencies.')
+
+    # create the parser for the "search-enclosure" command
+    searchenclosure_parser = subparsers.add_parser('search-enclosure', parents=[parent_output_parser],
+                                                   help='Search the enclosure for packages by names (substrings of them '
+                                                        'by default).')
+    searchenclosure_parser.add_argument('pattern', help='part of the package names to search for')
+    searchmode_group = searchenclosure_parser.add_mutually_exclusive_group()
+    searchmode_group.add_argument('-p', '--prefix', dest='search_mode', action='store_const', const=SearchMode.PREFIX,
+                                  default=SearchMode.SUBSTRING, help='Search for names beginning with the pattern.')
+    searchmode_group.add_argument('-e', '--regex', dest='search_mode', action='store_const', const=SearchMode.REGEX,
+                                  help='The pattern is a regular expression matching any part of the names.')
+    searchenclosure_parser.add_argument('--arch', help='Print only packages of this architecture.')
+    installed_group = searchenclosure_parser.add_mutually_exclusive_group()
+    installed_group.add_argument('--installed', dest='installed', action='store_const', const=True,
+                                 help='Print only installed packages.')
+    installed_group.add_argument('--not-installed', dest='installed', action='store_const', const=False,
+                                 help='Print only not installed packages.')
 
     # create the parser for the "list-of-mine" command
-    subparsers.add_parser('list-of-mine',
-                          help='Print list of the packages installed (or unmarked auto) by you. Has not subparameters.',
-                          add_help=False)
+    listofmine_parser = subparsers.add_parser('list-of-mine', parents=[parent_output_parser],
+                                              help='Print list of the packages installed (or unmarked auto) by you.')
+    listofmine_parser.add_argument('-u', '--unsorted', action='store_true',
+                                   help='Print packages as they are found instead of sorting them first.')
 
     # create the parser for the "owners-of" command
-    ownersof_parser = subparsers.add_parser('owners-of', help='Print list of users who owns package.', add_help=False)
-    ownersof_parser.add_argument('package', help='package name')
+    ownersof_parser = subparsers.add_parser('owners-of', parents=[parent_output_parser],
+                                            help='Print list of users who owns package (or every one of packages).')
+    ownersof_parser.add_argument('packages', nargs='*', metavar='package', help='package name')
+    ownersof_parser.add_argument('--stdin', action='store_true',
+                                 help='Read package names (separated by whitespaces) from the standard input too.')
+
+    # create the parser for the "ownership-report" command
+    subparsers.add_parser('ownership-report', parents=[parent_output_parser],
+                          help='Print owners of every installed package.')
 
     # Create parsers for "major" (modification) operations
 
@@ -118,28 +213,30 @@ def privileged_main():
                                   'markauto' : 'Mark packages as having been automatically installed.',
                                   'unmarkauto' : 'Mark packages as having been manually installed by you.'}
     
-    def add_unsuffixed_operation_to_tasks(operation, tasks):
-        if operation.endswith('+'):
-            tasks.install.append(operation[:-1])
-        elif operation.endswith('-'):
-            tasks.remove.append(operation[:-1])
-        elif operation.endswith('^'):
-            tasks.physically_remove.append(operation[:-1])
-        elif operation.endswith('_'):
-            tasks.purge.append(operation[:-1])
-        elif operation.endswith('%M'):
-            tasks.markauto.append(operation[:-2])
-        elif operation.endswith('%m'):
-            tasks.unmarkauto.append(operation[:-2])
-        else:
-            print_error('''Error: invalid operation on the suffix''')
-            sys.exit(ExitCodes.INVALID_OPERATION_ON_THE_SUFFIX.value)
-        
     diverse_parser = subparsers.add_parser('diverse', parents=[parent_operation_parser])
     diverse_parser.add_argument('package_operations', nargs='*', metavar='operation',
                                 help='''a package with one of the suffixes: "+", "-", "^", "_", "%M", "%m" \
                                 (similarly to ones in aptitude, see 'man {0}' for details)'''.format(PROGRAM_NAME))
     
+    plan_parser = subparsers.add_parser('plan', parents=[parent_operation_parser],
+                                        help='Check whether sets of operations are allowed without performing them.')
+    plan_parser.add_argument('task_sets', nargs='*', metavar='task-set',
+                             help='''operations of a set separated by spaces (as for "diverse" subcommand); \
+                             sets are read from the standard input one per line if none is given''')
+
+    applyplan_parser = subparsers.add_parser('apply-plan', parents=[parent_operation_parser],
+                                             help='Perform operations planned by your last simulation without resolving them anew.')
+    applyplan_parser.add_argument('package_operations', nargs='*', metavar='operation',
+                                  help='''operations of the simulation (as for "diverse" subcommand); \
+                                  the plan must be made for them if they are given''')
+
+    batch_parser = subparsers.add_parser('batch', parents=[parent_operation_parser],
+                                         help='Perform many operations one after another in one process.')
+    batch_parser.add_argument('file', nargs='?', default='-',
+                              help='''file with an operation per line: a subcommand with packages ("install foo bar"), \
+                              "safe-upgrade", "full-upgrade" or packages with suffixes (as for "diverse" subcommand); \
+                              the standard input by default''')
+
     # create the parser for the "safe-uprade" command
     #TODO: Is this explanation (help string) right in the circumstances of limited-apt utility?
     subparsers.add_parser('safe-upgrade', parents=[parent_operation_parser], help='Perform a safe upgrade.',
@@ -162,9 +259,19 @@ def privileged_main():
     # Parse and analyse arguments
     
     args = parser.parse_args(sys.argv[1:])
-    
+    if allowed_subcommands is not None and args.subcommand not in allowed_subcommands:
+        return
+
     display_modes = DisplayModes(args.show_arch, args.verbose, args.debug)
 
+    profiler = Profiler(enabled=args.profile or args.profile_output is not None)
+    python_profile = None
+    if args.cprofile is not None:
+        python_profile = cProfile.Profile()
+        python_profile.enable()
+    if profiler.enabled or python_profile is not None:
+        atexit.register(finish_profiling, profiler, args, python_profile, user_id)
+
     try:
         executable_name = sys.argv[0]
         if executable_name.startswith("/usr/local/"):
@@ -192,13 +299,14 @@ def privileged_main():
         spec.loader.exec_module(settings.updatetime_module)
 
         if args.subcommand in operation_subcommands_dict.keys() | {'safe-upgrade', 'full-upgrade', 'diverse',
-                                                                   'fix-interrupted', 'ignore-interrupted'}:
+                                                                   'apply-plan', 'fix-interrupted',
+                                                                   'ignore-interrupted'}:
             work_modes = WorkModes(args.remove_dependencies, args.force, args.purge_unused, args.fatal_errors,
                                    args.assume_yes, args.simulate)
             # TODO: Use "apt.progress.FetchProgress()" when it has been implemented
             progresses = Progresses(None, apt.progress.text.AcquireProgress(), apt.progress.base.InstallProgress())
             runner = ModificationRunner(settings, user_id, display_modes, work_modes, consoleui.ErrorHandlers(),
-                                        consoleui.Applying(), progresses, sys.stderr)
+                                        consoleui.Applying(), progresses, sys.stderr, profiler)
             if args.subcommand == 'safe-upgrade':
                 runner.upgrade(full_upgrade=False)
             elif args.subcommand == 'full-upgrade':
@@ -207,6 +315,9 @@ def privileged_main():
                 runner.fix_interrupted()
             elif args.subcommand == 'ignore-interrupted':
                 runner.ignore_interrupted()
+            elif args.subcommand == 'apply-plan':
+                runner.apply_resolved_plan(Tasks.from_suffixed_operations(args.package_operations)
+                                           if args.package_operations else None)
             else:
                 tasks = Tasks()
                 if args.subcommand == 'install':
@@ -222,29 +333,85 @@ def privileged_main():
                 elif args.subcommand == 'unmarkauto':
                     tasks.unmarkauto = args.packages
                 elif args.subcommand == 'diverse':
-                    for operation in args.package_operations:
-                        add_unsuffixed_operation_to_tasks(operation, tasks)
+                    tasks = Tasks.from_suffixed_operations(args.package_operations)
                 runner.perform_operations(tasks)
+        elif args.subcommand == 'batch':
+            if args.file == '-':
+                if not args.assume_yes and not args.simulate:
+                    parser.error('operations from the standard input need "--assume-yes" (or "--simulate")')
+                operations = parse_batch(sys.stdin)
+            else:
+                if not os.path.exists(args.file):
+                    raise FileNotExist(args.file)
+                with open(args.file) as file:
+                    operations = parse_batch(file)
+            work_modes = WorkModes(args.remove_dependencies, args.force, args.purge_unused, args.fatal_errors,
+                                   args.assume_yes, args.simulate)
+            progresses = Progresses(None, apt.progress.text.AcquireProgress(), apt.progress.base.InstallProgress())
+            runner = BatchRunner(settings, user_id, display_modes, work_modes, consoleui.ErrorHandlers(),
+                                 consoleui.Applying(), progresses, sys.stderr, profiler)
+            total = 0.0
+            for result in runner.run_all(operations):
+                total += result.seconds
+                print('[line {0}] {1}: {2} in {3:.3f} s'.format(result.operation.line_number, result.operation.text,
+                                                                result.outcome, result.seconds), flush=True)
+            print('{0} operations in {1:.3f} s'.format(len(operations), total))
+        elif args.subcommand == 'plan':
+            work_modes = WorkModes(args.remove_dependencies, args.force, args.purge_unused, fatal_errors=False,
+                                   assume_yes=True, simulate=True)
+            task_sets = args.task_sets or [line for line in sys.stdin if line.strip()]
+            tasks_list = [Tasks.from_suffixed_operations(task_set.split()) for task_set in task_sets]
+            planner = WhatIfPlanner(settings, user_id, display_modes, work_modes, sys.stderr, profiler)
+            all_allowed = True
+            for task_set, verdict in zip(task_sets, planner.plan_all(tasks_list)):
+                print('{0}: {1}'.format(task_set.strip(), 'allowed' if verdict.allowed else 'rejected'))
+                for message in verdict.messages:
+                    print('    {0}'.format(message))
+                all_allowed = all_allowed and verdict.allowed
+            if not all_allowed:
+                sys.exit(ExitCodes.SYSTEM_COMPOSING_BY_RESOLVER.value)
         elif args.subcommand == 'update':
-            runner = UpdationRunner(settings, user_id, display_modes, None, sys.stderr)
+            runner = UpdationRunner(settings, user_id, display_modes, None, sys.stderr, profiler)
             runner.update()
-        elif args.subcommand in ('print-enclosure', 'list-of-mine', 'owners-of'):
-            runner = PrintRunner(settings, user_id, display_modes, sys.stderr)
-            if args.subcommand == 'print-enclosure':
-                if display_modes.wordy():
-                    print('Packages you ({0}) may install:'.format(runner.username))
-                for name in runner.get_printed_enclosure():
-                    print(name)
-            elif args.subcommand == 'list-of-mine':
-                if display_modes.wordy():
-                    print('Packages installed by you ({0}):'.format(runner.username))
-                for name in runner.get_printed_list_of_mine():
-                    print(name)
-            elif args.subcommand == 'owners-of':
+        elif args.subcommand in ('print-enclosure', 'search-enclosure', 'list-of-mine', 'owners-of',
+                                 'ownership-report'):
+            runner = PrintRunner(settings, user_id, display_modes, sys.stderr, profiler)
+            output_format = OutputFormat(args.format)
+            if args.subcommand == 'owners-of' and len(args.packages) == 1 and not args.stdin and \
+                    output_format is OutputFormat.PLAIN:
                 if display_modes.wordy():
-                    print('Users that has install "{0}" package:'.format(args.package))
-                for user in runner.get_owners_of(args.package):
+                    print('Users that has install "{0}" package:'.format(args.packages[0]))
+                for user in sorted(runner.get_owners_of(args.packages[0])):
                     print(user)
+            else:
+                if args.subcommand == 'print-enclosure':
+                    header = 'Packages you ({0}) may install:'.format(runner.username)
+                    entries = runner.get_enclosure_entries(args.installable)
+                elif args.subcommand == 'search-enclosure':
+                    header = 'Packages you ({0}) may install matching "{1}":'.format(runner.username, args.pattern)
+                    entries = runner.get_search_entries(args.pattern, args.search_mode, args.arch, args.installed)
+                elif args.subcommand == 'list-of-mine':
+                    header = 'Packages installed by you ({0}):'.format(runner.username)
+                    entries = runner.get_list_of_mine_entries(not args.unsorted)
+                elif args.subcommand == 'owners-of':
+                    header = 'Users that has install the packages:'
+                    package_names = args.packages
+                    if args.stdin:
+                        package_names = itertools.chain(package_names,
+                                                        (name for line in sys.stdin for name in line.split()))
+                    entries = runner.get_owners_entries(package_names)
+                else:
+                    header = 'Owners of the installed packages:'
+                    entries = runner.get_ownership_report_entries()
+                # Headers would break machine-readable formats
+                if display_modes.wordy() and output_format is OutputFormat.PLAIN:
+                    print(header, flush=True)
+                try:
+                    with ChunkedWriter(sys.stdout.buffer, output_format) as writer:
+                        writer.write_all(entries)
+                except BrokenPipeError:
+                    # The reader has gone (e. g. "head"): it is not an error of ours
+                    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
         sys.exit(ExitCodes.GOOD.value)
     #TODO: Заставиль это работать
     except KeyboardInterrupt:
@@ -265,6 +432,12 @@ def privileged_main():
         sys.exit(ExitCodes.WANT_TO_DO_SYSTEM_COMPOSING.value)
     except SystemComposingByResolverError:
         sys.exit(ExitCodes.SYSTEM_COMPOSING_BY_RESOLVER.value)
+    except BatchSyntaxError as err:
+        print_error('''Error: line {0} of the batch "{1}": {2}'''.format(err.line_number, err.line, err.reason))
+        sys.exit(ExitCodes.INVALID_OPERATION_ON_THE_SUFFIX.value)
+    except InvalidOperationSuffix as err:
+        print_error('''Error: invalid operation on the suffix: "{0}"'''.format(err.operation))
+        sys.exit(ExitCodes.INVALID_OPERATION_ON_THE_SUFFIX.value)
     except OnlyRootMayForceError:
         print_error('''Error: only root is able to use "--force" option''')
         sys.exit(ExitCodes.YOU_HAVE_NOT_PRIVILEGES.value)
@@ -295,6 +468,9 @@ def privileged_main():
     except EnclosureImportSyntaxError:
         print_error('Error while parsing enclosure')
         sys.exit(ExitCodes.ERROR_WHILE_PARSING_VARIABLE_FILE.value)
+    except FeedError as err:
+        print_error('Error while reading downloaded feed: {0}'.format(err))
+        sys.exit(ExitCodes.ERROR_WHILE_PARSING_VARIABLE_FILE.value)
     except CoownershipImportSyntaxError:
         print_error('Error while parsing coownership-list')
         sys.exit(ExitCodes.ERROR_WHILE_PARSING_VARIABLE_FILE.value)
@@ -330,6 +506,17 @@ def privileged_main():
         if display_modes.wordy():
             print(''''{0}' is good. Nothing has been interrupaptted'''.format(PROGRAM_NAME))
         sys.exit(ExitCodes.NOTHING_INTERRUPTED.value)
+    except NoResolvedPlanError:
+        print_error('Error: there is no plan to apply')
+        if display_modes.wordy():
+            print('''Run the operations with "--simulate" option first''')
+        sys.exit(ExitCodes.NO_RESOLVED_PLAN.value)
+    except StaleResolvedPlanError as err:
+        print_error('Error: the plan is out of date, changed since simulation: {0}'.format(", ".join(err.differences)))
+        sys.exit(ExitCodes.RESOLVED_PLAN_IS_STALE.value)
+    except ConfiguringError as err:
+        print_error('''Error: dpkg cannot configure packages: {0}'''.format(", ".join(err.packages)))
+        sys.exit(ExitCodes.CONFIGURING_FAILED.value)
     except PackageNotExistNow as err:
         print_error('''Error: package "{0}" you want to process to fix interrupted actions doesn't exist now'''.
                     format(err.package))
@@ -349,6 +536,9 @@ def privileged_main():
     except apt_pkg.Error as err:
         print_error('UNKNOWN ERROR: ', err)
         sys.exit(ExitCodes.UNKNOWN_ERROR.value)
+    except BadSearchPatternError as err:
+        print_error('Error: bad search pattern "{0}": {1}'.format(err.pattern, err.reason))
+        sys.exit(ExitCodes.BAD_SEARCH_PATTERN.value)
     except StubError as err:
         print_error('It is a stub: ', err)
         sys.exit(ExitCodes.STUB.value)
@@ -23,6 +23,27 @@ from test_files import *
 from test_updatetime import *
 from test_debconf import *
 from test_settings import *
+from test_synthetic import *
+from test_profiling import *
+from test_download import *
+from test_feeds import *
+from test_debversion import *
+from test_rules import *
+from test_debtags import *
+from test_sharding import *
+from test_installability import *
+from test_planning import *
+from test_plancache import *
+from test_prefetch import *
+from test_journal import *
+from test_dpkgstatus import *
+from test_xmlwriting import *
+from test_output import *
+from test_search import *
+from test_nsscache import *
+from test_main import *
+from test_batch import *
+from test_obtainpriorities import *
 
      
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import functools
+import http.server
+import os
+import socket
+import threading
+import time
+
+
+class ThrottledRequestHandler(http.server.SimpleHTTPRequestHandler):
+    '''Serves files of the directory sending them in chunks with a delay between each other'''
+
+    chunk_size = 64 * 1024
+    delay = 0.0
+
+    def copyfile(self, source, outputfile):
+        while True:
+            chunk = source.read(self.chunk_size)
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            if self.delay:
+                time.sleep(self.delay)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalHttpServer:
+    '''HTTP server serving files of a local directory in a background thread'''
+
+    def __init__(self, directory, handler_class=ThrottledRequestHandler, delay=0.0, **attributes):
+        self.__handler_class = type("Handler", (handler_class,), dict(attributes, delay=delay))
+        self.__server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                                        functools.partial(self.__handler_class, directory=directory))
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def handler_class(self):
+        '''Class attributes of the handler (e. g. "delay") may be changed while the server is running'''
+        return self.__handler_class
+
+    def url(self, filename):
+        host, port = self.__server.server_address
+        return "http://{0}:{1}/{2}".format(host, port, filename)
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread.join()
+
+
+class RecordedRequest:
+
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = headers
+
+
+class ValidatingRequestHandler(ThrottledRequestHandler):
+    '''Supports "ETag", "If-None-Match", "Range" and "If-Range" like real HTTP servers do.
+    Transfer is broken off after "interrupt_after" bytes of the body if it is set
+    '''
+
+    interrupt_after = None
+    requests = None
+
+    def __etag(self, path):
+        stat = os.stat(path)
+        return '"{0:x}-{1:x}"'.format(stat.st_mtime_ns, stat.st_size)
+
+    def send_head(self):
+        if self.requests is not None:
+            self.requests.append(RecordedRequest(self.path, dict(self.headers)))
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        etag = self.__etag(path)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+        size = os.path.getsize(path)
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header is not None and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= size:
+                self.send_error(416)
+                return None
+        file = open(path, "rb")
+        file.seek(start)
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size - start))
+        if start:
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(start, size - 1, size))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(os.path.getmtime(path))))
+        self.end_headers()
+        return file
+
+    def copyfile(self, source, outputfile):
+        if self.interrupt_after is None:
+            super().copyfile(source, outputfile)
+        else:
+            outputfile.write(source.read(self.interrupt_after))
+            outputfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from limitedapt import constants
+from limitedapt import single
+from limitedapt.batch import *
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+from limitedapt.enclosure import *
+from limitedapt.installability import *
+from limitedapt.modes import *
+from limitedapt.packages import *
+from limitedapt.planning import RecordingHandlers, RecordingApplying
+from limitedapt.profiling import Profiler
+from limitedapt.runners import *
+from limitedapt.settings import Settings, EnclosureRecord
+from limitedapt.synthetic import *
+from limitedapt.tasks import *
+from limitedapt.updatetime import UpdateTimes
+
+
+ROOT_ID = 0
+USER_ID = 1
+
+
+class CountingCache(SyntheticCache):
+
+    def __init__(self):
+        super().__init__()
+        self.open_count = 0
+
+    def open(self, progress=None):
+        self.open_count += 1
+        super().open(progress)
+
+
+def make_cache():
+    cache = CountingCache()
+    cache.create_package("libbase", installed=True, auto=True)
+    cache.create_package("libfoo", [("libbase",)])
+    cache.create_package("foo", [("libfoo",)])
+    cache.create_package("baz")
+    cache.create_package("bar", [("libbase",)], installed=True)
+    cache.create_package("secret")
+    cache.create_package("libextra")
+    cache.create_package("qux", [("libextra",)])
+    return cache
+
+
+class RootBatchRunner(BatchRunner):
+
+    @staticmethod
+    def _minimal_debconf_priority():
+        return Priority.HIGH
+
+
+class UserBatchRunner(RootBatchRunner):
+
+    @staticmethod
+    def _is_belong_to_group(user_name, group_name):
+        return group_name != constants.UNIX_LIMITEDAPT_ROOTS_GROUPNAME
+
+
+class ParseBatchTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        operations = parse_batch(["# provisioning\n", "install foo baz\n", "\n", "bar- foo%M  # mixed\n",
+                                  "safe-upgrade\n", "purge bar\n"])
+        self.assertEqual([operation.line_number for operation in operations], [2, 4, 5, 6])
+        self.assertEqual(operations[0].tasks.install, ["foo", "baz"])
+        self.assertEqual(operations[1].text, "bar- foo%M")
+        self.assertEqual((operations[1].tasks.remove, operations[1].tasks.markauto), (["bar"], ["foo"]))
+        self.assertTrue(operations[2].is_upgrade)
+        self.assertFalse(operations[2].full_upgrade)
+        self.assertEqual(operations[3].tasks.purge, ["bar"])
+
+    def test_syntax_errors(self):
+        for lines, line_number in [(["install foo", "foo*"], 2), (["remove"], 1), (["", "full-upgrade foo"], 2)]:
+            with self.assertRaises(BatchSyntaxError) as context:
+                parse_batch(lines)
+            self.assertEqual(context.exception.line_number, line_number)
+
+
+class BatchRunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old_constants = {name: getattr(constants, name)
+                                for name in ["PATH_TO_PROGRAM_VARIABLE", "PATH_TO_UNCOMPLETED_TASKS",
+                                             "PATH_TO_APT_PKGCACHE", "PATH_TO_DPKG_STATUS",
+                                             "PATH_TO_APT_EXTENDED_STATES"]}
+        directory = self.__directory.name
+        constants.PATH_TO_PROGRAM_VARIABLE = directory
+        constants.PATH_TO_UNCOMPLETED_TASKS = os.path.join(directory, constants.UNCOMPLETED_TASKS_FILENAME)
+        constants.PATH_TO_APT_PKGCACHE = os.path.join(directory, "pkgcache.bin")
+        constants.PATH_TO_DPKG_STATUS = os.path.join(directory, "status")
+        constants.PATH_TO_APT_EXTENDED_STATES = os.path.join(directory, "extended_states")
+
+        self.__cache = make_cache()
+        self.__cache_creations = 0
+
+        def factory():
+            self.__cache_creations += 1
+            return self.__cache
+
+        single.set_cache_factory(factory)
+
+        enclosure = Enclosure()
+        for name in ["libfoo", "foo", "baz", "bar", "qux"]:
+            enclosure.add_versioned_package(VersionedPackage(name, "amd64", "1.0-1"))
+        enclosure.export_to_xml(os.path.join(directory, "main.enclosure"))
+        CoownershipList().export_to_xml(os.path.join(directory, "coownership-list"))
+        priorities = DebconfPrioritiesDB("sqlite:///" + os.path.join(directory, "debconf-priorities.sqlite"))
+        priorities.add_new((ConcretePackage(pkg.shortname, "amd64"), PackageState(Status.HAS_NOT_QUESTIONS))
+                           for pkg in self.__cache)
+        priorities.commit()
+        update_times = UpdateTimes()
+        update_times.distro = update_times.enclosure = update_times.priorities = datetime.now()
+        update_times.export_to_xml(os.path.join(directory, "updatetimes"))
+
+        self.__settings = Settings(directory)
+        self.__settings.urls.enclosures = [EnclosureRecord("main", "file:///dev/null")]
+        self.__settings.updatetime_module = SimpleNamespace(is_distro_update_needed=lambda last_update: False,
+                                                            is_enclosure_update_needed=lambda last_update: False,
+                                                            is_priorities_update_needed=lambda last_update: False)
+
+    def tearDown(self):
+        single.set_cache_factory(single.apt_cache_factory)
+        for name, value in self.__old_constants.items():
+            setattr(constants, name, value)
+        self.__directory.cleanup()
+
+    def __runner(self, simulate=False, user_id=ROOT_ID):
+        # Force skips checking of free space which depends on the real file system (only root may force)
+        work_modes = WorkModes(remove_dependencies=False, force=user_id == ROOT_ID, purge_unused=False,
+                               fatal_errors=True, assume_yes=True, simulate=simulate)
+        runner_class = RootBatchRunner if user_id == ROOT_ID else UserBatchRunner
+        return runner_class(self.__settings, user_id, DisplayModes(False, False, False), work_modes,
+                            RecordingHandlers(), RecordingApplying(), Progresses(None, None, None), None, Profiler())
+
+    def __installed(self):
+        return sorted(pkg.name for pkg in self.__cache if pkg.is_installed)
+
+    def test_operations_one_after_another(self):
+        runner = self.__runner()
+        results = list(runner.run_all(parse_batch(["install foo", "baz+", "remove foo", "install foo"])))
+        self.assertEqual([result.outcome for result in results], [BatchOutcome.DONE] * 4)
+        self.assertTrue(all(result.seconds >= 0 for result in results))
+        self.assertEqual(self.__installed(), ["bar", "baz", "foo", "libbase", "libfoo"])
+        self.assertEqual(self.__cache.commit_count, 4)
+        # One cache reopened after every commit, the enclosure loaded once
+        self.assertEqual(self.__cache_creations, 1)
+        self.assertEqual(self.__cache.open_count, 4)
+        span_names = [span.name for span in runner.profiler.spans]
+        self.assertEqual(span_names.count("batch-operation"), 4)
+        self.assertEqual(span_names.count("enclosure-loading"), 1)
+
+    def test_coownership_reloaded_only_after_writes(self):
+        runner = self.__runner()
+        # Installs the package, makes root own it, then root already owns it
+        results = list(runner.run_all(parse_batch(["install baz"] * 4)))
+        self.assertEqual([result.outcome for result in results],
+                         [BatchOutcome.DONE, BatchOutcome.DONE, BatchOutcome.NOTHING_DONE, BatchOutcome.NOTHING_DONE])
+        span_names = [span.name for span in runner.profiler.spans]
+        self.assertEqual(span_names.count("coownership-saving"), 2)
+        # Loaded by the first operation and after each of the writes only
+        self.assertEqual(span_names.count("coownership-loading"), 3)
+        coownership = CoownershipList()
+        coownership.import_from_xml(os.path.join(self.__directory.name, "coownership-list"))
+        self.assertTrue(coownership.is_own(ConcretePackage("baz", "amd64"), "root"))
+
+    def test_simulated(self):
+        results = list(self.__runner(simulate=True).run_all(parse_batch(["install foo", "install baz"])))
+        self.assertEqual([result.outcome for result in results], [BatchOutcome.SIMULATED] * 2)
+        self.assertEqual(self.__cache.commit_count, 0)
+        self.assertEqual(self.__cache.get_changes(), [])
+
+    def test_stops_at_error(self):
+        # The user may not install the package which is not enclosed
+        runner = self.__runner(user_id=USER_ID)
+        results = []
+        with self.assertRaises(WantToDoSystemComposingError):
+            for result in runner.run_all(parse_batch(["install secret", "install baz"])):
+                results.append(result)
+        self.assertEqual(results, [])
+        self.assertEqual(self.__cache.commit_count, 0)
+        self.assertEqual(self.__cache.get_changes(), [])
+
+    def test_installability_report_is_stale_after_installations(self):
+        runner = self.__runner(user_id=USER_ID)
+        report = runner._analyse_installability(Priority.HIGH)
+        self.assertEqual(report.installability_of(self.__cache["qux"]).status, Installability.DEPENDENCY_NOT_ENCLOSED)
+        save_installability_report(report, runner._installability_filename())
+        self.assertIsNotNone(runner._load_installability_report(Priority.HIGH))
+        # Root installs the dependency which is not enclosed, so qux may be installed now
+        self.__cache["libextra"].mark_install()
+        self.__cache.commit()
+        for filename in [constants.PATH_TO_DPKG_STATUS, constants.PATH_TO_APT_EXTENDED_STATES,
+                         constants.PATH_TO_APT_PKGCACHE]:
+            with open(filename, "w") as file:
+                file.write("changed")
+            self.assertIsNone(runner._load_installability_report(Priority.HIGH))
+            os.remove(filename)
+            self.assertIsNotNone(runner._load_installability_report(Priority.HIGH))
+
+
+if __name__ == "__main__":
+    unittest.main()
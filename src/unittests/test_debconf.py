@@ -16,6 +16,8 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import tempfile
 import unittest
 from limitedapt.packages import *
 from limitedapt.debconf import *
@@ -57,5 +59,33 @@ class DebconfTestCase1(unittest.TestCase):
         with self.assertRaises(KeyError):
             self.__debconf[ConcretePackage("python3-apt", "i386")]
 
+class DebconfPrioritiesDBTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__url = "sqlite:///" + os.path.join(self.__directory.name, "priorities.sqlite")
+        self.__debconf = DebconfPriorities()
+        self.__debconf.import_from_xml("data/debconf-priorities1")
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def test_add_new_and_items(self):
+        db = DebconfPrioritiesDB(self.__url)
+        db.add_new(self.__debconf.items())
+        db.commit()
+        self.assertEqual(list(DebconfPrioritiesDB(self.__url).items()), list(self.__debconf.items()))
+
+    def test_items_after_replacing(self):
+        db = DebconfPrioritiesDB(self.__url)
+        db[ConcretePackage("abe", "armel")] = PackageState(Status.HAS_NOT_QUESTIONS)
+        db[ConcretePackage("3dchess", "i386")] = PackageState(Status.PROCESSING_ERROR)
+        db[ConcretePackage("abe", "armel")] = PackageState(Status.HAS_QUESTIONS, Priority.HIGH)
+        db.commit()
+        self.assertEqual(list(DebconfPrioritiesDB(self.__url).items()),
+                         [(ConcretePackage("3dchess", "i386"), PackageState(Status.PROCESSING_ERROR)),
+                          (ConcretePackage("abe", "armel"), PackageState(Status.HAS_QUESTIONS, Priority.HIGH))])
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from limitedapt import debug
+from limitedapt import single
+from limitedapt.debtags import *
+from limitedapt.enclosure import *
+from limitedapt.packages import VersionedPackage
+from limitedapt.synthetic import *
+
+
+class DebtagsDatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__database = DebtagsDatabase()
+        self.__database.load("data/debtags-package-tags1")
+
+    def __search(self, query):
+        return list(self.__database.names_of(self.__database.search(query)))
+
+    def test_load(self):
+        self.assertEqual(len(self.__database.names), 10)
+        self.assertEqual(self.__search("made-of::info"), ["python3-doc"])
+        self.assertEqual(self.__search("role::documentation"), ["bash-doc", "python3-doc"])
+
+    def test_operators(self):
+        self.assertEqual(self.__search("role::program && interface::daemon"), ["cron", "rsyslog"])
+        self.assertEqual(self.__search("role::source || role::data"), ["firmware-linux", "linux-source"])
+        self.assertEqual(self.__search("role::program && ! (security::antivirus || interface::daemon)"),
+                         ["3dchess", "bash"])
+        self.assertEqual(self.__search("!role::program && !role::documentation"),
+                         ["firmware-linux", "linux-source", "untagged-package"])
+        # "&&" binds tighter than "||"
+        self.assertEqual(self.__search("role::data || role::program && security::antivirus"),
+                         ["clamav", "firmware-linux"])
+
+    def test_wildcards(self):
+        self.assertEqual(self.__search("game::*"), ["3dchess"])
+        self.assertEqual(self.__search("admin::* && !admin::logging"), ["cron"])
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.__search("role::nothing"), [])
+
+    def test_syntax_errors(self):
+        for query in ["role::program &&", "(role::program", "role::program)", "&& role::program", ""]:
+            with self.assertRaises(DebtagsQuerySyntaxError):
+                self.__database.search(query)
+
+    def test_debug_query(self):
+        # The last "! (...)" alternative of the debug query holds for every package of the fixture
+        self.assertEqual(self.__search(debug.DEBUG_ENCLOSURE_QUERY), self.__database.names)
+
+
+class DebtagsEnclosureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        cache = SyntheticCache()
+        for name in ["bash-doc", "clamav", "3dchess"]:
+            pkg = SyntheticPackage(cache, name, "amd64")
+            pkg.candidate = SyntheticVersion(pkg, "1.0-1", "amd64", 100, 300)
+            cache.add_package(pkg)
+        single.set_cache_factory(lambda: cache)
+
+    def tearDown(self):
+        single.set_cache_factory(single.apt_cache_factory)
+        self.__directory.cleanup()
+
+    def test_update_enclosure(self):
+        filename = os.path.join(self.__directory.name, "enclosure")
+        debug.update_enclosure_by_debtags(filename, "data/debtags-package-tags1")
+        enclosure = load_enclosure(filename)
+        self.assertEqual(sorted(enclosure), ["3dchess", "bash-doc", "clamav"])
+        self.assertIn(VersionedPackage("bash-doc", "amd64", "1.0-1"), enclosure)
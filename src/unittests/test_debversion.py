@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from limitedapt.debversion import *
+
+
+class VersionCompareTestCase(unittest.TestCase):
+
+    ORDERED = ["1.0~~", "1.0~", "1.0~rc1", "1.0", "1.0-0.1", "1.0-1", "1.0-1+b1", "1.0a", "1.0+dfsg", "1.1",
+               "1.9", "1.10", "2.0", "1:0.1", "1:0.1-1"]
+
+    def __sign(self, number):
+        return (number > 0) - (number < 0)
+
+    def test_order(self):
+        for compare in (python_version_compare, version_compare):
+            for i, a in enumerate(self.ORDERED):
+                for j, b in enumerate(self.ORDERED):
+                    self.assertEqual(self.__sign(compare(a, b)), self.__sign(i - j), (a, b))
+
+    def test_equal(self):
+        self.assertEqual(python_version_compare("0:1.0", "1.0"), 0)
+        self.assertEqual(python_version_compare("1.00", "1.0"), 0)
+
+    def test_sorting(self):
+        self.assertEqual(sorted(reversed(self.ORDERED), key=version_key), self.ORDERED)
+
+    def test_relations(self):
+        self.assertTrue(check_relation("1.2", ">=", "1.2"))
+        self.assertTrue(check_relation("1.2", "<<", "1.10"))
+        self.assertFalse(check_relation("1:1.0", "<=", "2.0"))
+        with self.assertRaises(BadVersionRelation):
+            check_relation("1.0", "~=", "1.0")
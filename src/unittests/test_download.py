@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import time
+import unittest
+from limitedapt.download import *
+from httpfixture import *
+
+
+class ParallelDownloadsTestCase(unittest.TestCase):
+
+    CONTENT_SIZE = 256 * 1024
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__served = os.path.join(self.__directory.name, "served")
+        self.__downloaded = os.path.join(self.__directory.name, "downloaded")
+        os.mkdir(self.__served)
+        os.mkdir(self.__downloaded)
+        for index in range(4):
+            with open(os.path.join(self.__served, "file{0}".format(index)), "wb") as file:
+                file.write(bytes([index]) * self.CONTENT_SIZE)
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __job(self, server, name):
+        return DownloadJob(server.url(name), os.path.join(self.__downloaded, name))
+
+    def test_downloading(self):
+        with LocalHttpServer(self.__served) as server:
+            results = download_files([self.__job(server, "file{0}".format(index)) for index in range(4)])
+        self.assertTrue(all(result.succeeded for result in results))
+        for index, result in enumerate(results):
+            self.assertEqual(result.filename, os.path.join(self.__downloaded, "file{0}".format(index)))
+            with open(result.filename, "rb") as file:
+                self.assertEqual(file.read(), bytes([index]) * self.CONTENT_SIZE)
+
+    def test_failure_isolation(self):
+        with LocalHttpServer(self.__served) as server:
+            results = download_files([self.__job(server, "file0"), self.__job(server, "missing"),
+                                      self.__job(server, "file1")])
+        self.assertEqual([result.succeeded for result in results], [True, False, True])
+        self.assertIsInstance(results[1].error, DownloadError)
+        self.assertEqual(results[1].url, results[1].error.url)
+
+    def test_concurrency(self):
+        # Every file is sent in 4 chunks with 0.1 second delays so sequential downloading
+        # would take at least 1.6 seconds
+        with LocalHttpServer(self.__served, delay=0.1) as server:
+            start = time.perf_counter()
+            results = download_files([self.__job(server, "file{0}".format(index)) for index in range(4)])
+            elapsed = time.perf_counter() - start
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertLess(elapsed, 1.2)
+
+
+class DownloadFileTestCase(unittest.TestCase):
+
+    CONTENT = bytes(range(256)) * 1024
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__served = os.path.join(self.__directory.name, "served")
+        os.mkdir(self.__served)
+        self.__write_served(self.CONTENT)
+        self.__filename = os.path.join(self.__directory.name, "downloaded")
+        self.__requests = []
+        self.__server = LocalHttpServer(self.__served, ValidatingRequestHandler, requests=self.__requests)
+        self.__server.__enter__()
+        self.__url = self.__server.url("file")
+
+    def tearDown(self):
+        self.__server.__exit__(None, None, None)
+        self.__directory.cleanup()
+
+    def __write_served(self, content):
+        with open(os.path.join(self.__served, "file"), "wb") as file:
+            file.write(content)
+
+    def __read_downloaded(self):
+        with open(self.__filename, "rb") as file:
+            return file.read()
+
+    def __interrupted_download(self, after):
+        self.__server.handler_class.interrupt_after = after
+        with self.assertRaises(DownloadError):
+            download_file(self.__url, self.__filename)
+        self.__server.handler_class.interrupt_after = None
+
+    def test_revalidation(self):
+        statistics = download_file(self.__url, self.__filename)
+        self.assertEqual((statistics.transferred, statistics.saved), (len(self.CONTENT), 0))
+        statistics = download_file(self.__url, self.__filename)
+        self.assertTrue(statistics.not_modified)
+        self.assertEqual((statistics.transferred, statistics.saved), (0, len(self.CONTENT)))
+        self.assertIn("If-None-Match", self.__requests[-1].headers)
+        self.assertEqual(self.__read_downloaded(), self.CONTENT)
+
+    def test_modified(self):
+        download_file(self.__url, self.__filename)
+        self.__write_served(b"new content")
+        statistics = download_file(self.__url, self.__filename)
+        self.assertFalse(statistics.not_modified)
+        self.assertEqual(self.__read_downloaded(), b"new content")
+
+    def test_resuming(self):
+        self.__interrupted_download(1000)
+        self.assertFalse(os.path.exists(self.__filename))
+        self.assertEqual(os.path.getsize(partial_filename(self.__filename)), 1000)
+        statistics = download_file(self.__url, self.__filename)
+        self.assertTrue(statistics.resumed)
+        self.assertEqual((statistics.transferred, statistics.saved), (len(self.CONTENT) - 1000, 1000))
+        self.assertEqual(self.__requests[-1].headers["Range"], "bytes=1000-")
+        self.assertEqual(self.__read_downloaded(), self.CONTENT)
+        self.assertFalse(os.path.exists(partial_filename(self.__filename)))
+
+    def test_resuming_of_changed(self):
+        self.__interrupted_download(1000)
+        self.__write_served(b"new content")
+        statistics = download_file(self.__url, self.__filename)
+        self.assertFalse(statistics.resumed)
+        self.assertEqual(self.__read_downloaded(), b"new content")
+
+    def test_atomicity(self):
+        download_file(self.__url, self.__filename)
+        self.__write_served(b"new content" * 1000)
+        self.__interrupted_download(100)
+        self.assertEqual(self.__read_downloaded(), self.CONTENT)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+import unittest
+from limitedapt import constants
+from limitedapt.coownership import *
+from limitedapt.dpkgstatus import *
+from limitedapt.modes import DisplayModes
+from limitedapt.packages import *
+from limitedapt.runners import PrintRunner
+from limitedapt.settings import Settings
+
+
+STATUS = '''Package: bash
+Essential: yes
+Status: install ok installed
+Priority: required
+Section: shells
+Installed-Size: 6470
+Maintainer: Matthias Klose <doko@debian.org>
+Architecture: amd64
+Version: 5.0-4
+Depends: base-files (>= 2.1.12), debianutils (>= 2.15)
+Description: GNU Bourne Again SHell
+ Bash is an sh-compatible command language interpreter.
+ Status: this continuation line is not a field
+
+Package: libfoo
+Status: install ok installed
+Architecture: amd64
+Version: 1.0-1
+
+Package: libfoo
+Status: install ok installed
+Architecture: i386
+Version: 1.0-1
+
+
+Package: foo-doc
+Status: install ok unpacked
+Architecture: all
+Version: 2:1.0-1
+
+Package: removed
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 0.1-1
+
+Package: wine32
+Status: install ok installed
+Architecture: i386
+Version: 5.0-3
+'''
+
+EXTENDED_STATES = '''Package: libfoo
+Architecture: amd64
+Auto-Installed: 1
+
+Package: libfoo
+Architecture: i386
+Auto-Installed: 0
+
+Package: foo-doc
+Auto-Installed: 1
+'''
+
+
+def write(filename, content):
+    with open(filename, "w") as file:
+        file.write(content)
+
+
+class DpkgStatusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__status_filename = os.path.join(self.__directory.name, "status")
+        self.__extended_states_filename = os.path.join(self.__directory.name, "extended_states")
+        write(self.__status_filename, STATUS)
+        write(self.__extended_states_filename, EXTENDED_STATES)
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __status(self):
+        return DpkgStatus(self.__status_filename, self.__extended_states_filename, "amd64")
+
+    def test_installed(self):
+        installed = self.__status().installed()
+        self.assertEqual([(str(package.concrete), package.version, package.is_auto_installed) for package in installed],
+                         [("bash:amd64", "5.0-4", False), ("foo-doc:all", "2:1.0-1", True),
+                          ("libfoo:amd64", "1.0-1", True), ("libfoo:i386", "1.0-1", False),
+                          ("wine32:i386", "5.0-3", False)])
+        self.assertEqual(installed[1].state, "unpacked")
+
+    def test_find(self):
+        status = self.__status()
+        self.assertEqual(status.find("bash").version, "5.0-4")
+        self.assertEqual(status.find("libfoo", "i386").architecture, "i386")
+        self.assertEqual(status.find("libfoo").architecture, "amd64")
+        self.assertEqual(status.find("foo-doc").architecture, "all")
+        # Names without architecture are native ones as in apt
+        self.assertIsNone(status.find("wine32"))
+        self.assertIn("wine32:i386", status)
+        self.assertNotIn("removed", status)
+        self.assertNotIn("unknown", status)
+        self.assertEqual(len(status.installed()), 5)
+
+    def test_iter_installed(self):
+        status = self.__status()
+        self.assertEqual(status.find("libfoo", "i386").architecture, "i386")
+        # Packages read by the lookup are yielded first, then the scanning goes on
+        self.assertEqual([str(package.concrete) for package in status.iter_installed()],
+                         ["bash:amd64", "libfoo:amd64", "libfoo:i386", "foo-doc:all", "wine32:i386"])
+        self.assertEqual(len(list(status.iter_installed())), 5)
+
+    def test_missing_files(self):
+        status = DpkgStatus(os.path.join(self.__directory.name, "nothing"),
+                            os.path.join(self.__directory.name, "nothing"), "amd64")
+        self.assertEqual(status.installed(), [])
+        self.assertIsNone(status.find("bash"))
+        write(self.__status_filename, "")
+        self.assertEqual(self.__status().installed(), [])
+
+    def test_cache_by_signature(self):
+        status = get_dpkg_status(self.__status_filename, self.__extended_states_filename, "amd64")
+        self.assertIs(get_dpkg_status(self.__status_filename, self.__extended_states_filename, "amd64"), status)
+        write(self.__extended_states_filename, "")
+        changed = get_dpkg_status(self.__status_filename, self.__extended_states_filename, "amd64")
+        self.assertIsNot(changed, status)
+        self.assertFalse(changed.find("libfoo").is_auto_installed)
+
+    def test_concrete_str(self):
+        modes = DisplayModes(show_arch=False, verbose=False, debug=False)
+        self.assertEqual(modes.concrete_str(ConcretePackage("bash", "amd64"), "amd64"), "bash")
+        self.assertEqual(modes.concrete_str(ConcretePackage("foo-doc", "all"), "amd64"), "foo-doc")
+        self.assertEqual(modes.concrete_str(ConcretePackage("wine32", "i386"), "amd64"), "wine32:i386")
+        modes = DisplayModes(show_arch=True, verbose=False, debug=False)
+        self.assertEqual(modes.concrete_str(ConcretePackage("bash", "amd64"), "amd64"), "bash:amd64")
+
+
+class StatusPrintRunner(PrintRunner):
+
+    status_filenames = None
+
+    def _dpkg_status(self):
+        return DpkgStatus(*self.status_filenames, native_architecture="amd64")
+
+    @staticmethod
+    def _is_belong_to_group(user_name, group_name):
+        return False
+
+
+class PrintRunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old_variable = constants.PATH_TO_PROGRAM_VARIABLE
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__directory.name
+        StatusPrintRunner.status_filenames = (os.path.join(self.__directory.name, "status"),
+                                              os.path.join(self.__directory.name, "extended_states"))
+        write(StatusPrintRunner.status_filenames[0], STATUS)
+        write(StatusPrintRunner.status_filenames[1], EXTENDED_STATES)
+        coownership = CoownershipList()
+        coownership.add_ownership(ConcretePackage("wine32", "i386"), "user")
+        coownership.add_ownership(ConcretePackage("libfoo", "i386"), "user", also_root=True)
+        coownership.add_ownership(ConcretePackage("bash", "amd64"), "user", also_root=False)
+        coownership.export_to_xml(os.path.join(self.__directory.name, "coownership-list"))
+
+    def tearDown(self):
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__old_variable
+        self.__directory.cleanup()
+
+    def __runner(self):
+        return StatusPrintRunner(Settings(self.__directory.name), 0, DisplayModes(False, False, False), None)
+
+    def test_list_of_mine(self):
+        self.assertEqual(list(self.__runner().get_printed_list_of_mine()), ["libfoo:i386"])
+
+    def test_unsorted_list_of_mine(self):
+        coownership = CoownershipList()
+        coownership.add_ownership(ConcretePackage("libfoo", "i386"), "root")
+        coownership.add_ownership(ConcretePackage("wine32", "i386"), "user")
+        coownership.export_to_xml(os.path.join(self.__directory.name, "coownership-list"))
+        runner = self.__runner()
+        # bash, libfoo:i386 and then wine32 is met in the status file; libfoo:amd64 and foo-doc are auto
+        self.assertEqual(list(runner.get_list_of_mine(sort=False)),
+                         [ConcretePackage("bash", "amd64"), ConcretePackage("libfoo", "i386")])
+        self.assertEqual(list(runner.get_list_of_mine_entries(sort=False)),
+                         [("bash", {"name": "bash", "architecture": "amd64"}),
+                          ("libfoo:i386", {"name": "libfoo", "architecture": "i386"})])
+
+    def test_owners_of(self):
+        runner = self.__runner()
+        self.assertEqual(runner.get_owners_of("wine32:i386"), {"user"})
+        self.assertEqual(runner.get_owners_of("libfoo:i386"), {"user", "root"})
+        self.assertEqual(runner.get_owners_of("bash"), {"user"})
+        self.assertEqual(runner.get_owners_of("libfoo"), set())
+        self.assertEqual(runner.get_owners_of("wine32"), set())
+        self.assertEqual(runner.get_owners_of("unknown"), set())
+
+    def test_owners_of_many(self):
+        runner = self.__runner()
+        self.assertEqual([(str(package), owners) for package, owners in
+                          runner.get_owners_of_many(iter(["wine32:i386", "bash", "libfoo", "unknown"]))],
+                         [("wine32:i386", {"user"}), ("bash:amd64", {"user"}), ("libfoo:amd64", set()),
+                          ("unknown:amd64", set())])
+        self.assertEqual(list(runner.get_owners_entries(["libfoo:i386", "foo-doc"])),
+                         [("libfoo:i386: root user", {"name": "libfoo", "architecture": "i386",
+                                                      "owners": ["root", "user"]}),
+                          ("foo-doc:", {"name": "foo-doc", "architecture": "all", "owners": []})])
+
+    def test_ownership_report(self):
+        coownership = CoownershipList()
+        coownership.add_ownership(ConcretePackage("bash", "amd64"), "user")
+        coownership.add_ownership(ConcretePackage("gone", "amd64"), "user")
+        coownership.export_to_xml(os.path.join(self.__directory.name, "coownership-list"))
+        runner = self.__runner()
+        self.assertEqual([(str(package), owners, installed) for package, owners, installed in
+                          runner.get_ownership_report()],
+                         [("bash:amd64", {"user"}, True), ("foo-doc:all", set(), True),
+                          ("gone:amd64", {"user"}, False), ("libfoo:amd64", set(), True),
+                          ("libfoo:i386", {"root"}, True), ("wine32:i386", {"root"}, True)])
+        entries = list(runner.get_ownership_report_entries())
+        self.assertEqual(entries[-1], ("wine32:i386: root", {"name": "wine32", "architecture": "i386",
+                                                             "owners": ["root"], "installed": True}))
+
+
+if __name__ == "__main__":
+    unittest.main()
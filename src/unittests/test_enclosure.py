@@ -16,6 +16,8 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import tempfile
 import unittest
 from limitedapt.packages import *
 from limitedapt.enclosure import *
@@ -66,5 +68,52 @@ class EnclosureTestCase(unittest.TestCase):
         self.assertNotIn(VersionedPackage("aaa", "i8086", "1.1"), enclosure)
         
 
+class VersionRangesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__enclosure = Enclosure()
+        self.__enclosure.import_from_xml("data/enclosure-ranges1")
+
+    def test_contains(self):
+        self.assertIn(VersionedPackage("firefox-esr", "amd64", "0.9-1"), self.__enclosure)
+        self.assertIn(VersionedPackage("firefox-esr", "amd64", "1:115.0"), self.__enclosure)
+        self.assertIn(VersionedPackage("firefox-esr", "amd64", "1:115.9.1esr-1~deb12u1"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("firefox-esr", "amd64", "1:116.0"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("firefox-esr", "amd64", "115.1"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("firefox-esr", "amd64", "1:128.0"), self.__enclosure)
+        self.assertIn(VersionedPackage("firefox-esr", "amd64", "1:128.0-1"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("firefox-esr", "i386", "1:115.0"), self.__enclosure)
+        self.assertIn(VersionedPackage("libc6", "armhf", "2.36-9+deb12u4"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("libc6", "armhf", "2.36-9+deb12u5"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("libc6", "armhf", "2.36~rc1"), self.__enclosure)
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "enclosure")
+            self.__enclosure.export_to_xml(filename)
+            with open(filename) as exported, open("data/enclosure-ranges1") as original:
+                self.assertEqual(exported.read(), original.read())
+
+    def test_overlapping_ranges(self):
+        versions = Versions()
+        versions.add_range(VersionRange("3.0", True, "4.0", False))
+        versions.add_range(VersionRange("1.0", True, "2.0", False))
+        versions.add_range(VersionRange("2.0", True, "2.5", True))
+        versions.add_range(VersionRange(None, True, "0.5", False))
+        versions.add_range(VersionRange("3.5", False, None, False))
+        for version in ["0.1", "1.0", "1.9", "2.0", "2.5", "3.0", "3.9", "4.0", "10.0"]:
+            self.assertIn(version, versions)
+        for version in ["0.5", "0.9", "2.5.1", "2.9"]:
+            self.assertNotIn(version, versions)
+
+    def test_bad_range(self):
+        with self.assertRaises(ValueError):
+            VersionRange.from_xml_attributes({"ge": "1.0", "gt": "1.1"})
+        with self.assertRaises(ValueError):
+            VersionRange.from_xml_attributes({})
+        with self.assertRaises(VersionsEveryAndDistinctError):
+            Versions(isevery=True).add_range(VersionRange("1.0"))
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from limitedapt import constants
+from limitedapt import single
+from limitedapt.enclosure import *
+from limitedapt.feeds import *
+from limitedapt.runners import UpdationRunner
+from limitedapt.settings import *
+from limitedapt.synthetic import SyntheticCache
+from limitedapt.download import *
+from httpfixture import *
+
+
+def enclosure_to_bytes(enclosure, directory):
+    filename = os.path.join(directory, "exported")
+    enclosure.export_to_xml(filename)
+    with open(filename, "rb") as file:
+        return file.read()
+
+
+class CompressedFeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__expected = Enclosure()
+        self.__expected.import_from_xml("data/enclosure1")
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __check_compression(self, compression):
+        feed = os.path.join(self.__directory.name, "enclosure1." + compression)
+        compress_file("data/enclosure1", feed, compression)
+        self.assertEqual(detect_compression(feed), compression)
+        target = os.path.join(self.__directory.name, "enclosure1")
+        install_enclosure_feed(feed, target)
+        with open(target, "rb") as file:
+            self.assertEqual(file.read(), enclosure_to_bytes(self.__expected, self.__directory.name))
+
+    def test_plain(self):
+        self.assertIsNone(detect_compression("data/enclosure1"))
+        self.assertEqual(enclosure_to_bytes(load_enclosure_feed("data/enclosure1"), self.__directory.name),
+                         enclosure_to_bytes(self.__expected, self.__directory.name))
+
+    def test_xz(self):
+        self.__check_compression("xz")
+
+    def test_gzip(self):
+        self.__check_compression("gzip")
+
+    @unittest.skipIf(zstandard is None, '"zstandard" module is not installed')
+    def test_zstd(self):
+        self.__check_compression("zstd")
+
+    def test_decompression(self):
+        feed = os.path.join(self.__directory.name, "db.xz")
+        compress_file("data/dbconf-db1.sqlite", feed, "xz")
+        target = os.path.join(self.__directory.name, "db.sqlite")
+        decompress_feed(feed, target)
+        with open(target, "rb") as file, open("data/dbconf-db1.sqlite", "rb") as original:
+            self.assertEqual(file.read(), original.read())
+
+    def test_corrupted(self):
+        feed = os.path.join(self.__directory.name, "enclosure1.xz")
+        compress_file("data/enclosure1", feed, "xz")
+        with open(feed, "r+b") as file:
+            file.truncate(os.path.getsize(feed) // 2)
+        target = os.path.join(self.__directory.name, "enclosure1")
+        with self.assertRaises((FeedError, EnclosureImportSyntaxError)):
+            install_enclosure_feed(feed, target)
+        self.assertFalse(os.path.exists(target))
+
+
+def make_large_enclosure(package_count):
+    enclosure = Enclosure()
+    for index in range(package_count):
+        for arch in ("amd64", "i386"):
+            enclosure.add_versioned_package(SimpleNamespace(name="package{0:05}".format(index), architecture=arch,
+                                                            version="1.{0}-1".format(index)))
+    return enclosure
+
+
+class RecordingEnclosureFeed(StreamingEnclosureFeed):
+
+    def __init__(self):
+        super().__init__()
+        self.counts = []
+
+    def feed(self, data):
+        super().feed(data)
+        self.counts.append(self.package_count)
+
+
+class StreamingFeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__expected = Enclosure()
+        self.__expected.import_from_xml("data/enclosure1")
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __feed_by_chunks(self, filename, chunk_size=100):
+        feed = StreamingEnclosureFeed()
+        with open(filename, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                feed.feed(chunk)
+        return feed.finish()
+
+    def test_compressions(self):
+        compressions = ["xz", "gzip"] + (["zstd"] if zstandard is not None else [])
+        expected = enclosure_to_bytes(self.__expected, self.__directory.name)
+        self.assertEqual(enclosure_to_bytes(self.__feed_by_chunks("data/enclosure1"), self.__directory.name), expected)
+        for compression in compressions:
+            feed = os.path.join(self.__directory.name, "enclosure1." + compression)
+            compress_file("data/enclosure1", feed, compression)
+            self.assertEqual(enclosure_to_bytes(self.__feed_by_chunks(feed, 7), self.__directory.name), expected)
+
+    def test_truncated(self):
+        feed = os.path.join(self.__directory.name, "enclosure1.gz")
+        compress_file("data/enclosure1", feed, "gzip")
+        with open(feed, "r+b") as file:
+            file.truncate(os.path.getsize(feed) - 10)
+        with self.assertRaises(FeedError):
+            self.__feed_by_chunks(feed)
+
+    def test_syntax_error(self):
+        feed = StreamingEnclosureFeed()
+        feed.feed(b"<enclosure><package name='a'></enclosure>")
+        with self.assertRaises(EnclosureImportSyntaxError):
+            feed.finish()
+
+    def test_index(self):
+        filename = os.path.join(self.__directory.name, "main.enclosure")
+        store_enclosure(self.__expected, filename)
+        indexed = load_enclosure_index(filename)
+        self.assertIsNotNone(indexed)
+        self.assertEqual(enclosure_to_bytes(indexed, self.__directory.name),
+                         enclosure_to_bytes(self.__expected, self.__directory.name))
+        shutil.copyfile("data/enclosure1-orig", filename)
+        self.assertIsNone(load_enclosure_index(filename))
+
+    def test_throttled_download(self):
+        served = os.path.join(self.__directory.name, "served")
+        os.mkdir(served)
+        enclosure = make_large_enclosure(2000)
+        enclosure.export_to_xml(os.path.join(served, "enclosure"))
+        feed = RecordingEnclosureFeed()
+        with LocalHttpServer(served, ValidatingRequestHandler, delay=0.01, chunk_size=16 * 1024) as server:
+            download_file(server.url("enclosure"), os.path.join(self.__directory.name, "enclosure"), feed)
+        # Packages have been built while the rest of the feed was still being transferred
+        self.assertGreater(len(feed.counts), 2)
+        self.assertGreater(feed.counts[0], 0)
+        self.assertLess(feed.counts[-2], 2000)
+        self.assertEqual(len(list(feed.finish())), 2000)
+
+
+def make_revisions():
+    old = Enclosure()
+    old.import_from_xml("data/enclosure1")
+    old.revision = "1"
+    new = Enclosure()
+    new.import_from_xml("data/enclosure1")
+    new.revision = "2"
+    names = sorted(new)
+    new.remove_package(names[0])
+    new.replace_package(names[1], ArchAndVersions(isevery=True))
+    new.arch_and_versions(names[1]).every = Versions(isevery=True)
+    new.add_package("newcomer", ArchAndVersions())
+    new.arch_and_versions("newcomer").add_single("1.0-1", "amd64")
+    return old, new
+
+
+class EnclosureDeltaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old, self.__new = make_revisions()
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def test_between(self):
+        delta = EnclosureDelta.between(self.__old, self.__new)
+        self.assertEqual((delta.base, delta.revision), ("1", "2"))
+        self.assertEqual(len(delta.removed), 1)
+        self.assertEqual(len(delta.replaced), 2)
+
+    def test_applying(self):
+        filename = os.path.join(self.__directory.name, "delta")
+        EnclosureDelta.between(self.__old, self.__new).export_to_xml(filename)
+        delta = EnclosureDelta()
+        delta.import_from_xml(filename)
+        delta.apply_to(self.__old)
+        self.assertEqual(enclosure_to_bytes(self.__old, self.__directory.name),
+                         enclosure_to_bytes(self.__new, self.__directory.name))
+        self.assertEqual(read_enclosure_revision(os.path.join(self.__directory.name, "exported")), "2")
+
+    def test_base_mismatch(self):
+        delta = EnclosureDelta.between(self.__old, self.__new)
+        self.__old.revision = "0"
+        with self.assertRaises(EnclosureDeltaBaseMismatch):
+            delta.apply_to(self.__old)
+
+
+class FeedsUpdatingTestCase(unittest.TestCase):
+    '''The whole updating flow with compressed and delta-encoded feeds served locally'''
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__served = os.path.join(self.__directory.name, "served")
+        self.__variable = os.path.join(self.__directory.name, "variable")
+        os.mkdir(self.__served)
+        os.mkdir(self.__variable)
+        self.__old_variable = constants.PATH_TO_PROGRAM_VARIABLE
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__variable
+        single.set_cache_factory(SyntheticCache)
+        self.__requests = []
+        self.__server = LocalHttpServer(self.__served, ValidatingRequestHandler, requests=self.__requests)
+        self.__server.__enter__()
+
+    def tearDown(self):
+        self.__server.__exit__(None, None, None)
+        single.set_cache_factory(single.apt_cache_factory)
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__old_variable
+        self.__directory.cleanup()
+
+    def __publish(self, structure, name, compression):
+        plain = os.path.join(self.__directory.name, name)
+        structure.export_to_xml(plain)
+        compress_file(plain, os.path.join(self.__served, name), compression)
+
+    def __update(self):
+        settings = Settings(self.__directory.name)
+        settings.urls.enclosures.append(EnclosureRecord("main", self.__server.url("enclosure"),
+                                                        self.__server.url("delta")))
+        settings.urls.debconf_priorities = self.__server.url("priorities")
+        runner = UpdationRunner(settings, 0, SimpleNamespace(debug=False), None, sys.stdout)
+        runner.update()
+
+    def __local_enclosure(self):
+        with open(os.path.join(self.__variable, "main.enclosure"), "rb") as file:
+            return file.read()
+
+    def test_updating(self):
+        old, new = make_revisions()
+        self.__publish(old, "enclosure", "xz")
+        compress_file("data/dbconf-db1.sqlite", os.path.join(self.__served, "priorities"), "gzip")
+        self.__update()
+        self.assertEqual(self.__local_enclosure(), enclosure_to_bytes(old, self.__directory.name))
+        with open(os.path.join(self.__variable, "debconf-priorities.sqlite"), "rb") as file, \
+                open("data/dbconf-db1.sqlite", "rb") as original:
+            self.assertEqual(file.read(), original.read())
+
+        self.__publish(new, "enclosure", "xz")
+        self.__publish(EnclosureDelta.between(old, new), "delta", "gzip")
+        del self.__requests[:]
+        self.__update()
+        self.assertEqual(self.__local_enclosure(), enclosure_to_bytes(new, self.__directory.name))
+        self.assertNotIn("/enclosure", [request.path for request in self.__requests])
+        self.assertIsNotNone(load_enclosure_index(os.path.join(self.__variable, "main.enclosure")))
+
+    def test_delta_of_other_base(self):
+        old, new = make_revisions()
+        self.__publish(old, "enclosure", "xz")
+        compress_file("data/dbconf-db1.sqlite", os.path.join(self.__served, "priorities"), "gzip")
+        self.__update()
+        new.revision = "3"
+        self.__publish(new, "enclosure", "xz")
+        delta = EnclosureDelta.between(old, new)
+        delta.base = "2"
+        self.__publish(delta, "delta", "xz")
+        self.__update()
+        self.assertEqual(self.__local_enclosure(), enclosure_to_bytes(new, self.__directory.name))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import random
+import tempfile
+import unittest
+from limitedapt.debconf import *
+from limitedapt.enclosure import *
+from limitedapt.installability import *
+from limitedapt.packages import *
+from limitedapt.synthetic import *
+
+
+def enclose(enclosure, *names, cache):
+    for name in names:
+        pkg = cache[name]
+        enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.candidate.architecture,
+                                                         pkg.candidate.version))
+
+
+def no_questions(cache):
+    priorities = DebconfPriorities()
+    for pkg in cache:
+        priorities[ConcretePackage(pkg.shortname, pkg.candidate.architecture)] = PackageState(Status.HAS_NOT_QUESTIONS)
+    return priorities
+
+
+def make_cache():
+    cache = SyntheticCache()
+    cache.create_package("libc", installed=True)
+    cache.create_package("libfoo", [("libc",)])
+    cache.create_package("foo", [("libfoo",), ("foo-data", "foo-data-alt")])
+    cache.create_package("foo-data")
+    cache.create_package("foo-data-alt")
+    cache.create_package("bar", [("libbar",)])
+    cache.create_package("libbar", [("libc",), ("libbar-helper",)])
+    cache.create_package("libbar-helper")
+    cache.create_package("cycle1", [("cycle2",)])
+    cache.create_package("cycle2", [("cycle1",)])
+    cache.create_package("asking", [("libc",)])
+    cache.create_package("needs-asking", [("asking",)])
+    cache.create_package("untrusted", trusted=False)
+    cache.create_package("missing-dependency", [("not-a-package",)])
+    return cache
+
+
+class InstallabilityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__cache = make_cache()
+        self.__enclosure = Enclosure()
+        enclose(self.__enclosure, "libfoo", "foo", "foo-data-alt", "bar", "libbar", "cycle1", "cycle2", "asking",
+                "needs-asking", "untrusted", "missing-dependency", cache=self.__cache)
+        self.__priorities = no_questions(self.__cache)
+        self.__priorities[ConcretePackage("asking", "amd64")] = PackageState(Status.HAS_QUESTIONS, Priority.HIGH)
+
+    def __analyse(self, previous=None, minimal_priority=Priority.MEDIUM):
+        return analyse_installability(self.__cache, self.__enclosure, self.__priorities, minimal_priority, {},
+                                      previous)
+
+    def __statuses(self, report):
+        return {name: report[name].status for name in report}
+
+    def test_analysis(self):
+        report = self.__analyse()
+        self.assertEqual(self.__statuses(report), {
+            "libfoo": Installability.INSTALLABLE,
+            "foo": Installability.INSTALLABLE,
+            "foo-data-alt": Installability.INSTALLABLE,
+            "bar": Installability.DEPENDENCY_NOT_ENCLOSED,
+            "libbar": Installability.DEPENDENCY_NOT_ENCLOSED,
+            "cycle1": Installability.INSTALLABLE,
+            "cycle2": Installability.INSTALLABLE,
+            "asking": Installability.DEBCONF_PRIORITY,
+            "needs-asking": Installability.DEPENDENCY_NOT_ENCLOSED,
+            "untrusted": Installability.UNTRUSTED,
+            "missing-dependency": Installability.DEPENDENCY_NOT_ENCLOSED,
+        })
+        self.assertEqual(report["bar"].blocker, "libbar")
+        self.assertEqual(report["libbar"].blocker, "libbar-helper")
+        self.assertEqual(report["asking"].blocker, "high")
+        self.assertEqual(report.count_installable(), 5)
+        self.assertEqual(report.installability_of(self.__cache["foo"]).version, "1.0-1")
+        self.assertIsNone(report.installability_of(self.__cache["libbar-helper"]))
+
+    def test_minimal_priority(self):
+        report = self.__analyse(minimal_priority=Priority.CRITICAL)
+        self.assertTrue(report["asking"].installable)
+        self.assertTrue(report["needs-asking"].installable)
+
+    def test_unknown_priority(self):
+        self.__priorities[ConcretePackage("libfoo", "amd64")] = PackageState(Status.PROCESSING_ERROR)
+        report = self.__analyse()
+        self.assertEqual(report["libfoo"].status, Installability.UNKNOWN_DEBCONF_PRIORITY)
+        self.assertEqual(report["foo"].status, Installability.DEPENDENCY_NOT_ENCLOSED)
+
+    def test_reuse(self):
+        previous = self.__analyse()
+        self.assertEqual(previous.analysed_count, 11)
+        enclose(self.__enclosure, "libbar-helper", cache=self.__cache)
+        report = self.__analyse(previous)
+        self.assertTrue(report["bar"].installable)
+        self.assertTrue(report["libbar"].installable)
+        self.assertLess(report.analysed_count, previous.analysed_count)
+        self.assertEqual(self.__statuses(report), self.__statuses(self.__analyse()))
+
+    def test_new_candidate(self):
+        previous = self.__analyse()
+        libfoo = self.__cache["libfoo"]
+        libfoo.candidate = SyntheticVersion(libfoo, "2.0-1", "amd64", 100, 300, depends=[("libc",)])
+        report = self.__analyse(previous)
+        # The new version is not enclosed, "foo" is not installable now
+        self.assertNotIn("libfoo", report)
+        self.assertEqual(report["foo"].status, Installability.DEPENDENCY_NOT_ENCLOSED)
+        self.assertTrue(report["foo-data-alt"].installable)
+        # "foo" and four packages blocked by dependencies (they are always analysed anew)
+        self.assertEqual(report.analysed_count, 5)
+
+    def test_save_and_load(self):
+        report = self.__analyse()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "installability")
+            self.assertIsNone(load_installability_report(filename))
+            save_installability_report(report, filename)
+            loaded = load_installability_report(filename)
+            self.assertEqual(self.__statuses(loaded), self.__statuses(report))
+            self.assertTrue(loaded.is_current({}, Priority.MEDIUM))
+            self.assertFalse(loaded.is_current({}, Priority.HIGH))
+            with open(filename, "wb") as file:
+                file.write(b"garbage")
+            self.assertIsNone(load_installability_report(filename))
+
+
+class IncrementalInstallabilityTestCase(unittest.TestCase):
+    '''Reused results must be the same as ones analysed from scratch'''
+
+    def test_random_changes(self):
+        rnd = random.Random(3)
+        cache = generate_cache(3000, seed=3)
+        packages = list(cache)
+        enclosure = Enclosure()
+        for pkg in packages:
+            if rnd.random() < 0.9:
+                enclose(enclosure, pkg.name, cache=cache)
+        priorities = no_questions(cache)
+        for pkg in rnd.sample(packages, 30):
+            priorities[ConcretePackage(pkg.shortname, pkg.candidate.architecture)] = \
+                PackageState(Status.HAS_QUESTIONS, Priority.CRITICAL)
+        report = analyse_installability(cache, enclosure, priorities, Priority.HIGH, {})
+        for _ in range(3):
+            for pkg in rnd.sample(packages, 20):
+                if rnd.random() < 0.5:
+                    enclose(enclosure, pkg.name, cache=cache)
+                else:
+                    priorities[ConcretePackage(pkg.shortname, pkg.candidate.architecture)] = \
+                        PackageState(Status.PROCESSING_ERROR)
+            report = analyse_installability(cache, enclosure, priorities, Priority.HIGH, {}, report)
+            scratch = analyse_installability(cache, enclosure, priorities, Priority.HIGH, {})
+            self.assertLess(report.analysed_count, scratch.analysed_count)
+            self.assertEqual({name: report[name] for name in report}, {name: scratch[name] for name in scratch})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from lxml import etree
+from limitedapt import constants
+from limitedapt import single
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+from limitedapt.enclosure import *
+from limitedapt.journal import *
+from limitedapt.modes import *
+from limitedapt.packages import *
+from limitedapt.planning import RecordingHandlers, RecordingApplying
+from limitedapt.profiling import Profiler
+from limitedapt.runners import *
+from limitedapt.settings import Settings, EnclosureRecord
+from limitedapt.synthetic import *
+from limitedapt.tasks import *
+from limitedapt.updatetime import UpdateTimes
+
+
+ROOT_ID = 0
+
+
+class PowerLoss(Exception): pass
+
+
+class InterruptibleCache(SyntheticCache):
+    '''Loses power before dpkg is run ("before"), after it has unpacked the packages to install ("unpacked"),
+    while it configures them ("half-configured") or after it has done everything ("after")'''
+
+    power_loss = None
+
+    def commit(self, fetch_progress=None, install_progress=None):
+        if self.power_loss == "before":
+            raise PowerLoss()
+        installed = [pkg for pkg in self.get_changes() if not pkg.marked_delete]
+        result = super().commit(fetch_progress, install_progress)
+        if self.power_loss in ("unpacked", "half-configured"):
+            for pkg in installed:
+                pkg.dpkg_state = SyntheticDpkgState.UNPACKED
+            installed[-1].dpkg_state = SyntheticDpkgState.HALF_CONFIGURED if self.power_loss == "half-configured" \
+                else SyntheticDpkgState.UNPACKED
+        if self.power_loss is not None:
+            raise PowerLoss()
+        return result
+
+
+def make_cache():
+    cache = InterruptibleCache()
+    cache.create_package("libbase", installed=True, auto=True, version="1:1.0-1")
+    cache.create_package("libfoo", [("libbase",)], version="1:1.0-1")
+    cache.create_package("foo", [("libfoo",)], version="1:1.0-1")
+    cache.create_package("bar", [("libbase",)], installed=True, version="1:1.0-1")
+    return cache
+
+
+class RootRunner(ModificationRunner):
+
+    configured = None
+
+    @staticmethod
+    def _minimal_debconf_priority():
+        return Priority.HIGH
+
+    def _configure_packages(self, names):
+        # What "dpkg --configure" does
+        self.configured = names
+        for name in names:
+            get_cache()[name].dpkg_state = SyntheticDpkgState.INSTALLED
+
+
+class CommitJournalTestCase(unittest.TestCase):
+
+    def test_xml(self):
+        cache = make_cache()
+        cache["foo"].mark_install()
+        cache["bar"].mark_delete(purge=True)
+        cache["libbase"].mark_auto(False)
+        journal = CommitJournal.from_cache(cache, "/archives", lambda pkg: pkg.name == "bar", [cache["libbase"]])
+        journal.phase = JournalPhase.FETCHED
+        root = etree.Element("tasks")
+        journal.export_to_xml_element(root)
+        journal.export_to_xml_element(root)
+        self.assertEqual(len(root.findall("journal")), 1)
+
+        imported = CommitJournal.import_from_xml_element(etree.fromstring(etree.tostring(root)))
+        self.assertEqual(imported.phase, JournalPhase.FETCHED)
+        self.assertEqual([(change.name, change.version, change.purge, change.auto) for change in imported.changes],
+                         [("bar", None, True, False), ("foo", "1:1.0-1", False, False),
+                          ("libfoo", "1:1.0-1", False, True)])
+        foo = imported.changes[1]
+        self.assertEqual(foo.archive, "/archives/foo_1%3a1.0-1_amd64.deb")
+        self.assertEqual((foo.size, foo.sha256), (100, cache["foo"].candidate.sha256))
+        self.assertEqual(imported.auto_flags, {"libbase": False})
+        self.assertIsNone(CommitJournal.import_from_xml_element(etree.Element("tasks")))
+
+    def test_remaining(self):
+        cache = make_cache()
+        cache["foo"].mark_install()
+        journal = CommitJournal.from_cache(cache, "/archives")
+        cache.clear()
+        cache["libfoo"].mark_install(auto_inst=False, from_user=False)
+        cache.commit()
+        remaining = journal.remaining(cache)
+        self.assertEqual([change.name for change in remaining.changes], ["foo"])
+        with self.assertRaises(JournalMismatch):
+            CommitJournal([JournalChange("unknown", "1.0")]).remaining(cache)
+
+        pkg = cache["foo"]
+        pkg.candidate = SyntheticVersion(pkg, "2.0-1", "amd64")
+        with self.assertRaises(JournalMismatch):
+            remaining.mark(cache)
+
+    def test_unconfigured(self):
+        cache = make_cache()
+        cache["foo"].mark_install()
+        journal = CommitJournal.from_cache(cache, "/archives")
+        cache.commit()
+        self.assertTrue(journal.remaining(cache).is_empty())
+
+        for state in [SyntheticDpkgState.UNPACKED, SyntheticDpkgState.HALF_CONFIGURED]:
+            cache["foo"].dpkg_state = state
+            remaining = journal.remaining(cache)
+            self.assertEqual([change.name for change in remaining.changes], ["foo"])
+            self.assertEqual(remaining.unconfigured(cache), ["foo"])
+            with cache.actiongroup():
+                remaining.mark(cache)
+            # The unpacked version is configured apart
+            self.assertEqual(cache.get_changes(), [])
+
+        cache["foo"].dpkg_state = SyntheticDpkgState.HALF_INSTALLED
+        cache["foo"].is_reinstall_required = True
+        remaining = journal.remaining(cache)
+        self.assertEqual([change.name for change in remaining.changes], ["foo"])
+        self.assertEqual(remaining.unconfigured(cache), [])
+        with cache.actiongroup():
+            remaining.mark(cache)
+        self.assertTrue(cache["foo"].marked_reinstall)
+        cache.commit()
+        self.assertTrue(journal.remaining(cache).is_empty())
+
+    def test_invalid_archives(self):
+        with tempfile.TemporaryDirectory() as directory:
+            changes = []
+            for index in range(8):
+                content = "archive {0}".format(index).encode()
+                filename = os.path.join(directory, "{0}.deb".format(index))
+                with open(filename, "wb") as file:
+                    file.write(content)
+                changes.append(JournalChange(str(index), "1.0", archive=filename, size=len(content),
+                                             sha256=hashlib.sha256(content).hexdigest()))
+            changes.append(JournalChange("missing", "1.0", archive=os.path.join(directory, "missing.deb"), size=1,
+                                         sha256=""))
+            changes.append(JournalChange("deleted", None))
+            with open(changes[3].archive, "wb") as file:
+                file.write(b"archive X")
+            journal = CommitJournal(changes)
+            self.assertEqual([change.name for change in journal.invalid_archives(max_workers=4)], ["3", "missing"])
+
+
+class FixInterruptedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old_constants = {name: getattr(constants, name)
+                                for name in ["PATH_TO_PROGRAM_VARIABLE", "PATH_TO_UNCOMPLETED_TASKS",
+                                             "PATH_TO_APT_ARCHIVES"]}
+        directory = self.__directory.name
+        constants.PATH_TO_PROGRAM_VARIABLE = directory
+        constants.PATH_TO_UNCOMPLETED_TASKS = os.path.join(directory, constants.UNCOMPLETED_TASKS_FILENAME)
+        constants.PATH_TO_APT_ARCHIVES = os.path.join(directory, "archives")
+
+        self.__cache = make_cache()
+        single.set_cache_factory(lambda: self.__cache)
+
+        enclosure = Enclosure()
+        for name in ["libfoo", "foo", "bar"]:
+            enclosure.add_versioned_package(VersionedPackage(name, "amd64", "1:1.0-1"))
+        enclosure.export_to_xml(os.path.join(directory, "main.enclosure"))
+        CoownershipList().export_to_xml(os.path.join(directory, "coownership-list"))
+        priorities = DebconfPrioritiesDB("sqlite:///" + os.path.join(directory, "debconf-priorities.sqlite"))
+        priorities.add_new((ConcretePackage(pkg.shortname, "amd64"), PackageState(Status.HAS_NOT_QUESTIONS))
+                           for pkg in self.__cache)
+        priorities.commit()
+        update_times = UpdateTimes()
+        update_times.distro = update_times.enclosure = update_times.priorities = datetime.now()
+        update_times.export_to_xml(os.path.join(directory, "updatetimes"))
+
+        self.__settings = Settings(directory)
+        self.__settings.urls.enclosures = [EnclosureRecord("main", "file:///dev/null")]
+        self.__settings.updatetime_module = SimpleNamespace(is_distro_update_needed=lambda last_update: False,
+                                                            is_enclosure_update_needed=lambda last_update: False,
+                                                            is_priorities_update_needed=lambda last_update: False)
+
+    def tearDown(self):
+        single.set_cache_factory(single.apt_cache_factory)
+        for name, value in self.__old_constants.items():
+            setattr(constants, name, value)
+        self.__directory.cleanup()
+
+    def __runner(self):
+        # Force skips checking of free space which depends on the real file system
+        work_modes = WorkModes(remove_dependencies=False, force=True, purge_unused=False, fatal_errors=False,
+                               assume_yes=True, simulate=False)
+        return RootRunner(self.__settings, ROOT_ID, DisplayModes(False, False, False), work_modes,
+                          RecordingHandlers(), RecordingApplying(), Progresses(None, None, None), None,
+                          Profiler())
+
+    def __interrupt(self, power_loss, operations):
+        self.__cache.power_loss = power_loss
+        with self.assertRaises(PowerLoss):
+            self.__runner().perform_operations(Tasks.from_suffixed_operations(operations))
+        self.__cache.power_loss = None
+        # The cache is opened anew after reboot
+        self.__cache.clear()
+        root = etree.parse(constants.PATH_TO_UNCOMPLETED_TASKS).getroot()
+        return CommitJournal.import_from_xml_element(root)
+
+    def __installed(self):
+        return sorted(pkg.name for pkg in self.__cache if pkg.is_installed)
+
+    def test_interrupted_before_dpkg(self):
+        journal = self.__interrupt("before", ["foo+", "bar-"])
+        self.assertEqual(journal.phase, JournalPhase.FETCHED)
+        self.assertEqual([change.name for change in journal.changes], ["bar", "foo", "libfoo"])
+
+        runner = self.__runner()
+        runner.fix_interrupted()
+        spans = {span.name for span in runner.profiler.spans}
+        self.assertIn("journal-replaying", spans)
+        self.assertNotIn("resolution", spans)
+        # Synthetic cache does not download anything, so the archives are fetched once again
+        self.assertIn("fetching", spans)
+        self.assertEqual(self.__cache.commit_count, 1)
+        self.assertEqual(self.__installed(), ["foo", "libbase", "libfoo"])
+        self.assertTrue(self.__cache["libfoo"].is_auto_installed)
+        self.assertFalse(os.path.exists(constants.PATH_TO_UNCOMPLETED_TASKS))
+
+    def test_interrupted_while_configuring(self):
+        for power_loss in ["unpacked", "half-configured"]:
+            with self.subTest(power_loss=power_loss):
+                self.__interrupt(power_loss, ["foo+"])
+                self.assertEqual(self.__installed(), ["bar", "foo", "libbase", "libfoo"])
+                runner = self.__runner()
+                runner.fix_interrupted()
+                self.assertEqual(sorted(runner.configured), ["foo", "libfoo"])
+                self.assertTrue(all(pkg.is_configured for pkg in self.__cache if pkg.is_installed))
+                self.assertFalse(os.path.exists(constants.PATH_TO_UNCOMPLETED_TASKS))
+                # The next run finds nothing to fix
+                with self.assertRaises(NothingInterruptedError):
+                    self.__runner().fix_interrupted()
+                self.__runner().perform_operations(Tasks.from_suffixed_operations(["foo-", "libfoo-"]))
+
+    def test_interrupted_after_dpkg(self):
+        self.__interrupt("after", ["foo+"])
+        self.assertEqual(self.__cache.commit_count, 1)
+        runner = self.__runner()
+        runner.fix_interrupted()
+        self.assertNotIn("commit", {span.name for span in runner.profiler.spans})
+        self.assertEqual(self.__cache.commit_count, 1)
+        self.assertFalse(os.path.exists(constants.PATH_TO_UNCOMPLETED_TASKS))
+
+
+if __name__ == "__main__":
+    unittest.main()
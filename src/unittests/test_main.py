@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from limitedapt import constants
+import main
+
+
+class UnprivilegedFastPathTestCase(unittest.TestCase):
+
+    def test_subcommand_of(self):
+        self.assertEqual(main.subcommand_of(["list-of-mine"]), "list-of-mine")
+        self.assertEqual(main.subcommand_of(["-a", "-v", "owners-of", "bash"]), "owners-of")
+        self.assertEqual(main.subcommand_of(["--profile-output", "list-of-mine", "install", "foo"]), "install")
+        self.assertEqual(main.subcommand_of(["--profile-output=out.json", "print-enclosure"]), "print-enclosure")
+        self.assertEqual(main.subcommand_of(["--", "install"]), "install")
+        self.assertIsNone(main.subcommand_of(["--version"]))
+
+    def test_may_run_unprivileged(self):
+        old_variable = constants.PATH_TO_PROGRAM_VARIABLE
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ):
+            os.environ.pop("LIMITED_APT_ALWAYS_ESCALATE", None)
+            constants.PATH_TO_PROGRAM_VARIABLE = directory
+            try:
+                self.assertTrue(main.may_run_unprivileged(["-a", "ownership-report"]))
+                self.assertFalse(main.may_run_unprivileged(["install", "foo"]))
+                self.assertFalse(main.may_run_unprivileged(["update"]))
+                os.environ["LIMITED_APT_ALWAYS_ESCALATE"] = "1"
+                self.assertFalse(main.may_run_unprivileged(["list-of-mine"]))
+                del os.environ["LIMITED_APT_ALWAYS_ESCALATE"]
+                constants.PATH_TO_PROGRAM_VARIABLE = os.path.join(directory, "nothing")
+                self.assertFalse(main.may_run_unprivileged(["list-of-mine"]))
+            finally:
+                constants.PATH_TO_PROGRAM_VARIABLE = old_variable
+
+
+if __name__ == "__main__":
+    unittest.main()
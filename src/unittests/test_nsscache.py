@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import grp
+import os
+import pwd
+import tempfile
+import unittest
+from limitedapt.errors import GroupNotExistError
+from limitedapt.nsscache import *
+from limitedapt.profiling import Profiler
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def some_user():
+    '''User with a primary group and the name of the group'''
+    entry = pwd.getpwuid(os.getuid())
+    return entry.pw_name, grp.getgrgid(entry.pw_gid).gr_name
+
+
+class NssCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__filename = os.path.join(self.__directory.name, "nss-cache")
+        self.__clock = Clock()
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __cache(self, **kwargs):
+        return NssCache(self.__filename, ttl=60, clock=self.__clock, **kwargs)
+
+    def test_resolution(self):
+        user_name, group_name = some_user()
+        cache = self.__cache()
+        self.assertEqual(cache.user_name(os.getuid()), user_name)
+        # The primary group counts as well
+        self.assertTrue(cache.is_belong_to_group(user_name, group_name))
+        self.assertFalse(cache.is_belong_to_group("no-such-user-here", group_name))
+        with self.assertRaises(GroupNotExistError) as context:
+            cache.is_belong_to_group(user_name, "no-such-group-here")
+        self.assertEqual(context.exception.group_name, "no-such-group-here")
+
+    def test_hits_and_expiration(self):
+        user_name, group_name = some_user()
+        profiler = Profiler()
+        cache = self.__cache(profiler=profiler)
+        cache.is_belong_to_group(user_name, group_name)
+        self.assertEqual((cache.statistics.hits, cache.statistics.lookups), (0, 2))
+        self.assertEqual([span.name for span in profiler.spans], ["nss-lookup", "nss-lookup"])
+        cache.is_belong_to_group(user_name, group_name)
+        self.assertEqual((cache.statistics.hits, cache.statistics.lookups), (2, 2))
+
+        # The next run takes the results from the file
+        self.__clock.now += 30
+        cache = self.__cache()
+        self.assertTrue(cache.is_belong_to_group(user_name, group_name))
+        self.assertEqual((cache.statistics.hits, cache.statistics.lookups), (2, 0))
+
+        self.__clock.now += 31
+        cache = self.__cache()
+        cache.is_belong_to_group(user_name, group_name)
+        self.assertEqual((cache.statistics.hits, cache.statistics.lookups), (0, 2))
+
+        # Clock turned back
+        self.__clock.now -= 1000
+        cache = self.__cache()
+        cache.user_name(os.getuid())
+        self.assertEqual(cache.statistics.lookups, 1)
+
+    def test_bad_and_unwritable_file(self):
+        user_name, group_name = some_user()
+        with open(self.__filename, "wb") as file:
+            file.write(b"garbage")
+        self.assertTrue(self.__cache().is_belong_to_group(user_name, group_name))
+        cache = NssCache(os.path.join(self.__directory.name, "no", "such", "directory"), clock=self.__clock)
+        self.assertEqual(cache.user_name(os.getuid()), user_name)
+        cache = NssCache(None)
+        cache.user_name(os.getuid())
+        cache.user_name(os.getuid())
+        self.assertEqual((cache.statistics.hits, cache.statistics.lookups), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import importlib.util
+import os
+import tempfile
+import unittest
+from limitedapt.debconf import *
+from limitedapt.packages import *
+
+
+def load_tool_module(name, filename):
+    '''Module of a tool loaded without adding its directory to "sys.path" (tools have their own "main.py")'''
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+compact = load_tool_module("obtain_priorities_compact",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools",
+                                        "obtain-priorities", "compact.py"))
+
+
+FOO = ConcretePackage("foo", "amd64")
+BAR = ConcretePackage("bar", "amd64")
+BAZ = ConcretePackage("baz", "i386")
+
+
+class ObtainPrioritiesCheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__priorities_filename = os.path.join(self.__directory.name, "priorities")
+        self.__script_types_filename = os.path.join(self.__directory.name, "script-types")
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def __write_script_types(self, *packages):
+        with open(self.__script_types_filename, "w") as file:
+            for package in packages:
+                print(str(package), "utf-8", "/bin/sh", file=file)
+
+    def __script_types(self):
+        with open(self.__script_types_filename) as file:
+            return [line.split()[0] for line in file]
+
+    def __checkpoint(self):
+        return DebconfPrioritiesDB("sqlite:///" + compact.checkpoint_filename(self.__priorities_filename))
+
+    def test_resume_does_not_duplicate_script_types(self):
+        # The run has been interrupted after "bar" is processed but before it is committed
+        checkpoint = self.__checkpoint()
+        checkpoint[FOO] = PackageState(Status.HAS_QUESTIONS, Priority.HIGH)
+        checkpoint.commit()
+        self.__write_script_types(FOO, BAR)
+        # The resumed run processes all the packages not well processed in the checkpoint once again
+        reprocessed = {str(package) for package in [BAR, BAZ] if not self.__checkpoint().well_processed(package)}
+        with compact.open_script_types(self.__script_types_filename, False, True, reprocessed) as file:
+            for package in [BAR, BAZ]:
+                print(str(package), "utf-8", "/bin/sh", file=file)
+        self.assertEqual(self.__script_types(), ["foo:amd64", "bar:amd64", "baz:i386"])
+        self.assertFalse(os.path.exists(self.__script_types_filename + ".backup"))
+
+    def test_new_run(self):
+        self.__write_script_types(FOO)
+        with compact.open_script_types(self.__script_types_filename, False, False, {"bar:amd64"}) as file:
+            print(str(BAR), "utf-8", "/bin/sh", file=file)
+        self.assertEqual(self.__script_types(), ["foo:amd64", "bar:amd64"])
+        # Repeat mode writes the file anew
+        with compact.open_script_types(self.__script_types_filename, True, False, {"bar:amd64"}) as file:
+            print(str(BAR), "utf-8", "/bin/sh", file=file)
+        self.assertEqual(self.__script_types(), ["bar:amd64"])
+        with open(self.__script_types_filename + ".backup") as file:
+            self.assertEqual([line.split()[0] for line in file], ["foo:amd64", "bar:amd64"])
+
+    def test_compact(self):
+        priorities = DebconfPriorities()
+        priorities[FOO] = PackageState(Status.PROCESSING_ERROR)
+        priorities[BAR] = PackageState(Status.NO_CONFIG_FILE)
+        priorities.export_to_xml(self.__priorities_filename)
+        checkpoint = self.__checkpoint()
+        checkpoint[FOO] = PackageState(Status.HAS_QUESTIONS, Priority.HIGH)
+        checkpoint[BAZ] = PackageState(Status.HAS_NOT_QUESTIONS)
+        checkpoint.commit()
+        db_filename = os.path.join(self.__directory.name, "priorities.sqlite")
+
+        compact.compact(self.__priorities_filename, db_filename, keep_checkpoint=True)
+        self.assertTrue(os.path.exists(compact.checkpoint_filename(self.__priorities_filename)))
+        compact.compact(self.__priorities_filename, db_filename, keep_checkpoint=False)
+        self.assertFalse(os.path.exists(compact.checkpoint_filename(self.__priorities_filename)))
+
+        expected = {FOO: PackageState(Status.HAS_QUESTIONS, Priority.HIGH), BAR: PackageState(Status.NO_CONFIG_FILE),
+                    BAZ: PackageState(Status.HAS_NOT_QUESTIONS)}
+        compacted = DebconfPriorities()
+        compacted.import_from_xml(self.__priorities_filename)
+        self.assertEqual(dict(compacted.items()), expected)
+        self.assertEqual(dict(DebconfPrioritiesDB("sqlite:///" + db_filename).items()), expected)
+        backup = DebconfPriorities()
+        backup.import_from_xml(self.__priorities_filename + ".backup")
+        self.assertEqual(backup[FOO], PackageState(Status.HAS_QUESTIONS, Priority.HIGH))
+
+    def test_compact_without_checkpoint(self):
+        compact.compact(self.__priorities_filename, None, keep_checkpoint=False)
+        self.assertFalse(os.path.exists(self.__priorities_filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
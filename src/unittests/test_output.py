@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import io
+import json
+import unittest
+from limitedapt.output import *
+
+
+class RecordingStream(io.BytesIO):
+    '''Remembers sizes of the separate writes'''
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(len(data))
+        return super().write(data)
+
+
+ENTRIES = [("bash", {"name": "bash", "architecture": "amd64"}),
+           ("wine32:i386", {"name": "wine32", "architecture": "i386"}),
+           ("пакет", {"name": "пакет", "architecture": "all"})]
+
+
+class ChunkedWriterTestCase(unittest.TestCase):
+
+    def __write(self, output_format, entries=ENTRIES, chunk_size=DEFAULT_CHUNK_SIZE):
+        stream = RecordingStream()
+        with ChunkedWriter(stream, output_format, chunk_size) as writer:
+            writer.write_all(entries)
+        return stream
+
+    def test_plain(self):
+        self.assertEqual(self.__write(OutputFormat.PLAIN).getvalue().decode(), "bash\nwine32:i386\nпакет\n")
+
+    def test_nul(self):
+        self.assertEqual(self.__write("nul").getvalue().decode().split("\0"), ["bash", "wine32:i386", "пакет", ""])
+
+    def test_json_lines(self):
+        lines = self.__write(OutputFormat.JSON_LINES).getvalue().decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [fields for text, fields in ENTRIES])
+        stream = io.BytesIO()
+        with ChunkedWriter(stream, OutputFormat.JSON_LINES) as writer:
+            writer.write("bash")
+        self.assertEqual(json.loads(stream.getvalue()), {"name": "bash"})
+
+    def test_chunks(self):
+        entries = [("package{0:04}".format(number), None) for number in range(1000)]
+        stream = self.__write(OutputFormat.PLAIN, entries, chunk_size=1000)
+        self.assertEqual(stream.getvalue().decode().splitlines(), [text for text, fields in entries])
+        # The first entry goes at once, the rest in chunks
+        self.assertEqual(stream.writes[0], len("package0000\n"))
+        self.assertTrue(all(size >= 1000 for size in stream.writes[1:-1]))
+        self.assertLess(len(stream.writes), 20)
+
+    def test_first_entry_without_waiting(self):
+        stream = RecordingStream()
+
+        def entries():
+            yield "bash", None
+            # Nothing is written before the first entry has been flushed
+            self.assertEqual(stream.getvalue(), b"bash\n")
+            yield "dash", None
+
+        with ChunkedWriter(stream) as writer:
+            writer.write_all(entries())
+            self.assertEqual(writer.written, 2)
+        self.assertEqual(stream.getvalue(), b"bash\ndash\n")
+
+    def test_nothing(self):
+        self.assertEqual(self.__write(OutputFormat.NUL, []).getvalue(), b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from limitedapt import constants
+from limitedapt import single
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+from limitedapt.enclosure import *
+from limitedapt.modes import *
+from limitedapt.packages import *
+from limitedapt.plancache import *
+from limitedapt.planning import RecordingHandlers, RecordingApplying
+from limitedapt.profiling import Profiler
+from limitedapt.runners import *
+from limitedapt.settings import Settings, EnclosureRecord
+from limitedapt.synthetic import *
+from limitedapt.tasks import *
+from limitedapt.updatetime import UpdateTimes
+
+
+ROOT_ID = 0
+
+
+def make_cache():
+    cache = SyntheticCache()
+    cache.create_package("libbase", installed=True, auto=True)
+    cache.create_package("libfoo", [("libbase",)])
+    cache.create_package("foo", [("libfoo",), ("foo-data", "foo-data-alt")])
+    cache.create_package("foo-data")
+    cache.create_package("foo-data-alt")
+    cache.create_package("bar", [("libbase",)], installed=True)
+    return cache
+
+
+class RootRunner(ModificationRunner):
+
+    @staticmethod
+    def _minimal_debconf_priority():
+        return Priority.HIGH
+
+
+class ResolvedPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old_constants = {name: getattr(constants, name)
+                                for name in ["PATH_TO_PROGRAM_VARIABLE", "PATH_TO_UNCOMPLETED_TASKS",
+                                             "PATH_TO_APT_PKGCACHE", "PATH_TO_DPKG_STATUS",
+                                             "PATH_TO_APT_EXTENDED_STATES"]}
+        directory = self.__directory.name
+        constants.PATH_TO_PROGRAM_VARIABLE = directory
+        constants.PATH_TO_UNCOMPLETED_TASKS = os.path.join(directory, constants.UNCOMPLETED_TASKS_FILENAME)
+        constants.PATH_TO_APT_PKGCACHE = os.path.join(directory, "pkgcache.bin")
+        constants.PATH_TO_DPKG_STATUS = os.path.join(directory, "status")
+        constants.PATH_TO_APT_EXTENDED_STATES = os.path.join(directory, "extended_states")
+        for filename in [constants.PATH_TO_APT_PKGCACHE, constants.PATH_TO_DPKG_STATUS]:
+            with open(filename, "w") as file:
+                file.write("Package: libbase\n")
+        self.__plan_filename = os.path.join(directory, constants.RESOLVED_PLANS_DIRNAME, "root")
+
+        self.__cache = make_cache()
+        single.set_cache_factory(lambda: self.__cache)
+
+        enclosure = Enclosure()
+        for name in ["libfoo", "foo", "foo-data", "foo-data-alt", "bar"]:
+            enclosure.add_versioned_package(VersionedPackage(name, "amd64", "1.0-1"))
+        enclosure.export_to_xml(os.path.join(directory, "main.enclosure"))
+        CoownershipList().export_to_xml(os.path.join(directory, "coownership-list"))
+        priorities = DebconfPrioritiesDB("sqlite:///" + os.path.join(directory, "debconf-priorities.sqlite"))
+        priorities.add_new((ConcretePackage(pkg.shortname, "amd64"), PackageState(Status.HAS_NOT_QUESTIONS))
+                           for pkg in self.__cache)
+        priorities.commit()
+        update_times = UpdateTimes()
+        update_times.distro = update_times.enclosure = update_times.priorities = datetime.now()
+        update_times.export_to_xml(os.path.join(directory, "updatetimes"))
+
+        self.__settings = Settings(directory)
+        self.__settings.urls.enclosures = [EnclosureRecord("main", "file:///dev/null")]
+        self.__settings.updatetime_module = SimpleNamespace(is_distro_update_needed=lambda last_update: False,
+                                                            is_enclosure_update_needed=lambda last_update: False,
+                                                            is_priorities_update_needed=lambda last_update: False)
+
+    def tearDown(self):
+        single.set_cache_factory(single.apt_cache_factory)
+        for name, value in self.__old_constants.items():
+            setattr(constants, name, value)
+        self.__directory.cleanup()
+
+    def __runner(self, simulate):
+        # Force skips checking of free space which depends on the real file system
+        work_modes = WorkModes(remove_dependencies=False, force=True, purge_unused=False, fatal_errors=False,
+                               assume_yes=True, simulate=simulate)
+        return RootRunner(self.__settings, ROOT_ID, DisplayModes(False, False, False), work_modes,
+                          RecordingHandlers(), RecordingApplying(), Progresses(None, None, None), None,
+                          Profiler())
+
+    def __simulate(self, operations):
+        self.__runner(simulate=True).perform_operations(Tasks.from_suffixed_operations(operations))
+        # The simulating process exits leaving the cache marked
+        self.__cache.clear()
+
+    @staticmethod
+    def __span_names(runner):
+        return {span.name for span in runner.profiler.spans}
+
+    def __installed(self):
+        return sorted(pkg.name for pkg in self.__cache if pkg.is_installed)
+
+    def test_real_run_reuses_simulation(self):
+        self.__simulate(["foo+", "bar-"])
+        self.assertTrue(os.path.exists(self.__plan_filename))
+        self.assertEqual(self.__cache.commit_count, 0)
+
+        runner = self.__runner(simulate=False)
+        runner.perform_operations(Tasks.from_suffixed_operations(["foo+", "bar-"]))
+        self.assertIn("plan-replaying", self.__span_names(runner))
+        self.assertNotIn("resolution", self.__span_names(runner))
+        self.assertEqual(self.__cache.commit_count, 1)
+        self.assertEqual(self.__installed(), ["foo", "foo-data", "libbase", "libfoo"])
+        self.assertFalse(self.__cache["foo"].is_auto_installed)
+        self.assertTrue(self.__cache["libfoo"].is_auto_installed)
+        self.assertFalse(os.path.exists(self.__plan_filename))
+        self.assertFalse(os.path.exists(constants.PATH_TO_UNCOMPLETED_TASKS))
+
+    def test_real_run_without_plan(self):
+        runner = self.__runner(simulate=False)
+        runner.perform_operations(Tasks.from_suffixed_operations(["foo+"]))
+        self.assertIn("resolution", self.__span_names(runner))
+        self.assertNotIn("plan-key", self.__span_names(runner))
+        self.assertEqual(self.__cache.commit_count, 1)
+
+    def test_other_tasks_are_resolved(self):
+        self.__simulate(["foo+"])
+        runner = self.__runner(simulate=False)
+        runner.perform_operations(Tasks.from_suffixed_operations(["bar-"]))
+        self.assertIn("resolution", self.__span_names(runner))
+        self.assertNotIn("plan-replaying", self.__span_names(runner))
+        self.assertEqual(self.__installed(), ["libbase"])
+
+    def test_stale_plan(self):
+        self.__simulate(["foo+"])
+        with open(constants.PATH_TO_DPKG_STATUS, "a") as file:
+            file.write("Package: bar\n")
+        with self.assertRaises(StaleResolvedPlanError) as context:
+            self.__runner(simulate=False).apply_resolved_plan()
+        self.assertEqual(context.exception.differences, ['file "{0}"'.format(constants.PATH_TO_DPKG_STATUS)])
+        self.assertEqual(self.__cache.commit_count, 0)
+
+        runner = self.__runner(simulate=False)
+        runner.perform_operations(Tasks.from_suffixed_operations(["foo+"]))
+        self.assertIn("resolution", self.__span_names(runner))
+        self.assertEqual(self.__installed(), ["bar", "foo", "foo-data", "libbase", "libfoo"])
+
+    def test_changed_candidate(self):
+        self.__simulate(["foo+"])
+        pkg = self.__cache["foo-data"]
+        pkg.candidate = SyntheticVersion(pkg, "2.0-1", "amd64", 100, 300)
+        with self.assertRaises(StaleResolvedPlanError):
+            self.__runner(simulate=False).apply_resolved_plan()
+        self.assertEqual(self.__cache.get_changes(), [])
+
+    def test_apply_plan(self):
+        with self.assertRaises(NoResolvedPlanError):
+            self.__runner(simulate=False).apply_resolved_plan()
+        self.__simulate(["foo+"])
+        with self.assertRaises(StaleResolvedPlanError) as context:
+            self.__runner(simulate=False).apply_resolved_plan(Tasks.from_suffixed_operations(["bar-"]))
+        self.assertEqual(context.exception.differences, ["tasks"])
+        self.__runner(simulate=False).apply_resolved_plan(Tasks.from_suffixed_operations(["foo+"]))
+        self.assertEqual(self.__installed(), ["bar", "foo", "foo-data", "libbase", "libfoo"])
+        self.assertFalse(os.path.exists(self.__plan_filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
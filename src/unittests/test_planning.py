@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pwd
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from limitedapt import constants
+from limitedapt import single
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+from limitedapt.enclosure import *
+from limitedapt.modes import *
+from limitedapt.packages import *
+from limitedapt.planning import *
+from limitedapt.settings import Settings, EnclosureRecord
+from limitedapt.synthetic import *
+from limitedapt.tasks import *
+from limitedapt.updatetime import UpdateTimes
+
+
+USER_ID = 1
+
+
+def make_cache():
+    cache = SyntheticCache()
+    cache.create_package("libbase", installed=True, auto=True)
+    cache.create_package("libfoo", [("libbase",)])
+    cache.create_package("foo", [("libfoo",), ("foo-data", "foo-data-alt")])
+    cache.create_package("foo-data")
+    cache.create_package("foo-data-alt")
+    cache.create_package("secret")
+    cache.create_package("needy", [("secret",)])
+    cache.create_package("asking")
+    cache.create_package("bar", [("libbase",)], installed=True)
+    return cache
+
+
+class TestPlanner(WhatIfPlanner):
+
+    @staticmethod
+    def _is_belong_to_group(user_name, group_name):
+        return group_name != constants.UNIX_LIMITEDAPT_ROOTS_GROUPNAME
+
+    @staticmethod
+    def _minimal_debconf_priority():
+        return Priority.HIGH
+
+
+class WhatIfPlannerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old_variable = constants.PATH_TO_PROGRAM_VARIABLE
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__directory.name
+        self.__cache = make_cache()
+        single.set_cache_factory(lambda: self.__cache)
+        self.__username = pwd.getpwuid(USER_ID).pw_name
+
+        enclosure = Enclosure()
+        for name in ["libfoo", "foo", "foo-data", "foo-data-alt", "needy", "asking", "bar"]:
+            enclosure.add_versioned_package(VersionedPackage(name, "amd64", "1.0-1"))
+        enclosure.export_to_xml(os.path.join(self.__directory.name, "main.enclosure"))
+        coownership = CoownershipList()
+        coownership.add_ownership(ConcretePackage("bar", "amd64"), self.__username)
+        coownership.export_to_xml(os.path.join(self.__directory.name, "coownership-list"))
+        self.__coownership_filename = os.path.join(self.__directory.name, "coownership-list")
+        priorities = DebconfPrioritiesDB("sqlite:///" + os.path.join(self.__directory.name, "debconf-priorities.sqlite"))
+        priorities.add_new((ConcretePackage(pkg.shortname, "amd64"), PackageState(Status.HAS_NOT_QUESTIONS))
+                           for pkg in self.__cache if pkg.shortname != "asking")
+        priorities.add_new([(ConcretePackage("asking", "amd64"), PackageState(Status.HAS_QUESTIONS, Priority.CRITICAL))])
+        priorities.commit()
+        update_times = UpdateTimes()
+        update_times.distro = update_times.enclosure = update_times.priorities = datetime.now()
+        update_times.export_to_xml(os.path.join(self.__directory.name, "updatetimes"))
+
+        self.__settings = Settings(self.__directory.name)
+        self.__settings.urls.enclosures = [EnclosureRecord("main", "file:///dev/null")]
+        self.__settings.updatetime_module = SimpleNamespace(is_distro_update_needed=lambda last_update: False,
+                                                            is_enclosure_update_needed=lambda last_update: False,
+                                                            is_priorities_update_needed=lambda last_update: False)
+
+    def tearDown(self):
+        single.set_cache_factory(single.apt_cache_factory)
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__old_variable
+        self.__directory.cleanup()
+
+    def __planner(self):
+        work_modes = WorkModes(remove_dependencies=False, force=False, purge_unused=False, fatal_errors=False,
+                               assume_yes=True, simulate=True)
+        return TestPlanner(self.__settings, USER_ID, DisplayModes(False, False, False), work_modes, None)
+
+    def test_verdicts(self):
+        task_sets = ["foo+", "secret+", "needy+", "asking+", "bar-", "not-a-package+", "foo+ bar-", "foo-data%M"]
+        with open(self.__coownership_filename, "rb") as file:
+            coownership_before = file.read()
+        verdicts = list(self.__planner().plan_all(Tasks.from_suffixed_operations(task_set.split())
+                                                  for task_set in task_sets))
+        self.assertEqual([verdict.allowed for verdict in verdicts], [True, False, False, False, True, True, True, True])
+        self.assertEqual(sorted(pkg.name for pkg in verdicts[0].changes.physically_installed),
+                         ["foo", "foo-data", "libfoo"])
+        self.assertIsNone(verdicts[1].changes)
+        self.assertEqual([str(message) for message in verdicts[2].messages], ["may_not_install(secret)"])
+        self.assertEqual([message.name for message in verdicts[3].messages], ["may_not_debconf_configure"])
+        self.assertEqual([pkg.name for pkg in verdicts[4].changes.physically_removed], ["bar"])
+        self.assertEqual([message.name for message in verdicts[5].messages], ["cannot_find_package"])
+        self.assertEqual([message.name for message in verdicts[7].messages], ["is_not_installed"])
+        # Nothing is left marked or saved
+        self.assertEqual(self.__cache.get_changes(), [])
+        with open(self.__coownership_filename, "rb") as file:
+            self.assertEqual(file.read(), coownership_before)
+
+    def test_planner_is_independent_of_order(self):
+        planner = self.__planner()
+        alone = planner.plan(Tasks.from_suffixed_operations(["foo+"]))
+        planner.plan(Tasks.from_suffixed_operations(["bar-"]))
+        planner.plan(Tasks.from_suffixed_operations(["secret+"]))
+        again = planner.plan(Tasks.from_suffixed_operations(["foo+"]))
+        self.assertEqual(alone.allowed, again.allowed)
+        self.assertEqual([str(message) for message in alone.messages], [str(message) for message in again.messages])
+
+
+class SuffixedOperationsTestCase(unittest.TestCase):
+
+    def test_parsing(self):
+        tasks = Tasks.from_suffixed_operations(["a+", "b-", "c^", "d_", "e%M", "f%m"])
+        self.assertEqual((tasks.install, tasks.remove, tasks.physically_remove, tasks.purge, tasks.markauto,
+                          tasks.unmarkauto), (["a"], ["b"], ["c"], ["d"], ["e"], ["f"]))
+        with self.assertRaises(InvalidOperationSuffix) as context:
+            Tasks.from_suffixed_operations(["a+", "b"])
+        self.assertEqual(context.exception.operation, "b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+import time
+import unittest
+from limitedapt.prefetch import *
+from limitedapt.synthetic import SyntheticCache
+
+
+class FetchCancelled(Exception): pass
+
+
+class PulsingCache(SyntheticCache):
+    '''Downloads "archive_count" archives pulsing the progress after each one as apt does'''
+
+    def __init__(self, archive_count, delay=0.01, error=None):
+        super().__init__()
+        self.archive_count = archive_count
+        self.delay = delay
+        self.error = error
+        self.fetched = 0
+        self.started = threading.Event()
+
+    def fetch_archives(self, progress=None, fetcher=None):
+        progress.start()
+        self.started.set()
+        try:
+            for index in range(self.archive_count):
+                time.sleep(self.delay)
+                if self.error is not None:
+                    raise self.error
+                self.fetched += 1
+                if not progress.pulse(None):
+                    raise FetchCancelled()
+        finally:
+            progress.stop()
+        return True
+
+
+class ArchivePrefetchTestCase(unittest.TestCase):
+
+    def test_completed(self):
+        cache = PulsingCache(5)
+        prefetch = ArchivePrefetch(cache)
+        prefetch.start()
+        self.assertTrue(prefetch.wait())
+        self.assertEqual(cache.fetched, 5)
+        self.assertIsNone(prefetch.error)
+        self.assertFalse(prefetch.cancelled)
+
+    def test_cancel(self):
+        cache = PulsingCache(10000)
+        prefetch = ArchivePrefetch(cache)
+        prefetch.start()
+        cache.started.wait()
+        prefetch.cancel()
+        self.assertTrue(prefetch.cancelled)
+        self.assertFalse(prefetch.completed)
+        self.assertIsInstance(prefetch.error, FetchCancelled)
+        self.assertLess(cache.fetched, cache.archive_count)
+
+    def test_failure_is_not_raised(self):
+        prefetch = ArchivePrefetch(PulsingCache(3, error=IOError("network is unreachable")))
+        prefetch.start()
+        self.assertFalse(prefetch.wait())
+        self.assertIsInstance(prefetch.error, IOError)
+
+    def test_not_started(self):
+        prefetch = ArchivePrefetch(PulsingCache(3))
+        prefetch.cancel()
+        self.assertFalse(prefetch.wait())
+
+
+if __name__ == "__main__":
+    unittest.main()
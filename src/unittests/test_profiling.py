@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+import tempfile
+import unittest
+from limitedapt.profiling import *
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__profiler = Profiler()
+        with self.__profiler.span("loading"):
+            with self.__profiler.span("parsing"):
+                pass
+        with self.__profiler.span("parsing"):
+            pass
+
+    def test_spans(self):
+        spans = sorted(self.__profiler.spans, key=lambda span: span.start)
+        self.assertEqual([(span.name, span.depth) for span in spans], [("loading", 0), ("parsing", 1), ("parsing", 0)])
+        self.assertGreaterEqual(spans[0].duration, spans[1].duration)
+
+    def test_phases(self):
+        phases = self.__profiler.phases()
+        self.assertEqual([(statistics.name, statistics.count) for statistics in phases],
+                         [("loading", 1), ("parsing", 2)])
+        self.assertEqual(len(self.__profiler.format_phases()), 4)
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False)
+        with profiler.span("loading"):
+            pass
+        self.assertEqual(profiler.spans, [])
+
+    def test_exception(self):
+        with self.assertRaises(ValueError):
+            with self.__profiler.span("failing"):
+                raise ValueError()
+        self.assertIn("failing", [span.name for span in self.__profiler.spans])
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "profile.json")
+            self.__profiler.export_to_json(filename)
+            with open(filename) as file:
+                data = json.load(file)
+            self.assertEqual([phase["name"] for phase in data["phases"]], ["loading", "parsing"])
+            self.__profiler.export_to_chrome_trace(filename)
+            with open(filename) as file:
+                data = json.load(file)
+            self.assertEqual(len(data["traceEvents"]), 3)
+            self.assertTrue(all(event["ph"] == "X" for event in data["traceEvents"]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from limitedapt.enclosure import *
+from limitedapt.packages import *
+from limitedapt.rules import *
+from limitedapt.synthetic import *
+
+
+def package(name, version="1.0-1", architecture="amd64", section="utils", priority="optional", tags=(),
+            origins=(("Debian", "stable"),)):
+    return DescribedPackage(name, architecture, version, section, priority, tags, origins)
+
+
+class RuleEnclosureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__enclosure = Enclosure()
+        self.__enclosure.import_from_xml("data/enclosure-rules1")
+
+    def test_import(self):
+        self.assertEqual(self.__enclosure.revision, "7")
+        self.assertEqual(len(self.__enclosure.rules), 4)
+        self.assertEqual(self.__enclosure.rules[1].versions, [(">=", "1:2.0"), ("<<", "1:3.0")])
+        self.assertEqual(self.__enclosure.rules[3].origins, [("Debian", "stable-backports")])
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "enclosure")
+            self.__enclosure.export_to_xml(filename)
+            with open(filename) as exported, open("data/enclosure-rules1") as original:
+                self.assertEqual(exported.read(), original.read())
+
+    def test_glob_and_section(self):
+        self.assertIn(package("bash-doc", section="doc"), self.__enclosure)
+        self.assertIn(package("bash-doc", section="non-free/doc"), self.__enclosure)
+        self.assertNotIn(package("bash-doc", section="shells"), self.__enclosure)
+        self.assertNotIn(package("bash-docs", section="doc"), self.__enclosure)
+
+    def test_regex_arch_and_versions(self):
+        self.assertIn(package("python3-lxml", "1:2.5-1"), self.__enclosure)
+        self.assertIn(package("python3-lxml", "1:2.5-1", "all"), self.__enclosure)
+        self.assertNotIn(package("python3-lxml", "1:2.5-1", "i386"), self.__enclosure)
+        self.assertNotIn(package("python3-lxml", "2.5-1"), self.__enclosure)
+        self.assertNotIn(package("python3-lxml", "1:3.0"), self.__enclosure)
+        self.assertIn(package("python3-lxml", "1:3.0~rc1"), self.__enclosure)
+        self.assertNotIn(package("python3-lxml2", "1:2.5-1"), self.__enclosure)
+
+    def test_tags(self):
+        self.assertIn(package("manpages", tags=["role::documentation", "use::browsing"]), self.__enclosure)
+        self.assertNotIn(package("manpages", tags=["role::documentation"]), self.__enclosure)
+        self.assertNotIn(package("manpages", tags=["use::browsing"]), self.__enclosure)
+
+    def test_priority_and_origin(self):
+        self.assertIn(package("foo", priority="extra", origins=[("Debian", "stable"), ("Debian", "stable-backports")]),
+                      self.__enclosure)
+        self.assertNotIn(package("foo", priority="extra"), self.__enclosure)
+        self.assertNotIn(package("foo", origins=[("Debian", "stable-backports")]), self.__enclosure)
+
+    def test_explicit_packages(self):
+        self.assertIn(VersionedPackage("3dchess", "amd64", "0.8.1-17"), self.__enclosure)
+        self.assertNotIn(VersionedPackage("3dchess", "amd64", "0.8.1-16"), self.__enclosure)
+        # Properties that are unknown don't match
+        self.assertNotIn(VersionedPackage("bash-doc", "amd64", "1.0"), self.__enclosure)
+
+    def test_matching_rules(self):
+        matcher = self.__enclosure.matcher
+        self.assertEqual(matcher.matching_rules(package("bash-doc", section="doc", tags=["role::documentation",
+                                                                                          "use::viewing"])), 0b101)
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "enclosure")
+            store_enclosure(self.__enclosure, filename)
+            indexed = load_enclosure_index(filename)
+        self.assertEqual(indexed.rules, self.__enclosure.rules)
+        self.assertIn(package("bash-doc", section="doc"), indexed)
+
+    def test_bad_rule(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "enclosure")
+            with open(filename, "w") as file:
+                file.write('<enclosure><rule><version relation="~=" number="1"/></rule></enclosure>')
+            with self.assertRaises(EnclosureImportSyntaxError):
+                Enclosure().import_from_xml(filename)
+
+
+class DescribedPackageTestCase(unittest.TestCase):
+
+    def test_described_package(self):
+        cache = SyntheticCache()
+        pkg = SyntheticPackage(cache, "foo-doc", "amd64")
+        pkg.candidate = SyntheticVersion(pkg, "1.0-1", "all", 100, 300, "doc", "optional",
+                                         ["role::documentation", "use::browsing"])
+        cache.add_package(pkg)
+        described = described_package(pkg)
+        self.assertEqual((described.name, described.architecture, described.version), ("foo-doc", "all", "1.0-1"))
+        self.assertEqual(described.tags, frozenset(["role::documentation", "use::browsing"]))
+        self.assertEqual(described.origins, (("Debian", "stable"),))
+        enclosure = Enclosure()
+        enclosure.import_from_xml("data/enclosure-rules1")
+        self.assertIn(described, enclosure)
+
+    def test_without_rules(self):
+        cache = SyntheticCache()
+        pkg = SyntheticPackage(cache, "foo", "amd64")
+        pkg.candidate = SyntheticVersion(pkg, "1.0-1", "amd64", 100, 300)
+        cache.add_package(pkg)
+        enclosure = Enclosure()
+        enclosure.add_versioned_package(VersionedPackage("foo", "amd64", "1.0-1"))
+        package = described_package(pkg, enclosure=enclosure)
+        self.assertNotIsInstance(package, DescribedPackage)
+        self.assertIn(package, enclosure)
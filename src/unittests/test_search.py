@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import random
+import re
+import tempfile
+import unittest
+from limitedapt import constants
+from limitedapt import single
+from limitedapt.enclosure import *
+from limitedapt.modes import DisplayModes
+from limitedapt.packages import *
+from limitedapt.runners import PrintRunner
+from limitedapt.search import *
+from limitedapt.settings import Settings, EnclosureRecord
+from limitedapt.synthetic import *
+
+
+def make_cache():
+    cache = SyntheticCache()
+    cache.create_package("libfoo1", installed=True)
+    cache.create_package("libfoo1-compat", architecture="i386")
+    cache.create_package("libfoo-dev")
+    cache.create_package("foo")
+    cache.create_package("foo-doc", architecture="all")
+    cache.create_package("foobar")
+    cache.create_package("bar")
+    cache.create_package("libbar2")
+    cache.create_package("python3-foo", installed=True)
+    cache.create_package("not-enclosed")
+    return cache
+
+
+def make_enclosure(cache):
+    enclosure = Enclosure()
+    for pkg in cache:
+        if pkg.shortname != "not-enclosed":
+            enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.candidate.architecture,
+                                                             pkg.candidate.version))
+    return enclosure
+
+
+def names(entries):
+    return [entry.shortname + ":" + entry.architecture for entry in entries]
+
+
+class RequiredLiteralsTestCase(unittest.TestCase):
+
+    def test_literals(self):
+        self.assertEqual(required_literals("foo"), ["foo"])
+        self.assertEqual(required_literals("^lib.*-dev$"), ["lib", "-dev"])
+        self.assertEqual(required_literals("python3?-foo"), ["python", "-foo"])
+        self.assertEqual(required_literals("lib[a-z]+1"), ["lib", "1"])
+        self.assertEqual(required_literals("ab+c"), ["ab", "c"])
+        self.assertEqual(required_literals(r"g\+\+-\d+"), ["g++-"])
+        self.assertEqual(required_literals("x{0,2}yz"), ["yz"])
+        self.assertEqual(required_literals("lib(foo)?bar"), ["lib", "bar"])
+
+    def test_nothing_known(self):
+        self.assertEqual(required_literals("foo|bar"), [])
+        self.assertEqual(required_literals("(?i)foo"), [])
+        self.assertEqual(required_literals(".*"), [])
+
+    def test_literals_are_required(self):
+        random_generator = random.Random(0)
+        patterns = ["lib.*1", "fo+", "o?b", "lib(foo)*-", r"\w+-dev", "^[a-z]+3-", "ba?r", "foo$", "1|2"]
+        words = ["libfoo1", "libfoo-dev", "foobar", "bar", "br", "python3-foo", "fobar", "lib-", "libfoofoo-"]
+        words += ["".join(random_generator.choice("abfilor13-") for _ in range(8)) for _ in range(2000)]
+        for pattern in patterns:
+            literals = required_literals(pattern)
+            for word in words:
+                if re.search(pattern, word):
+                    self.assertTrue(all(literal in word for literal in literals), (pattern, word))
+
+
+class EnclosureSearchIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__cache = make_cache()
+        self.__index = EnclosureSearchIndex.build(self.__cache, make_enclosure(self.__cache), {})
+
+    def test_build(self):
+        self.assertEqual(len(self.__index), 9)
+        self.assertNotIn("not-enclosed:amd64", names(self.__index))
+        self.assertEqual([entry.name for entry in self.__index if entry.shortname.startswith("libfoo1")],
+                         ["libfoo1", "libfoo1-compat:i386"])
+
+    def test_prefix(self):
+        self.assertEqual(names(self.__index.search("libfoo", SearchMode.PREFIX)),
+                         ["libfoo-dev:amd64", "libfoo1:amd64", "libfoo1-compat:i386"])
+        self.assertEqual(names(self.__index.search("foo", "prefix")), ["foo:amd64", "foo-doc:all", "foobar:amd64"])
+        self.assertEqual(names(self.__index.search("zzz", SearchMode.PREFIX)), [])
+        self.assertEqual(len(list(self.__index.search("", SearchMode.PREFIX))), 9)
+
+    def test_substring(self):
+        self.assertEqual(names(self.__index.search("bar")), ["bar:amd64", "foobar:amd64", "libbar2:amd64"])
+        self.assertEqual(names(self.__index.search("o-")), ["foo-doc:all", "libfoo-dev:amd64"])
+        self.assertEqual(names(self.__index.search("enclosed")), [])
+
+    def test_regex(self):
+        self.assertEqual(names(self.__index.search("^lib.*[0-9]", SearchMode.REGEX)),
+                         ["libbar2:amd64", "libfoo1:amd64", "libfoo1-compat:i386"])
+        self.assertEqual(names(self.__index.search("doc|dev", SearchMode.REGEX)),
+                         ["foo-doc:all", "libfoo-dev:amd64"])
+        with self.assertRaises(BadSearchPatternError):
+            self.__index.search("lib(", SearchMode.REGEX)
+
+    def test_architecture(self):
+        self.assertEqual(names(self.__index.search("libfoo1", architecture="i386")), ["libfoo1-compat:i386"])
+        self.assertEqual(names(self.__index.search("", SearchMode.PREFIX, architecture="all")), ["foo-doc:all"])
+
+    def test_same_as_scanning(self):
+        cache = generate_cache(3000, seed=1)
+        enclosure = Enclosure()
+        for number, pkg in enumerate(cache):
+            if number % 3:
+                enclosure.add_versioned_package(VersionedPackage(pkg.shortname, pkg.candidate.architecture,
+                                                                 pkg.candidate.version))
+        index = EnclosureSearchIndex.build(cache, enclosure, {})
+        entries = list(index)
+        for pattern, mode in [("lib", SearchMode.PREFIX), ("a1", SearchMode.SUBSTRING), ("ab", SearchMode.SUBSTRING),
+                              ("xyz", SearchMode.SUBSTRING), ("^lib.*[0-9]+-", SearchMode.REGEX),
+                              ("a.b", SearchMode.REGEX), ("(ab|ba)c", SearchMode.REGEX)]:
+            if mode is SearchMode.PREFIX:
+                expected = [entry for entry in entries if entry.shortname.startswith(pattern)]
+            elif mode is SearchMode.SUBSTRING:
+                expected = [entry for entry in entries if pattern in entry.shortname]
+            else:
+                expected = [entry for entry in entries if re.search(pattern, entry.shortname)]
+            self.assertEqual(names(index.search(pattern, mode)), names(expected), pattern)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = search_index_filename(directory)
+            self.assertIsNone(load_search_index(filename))
+            index = EnclosureSearchIndex.build(self.__cache, make_enclosure(self.__cache), {"a": (1, 2)})
+            save_search_index(index, filename)
+            loaded = load_search_index(filename)
+            self.assertTrue(loaded.is_current({"a": (1, 2)}))
+            self.assertFalse(loaded.is_current({"a": (1, 3)}))
+            self.assertEqual(names(loaded.search("foo")), names(index.search("foo")))
+
+
+class SearchPrintRunner(PrintRunner):
+
+    cache = None
+
+    def _dpkg_status(self):
+        return SimpleStatus(self.cache)
+
+    @staticmethod
+    def _is_belong_to_group(user_name, group_name):
+        return False
+
+
+class SimpleStatus:
+    '''Installed packages of the synthetic cache'''
+
+    def __init__(self, cache):
+        self.__cache = cache
+
+    def find(self, name, architecture=None):
+        for pkg in self.__cache:
+            if pkg.shortname == name and pkg.candidate.architecture == architecture and pkg.is_installed:
+                return pkg
+        return None
+
+
+class SearchRunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__old_variable = constants.PATH_TO_PROGRAM_VARIABLE
+        self.__old_pkgcache = constants.PATH_TO_APT_PKGCACHE
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__directory.name
+        constants.PATH_TO_APT_PKGCACHE = os.path.join(self.__directory.name, "pkgcache.bin")
+        self.__cache = make_cache()
+        single.set_cache_factory(lambda: self.__cache)
+        SearchPrintRunner.cache = self.__cache
+        make_enclosure(self.__cache).export_to_xml(os.path.join(self.__directory.name, "main.enclosure"))
+        self.__settings = Settings(self.__directory.name)
+        self.__settings.urls.enclosures = [EnclosureRecord("main", "file:///dev/null")]
+
+    def tearDown(self):
+        single.set_cache_factory(single.apt_cache_factory)
+        constants.PATH_TO_PROGRAM_VARIABLE = self.__old_variable
+        constants.PATH_TO_APT_PKGCACHE = self.__old_pkgcache
+        self.__directory.cleanup()
+
+    def __runner(self, show_arch=False):
+        return SearchPrintRunner(self.__settings, 0, DisplayModes(show_arch, False, False), None)
+
+    def test_search(self):
+        runner = self.__runner()
+        self.assertEqual([text for text, fields in runner.get_search_entries("libfoo1")],
+                         ["libfoo1", "libfoo1-compat:i386"])
+        self.assertEqual(list(runner.get_search_entries("foo-d", SearchMode.PREFIX)),
+                         [("foo-doc", {"name": "foo-doc", "architecture": "all", "version": "1.0-1"})])
+        self.assertEqual([text for text, fields in self.__runner(True).get_search_entries("foo-do")], ["foo-doc:all"])
+
+    def test_installed(self):
+        runner = self.__runner()
+        self.assertEqual(names(runner.search_enclosure("foo", installed=True)),
+                         ["libfoo1:amd64", "python3-foo:amd64"])
+        self.assertEqual(names(runner.search_enclosure("libfoo", SearchMode.PREFIX, installed=False)),
+                         ["libfoo-dev:amd64", "libfoo1-compat:i386"])
+
+    def test_stored_index(self):
+        runner = self.__runner()
+        filename = search_index_filename(self.__directory.name)
+        index = EnclosureSearchIndex.build(self.__cache, Enclosure(), runner._search_index_sources())
+        save_search_index(index, filename)
+        # The stored index is current: nothing is found in it
+        self.assertEqual(list(runner.search_enclosure("foo")), [])
+        with open(constants.PATH_TO_APT_PKGCACHE, "w") as file:
+            file.write("changed")
+        # The package cache has changed since: the index is made anew
+        self.assertEqual(len(list(runner.search_enclosure("foo"))), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from limitedapt.debconf import *
+from limitedapt.packages import *
+from limitedapt.sharding import *
+
+
+OBTAIN_PRIORITIES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools",
+                                           "obtain-priorities")
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PACKAGE_COUNT = 24
+SHARD_COUNT = 4
+# Seconds a shard (or merging) may take before it is considered hung
+TIMEOUT = 120
+
+
+def package_name(index):
+    return "pkg{0:02}".format(index)
+
+
+def fake_state(name):
+    index = int(name[3:])
+    if index % 3 == 0:
+        return PackageState(Status.HAS_QUESTIONS, list(Priority)[index % len(Priority)])
+    elif index % 3 == 1:
+        return PackageState(Status.NO_CONFIG_FILE)
+    else:
+        return PackageState(Status.HAS_NOT_QUESTIONS)
+
+
+def can_run_obtain_priorities():
+    return all(shutil.which(program) is not None for program in ["dpkg-deb", "dpkg-scanpackages", "apt-get"]) and \
+           all(importlib.util.find_spec(module) is not None for module in ["apt", "apt_pkg", "chardet"])
+
+
+def make_repository(directory):
+    '''Flat apt repository of packages whose debconf "config" scripts give "fake_state"'''
+    os.makedirs(directory)
+    for index in range(PACKAGE_COUNT):
+        name = package_name(index)
+        state = fake_state(name)
+        control_directory = os.path.join(directory, name, "DEBIAN")
+        os.makedirs(control_directory)
+        with open(os.path.join(control_directory, "control"), "w") as file:
+            file.write("Package: {0}\nVersion: 1.0-1\nArchitecture: amd64\nMaintainer: Nobody <nobody@example.org>\n"
+                       "Description: test package\n".format(name))
+        if state.status != Status.NO_CONFIG_FILE:
+            config = os.path.join(control_directory, "config")
+            with open(config, "w") as file:
+                file.write("#!/bin/sh\n. /usr/share/debconf/confmodule\n")
+                if state.status == Status.HAS_QUESTIONS:
+                    file.write("db_input {0} {1}/question || true\n".format(state.priority, name))
+                file.write("db_go || true\n")
+            os.chmod(config, 0o755)
+        subprocess.run(["dpkg-deb", "--build", "--root-owner-group", os.path.join(directory, name),
+                        os.path.join(directory, name + ".deb")], check=True, stdout=subprocess.DEVNULL)
+        shutil.rmtree(os.path.join(directory, name))
+    packages = subprocess.run(["dpkg-scanpackages", ".", "/dev/null"], cwd=directory, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    with open(os.path.join(directory, "Packages"), "wb") as file:
+        file.write(packages)
+    with open(os.path.join(directory, "Release"), "w") as file:
+        file.write("Architectures: amd64\nSHA256:\n {0} {1} Packages\n".format(hashlib.sha256(packages).hexdigest(),
+                                                                            len(packages)))
+
+
+def make_apt_config(directory, repository):
+    '''Configuration (for "APT_CONFIG") of apt which knows the repository only'''
+    for subdirectory in ["etc/apt.conf.d", "etc/preferences.d", "etc/sources.list.d", "etc/trusted.gpg.d",
+                         "state/lists/partial", "cache/archives/partial"]:
+        os.makedirs(os.path.join(directory, subdirectory))
+    open(os.path.join(directory, "status"), "w").close()
+    with open(os.path.join(directory, "etc", "sources.list"), "w") as file:
+        file.write("deb [trusted=yes] file:{0} ./\n".format(repository))
+    filename = os.path.join(directory, "apt.conf")
+    with open(filename, "w") as file:
+        file.write('''APT::Architecture "amd64";
+APT::Architectures {{ "amd64"; }};
+APT::Sandbox::User "root";
+Debug::NoLocking "true";
+Dir::Etc "{0}/etc";
+Dir::Etc::main "/dev/null";
+Dir::State "{0}/state";
+Dir::State::status "{0}/status";
+Dir::Cache "{0}/cache";
+'''.format(directory))
+    return filename
+
+
+@unittest.skipUnless(can_run_obtain_priorities(), "python-apt, chardet and dpkg tools are needed")
+class ShardedProcessingTestCase(unittest.TestCase):
+    '''Shards processed by "obtain-priorities --shard K/N" in separate processes are merged by "merge-priorities"'''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.__directory = tempfile.TemporaryDirectory()
+        directory = cls.__directory.name
+        make_repository(os.path.join(directory, "repository"))
+        environment = dict(os.environ)
+        environment["APT_CONFIG"] = make_apt_config(os.path.join(directory, "apt"),
+                                                    os.path.join(directory, "repository"))
+        environment["PYTHONPATH"] = os.pathsep.join([os.path.abspath(SOURCE_DIRECTORY)] +
+                                                    [path for path in [os.environ.get("PYTHONPATH")] if path])
+        cls.__environment = environment
+        subprocess.run(["apt-get", "update", "-qq"], env=environment, check=True, timeout=TIMEOUT)
+
+        cls.__filenames = []
+        shards = []
+        for index in range(1, SHARD_COUNT + 1):
+            filename = os.path.join(directory, "priorities{0}".format(index))
+            tempdir = os.path.join(directory, "temp{0}".format(index))
+            os.makedirs(tempdir)
+            shards.append(subprocess.Popen([sys.executable, "main.py", tempdir, filename, filename + ".script-types",
+                                            "--shard", "{0}/{1}".format(index, SHARD_COUNT)],
+                                           cwd=OBTAIN_PRIORITIES_DIRECTORY, env=environment,
+                                           stdout=subprocess.DEVNULL))
+            cls.__filenames.append(filename)
+        try:
+            for shard in shards:
+                if shard.wait(timeout=TIMEOUT) != 0:
+                    raise AssertionError("obtain-priorities has failed with code {0}".format(shard.returncode))
+        finally:
+            for shard in shards:
+                shard.kill()
+        for filename in cls.__filenames:
+            cls.__run("compact.py", filename)
+        cls.__packages = [ConcretePackage(package_name(index), "amd64") for index in range(PACKAGE_COUNT)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.__directory.cleanup()
+
+    @classmethod
+    def __run(cls, script, *args):
+        return subprocess.run([sys.executable, script] + list(args), cwd=OBTAIN_PRIORITIES_DIRECTORY,
+                              env=cls.__environment, stdout=subprocess.PIPE, universal_newlines=True,
+                              timeout=TIMEOUT)
+
+    def __merge(self, filenames):
+        output = os.path.join(self.__directory.name, "merged")
+        result = self.__run("merge.py", *filenames, "--output", output, "--shard-count", str(SHARD_COUNT))
+        merged = DebconfPriorities()
+        merged.import_from_xml(output)
+        return result, merged
+
+    def test_merge(self):
+        result, merged = self.__merge(self.__filenames)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertEqual(len(list(merged.items())), len(self.__packages))
+        for package in self.__packages:
+            self.assertEqual(merged[package], fake_state(package.name))
+
+    def test_shards_are_disjoint(self):
+        seen = set()
+        for filename in self.__filenames:
+            priorities = DebconfPriorities()
+            priorities.import_from_xml(filename)
+            packages = {package for package, state in priorities.items()}
+            self.assertTrue(packages)
+            self.assertFalse(seen & packages)
+            seen |= packages
+
+    def test_missing_shard(self):
+        result, merged = self.__merge(self.__filenames[:1] + self.__filenames[2:])
+        self.assertEqual(result.returncode, 1)
+        missing = [package for package in self.__packages if package.name in Shard(2, SHARD_COUNT)]
+        self.assertIn("Shard 2/{0}: {1} packages are not processed".format(SHARD_COUNT, len(missing)), result.stdout)
+        self.assertEqual(len(list(merged.items())), len(self.__packages) - len(missing))
+
+
+class ShardTestCase(unittest.TestCase):
+
+    def test_from_string(self):
+        shard = Shard.from_string("3/16")
+        self.assertEqual((shard.index, shard.count), (3, 16))
+        self.assertEqual(str(shard), "3/16")
+        for bad in ["3", "0/16", "17/16", "a/b", "1/0", "1/2/3"]:
+            with self.assertRaises(BadShardSpec):
+                Shard.from_string(bad)
+
+    def test_disjoint(self):
+        shards = [Shard(index, 7) for index in range(1, 8)]
+        for name in ["bash", "vim", "libc6", "python3-apt", "0ad", ""]:
+            self.assertEqual(sum(name in shard for shard in shards), 1)
+
+    def test_stable(self):
+        self.assertEqual(shard_of("bash", 16), 13)
+        self.assertEqual(shard_of("extremetuxracer", 3), 2)
+
+
+class PrioritiesMergeTestCase(unittest.TestCase):
+
+    def test_conflicts(self):
+        bash, vim = ConcretePackage("bash", "amd64"), ConcretePackage("vim", "amd64")
+        first, second, third = DebconfPriorities(), DebconfPriorities(), DebconfPriorities()
+        first[bash] = PackageState(Status.HAS_QUESTIONS, Priority.LOW)
+        first[vim] = PackageState(Status.PROCESSING_ERROR)
+        second[bash] = PackageState(Status.HAS_QUESTIONS, Priority.HIGH)
+        second[vim] = PackageState(Status.NO_CONFIG_FILE)
+        third[bash] = PackageState(Status.PROCESSING_ERROR)
+        third[vim] = PackageState(Status.NO_CONFIG_FILE)
+        merging = PrioritiesMerge()
+        for source, priorities in [("first", first), ("second", second), ("third", third)]:
+            merging.add(source, priorities)
+        self.assertEqual(merging.merged[bash], PackageState(Status.HAS_QUESTIONS, Priority.LOW))
+        self.assertEqual(merging.merged[vim], PackageState(Status.NO_CONFIG_FILE))
+        conflicts = merging.conflicts
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0].package, bash)
+        self.assertEqual([source for source, state in conflicts[0].states], ["first", "second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
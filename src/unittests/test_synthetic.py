@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+from limitedapt.synthetic import *
+from limitedapt import single
+
+
+def make_small_cache():
+    cache = SyntheticCache()
+    cache.create_package("libbase", installed=True, auto=True)
+    cache.create_package("libfoo", [("libbase",)])
+    cache.create_package("foo", [("libfoo",), ("foo-data", "foo-data-alt")])
+    cache.create_package("foo-data", architecture="all")
+    cache.create_package("foo-data-alt", architecture="all")
+    cache.create_package("bar", [("libbase",)], installed=True)
+    return cache
+
+
+class SyntheticCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.__cache = make_small_cache()
+
+    def test_lookup(self):
+        self.assertIn("foo", self.__cache)
+        self.assertIn("foo:amd64", self.__cache)
+        self.assertIn("foo-data:all", self.__cache)
+        self.assertNotIn("foo:armel", self.__cache)
+        with self.assertRaises(KeyError):
+            self.__cache["not-a-package"]
+        self.assertEqual([pkg.name for pkg in self.__cache],
+                         ["bar", "foo", "foo-data", "foo-data-alt", "libbase", "libfoo"])
+
+    def test_install_dependencies(self):
+        self.__cache["foo"].mark_install()
+        self.assertEqual([pkg.name for pkg in self.__cache.get_changes()], ["foo", "foo-data", "libfoo"])
+        self.assertFalse(self.__cache["foo"].is_auto_installed)
+        self.assertTrue(self.__cache["libfoo"].is_auto_installed)
+        self.assertFalse(self.__cache["foo-data-alt"].marked_install)
+        self.assertEqual(self.__cache.required_download, 300)
+        self.assertFalse(any(pkg.is_inst_broken for pkg in self.__cache.get_changes()))
+
+    def test_delete_and_commit(self):
+        self.assertFalse(self.__cache["libbase"].is_auto_removable)
+        self.__cache["bar"].mark_delete()
+        self.assertTrue(self.__cache["libbase"].is_auto_removable)
+        self.__cache.commit()
+        self.assertFalse(self.__cache["bar"].is_installed)
+        self.assertEqual(self.__cache.get_changes(), [])
+        self.__cache["libbase"].mark_delete()
+        self.assertTrue(self.__cache["libbase"].marked_delete)
+        self.__cache.clear()
+        self.assertTrue(self.__cache["libbase"].marked_keep)
+
+    def test_delete_reverse_dependencies(self):
+        self.__cache["libbase"].mark_delete()
+        self.assertTrue(self.__cache["bar"].marked_delete)
+
+    def test_cache_factory(self):
+        single.set_cache_factory(lambda: self.__cache)
+        try:
+            self.assertIs(single.get_cache(), self.__cache)
+        finally:
+            single.set_cache_factory(single.apt_cache_factory)
+
+
+class GeneratedCacheTestCase(unittest.TestCase):
+
+    def test_deterministic(self):
+        first = generate_cache(500, seed=7)
+        second = generate_cache(500, seed=7)
+        self.assertEqual([(pkg.name, pkg.candidate.version, pkg.candidate.depends, pkg.is_installed)
+                          for pkg in first],
+                         [(pkg.name, pkg.candidate.version, pkg.candidate.depends, pkg.is_installed)
+                          for pkg in second])
+
+    def test_installed_dependencies(self):
+        cache = generate_cache(2000, seed=3, manual_ratio=0.1)
+        for pkg in cache:
+            if pkg.is_installed:
+                self.assertFalse(pkg.is_now_broken, pkg.name)
+
+    def test_install_everything(self):
+        cache = generate_cache(300, seed=5)
+        with cache.actiongroup():
+            for pkg in cache:
+                if not pkg.is_installed:
+                    pkg.mark_install()
+        self.assertFalse(any(pkg.is_inst_broken for pkg in cache))
+        cache.commit()
+        self.assertTrue(all(pkg.is_installed for pkg in cache))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
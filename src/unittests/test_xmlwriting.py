@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import io
+import os
+import tempfile
+import unittest
+from lxml import etree
+from limitedapt.xmlwriting import *
+from limitedapt.enclosure import *
+from limitedapt.coownership import *
+from limitedapt.debconf import *
+
+
+def tree_written(root):
+    output = io.BytesIO()
+    etree.ElementTree(root).write(output, pretty_print=True, encoding="UTF-8", xml_declaration=True)
+    return output.getvalue()
+
+
+def incrementally_written(root_tag, elements, root_attributes=None, pretty=True):
+    output = io.BytesIO()
+    write_xml_document(output, root_tag, elements, root_attributes, pretty)
+    return output.getvalue()
+
+
+class WriteXmlDocumentTestCase(unittest.TestCase):
+
+    def __elements(self):
+        package = etree.Element("package", name="bash")
+        etree.SubElement(etree.SubElement(package, "arch", name="amd64"), "version", number="5.0-4")
+        return [package, etree.Element("fullpackage", name="vim")]
+
+    def test_pretty_as_tree(self):
+        root = etree.Element("enclosure", revision="3")
+        root.extend(self.__elements())
+        self.assertEqual(incrementally_written("enclosure", self.__elements(), {"revision": "3"}), tree_written(root))
+
+    def test_empty(self):
+        self.assertEqual(incrementally_written("packages", []), tree_written(etree.Element("packages")))
+
+    def test_compact(self):
+        written = incrementally_written("enclosure", self.__elements(), pretty=False)
+        self.assertEqual(written.split(b"\n", 1)[1],
+                         b'<enclosure><package name="bash"><arch name="amd64"><version number="5.0-4"/></arch>'
+                         b'</package><fullpackage name="vim"/></enclosure>')
+
+    def test_generator(self):
+        written = incrementally_written("packages", (etree.Element("package", name=str(index)) for index in range(3)))
+        self.assertEqual([element.get("name") for element in etree.fromstring(written)], ["0", "1", "2"])
+
+
+class StructuresWritingTestCase(unittest.TestCase):
+
+    def __check(self, structure_class, filename):
+        structure = structure_class()
+        structure.import_from_xml(filename)
+        with tempfile.TemporaryDirectory() as directory:
+            pretty_filename = os.path.join(directory, "pretty")
+            compact_filename = os.path.join(directory, "compact")
+            structure.export_to_xml(pretty_filename)
+            structure.export_to_xml(compact_filename, pretty=False)
+            with open(compact_filename, "rb") as compact:
+                self.assertEqual(compact.read().count(b"\n"), 1)
+            reimported = structure_class()
+            reimported.import_from_xml(compact_filename)
+            output = io.BytesIO()
+            reimported.export_to_xml(output)
+            with open(pretty_filename, "rb") as pretty:
+                self.assertEqual(output.getvalue(), pretty.read())
+
+    def test_enclosure(self):
+        self.__check(Enclosure, "data/enclosure-rules1")
+        self.__check(Enclosure, "data/enclosure-ranges1")
+
+    def test_coownership(self):
+        self.__check(CoownershipList, "data/coownership1")
+
+    def test_debconf_priorities(self):
+        self.__check(DebconfPriorities, "data/debconf-priorities1")
+
+
+if __name__ == "__main__":
+    unittest.main()
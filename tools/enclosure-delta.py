@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Generates enclosure feeds for publishing: the delta between two revisions of an enclosure
+and (optionally) compressed copies of the delta and the new enclosure
+'''
+
+import argparse
+import os
+import tempfile
+from limitedapt.enclosure import *
+from limitedapt.feeds import *
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate delta between two revisions of an enclosure')
+    parser.add_argument('old', help='enclosure the delta is based on')
+    parser.add_argument('new', help='new enclosure')
+    parser.add_argument('delta', help='file to write the delta to')
+    parser.add_argument('--base-revision', help='revision of the old enclosure (if it has no "revision" attribute)')
+    parser.add_argument('--revision', help='revision of the new enclosure (if it has no "revision" attribute)')
+    parser.add_argument('--feed', help='also write the whole new enclosure (with its revision) to this file')
+    parser.add_argument('--compress', choices=COMPRESSIONS, help='compress the written feeds')
+    args = parser.parse_args()
+
+    old = load_enclosure_feed(args.old)
+    new = load_enclosure_feed(args.new)
+    if args.base_revision is not None:
+        old.revision = args.base_revision
+    if args.revision is not None:
+        new.revision = args.revision
+    if old.revision is None or new.revision is None:
+        parser.error('revisions of both enclosures must be known')
+
+    delta = EnclosureDelta.between(old, new)
+    write_feed(delta, args.delta, args.compress)
+    print('{0} packages replaced, {1} packages removed'.format(len(delta.replaced), len(delta.removed)))
+    if args.feed is not None:
+        write_feed(new, args.feed, args.compress)
+
+
+def write_feed(structure, filename, compression):
+    if compression is None:
+        structure.export_to_xml(filename)
+        return
+    descriptor, temp_filename = tempfile.mkstemp()
+    os.close(descriptor)
+    try:
+        structure.export_to_xml(temp_filename)
+        compress_file(temp_filename, filename, compression)
+    finally:
+        os.remove(temp_filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import os
+import shutil
+from limitedapt.debconf import *
+
+
+PROGRAM_NAME = 'compact-priorities'
+
+
+def checkpoint_filename(priorities_filename):
+    return priorities_filename + ".checkpoint.sqlite"
+
+
+def open_script_types(script_types_filename, repeat_mode, resuming, reprocessed):
+    '''Opens the script types file for writing lines of packages being processed.
+    If an interrupted run is resumed, lines of the packages which will be processed again
+    ("reprocessed" are their names, "name:architecture") are removed: they have been written
+    after the last commit of the checkpoint'''
+    if not resuming:
+        if os.path.exists(script_types_filename):
+            shutil.copyfile(script_types_filename, script_types_filename + ".backup")
+        return open(script_types_filename, "w" if repeat_mode else "a")
+    if os.path.exists(script_types_filename):
+        temp_filename = script_types_filename + ".new"
+        with open(script_types_filename) as old_file, open(temp_filename, "w") as new_file:
+            for line in old_file:
+                if line.split(" ", 1)[0] not in reprocessed:
+                    new_file.write(line)
+        os.replace(temp_filename, script_types_filename)
+    return open(script_types_filename, "a")
+
+
+def compact(priorities_filename, db_filename, keep_checkpoint):
+    checkpoint = checkpoint_filename(priorities_filename)
+    if not os.path.exists(checkpoint):
+        print('There is no checkpoint "{0}". Nothing to compact'.format(checkpoint))
+        return
+    priorities = DebconfPriorities()
+    if os.path.exists(priorities_filename):
+        shutil.copyfile(priorities_filename, priorities_filename + ".backup")
+        priorities.import_from_xml(priorities_filename)
+    for package, state in DebconfPrioritiesDB("sqlite:///" + checkpoint).items():
+        priorities[package] = state
+
+    temp_filename = priorities_filename + ".new"
+    priorities.export_to_xml(temp_filename)
+    os.replace(temp_filename, priorities_filename)
+    if db_filename is not None:
+        temp_filename = db_filename + ".new"
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        db = DebconfPrioritiesDB("sqlite:///" + temp_filename)
+        db.add_new(priorities.items())
+        db.commit()
+        os.replace(temp_filename, db_filename)
+    if not keep_checkpoint:
+        os.remove(checkpoint)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME,
+                                     description='''%(prog)s merges results saved by obtain-priorities '''
+                                     '''into the priority list.''')
+    parser.add_argument('priorities_filename', type=str, help='Filename of the priority list')
+    parser.add_argument('--db', type=str, help='Also write the priority list as SQLite database to this file')
+    parser.add_argument('-k', '--keep-checkpoint', action='store_true',
+                        help='Do not remove the checkpoint, so processing may be continued')
+    args = parser.parse_args()
+    compact(args.priorities_filename, args.db, args.keep_checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,9 @@ import limitedapt.errors
 from limitedapt.packages import *
 from limitedapt.single import get_cache
 from limitedapt.debconf import *
+from limitedapt.sharding import Shard, BadShardSpec
 from parsing import *
+from compact import checkpoint_filename, open_script_types
 
 
 PROGRAM_NAME = 'obtain-priorities'
@@ -36,7 +38,7 @@ PROGRAM_NAME = 'obtain-priorities'
 
 class UnpackingError(limitedapt.errors.Error):
 
-    def __int__(self, package):
+    def __init__(self, package):
         self.__package = package
 
     @property
@@ -44,43 +46,62 @@ class UnpackingError(limitedapt.errors.Error):
         return self.__package
 
 
-def process(tempdir, priorities_filename, script_types_filename, repeat_mode, autoremove_mode, verbose_mode, debug_mode):
+def process(tempdir, priorities_filename, script_types_filename, repeat_mode, autoremove_mode, verbose_mode, debug_mode,
+            commit_period, shard=None):
 
     def get_control_dir(deb_filename):
         filename = Path(deb_filename)
         filename_without_ext = filename.with_suffix("")
         return str(filename_without_ext) + "_control"
 
+    # Results go to the checkpoint database as soon as they are obtained. If it exists the previous run
+    # has been interrupted and is resumed. Packages of it are not processed again even in repeat mode
+    checkpoint = checkpoint_filename(priorities_filename)
+    resuming = os.path.exists(checkpoint)
+    processed = DebconfPrioritiesDB("sqlite:///" + checkpoint)
     priorities = DebconfPriorities()
-    if os.path.exists(priorities_filename):
-        shutil.copyfile(priorities_filename, priorities_filename + ".backup")
+    if not repeat_mode and os.path.exists(priorities_filename):
         priorities.import_from_xml(priorities_filename)
     cache = get_cache()
 
     def need_to_process(pkg):
-        return repeat_mode or not priorities.well_processed(ConcretePackage(pkg.shortname, pkg.candidate.architecture))
+        if shard is not None and pkg.shortname not in shard:
+            return False
+        package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
+        return not processed.well_processed(package) and (repeat_mode or not priorities.well_processed(package))
 
-    need_to_download_space = sum(pkg.candidate.size for pkg in cache if pkg.candidate is not None and need_to_process(pkg))
+    if shard is not None:
+        print('Processing shard {0}'.format(shard))
+    if resuming:
+        print('Resuming interrupted processing from "{0}"'.format(checkpoint))
+
+    to_process = [pkg for pkg in cache if pkg.candidate is not None and need_to_process(pkg)]
+    need_to_download_space = sum(pkg.candidate.size for pkg in to_process)
 
     print('Need to download: {0} bytes'.format(need_to_download_space))
 
+    script_types_fh = open_script_types(script_types_filename, repeat_mode, resuming,
+                                        {str(ConcretePackage(pkg.shortname, pkg.candidate.architecture))
+                                         for pkg in to_process})
+    downloaded_space = 0
+    not_committed = 0
     try:
-        if os.path.exists(script_types_filename):
-            shutil.copyfile(script_types_filename, script_types_filename + ".backup")
-        script_types_fh = open(script_types_filename, "w" if repeat_mode else "a")
-        downloaded_space = 0
         for pkg in cache:
             if pkg.candidate is not None and need_to_process(pkg):
+                concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
                 try:
                     deb_filename = pkg.candidate.fetch_binary(destdir=tempdir, progress=apt.progress.text.AcquireProgress())
                     control_dir = get_control_dir(deb_filename)
                     if not os.path.exists(control_dir):
                         os.makedirs(control_dir)
                         if subprocess.call(["/usr/bin/dpkg-deb", "--control", deb_filename, control_dir]) != 0:
-                            raise UnpackingError()
-                    concrete_package = ConcretePackage(pkg.shortname, pkg.candidate.architecture)
+                            raise UnpackingError(concrete_package)
                     state = process_package(concrete_package, control_dir, script_types_fh)
-                    priorities[concrete_package] = state
+                    processed[concrete_package] = state
+                    not_committed += 1
+                    if not_committed >= commit_period:
+                        processed.commit()
+                        not_committed = 0
                     if autoremove_mode:
                         os.remove(deb_filename)
                         if state.status == Status.NO_CONFIG_FILE:
@@ -90,6 +111,8 @@ def process(tempdir, priorities_filename, script_types_filename, repeat_mode, au
                         print('{0} bytes has been downloaded yet'.format(downloaded_space))
                 except apt.package.FetchError:
                     pass
+        print('All packages have been processed. Run "compact.py {0}" to write the priority list'.format(
+            priorities_filename))
     except apt.package.FetchError as err:
         print('''Error: cannot fetch: ''', err)
     except UnpackingError as err:
@@ -100,9 +123,9 @@ def process(tempdir, priorities_filename, script_types_filename, repeat_mode, au
         pass
     finally:
         script_types_fh.close()
+        processed.commit()
         if verbose_mode:
             print('{0} bytes has been downloaded yet'.format(downloaded_space))
-        priorities.export_to_xml(priorities_filename)
 
 
 def main():
@@ -118,10 +141,18 @@ def main():
     parser.add_argument('-v', '--verbose', action='store_true', help='Display extra information')
     parser.add_argument('-d', '--debug', action='store_true',
                         help='Debugging mode. Print detailed information on every action')
+    parser.add_argument('-s', '--shard', type=str,
+                        help='Process only K-th of N slices of packages ("K/N") so that N hosts can share the work')
+    parser.add_argument('-c', '--commit-period', type=int, default=20,
+                        help='Count of processed packages to save to the checkpoint at once')
 
     args = parser.parse_args()
+    try:
+        shard = Shard.from_string(args.shard) if args.shard is not None else None
+    except BadShardSpec as err:
+        parser.error(str(err))
     process(args.tempdir, args.priorities_filename, args.script_types,
-            args.repeat, args.autoremove, args.verbose, args.debug)
+            args.repeat, args.autoremove, args.verbose, args.debug, args.commit_period, shard)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) Anton Liaukevich 2011-2020 <leva.dev@gmail.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import os
+import sys
+from limitedapt.debconf import *
+from limitedapt.packages import *
+from limitedapt.sharding import *
+from limitedapt.single import get_cache
+
+
+PROGRAM_NAME = 'merge-priorities'
+
+
+def expected_packages():
+    return [ConcretePackage(pkg.shortname, pkg.candidate.architecture) for pkg in get_cache() if pkg.candidate is not None]
+
+
+def merge(shard_filenames, output_filename, db_filename, shard_count, force):
+    merging = PrioritiesMerge()
+    for filename in shard_filenames:
+        priorities = DebconfPriorities()
+        priorities.import_from_xml(filename)
+        merging.add(filename, priorities)
+
+    conflicts = merging.conflicts
+    for conflict in conflicts:
+        print('Conflict: "{0}": {1}'.format(conflict.package, ", ".join(
+            '{0} in "{1}"'.format(state.status if state.priority is None else state.priority, source)
+            for source, state in conflict.states)))
+
+    gap_count = 0
+    if shard_count is not None:
+        gaps = merging.coverage_gaps(expected_packages(), shard_count)
+        for shard in sorted(gaps, key=lambda shard: shard.index):
+            gap_count += len(gaps[shard])
+            print('Shard {0}: {1} packages are not processed, e. g. "{2}"'.format(shard, len(gaps[shard]),
+                                                                                  gaps[shard][0]))
+
+    if conflicts and not force:
+        print('Nothing has been written because of {0} conflicts'.format(len(conflicts)))
+        return 1
+    merging.merged.export_to_xml(output_filename)
+    if db_filename is not None:
+        if os.path.exists(db_filename):
+            os.remove(db_filename)
+        db = DebconfPrioritiesDB("sqlite:///" + db_filename)
+        db.add_new(merging.merged.items())
+        db.commit()
+    return 1 if conflicts or gap_count else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=PROGRAM_NAME,
+                                     description='''%(prog)s combines priority lists obtained by shards '''
+                                     '''("obtain-priorities --shard K/N") into one.''')
+    parser.add_argument('shards', type=str, nargs='+', help='Priority lists of shards')
+    parser.add_argument('-o', '--output', type=str, required=True, help='Filename for resulting priority list')
+    parser.add_argument('--db', type=str, help='Also write the priority list as SQLite database to this file')
+    parser.add_argument('-n', '--shard-count', type=int,
+                        help='Count of shards: report packages of the apt cache which no shard has processed')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Write the result in spite of conflicts (the state from the first list wins)')
+    args = parser.parse_args()
+    sys.exit(merge(args.shards, args.output, args.db, args.shard_count, args.force))
+
+
+if __name__ == "__main__":
+    main()